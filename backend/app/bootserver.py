@@ -0,0 +1,329 @@
+"""
+Optional asyncio boot-file server for RAM_DISK (an alternative to nginx /pxe/).
+
+- Zero-copy: response bodies go out with os.sendfile (loop.sendfile).
+- HTTP Range / resume: single byte ranges, 206 + Content-Range.
+- Fairness: a token bucket per client IP and one global bucket; bodies are
+  sent in slices so every stream gets its turn.
+- Admission control: at most `max_streams` concurrent streams of large files
+  (the squashfs); later boots wait in FIFO order instead of all crawling
+  along at once and timing out, and get 503 + Retry-After after
+  `queue_timeout` seconds.
+- Per-stream counters for the dashboard (`stats()`).
+- With a `precomputed` index (see precompute.py): strong ETags, 304 for
+  If-None-Match / If-Modified-Since, and the precomputed .gz variant for
+  clients that send Accept-Encoding: gzip.
+"""
+
+import asyncio
+import itertools
+import os
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import unquote
+
+SLICE = 256 * 1024
+HEADER_LIMIT = 16 * 1024
+RANGE_PREFIX = "bytes="
+
+
+class TokenBucket:
+    """Bytes/s limiter; rate 0 means unlimited. Waiters queue on the deficit, so sharing is FIFO-fair."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(rate // 4, SLICE)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    async def consume(self, amount):
+        if not self.rate:
+            return
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= amount
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single `bytes=` range, None for no range, ValueError if unsatisfiable."""
+    if not header or not header.startswith(RANGE_PREFIX) or "," in header:
+        return None
+    first, _, last = header[len(RANGE_PREFIX):].strip().partition("-")
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start > end or start >= size:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+def not_modified(headers, etag, mtime):
+    """True when the request's validators still match (If-None-Match wins over If-Modified-Since)."""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    since = headers.get("if-modified-since")
+    if since:
+        try:
+            return int(parsedate_to_datetime(since).timestamp()) >= mtime
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+class Stream:
+    def __init__(self, stream_id, client, path, size, start, length):
+        self.id = stream_id
+        self.client = client
+        self.path = path
+        self.size = size
+        self.start = start
+        self.length = length
+        self.sent = 0
+        self.state = "queued"
+        self.created = time.time()
+        self.started = None
+
+    def to_dict(self):
+        elapsed = time.time() - self.started if self.started else 0
+        return {
+            "id": self.id,
+            "client": self.client,
+            "path": self.path,
+            "state": self.state,
+            "offset": self.start,
+            "length": self.length,
+            "sent": self.sent,
+            "rate": round(self.sent / elapsed) if elapsed > 0 else None,
+            "queued_for": round((self.started or time.time()) - self.created, 2),
+        }
+
+
+class BootFileServer:
+    def __init__(self, root, host="0.0.0.0", port=8080, prefix="/pxe/", client_rate=0, global_rate=0,
+                 max_streams=0, queue_timeout=300, admission_min_size=64 * 1024 * 1024, on_request=None):
+        self.root = os.path.realpath(root)
+        self.host = host
+        self.port = port
+        self.prefix = prefix
+        self.client_rate = client_rate
+        self.global_bucket = TokenBucket(global_rate)
+        self.max_streams = max_streams
+        self.queue_timeout = queue_timeout
+        self.admission_min_size = admission_min_size
+        # `on_request(entry)` gets an access-log style dict after every response
+        self.on_request = on_request
+        # Optional precompute.Precomputed index (ETags and .gz variants)
+        self.precomputed = None
+        self.server = None
+        self.streams = {}
+        self.buckets = {}
+        self.totals = {"requests": 0, "bytes": 0, "completed": 0, "aborted": 0, "rejected": 0, "not_found": 0,
+                       "not_modified": 0, "gzip": 0}
+        self._slots = asyncio.Semaphore(max_streams) if max_streams else None
+        self._ids = itertools.count(1)
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port, backlog=4096)
+        print(f"Boot file server listening on {self.host}:{self.port} (root {self.root})")
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def stats(self):
+        streams = [s.to_dict() for s in self.streams.values()]
+        return {
+            "totals": dict(self.totals),
+            "streaming": sum(1 for s in streams if s["state"] == "streaming"),
+            "queued": sum(1 for s in streams if s["state"] == "queued"),
+            "max_streams": self.max_streams,
+            "streams": streams,
+        }
+
+    # --- request handling ---
+
+    def _resolve(self, target):
+        path = unquote(target.split("?", 1)[0])
+        if not path.startswith(self.prefix):
+            return None
+        full = os.path.realpath(os.path.join(self.root, path[len(self.prefix):]))
+        if full != self.root and not full.startswith(self.root + os.sep):
+            return None
+        return full if os.path.isfile(full) else None
+
+    def _bucket(self, client):
+        bucket = self.buckets.get(client)
+        if bucket is None:
+            bucket = self.buckets[client] = TokenBucket(self.client_rate)
+        return bucket
+
+    async def _respond(self, writer, status, reason, headers=(), keep_alive=True):
+        lines = [f"HTTP/1.1 {status} {reason}", f"Date: {formatdate(usegmt=True)}", "Server: utbk-pxe"]
+        lines += [f"{k}: {v}" for k, v in headers]
+        lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+    async def _handle(self, reader, writer):
+        client = (writer.get_extra_info("peername") or ("?",))[0]
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                if len(head) > HEADER_LIMIT:
+                    return
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                parts = request_line.split()
+                if len(parts) != 3:
+                    return
+                method, target, version = parts
+                headers = {}
+                for line in header_lines:
+                    if ":" in line:
+                        key, value = line.split(":", 1)
+                        headers[key.strip().lower()] = value.strip()
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                keep_alive = await self._serve(writer, client, method, target, headers, keep_alive)
+                if not keep_alive:
+                    return
+        finally:
+            writer.close()
+
+    async def _serve(self, writer, client, method, target, headers, keep_alive):
+        self.totals["requests"] += 1
+        if method not in ("GET", "HEAD"):
+            await self._respond(writer, 405, "Method Not Allowed", [("Allow", "GET, HEAD"), ("Content-Length", 0)], keep_alive)
+            return keep_alive
+        path = self._resolve(target)
+        if path is None:
+            self.totals["not_found"] += 1
+            await self._respond(writer, 404, "Not Found", [("Content-Length", 0)], keep_alive)
+            self._log(client, method, target, 404, 0)
+            return keep_alive
+
+        entry = self.precomputed.lookup(path) if self.precomputed else None
+        variant = []
+        f = None
+        if entry is not None:
+            etag = entry["etag"]
+            if entry["gzip"]:
+                variant.append(("Vary", "Accept-Encoding"))
+                if "range" not in headers and "gzip" in headers.get("accept-encoding", ""):
+                    try:
+                        f = open(f"{path}.gz", "rb")
+                        etag = f'{etag[:-1]}-gz"'
+                        variant.append(("Content-Encoding", "gzip"))
+                    except OSError:
+                        # The .gz went away since the last refresh: serve the file itself
+                        pass
+            variant.append(("ETag", etag))
+            if not_modified(headers, etag, entry["mtime_ns"] // 1_000_000_000):
+                if f:
+                    f.close()
+                self.totals["not_modified"] += 1
+                await self._respond(writer, 304, "Not Modified", [("ETag", etag), ("Content-Length", 0)], keep_alive)
+                self._log(client, method, target, 304, 0)
+                return keep_alive
+            if f:
+                self.totals["gzip"] += 1
+
+        with f or open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            size = st.st_size
+            try:
+                byte_range = parse_range(headers.get("range"), size)
+            except ValueError:
+                await self._respond(writer, 416, "Range Not Satisfiable", [("Content-Range", f"bytes */{size}"), ("Content-Length", 0)], keep_alive)
+                self._log(client, method, target, 416, 0)
+                return keep_alive
+            start, end = byte_range or (0, size - 1)
+            length = max(end - start + 1, 0)
+            common = [
+                ("Content-Type", "application/octet-stream"),
+                ("Accept-Ranges", "bytes"),
+                ("Last-Modified", formatdate(st.st_mtime, usegmt=True)),
+                ("Content-Length", length),
+            ] + variant
+            if byte_range:
+                status, reason = 206, "Partial Content"
+                common.append(("Content-Range", f"bytes {start}-{end}/{size}"))
+            else:
+                status, reason = 200, "OK"
+            if method == "HEAD" or length == 0:
+                await self._respond(writer, status, reason, common, keep_alive)
+                self._log(client, method, target, status, 0)
+                return keep_alive
+
+            stream = Stream(next(self._ids), client, target, size, start, length)
+            self.streams[stream.id] = stream
+            admitted = False
+            try:
+                if self._slots is not None and size >= self.admission_min_size:
+                    try:
+                        await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+                        admitted = True
+                    except asyncio.TimeoutError:
+                        # Logged once, by the finally below
+                        status = 503
+                        self.totals["rejected"] += 1
+                        await self._respond(writer, 503, "Service Unavailable", [("Retry-After", 30), ("Content-Length", 0)], False)
+                        return False
+                stream.state = "streaming"
+                stream.started = time.time()
+                await self._respond(writer, status, reason, common, keep_alive)
+                await self._send_body(writer, f, stream)
+                self.totals["completed"] += 1
+                return keep_alive
+            except (ConnectionError, OSError):
+                self.totals["aborted"] += 1
+                return False
+            finally:
+                if admitted:
+                    self._slots.release()
+                self.totals["bytes"] += stream.sent
+                self._log(client, method, target, status, stream.sent)
+                del self.streams[stream.id]
+                if not any(s.client == client for s in self.streams.values()):
+                    self.buckets.pop(client, None)
+
+    async def _send_body(self, writer, f, stream):
+        loop = asyncio.get_running_loop()
+        bucket = self._bucket(stream.client)
+        offset, remaining = stream.start, stream.length
+        while remaining:
+            count = min(SLICE, remaining)
+            await bucket.consume(count)
+            await self.global_bucket.consume(count)
+            sent = await loop.sendfile(writer.transport, f, offset, count)
+            if not sent:
+                raise ConnectionError("Client went away")
+            offset += sent
+            remaining -= sent
+            stream.sent += sent
+
+    def _log(self, client, method, target, status, size):
+        if self.on_request is None:
+            return
+        try:
+            self.on_request({
+                "ip": client,
+                "time": time.strftime("%d/%b/%Y:%H:%M:%S %z"),
+                "method": method,
+                "path": target,
+                "status": str(status),
+                "size": str(size),
+                "ts": time.time(),
+            })
+        except Exception as e:
+            print(f"Boot server listener error: {e}")
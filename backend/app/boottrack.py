@@ -0,0 +1,318 @@
+"""
+Per-client boot progress tracker.
+
+Builds a small state machine per client (keyed by IP, with the MAC attached
+once a DHCP lease is seen) from the nginx access log and, where available,
+the TFTP and DHCP logs:
+
+    dhcp -> efi -> script -> kernel -> initrd -> rootfs (booted)
+
+HTTP stages complete once the bytes served for the file reach its size in
+RAM_DISK. Stage counts, per-subnet counts and the change feed used by the
+SSE stream are maintained incrementally, so queries never scan all clients.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
+
+STAGES = ["dhcp", "efi", "script", "kernel", "initrd", "rootfs"]
+STAGE_INDEX = {name: i for i, name in enumerate(STAGES)}
+BOOTED = "rootfs"
+
+# HTTP path -> (stage, file in RAM_DISK whose size marks completion)
+HTTP_STAGES = {
+    "/pxe/vmlinuz": ("kernel", "vmlinuz"),
+    "/pxe/initrd.img": ("initrd", "initrd.img"),
+    "/pxe/filesystem.squashfs": ("rootfs", "filesystem.squashfs"),
+}
+TFTP_STAGES = {
+    "bootx64.efi": "efi",
+    "autoexec.ipxe": "script",
+    "boot.ipxe": "script",
+}
+GENERATION_PREFIX = "/pxe/generations/"
+# Dynamic per-client iPXE script (chained from autoexec.ipxe)
+SCRIPT_PATH = "/api/ipxe"
+
+# in.tftpd: "RRQ from 10.0.0.5 filename bootx64.efi"; dnsmasq-tftp: "sent /var/lib/tftpboot/bootx64.efi to 10.0.0.5"
+TFTP_PATTERN = re.compile(r'RRQ from (?P<ip>\d+\.\d+\.\d+\.\d+) filename (?P<file>\S+)|sent (?P<path>\S+) to (?P<ip2>\d+\.\d+\.\d+\.\d+)')
+
+
+def http_stage(path):
+    """(stage, file under RAM_DISK) for a /pxe/ path, including generation-pinned ones."""
+    target = HTTP_STAGES.get(path)
+    if target is None and path.split("?", 1)[0] == SCRIPT_PATH:
+        return ("script", None)
+    if target is None and path.startswith(GENERATION_PREFIX):
+        stage = HTTP_STAGES.get("/pxe/" + os.path.basename(path))
+        if stage is not None:
+            target = (stage[0], path[len("/pxe/"):])
+    return target
+
+
+def parse_tftp_line(line: str):
+    match = TFTP_PATTERN.search(line)
+    if not match:
+        return None
+    if match.group("ip"):
+        return {"ip": match.group("ip"), "file": os.path.basename(match.group("file")), "ts": time.time()}
+    return {"ip": match.group("ip2"), "file": os.path.basename(match.group("path")), "ts": time.time()}
+
+
+class BootRecord:
+    __slots__ = ("ip", "mac", "stage", "stages", "transferred", "cycle_start", "last_activity", "boots", "version", "subnet")
+
+    def __init__(self, ip, ts):
+        self.ip = ip
+        self.mac = None
+        self.stage = None
+        self.stages = {}
+        self.transferred = {}
+        self.cycle_start = ts
+        self.last_activity = ts
+        self.boots = 0
+        self.version = 0
+        self.subnet = ip.rsplit(".", 1)[0] + ".0/24"
+
+    def to_dict(self, now, stall_after):
+        durations = {}
+        previous = self.cycle_start
+        for name in STAGES:
+            ts = self.stages.get(name)
+            if ts is not None:
+                durations[name] = round(max(ts - previous, 0), 3)
+                previous = ts
+        return {
+            "ip": self.ip,
+            "mac": self.mac,
+            "stage": self.stage,
+            "booted": self.stage == BOOTED,
+            "stalled": self.stage != BOOTED and now - self.last_activity > stall_after,
+            "stages": dict(self.stages),
+            "durations": durations,
+            "transferred": dict(self.transferred),
+            "cycle_start": self.cycle_start,
+            "last_activity": self.last_activity,
+            "boots": self.boots,
+            "version": self.version,
+        }
+
+
+class BootTracker:
+    def __init__(self, ram_disk, stall_after=120, new_cycle_after=300, clock=time.time):
+        self.ram_disk = ram_disk
+        self.stall_after = stall_after
+        self.new_cycle_after = new_cycle_after
+        self.clock = clock
+        self.lock = threading.Lock()
+        self._stage_listeners = []
+        self._sizes = {}
+        self.reset()
+
+    def add_stage_listener(self, callback):
+        """`callback(record, stage)` runs (under the tracker lock) whenever a client reaches a new stage."""
+        self._stage_listeners.append(callback)
+
+    def reset(self):
+        with self.lock:
+            self.clients = {}
+            self.by_mac = {}
+            self.version = 0
+            # key -> None, ordered by last change (oldest first)
+            self._changes = OrderedDict()
+            # Unbooted clients active within stall_after (oldest first), and those past it; the
+            # sweep moves the front of _pending into stalled, so counting stalled clients is O(1)
+            self._pending = OrderedDict()
+            self.stalled = OrderedDict()
+            self.by_stage = {name: {} for name in [None] + STAGES}
+            self.by_subnet = {}
+
+    # --- ingestion ---
+
+    def ingest_access(self, entries):
+        """LogFollower listener for the nginx access log."""
+        with self.lock:
+            for entry in entries:
+                target = http_stage(entry["path"])
+                if target is None or entry["status"] not in ("200", "206"):
+                    continue
+                stage, filename = target
+                record = self._get(entry["ip"], entry["ts"])
+                self._maybe_new_cycle(record, stage, entry["ts"])
+                if filename is None:
+                    self._advance(record, stage, entry["ts"])
+                    continue
+                sent = record.transferred.get(stage, 0) + int(entry["size"])
+                record.transferred[stage] = sent
+                size = self._file_size(filename)
+                if size and sent >= size:
+                    self._advance(record, stage, entry["ts"])
+                else:
+                    self._touch(record, entry["ts"])
+
+    def ingest_tftp(self, entries):
+        with self.lock:
+            for entry in entries:
+                stage = TFTP_STAGES.get(entry["file"])
+                if stage is not None:
+                    self._advance(self._get(entry["ip"], entry["ts"]), stage, entry["ts"])
+
+    def ingest_dhcp(self, entries):
+        with self.lock:
+            for entry in entries:
+                record = self._get(entry["ip"], entry["ts"])
+                if record.mac != entry["mac"]:
+                    if record.mac and self.by_mac.get(record.mac) is record:
+                        del self.by_mac[record.mac]
+                    record.mac = entry["mac"]
+                    self.by_mac[record.mac] = record
+                self._advance(record, "dhcp", entry["ts"])
+
+    def record_stage(self, ip, stage, ts=None, transferred=None):
+        """Direct hook for in-process servers (TFTP, boot file server)."""
+        ts = self.clock() if ts is None else ts
+        with self.lock:
+            record = self._get(ip, ts)
+            if transferred is not None:
+                record.transferred[stage] = record.transferred.get(stage, 0) + transferred
+            self._advance(record, stage, ts)
+
+    def _get(self, ip, ts):
+        record = self.clients.get(ip)
+        if record is None:
+            record = self.clients[ip] = BootRecord(ip, ts)
+            self.by_stage[None][ip] = None
+            self._count_subnet(record.subnet, None, 1)
+        return record
+
+    def _maybe_new_cycle(self, record, stage, ts):
+        current = STAGE_INDEX.get(record.stage, -1)
+        if STAGE_INDEX[stage] < current and (record.stage == BOOTED or ts - record.last_activity > self.new_cycle_after):
+            # The machine rebooted: start a new boot cycle
+            self._move(record, None)
+            record.stages = {}
+            record.transferred = {}
+            record.cycle_start = ts
+
+    def _advance(self, record, stage, ts):
+        self._maybe_new_cycle(record, stage, ts)
+        current = STAGE_INDEX.get(record.stage, -1)
+        target = STAGE_INDEX[stage]
+        if target > current:
+            record.stages[stage] = ts
+            self._move(record, stage)
+            if stage == BOOTED:
+                record.boots += 1
+            for callback in self._stage_listeners:
+                callback(record, stage)
+        elif stage not in record.stages:
+            record.stages[stage] = ts
+        self._touch(record, max(ts, record.last_activity))
+
+    def _move(self, record, stage):
+        if record.stage == stage:
+            return
+        self.by_stage[record.stage].pop(record.ip, None)
+        self.by_stage[stage][record.ip] = None
+        if stage == BOOTED:
+            self._pending.pop(record.ip, None)
+            self.stalled.pop(record.ip, None)
+        self._count_subnet(record.subnet, record.stage, -1)
+        self._count_subnet(record.subnet, stage, 1)
+        record.stage = stage
+
+    def _touch(self, record, ts):
+        record.last_activity = max(ts, record.last_activity)
+        self.version += 1
+        record.version = self.version
+        self._changes[record.ip] = None
+        self._changes.move_to_end(record.ip)
+        self.stalled.pop(record.ip, None)
+        if record.stage != BOOTED:
+            self._pending[record.ip] = None
+            self._pending.move_to_end(record.ip)
+
+    def _count_subnet(self, subnet, stage, delta):
+        counts = self.by_subnet.setdefault(subnet, {})
+        key = stage or "seen"
+        counts[key] = counts.get(key, 0) + delta
+        if not counts[key]:
+            del counts[key]
+        if not counts:
+            del self.by_subnet[subnet]
+
+    def _file_size(self, filename):
+        now = time.monotonic()
+        cached = self._sizes.get(filename)
+        if cached is not None and now - cached[1] < 5:
+            return cached[0]
+        try:
+            size = os.path.getsize(os.path.join(self.ram_disk, filename))
+        except OSError:
+            size = 0
+        self._sizes[filename] = (size, now)
+        return size
+
+    # --- queries ---
+
+    def summary(self):
+        with self.lock:
+            self._sweep(self.clock())
+            return {
+                "total": len(self.clients),
+                "stages": {(name or "seen"): len(keys) for name, keys in self.by_stage.items()},
+                "stalled": len(self.stalled),
+                "subnets": {subnet: dict(counts) for subnet, counts in self.by_subnet.items()},
+                "version": self.version,
+            }
+
+    def list_clients(self, stage=None, stalled=False, offset=0, limit=100):
+        with self.lock:
+            now = self.clock()
+            self._sweep(now)
+            if stalled:
+                keys = iter(self.stalled)
+                total = len(self.stalled)
+            elif stage is not None:
+                members = self.by_stage.get(None if stage == "seen" else stage, {})
+                keys = iter(members)
+                total = len(members)
+            else:
+                keys = iter(self.clients)
+                total = len(self.clients)
+            page = [self.clients[ip].to_dict(now, self.stall_after) for ip in islice(keys, offset, offset + limit)]
+            return total, page
+
+    def client(self, key):
+        with self.lock:
+            record = self.clients.get(key) or self.by_mac.get(key.lower())
+            return record.to_dict(self.clock(), self.stall_after) if record else None
+
+    def changes_since(self, version, limit=500):
+        """Clients changed after `version`, oldest change first, and the version to resume from."""
+        with self.lock:
+            now = self.clock()
+            changed = []
+            for ip in reversed(self._changes):
+                record = self.clients[ip]
+                if record.version <= version:
+                    break
+                changed.append(record)
+            changed.reverse()
+            changed = changed[:limit]
+            resume = changed[-1].version if changed else self.version
+            return resume, [record.to_dict(now, self.stall_after) for record in changed]
+
+    def _sweep(self, now):
+        # _pending is ordered by last activity: only the clients that just went quiet are visited
+        edge = now - self.stall_after
+        while self._pending:
+            ip = next(iter(self._pending))
+            if self.clients[ip].last_activity > edge:
+                break
+            del self._pending[ip]
+            self.stalled[ip] = None
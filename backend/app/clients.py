@@ -0,0 +1,193 @@
+"""
+Sliding-window index of PXE clients, fed from the access log follower.
+
+Hits are kept in per-second buckets. Every IP lives only in the bucket of its
+latest hit, so the number of active clients is simply the number of IPs in
+the buckets inside the window. Buckets inside the default window and buckets
+beyond it (up to `horizon`) are kept apart, which makes the default-window
+count O(1); any other window is answered from the buckets without rescanning
+the log.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
+
+
+class ClientState:
+    __slots__ = ("ip", "first_seen", "last_seen", "hits", "bytes", "last_path", "last_status", "bucket")
+
+    def __init__(self, ip, ts):
+        self.ip = ip
+        self.first_seen = ts
+        self.last_seen = ts
+        self.hits = 0
+        self.bytes = 0
+        self.last_path = ""
+        self.last_status = ""
+        self.bucket = None
+
+    def to_dict(self):
+        return {
+            "ip": self.ip,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "hits": self.hits,
+            "bytes": self.bytes,
+            "last_path": self.last_path,
+            "last_status": self.last_status,
+        }
+
+
+class ClientWindowIndex:
+    def __init__(self, window=120, horizon=3600, prefix="/pxe/", clock=time.time):
+        self.window = window
+        self.horizon = max(horizon, window)
+        self.prefix = prefix
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.clients = {}
+            self._recent = OrderedDict()  # second -> set(ip), inside the window
+            self._old = OrderedDict()  # second -> set(ip), window < age <= horizon
+            self._recent_count = 0
+            self._newest = 0
+            self.session_started = False
+            self.session_min = 0
+            self.session_max = 0
+
+    # --- ingestion ---
+
+    def ingest(self, entries):
+        """LogFollower listener: record every /pxe/ hit of a batch."""
+        with self.lock:
+            prefix = self.prefix
+            for entry in entries:
+                if entry["path"].startswith(prefix):
+                    self._record(entry["ip"], entry["ts"], entry["path"], int(entry["size"]), entry["status"])
+            self._advance(self.clock())
+
+    def record(self, ip, ts, path="", size=0, status=""):
+        with self.lock:
+            self._record(ip, ts, path, size, status)
+            self._advance(self.clock())
+
+    def _record(self, ip, ts, path, size, status):
+        state = self.clients.get(ip)
+        if state is None:
+            state = ClientState(ip, ts)
+            self.clients[ip] = state
+        state.hits += 1
+        state.bytes += size
+        if ts < state.last_seen:
+            return
+        state.last_seen = ts
+        state.last_path = path
+        state.last_status = status
+
+        # Buckets must stay ordered; a slightly out-of-order line lands in the newest bucket
+        second = max(int(ts), self._newest)
+        if state.bucket == second:
+            return
+        self._detach(state)
+        bucket = self._recent.get(second)
+        if bucket is None:
+            bucket = self._recent[second] = set()
+            self._newest = second
+        bucket.add(ip)
+        self._recent_count += 1
+        state.bucket = second
+
+    def _detach(self, state):
+        if state.bucket is None:
+            return
+        bucket = self._recent.get(state.bucket)
+        if bucket is not None:
+            bucket.discard(state.ip)
+            self._recent_count -= 1
+        else:
+            bucket = self._old.get(state.bucket)
+            if bucket is not None:
+                bucket.discard(state.ip)
+        state.bucket = None
+
+    def _advance(self, now):
+        edge = int(now) - self.window
+        while self._recent:
+            second, bucket = next(iter(self._recent.items()))
+            if second > edge:
+                break
+            del self._recent[second]
+            self._recent_count -= len(bucket)
+            if bucket:
+                # A late line can recreate a second that already rolled over: merge, never replace
+                old = self._old.get(second)
+                if old is None:
+                    self._old[second] = bucket
+                else:
+                    old |= bucket
+
+        horizon_edge = int(now) - self.horizon
+        while self._old:
+            second, bucket = next(iter(self._old.items()))
+            if second > horizon_edge:
+                break
+            del self._old[second]
+            for ip in bucket:
+                self.clients.pop(ip, None)
+
+        active = self._recent_count
+        if not self.session_started:
+            if active > 0:
+                self.session_min = active
+                self.session_max = active
+                self.session_started = True
+        else:
+            if active > self.session_max:
+                self.session_max = active
+            if 0 < active < self.session_min:
+                self.session_min = active
+
+    # --- queries ---
+
+    def active_count(self, window=None):
+        """Number of clients seen within `window` seconds (default window is O(1))."""
+        with self.lock:
+            now = self.clock()
+            self._advance(now)
+            if window is None or window == self.window:
+                return self._recent_count
+            return sum(len(b) for b in self._buckets_within(now, window))
+
+    def session_range(self):
+        with self.lock:
+            self._advance(self.clock())
+            return self.session_min, self.session_max
+
+    def active_clients(self, window=None, offset=0, limit=100):
+        """Per-client state of the clients active within `window`, newest first."""
+        with self.lock:
+            now = self.clock()
+            self._advance(now)
+            window = self.window if window is None else window
+            ips = (ip for bucket in self._buckets_within(now, window) for ip in bucket)
+            page = [self.clients[ip].to_dict() for ip in islice(ips, offset, offset + limit)]
+            total = self._recent_count if window == self.window else sum(len(b) for b in self._buckets_within(now, window))
+            return total, page
+
+    def client(self, ip):
+        with self.lock:
+            state = self.clients.get(ip)
+            return state.to_dict() if state else None
+
+    def _buckets_within(self, now, window):
+        edge = int(now) - min(window, self.horizon)
+        for source in (self._recent, self._old):
+            for second in reversed(source):
+                if second <= edge:
+                    break
+                yield source[second]
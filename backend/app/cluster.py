@@ -0,0 +1,216 @@
+"""
+Cluster mode: several orchestrators share one exam site's boot load.
+
+Every node serves /api/cluster/status (role, active image, resident images,
+load). Replicas poll their peers, and when the primary's active image differs
+from their own they pull it in fixed-size chunks, verifying each chunk's
+SHA-256 against the primary's manifest (the library then re-checks the full
+component hashes on import). Dynamic iPXE scripts spread clients across the
+healthy nodes that have the client's image resident: rendezvous hashing of
+the MAC (a client keeps its node, and losing a node only moves its own
+clients) or least load between the two best-ranked nodes.
+
+    CLUSTER_PEERS=http://10.0.0.2:8000,http://10.0.0.3:8000
+    CLUSTER_ROLE=primary|replica  NODE_URL=http://10.0.0.1:8000
+    NODE_BOOT_HOST=10.0.0.1       CLUSTER_SPREAD=hash|load
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import psutil
+
+from .instrument import span
+
+CHUNK_SIZE = 8 * 1024 * 1024
+CHUNKS_FILE = "chunks.json"
+FETCH_RETRIES = 3
+
+
+class ClusterError(Exception):
+    pass
+
+
+def image_chunks(image_dir, components, chunk_size=CHUNK_SIZE):
+    """Per-component chunk hashes, cached next to the (immutable) image."""
+    path = os.path.join(image_dir, CHUNKS_FILE)
+    try:
+        with open(path, "r") as f:
+            cached = json.load(f)
+        if cached["chunk_size"] == chunk_size:
+            return cached["components"]
+    except (OSError, ValueError, KeyError):
+        pass
+    result = {}
+    for name in components:
+        hashes = []
+        with open(os.path.join(image_dir, name), "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                hashes.append(hashlib.sha256(chunk).hexdigest())
+        result[name] = hashes
+    with open(f"{path}.tmp", "w") as f:
+        json.dump({"chunk_size": chunk_size, "components": result}, f)
+    os.replace(f"{path}.tmp", path)
+    return result
+
+
+def rendezvous_rank(key, nodes):
+    """Nodes ordered by highest-random-weight for `key`."""
+    return sorted(nodes, key=lambda n: hashlib.sha1(f"{key}|{n['node']}".encode()).digest(), reverse=True)
+
+
+class TxRate:
+    """Outgoing bytes/s of the host since the previous sample."""
+
+    def __init__(self):
+        self._last = (time.monotonic(), psutil.net_io_counters().bytes_sent)
+
+    def sample(self):
+        with span("psutil", "net_io_counters"):
+            now, sent = time.monotonic(), psutil.net_io_counters().bytes_sent
+        then, before = self._last
+        self._last = (now, sent)
+        return round((sent - before) / (now - then)) if now > then else 0
+
+
+class ClusterNode:
+    def __init__(self, node_url, role, peers, token, local_status, interval=5, spread="hash", on_behind=None):
+        self.node_url = node_url
+        self.role = role
+        self.token = token
+        self.local_status = local_status
+        self.interval = interval
+        self.spread = spread
+        self.on_behind = on_behind
+        self.peers = {url.rstrip("/"): {"url": url.rstrip("/"), "status": None, "last_ok": 0, "error": None} for url in peers}
+        self.local = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    # --- peer I/O ---
+
+    def request(self, url, timeout=5):
+        req = urllib.request.Request(url, headers={"X-Dashboard-Token": self.token})
+        with urllib.request.urlopen(req, timeout=timeout) as res:
+            return res.read()
+
+    def fetch_manifest(self, peer_url, image_id):
+        return json.loads(self.request(f"{peer_url}/api/cluster/images/{image_id}", timeout=300))
+
+    def download_image(self, peer_url, manifest, dest_dir, progress=None, workers=4):
+        """Fetch every component chunk by chunk into dest_dir; chunks already on disk with the right hash are kept."""
+        os.makedirs(dest_dir, exist_ok=True)
+        chunk_size = manifest["chunk_size"]
+        for name, component in manifest["components"].items():
+            path = os.path.join(dest_dir, name)
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                os.ftruncate(fd, component["size"])
+
+                def fetch(index, expected):
+                    offset = index * chunk_size
+                    length = min(chunk_size, component["size"] - offset)
+                    if hashlib.sha256(os.pread(fd, length, offset)).hexdigest() == expected:
+                        return length
+                    url = f"{peer_url}/api/cluster/images/{manifest['id']}/{name}/{index}"
+                    for attempt in range(FETCH_RETRIES):
+                        try:
+                            data = self.request(url, timeout=60)
+                        except OSError as e:
+                            error = e
+                            continue
+                        if len(data) == length and hashlib.sha256(data).hexdigest() == expected:
+                            os.pwrite(fd, data, offset)
+                            return length
+                        error = ClusterError(f"Chunk {index} of {name} failed verification")
+                    raise ClusterError(f"Fetching {name} chunk {index} from {peer_url} failed: {error}")
+
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cluster-sync") as pool:
+                    futures = [pool.submit(fetch, i, h) for i, h in enumerate(component["chunks"])]
+                    for future in futures:
+                        done = future.result()
+                        if progress:
+                            progress(done)
+            finally:
+                os.close(fd)
+
+    # --- membership ---
+
+    def poll(self):
+        self.local = self.local_status()
+        for peer in self.peers.values():
+            try:
+                status = json.loads(self.request(f"{peer['url']}/api/cluster/status", timeout=2))
+                status.pop("peers", None)
+                peer["status"] = status
+                peer["last_ok"] = time.time()
+                peer["error"] = None
+            except Exception as e:
+                peer["error"] = str(e)
+
+    def healthy_peers(self):
+        cutoff = time.time() - 3 * self.interval
+        return [p for p in self.peers.values() if p["status"] and p["last_ok"] >= cutoff]
+
+    def primary(self):
+        for peer in self.healthy_peers():
+            if peer["status"].get("role") == "primary":
+                return peer
+        return None
+
+    def nodes(self):
+        nodes = [p["status"] for p in self.healthy_peers()]
+        if self.local:
+            nodes.append(self.local)
+        return nodes
+
+    def pick(self, mac, image):
+        """Boot host for a client, or None to let the script use ${next-server}."""
+        candidates = [n for n in self.nodes() if n.get("boot_host") and (image is None or image in n.get("resident", []))]
+        if not candidates:
+            return None
+        ranked = rendezvous_rank(mac or "", candidates)
+        if self.spread == "load" and len(ranked) > 1:
+            # Power of two choices: stale load reports cannot herd every client onto one node
+            best = min(ranked[:2], key=lambda n: n["load"]["clients"])
+        else:
+            best = ranked[0]
+        return best["boot_host"]
+
+    def peer_report(self):
+        healthy = {p["url"] for p in self.healthy_peers()}
+        return [
+            {"url": p["url"], "healthy": p["url"] in healthy, "error": p["error"], "last_ok": p["last_ok"], "status": p["status"]}
+            for p in self.peers.values()
+        ]
+
+    # --- loop ---
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+                primary = self.primary() if self.role == "replica" else None
+                if primary and self.on_behind:
+                    wanted = primary["status"].get("active_image")
+                    if wanted and wanted != self.local.get("active_image"):
+                        self.on_behind(primary["url"], wanted)
+            except Exception as e:
+                print(f"Cluster poll error: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="cluster", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,207 @@
+"""
+In-memory configuration store.
+
+Each watched file is read and parsed once; a background thread re-reads it
+only when its mtime/size/inode changes, and refreshes the host's IPv4
+addresses every `nic_interval` seconds. Request handlers therefore read
+cached values with no file or NIC I/O. Writes are atomic (temp file +
+rename) and report whether the content changed, so callers regenerate
+derived files and restart services only when something is different.
+"""
+
+import errno
+import os
+import socket
+import threading
+import time
+
+import psutil
+from pydantic import BaseModel, ConfigDict, field_validator
+
+from .instrument import span
+
+class ServerConfig(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    server_ip: str
+
+    @field_validator("server_ip")
+    @classmethod
+    def _ipv4(cls, value):
+        try:
+            socket.inet_pton(socket.AF_INET, value)
+        except OSError:
+            raise ValueError(f"{value!r} is not an IPv4 address")
+        return value
+
+
+def atomic_write(path, text):
+    """Replace `path` with `text` via temp file + rename. False (nothing written) when it already holds `text`."""
+    try:
+        with open(path, "r") as f:
+            if f.read() == text:
+                return False
+    except OSError:
+        pass
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        os.replace(tmp, path)
+    except OSError as e:
+        # Single-file bind mounts (docker-compose.dhcp.yml) cannot be renamed over
+        if e.errno not in (errno.EBUSY, errno.EXDEV):
+            raise
+        with open(path, "w") as f:
+            f.write(text)
+        os.unlink(tmp)
+    return True
+
+
+class WatchedFile:
+    def __init__(self, path, parse, default=None):
+        self.path = path
+        self.parse = parse
+        self.default = default
+        self.text = None
+        self.value = default
+        self._key = None
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _load(self, text):
+        self.text = text
+        self.value = self.default
+        if text is not None:
+            try:
+                self.value = self.parse(text)
+            except Exception as e:
+                print(f"Config {self.path} unreadable: {e}")
+
+    def refresh(self):
+        """Re-read when the file changed on disk; True if the content differs."""
+        key = self._stat()
+        if key == self._key:
+            return False
+        self._key = key
+        text = None
+        if key is not None:
+            try:
+                with open(self.path, "r") as f:
+                    text = f.read()
+            except OSError:
+                pass
+        if text == self.text:
+            return False
+        self._load(text)
+        return True
+
+    def write(self, text):
+        changed = atomic_write(self.path, text)
+        self._load(text)
+        self._key = self._stat()
+        return changed
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        self._load(None)
+        self._key = None
+
+
+class ConfigStore:
+    def __init__(self, interval=2.0, nic_interval=10.0):
+        self.interval = interval
+        self.nic_interval = nic_interval
+        self.files = {}
+        # iface -> [IPv4 addresses]
+        self.interfaces = {}
+        self.lock = threading.RLock()
+        # `listener(name)` runs on the watcher thread when a file changes outside the store ("interfaces" for NICs)
+        self.listeners = []
+        self._nic_checked = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self.refresh_interfaces()
+
+    def watch(self, name, path, parse=str, default=None):
+        entry = WatchedFile(path, parse, default)
+        entry.refresh()
+        with self.lock:
+            self.files[name] = entry
+        return entry
+
+    def get(self, name):
+        return self.files[name].value
+
+    def text(self, name):
+        return self.files[name].text
+
+    def write(self, name, text):
+        with self.lock:
+            return self.files[name].write(text)
+
+    def remove(self, name):
+        with self.lock:
+            self.files[name].remove()
+
+    def reload(self, *names):
+        """Pick up files changed by this process outside the store, without notifying listeners."""
+        with self.lock:
+            for name in names:
+                self.files[name].refresh()
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def refresh_interfaces(self):
+        with span("psutil", "net_if_addrs"):
+            interfaces = {
+                iface: [a.address for a in addrs if a.family == socket.AF_INET]
+                for iface, addrs in psutil.net_if_addrs().items()
+            }
+        self._nic_checked = time.monotonic()
+        if interfaces == self.interfaces:
+            return False
+        self.interfaces = interfaces
+        return True
+
+    def host_ips(self):
+        return {ip for addrs in self.interfaces.values() for ip in addrs}
+
+    def poll(self):
+        with self.lock:
+            changed = [name for name, entry in self.files.items() if entry.refresh()]
+        if time.monotonic() - self._nic_checked >= self.nic_interval and self.refresh_interfaces():
+            changed.append("interfaces")
+        for name in changed:
+            for listener in self.listeners:
+                try:
+                    listener(name)
+                except Exception as e:
+                    print(f"Config listener error ({name}): {e}")
+        return changed
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Config watch error: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="config-watch", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
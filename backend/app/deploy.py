@@ -0,0 +1,216 @@
+"""
+Deployment engine for boot components (UPLOAD_DIR -> RAM_DISK).
+
+Components are copied in parallel, in kernel space (reflink, then
+copy_file_range, then sendfile), to a temporary name that is atomically
+renamed into place, so clients never see a half-copied squashfs.
+Components whose size, mtime and SHA-256 already match the deployed copy
+are skipped. With `verify`, skipped copies are re-hashed as well, and any
+that no longer match the manifest (a corrupted tmpfs copy) are copied again.
+"""
+
+import fcntl
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .instrument import span
+from .integrity import HASH_CHUNK, hash_file, verify_file, write_checksums
+
+CHUNK = 64 * 1024 * 1024
+FICLONE = 0x40049409
+MANIFEST = ".deploy-manifest.json"
+HASH_CACHE = ".hash-cache.json"
+
+_cache_lock = threading.Lock()
+
+
+def _load_json(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_json(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def source_hash(path):
+    """SHA-256 of `path`, cached next to it keyed by size and mtime."""
+    st = os.stat(path)
+    cache_path = os.path.join(os.path.dirname(path), HASH_CACHE)
+    key = os.path.basename(path)
+    with _cache_lock:
+        entry = _load_json(cache_path).get(key)
+    if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+        return entry["sha256"]
+    digest = hash_file(path)
+    with _cache_lock:
+        cache = _load_json(cache_path)
+        cache[key] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest}
+        _save_json(cache_path, cache)
+    return digest
+
+
+def _copy_fd(src_fd, dst_fd, size, progress):
+    """Copy `size` bytes between descriptors. Returns the method that did the work."""
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        if progress:
+            progress(size)
+        return "reflink"
+    except OSError:
+        pass
+
+    method = "copy_file_range"
+    offset = 0
+    while offset < size:
+        count = min(CHUNK, size - offset)
+        n = 0
+        # copy_file_range and sendfile may return 0 before EOF (e.g. some FUSE, overlay or procfs-like
+        # sources): drop to the next method instead of treating it as a short copy
+        if method == "copy_file_range":
+            try:
+                n = os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+            except OSError:
+                pass
+            if n <= 0:
+                method = "sendfile"
+        if method == "sendfile":
+            try:
+                os.lseek(dst_fd, offset, os.SEEK_SET)
+                n = os.sendfile(dst_fd, src_fd, offset, count)
+            except OSError:
+                pass
+            if n <= 0:
+                method = "read/write"
+        if method == "read/write":
+            data = os.pread(src_fd, min(count, HASH_CHUNK), offset)
+            n = os.pwrite(dst_fd, data, offset) if data else 0
+        if n <= 0:
+            raise OSError(f"Short copy at offset {offset} of {size}")
+        offset += n
+        if progress:
+            progress(n)
+    return method
+
+
+def copy_atomic(src_path, dest_path, progress=None, hardlink=False):
+    """Copy src to dest via a temp file + rename; keeps mtime so later syncs can skip it."""
+    st = os.stat(src_path)
+    dest_dir = os.path.dirname(dest_path)
+    tmp_path = os.path.join(dest_dir, f".{os.path.basename(dest_path)}.tmp-{os.getpid()}-{threading.get_ident()}")
+    if hardlink:
+        try:
+            os.link(src_path, tmp_path)
+            os.replace(tmp_path, dest_path)
+            if progress:
+                progress(st.st_size)
+            return "hardlink"
+        except OSError:
+            pass
+    src_fd = os.open(src_path, os.O_RDONLY)
+    try:
+        dst_fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+        try:
+            with span("copy", os.path.basename(dest_path), bytes=st.st_size) as s:
+                method = _copy_fd(src_fd, dst_fd, st.st_size, progress)
+                s.set(method=method)
+        except BaseException:
+            os.close(dst_fd)
+            os.unlink(tmp_path)
+            raise
+        os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    os.chmod(tmp_path, 0o666)
+    os.utime(tmp_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    os.replace(tmp_path, dest_path)
+    return method
+
+
+def is_current(src_path, dest_path, manifest_entry, src_sha256):
+    try:
+        src = os.stat(src_path)
+        dest = os.stat(dest_path)
+    except OSError:
+        return False
+    return (
+        manifest_entry is not None
+        and src.st_size == dest.st_size == manifest_entry.get("size")
+        and src.st_mtime_ns == dest.st_mtime_ns == manifest_entry.get("mtime_ns")
+        and manifest_entry.get("sha256") == src_sha256
+    )
+
+
+def deploy_components(src_dir, dest_dir, names, progress=None, parallel=True, hardlink=False, verify=False):
+    """Deploy `names` from src_dir to dest_dir. Returns a per-component timing report."""
+    manifest_path = os.path.join(dest_dir, MANIFEST)
+    manifest = _load_json(manifest_path)
+    progress_lock = threading.Lock()
+    failed = threading.Event()
+
+    def report_progress(n):
+        if failed.is_set():
+            raise InterruptedError("Deployment aborted")
+        if progress:
+            with progress_lock:
+                progress(n)
+
+    def deploy_one(name):
+        src_path = os.path.join(src_dir, name)
+        dest_path = os.path.join(dest_dir, name)
+        started = time.perf_counter()
+        size = os.path.getsize(src_path)
+        digest = source_hash(src_path)
+        action = "copied"
+        if is_current(src_path, dest_path, manifest.get(name), digest):
+            status = verify_file(dest_path, manifest[name]) if verify else "ok"
+            if status == "ok":
+                report_progress(size)
+                return name, {"action": "verified" if verify else "skipped", "bytes": size, "seconds": round(time.perf_counter() - started, 3), "sha256": digest}
+            print(f"Deploy {name}: RAM copy failed verification ({status}), copying again")
+            action = "repaired"
+        method = copy_atomic(src_path, dest_path, report_progress, hardlink=hardlink)
+        seconds = time.perf_counter() - started
+        st = os.stat(dest_path)
+        return name, {
+            "action": action,
+            "method": method,
+            "bytes": size,
+            "seconds": round(seconds, 3),
+            "mb_per_s": round(size / seconds / 1e6, 1) if seconds > 0 else None,
+            "sha256": digest,
+            "mtime_ns": st.st_mtime_ns,
+        }
+
+    started = time.perf_counter()
+    results = {}
+    workers = len(names) if parallel else 1
+    with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="deploy") as pool:
+        futures = [pool.submit(deploy_one, name) for name in names]
+        error = None
+        for future in futures:
+            try:
+                name, result = future.result()
+                results[name] = result
+            except BaseException as e:
+                failed.set()
+                if error is None or isinstance(error, InterruptedError):
+                    error = e
+        if error is not None:
+            raise error
+
+    for name, result in results.items():
+        manifest[name] = {"size": result["bytes"], "mtime_ns": os.stat(os.path.join(dest_dir, name)).st_mtime_ns, "sha256": result["sha256"]}
+        print(f"Deploy {name}: {result['action']} {result.get('method', '')} {result['bytes'] / 1e6:.1f} MB in {result['seconds']:.2f}s")
+    write_checksums(dest_dir, {name: manifest[name] for name in names})
+    _save_json(manifest_path, manifest)
+    return {"components": results, "seconds": round(time.perf_counter() - started, 3)}
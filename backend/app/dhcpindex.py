@@ -0,0 +1,393 @@
+"""
+DHCP analytics index built from dnsmasq `log-dhcp` output.
+
+Each line is parsed once into an event and folded into per-client records
+(keyed by MAC, with an IP -> MAC map for current leases). The index tracks
+DISCOVER -> OFFER -> REQUEST -> ACK latency per handshake, NAKs and "no
+address available" per 10s bucket, and PXE / iPXE vendor and user classes,
+so a query never rescans the log:
+
+- lease exhaustion: pool utilisation against the configured dhcp-range plus
+  the rate of "no address available";
+- NAK storms: NAKs per bucket;
+- clients that got a PXE lease but never came back as iPXE (never chained).
+
+A dnsmasq lease file (`expiry mac ip hostname clientid`) can seed the lease
+map after a restart.
+"""
+
+import ipaddress
+import re
+import socket
+import struct
+import threading
+import time
+from datetime import datetime
+from collections import OrderedDict, deque
+from itertools import islice
+
+# "dnsmasq-dhcp[1]: 3364218 DHCPOFFER(eth0) 10.0.0.50 aa:bb:cc:dd:ee:ff" (the xid needs log-dhcp)
+EVENT_PATTERN = re.compile(
+    r'(?:(?P<xid>\d+) )?(?P<type>DHCP[A-Z]+)\((?P<iface>[^)]*)\)'
+    r'(?: (?P<ip>\d+\.\d+\.\d+\.\d+))?(?: (?P<mac>[0-9a-fA-F]{2}(?::[0-9a-fA-F]{2}){5}))?(?: (?P<info>.*))?'
+)
+# "3364218 vendor class: PXEClient:Arch:00007:UNDI:003016", "3364218 user class: iPXE"
+CLASS_PATTERN = re.compile(r'(?P<xid>\d+) (?P<kind>vendor|user) class: (?P<value>.*)')
+NO_ADDRESS = "no address available"
+LEASE_TIME = 12 * 3600
+BUCKET = 10
+BUCKETS = 360
+XID_MEMORY = 8192
+
+
+def _ip_int(ip):
+    return struct.unpack("!I", socket.inet_aton(ip))[0]
+
+
+def parse_dhcp_event(line, ts=None):
+    """Event dict for a dnsmasq DHCP or class line, None for anything else."""
+    if "DHCP" in line:
+        match = EVENT_PATTERN.search(line)
+        if match:
+            mac = match.group("mac")
+            return {
+                "type": match.group("type"),
+                "xid": match.group("xid"),
+                "iface": match.group("iface"),
+                "ip": match.group("ip"),
+                "mac": mac.lower() if mac else None,
+                "info": (match.group("info") or "").strip(),
+                "ts": time.time() if ts is None else ts,
+            }
+    if " class: " in line:
+        match = CLASS_PATTERN.search(line)
+        if match:
+            return {
+                "type": f"{match.group('kind')}_class",
+                "xid": match.group("xid"),
+                "value": match.group("value").strip(),
+                "ts": time.time() if ts is None else ts,
+            }
+    return None
+
+
+# Syslog prefix: RFC 3339 (rsyslog) or RFC 3164 "Oct 18 10:00:00"
+SYSLOG_STAMP = re.compile(
+    r'^(?:(?P<iso>\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(?:\.\d+)?(?:Z|[+-]\d\d:?\d\d)?)|(?P<bsd>[A-Z][a-z]{2} [ \d]\d \d\d:\d\d:\d\d))'
+)
+
+
+def syslog_time(line, now=None):
+    """Epoch seconds of a syslog line's timestamp prefix, None when it has none."""
+    match = SYSLOG_STAMP.match(line)
+    if not match:
+        return None
+    now = time.time() if now is None else now
+    try:
+        if match.group("iso"):
+            return datetime.fromisoformat(match.group("iso").replace("Z", "+00:00")).timestamp()
+        current = datetime.fromtimestamp(now)
+        stamp = datetime.strptime(f"{current.year} {match.group('bsd')}", "%Y %b %d %H:%M:%S")
+    except ValueError:
+        return None
+    # RFC 3164 has no year: a stamp ahead of now is from last year (read in early January)
+    if stamp.timestamp() > now + 86400:
+        stamp = stamp.replace(year=current.year - 1)
+    return stamp.timestamp()
+
+
+def parse_dhcp_log_line(line):
+    """parse_dhcp_event stamped with the line's own syslog time instead of the time it was read."""
+    return parse_dhcp_event(line, syslog_time(line))
+
+
+def parse_lease_file(text):
+    """dnsmasq.leases -> [(expiry, mac, ip, hostname)]."""
+    leases = []
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) >= 4 and ":" in parts[1]:
+            leases.append((int(parts[0]), parts[1].lower(), parts[2], None if parts[3] == "*" else parts[3]))
+    return leases
+
+
+class DhcpClient:
+    __slots__ = ("mac", "ip", "ip_int", "hostname", "state", "first_seen", "last_seen", "discover_ts", "offer_ts",
+                 "request_ts", "offer_latency", "ack_latency", "expires", "counts", "vendor", "pxe", "ipxe")
+
+    def __init__(self, mac, ts):
+        self.mac = mac
+        self.ip = None
+        self.ip_int = 0
+        self.hostname = None
+        self.state = None
+        self.first_seen = ts
+        self.last_seen = ts
+        self.discover_ts = None
+        self.offer_ts = None
+        self.request_ts = None
+        self.offer_latency = None
+        self.ack_latency = None
+        self.expires = None
+        self.counts = {}
+        self.vendor = None
+        self.pxe = False
+        self.ipxe = False
+
+    def never_chained(self, now):
+        return self.pxe and not self.ipxe and self.expires is not None and self.expires > now
+
+    def to_dict(self, now):
+        return {
+            "mac": self.mac,
+            "ip": self.ip,
+            "hostname": self.hostname,
+            "state": self.state,
+            "leased": self.expires is not None and self.expires > now,
+            "expires": self.expires,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "offer_latency": self.offer_latency,
+            "ack_latency": self.ack_latency,
+            "counts": dict(self.counts),
+            "vendor": self.vendor,
+            "pxe": self.pxe,
+            "ipxe": self.ipxe,
+            "never_chained": self.never_chained(now),
+        }
+
+
+class DhcpIndex:
+    def __init__(self, lease_time=LEASE_TIME, clock=time.time, max_events=5000):
+        self.lease_time = lease_time
+        self.clock = clock
+        self.max_events = max_events
+        self.lock = threading.Lock()
+        self.range = None
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            # mac -> DhcpClient, ordered by last activity (oldest first)
+            self.clients = OrderedDict()
+            self.by_ip = {}
+            self.totals = {}
+            self.events = deque(maxlen=self.max_events)
+            self.latencies = deque(maxlen=2000)
+            self._xids = OrderedDict()
+            # dnsmasq logs the vendor/user class before the DISCOVER/REQUEST that names the MAC
+            self._pending = OrderedDict()
+            # per-10s counters: bucket start -> {event type: count}
+            self._buckets = OrderedDict()
+
+    def set_range(self, start_ip, end_ip):
+        """Pool bounds for utilisation (from the saved DHCP config); None to clear."""
+        try:
+            self.range = (_ip_int(start_ip), _ip_int(end_ip)) if start_ip and end_ip else None
+        except OSError:
+            self.range = None
+
+    # --- ingestion ---
+
+    def ingest(self, events):
+        with self.lock:
+            for event in events:
+                kind = event["type"]
+                if kind.endswith("_class"):
+                    self._class(event)
+                    continue
+                if kind == "DHCPDISCOVER" and event["info"] == NO_ADDRESS:
+                    kind = "exhausted"
+                self.totals[kind] = self.totals.get(kind, 0) + 1
+                self._count(kind, event["ts"])
+                self.events.append(event)
+                if event["mac"]:
+                    self._apply(kind, event)
+
+    def _count(self, kind, ts):
+        start = int(ts) - int(ts) % BUCKET
+        bucket = self._buckets.get(start)
+        if bucket is None:
+            newest = next(reversed(self._buckets), None)
+            bucket = self._buckets[start] = {}
+            if newest is not None and start < newest:
+                # Late line (log replay at startup, clock step): keep buckets in time order, rates() relies on it
+                self._buckets = OrderedDict(sorted(self._buckets.items()))
+            while len(self._buckets) > BUCKETS:
+                self._buckets.popitem(last=False)
+        bucket[kind] = bucket.get(kind, 0) + 1
+
+    def _apply(self, kind, event):
+        mac, ts = event["mac"], event["ts"]
+        client = self.clients.get(mac)
+        if client is None:
+            client = self.clients[mac] = DhcpClient(mac, ts)
+        else:
+            self.clients.move_to_end(mac)
+        client.last_seen = ts
+        client.counts[kind] = client.counts.get(kind, 0) + 1
+        if event["xid"]:
+            self._xids[event["xid"]] = mac
+            if len(self._xids) > XID_MEMORY:
+                self._xids.popitem(last=False)
+            for pending in self._pending.pop(event["xid"], ()):
+                self._set_class(client, pending)
+
+        if kind == "DHCPDISCOVER":
+            client.discover_ts = ts
+            client.offer_ts = client.request_ts = None
+        elif kind == "DHCPOFFER":
+            client.offer_ts = ts
+            if client.discover_ts is not None:
+                client.offer_latency = ts - client.discover_ts
+        elif kind == "DHCPREQUEST":
+            client.request_ts = ts
+        elif kind == "DHCPACK" and event["ip"]:
+            # Renewals skip DISCOVER; their handshake starts at REQUEST
+            started = client.discover_ts if client.discover_ts is not None else client.request_ts
+            if started is not None:
+                client.ack_latency = ts - started
+                self.latencies.append(client.ack_latency)
+            client.discover_ts = client.offer_ts = client.request_ts = None
+            self._lease(client, event["ip"], ts + self.lease_time)
+            if event["info"]:
+                client.hostname = event["info"].split()[0]
+        elif kind in ("DHCPRELEASE", "DHCPDECLINE") and client.ip:
+            self._lease(client, None, None)
+        client.state = kind
+
+    def _lease(self, client, ip, expires):
+        if client.ip and self.by_ip.get(client.ip) == client.mac:
+            del self.by_ip[client.ip]
+        client.ip = ip
+        client.ip_int = _ip_int(ip) if ip else 0
+        client.expires = expires
+        if ip:
+            previous = self.by_ip.get(ip)
+            if previous and previous != client.mac and previous in self.clients:
+                # The address moved to another client: the old lease is gone
+                self.clients[previous].expires = None
+            self.by_ip[ip] = client.mac
+
+    def _class(self, event):
+        mac = self._xids.get(event["xid"])
+        client = self.clients.get(mac) if mac else None
+        if client is not None:
+            self._set_class(client, event)
+            return
+        self._pending.setdefault(event["xid"], []).append(event)
+        if len(self._pending) > XID_MEMORY:
+            self._pending.popitem(last=False)
+
+    def _set_class(self, client, event):
+        if event["type"] == "vendor_class":
+            client.vendor = event["value"]
+            client.pxe = client.pxe or event["value"].startswith("PXEClient")
+        elif event["value"] == "iPXE":
+            client.ipxe = True
+
+    def load_leases(self, leases):
+        """Seed leases from a dnsmasq lease file; newer log events keep precedence."""
+        with self.lock:
+            for expiry, mac, ip, hostname in leases:
+                client = self.clients.get(mac)
+                if client is None:
+                    client = self.clients[mac] = DhcpClient(mac, self.clock())
+                    self.clients.move_to_end(mac, last=False)
+                if client.expires is None or expiry > client.expires:
+                    self._lease(client, ip, expiry)
+                    client.hostname = hostname or client.hostname
+                    client.state = client.state or "lease"
+
+    # --- queries ---
+
+    def rates(self, seconds=300):
+        """Event counts over the last `seconds`, from the 10s buckets."""
+        cutoff = self.clock() - seconds
+        totals = {}
+        for start in reversed(self._buckets):
+            if start + BUCKET <= cutoff:
+                break
+            for kind, count in self._buckets[start].items():
+                totals[kind] = totals.get(kind, 0) + count
+        return totals
+
+    def summary(self):
+        with self.lock:
+            now = self.clock()
+            low, high = self.range or (1, 0)
+            leases = used = pxe = never_chained = 0
+            for client in self.clients.values():
+                if client.expires is not None and client.expires > now:
+                    leases += 1
+                    if low <= client.ip_int <= high:
+                        used += 1
+                    if client.pxe and not client.ipxe:
+                        never_chained += 1
+                pxe += client.pxe
+            pool = None
+            if self.range:
+                size = high - low + 1
+                pool = {"size": size, "used": used, "free": size - used, "utilisation": round(used / size, 4) if size > 0 else None}
+            latencies = sorted(self.latencies)
+            return {
+                "clients": len(self.clients),
+                "leases": leases,
+                "pool": pool,
+                "totals": dict(self.totals),
+                "last_5m": self.rates(300),
+                "ack_latency": {
+                    "p50": latencies[len(latencies) // 2] if latencies else None,
+                    "p95": latencies[int(len(latencies) * 0.95)] if latencies else None,
+                    "max": latencies[-1] if latencies else None,
+                },
+                "pxe": pxe,
+                "never_chained": never_chained,
+            }
+
+    def timeline(self, seconds=600):
+        """[(bucket start, {event type: count})] for charts (NAK storms, exhaustion)."""
+        with self.lock:
+            cutoff = self.clock() - seconds
+            return [(start, dict(counts)) for start, counts in self._buckets.items() if start + BUCKET > cutoff]
+
+    def list_clients(self, state=None, leased=None, pxe=None, never_chained=False, subnet=None, offset=0, limit=100):
+        """Clients matching every given filter, most recently active first; `subnet` is CIDR (ValueError if invalid)."""
+        network = ipaddress.ip_network(subnet, strict=False) if subnet else None
+        if network:
+            base, mask = int(network.network_address), int(network.netmask)
+        with self.lock:
+            now = self.clock()
+
+            def matches(client):
+                if state is not None and client.state != state:
+                    return False
+                if leased is not None and (client.expires is not None and client.expires > now) != leased:
+                    return False
+                if pxe is not None and client.pxe != pxe:
+                    return False
+                if never_chained and not client.never_chained(now):
+                    return False
+                if network and (not client.ip_int or client.ip_int & mask != base):
+                    return False
+                return True
+
+            selected = (c for c in reversed(self.clients.values()) if matches(c))
+            # Count the skipped matches too: `offset` may lie past the last one
+            skipped = sum(1 for _ in islice(selected, offset))
+            page = [c.to_dict(now) for c in islice(selected, limit)]
+            # The generator resumes after the page, so the total still costs a single pass
+            total = skipped + len(page) + sum(1 for _ in selected)
+            return total, page
+
+    def client(self, key):
+        with self.lock:
+            mac = key.lower() if key.lower() in self.clients else self.by_ip.get(key)
+            client = self.clients.get(mac) if mac else None
+            return client.to_dict(self.clock()) if client else None
+
+    def recent_events(self, type=None, mac=None, offset=0, limit=100):
+        with self.lock:
+            mac = mac.lower() if mac else None
+            selected = (e for e in reversed(self.events) if (type is None or e["type"] == type) and (mac is None or e["mac"] == mac))
+            return list(islice(selected, offset, offset + limit))
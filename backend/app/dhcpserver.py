@@ -0,0 +1,567 @@
+"""
+Optional in-process DHCP responder (an alternative to the pxe-dhcp dnsmasq container).
+
+- "proxy": ProxyDHCP. Answers PXE clients with the boot server (option 66)
+  and boot file (option 67) only and leaves address assignment to the
+  existing DHCP server. Requests to port 4011 are answered as well.
+- "full": also leases addresses from the configured range. Free addresses
+  are a bitmap with a stack of bytes that still have a free bit, so
+  allocate and release are O(1). Expired leases come back through an
+  expiry heap.
+
+`configure()` applies a new range, boot file or server address in place.
+Leases inside the new range are kept, and the sockets stay open, so no
+handshake is dropped. Every packet is logged as a dnsmasq `log-dhcp`
+style line, so the log view and the DHCP index read both servers the same
+way. Leases are saved in the dnsmasq lease file format.
+"""
+
+import asyncio
+import heapq
+import socket
+import struct
+import time
+from collections import deque
+
+from .configstore import atomic_write
+
+SERVER_PORT = 67
+CLIENT_PORT = 68
+PROXY_PORT = 4011
+RECEIVE_BUFFER = 4 * 1024 * 1024
+MAGIC_COOKIE = b"\x63\x82\x53\x63"
+BOOTP = struct.Struct("!BBBBIHHIIII16s64s128s")
+
+DISCOVER, OFFER, REQUEST, DECLINE, ACK, NAK, RELEASE, INFORM = range(1, 9)
+MESSAGE_NAMES = {DISCOVER: "DHCPDISCOVER", OFFER: "DHCPOFFER", REQUEST: "DHCPREQUEST", DECLINE: "DHCPDECLINE",
+                 ACK: "DHCPACK", NAK: "DHCPNAK", RELEASE: "DHCPRELEASE", INFORM: "DHCPINFORM"}
+
+OPT_MASK, OPT_ROUTER, OPT_DNS, OPT_HOSTNAME = 1, 3, 6, 12
+OPT_VENDOR_INFO, OPT_REQUESTED_IP, OPT_LEASE_TIME, OPT_MESSAGE_TYPE, OPT_SERVER_ID = 43, 50, 51, 53, 54
+OPT_RENEWAL, OPT_REBINDING, OPT_VENDOR_CLASS, OPT_TFTP_SERVER, OPT_BOOT_FILE = 58, 59, 60, 66, 67
+OPT_USER_CLASS, OPT_CLIENT_UUID, OPT_END = 77, 97, 255
+# PXE vendor options: discovery control 8 = boot the file in the reply without a boot server menu
+PXE_VENDOR_INFO = bytes([6, 1, 8, 255])
+
+# Lowest clear bit of a bitmap byte (8 when the byte is full)
+FIRST_FREE = bytes(next((bit for bit in range(8) if not value & (1 << bit)), 8) for value in range(256))
+
+
+def _ip(value):
+    return socket.inet_ntoa(struct.pack("!I", value))
+
+
+def _ip_int(ip):
+    return struct.unpack("!I", socket.inet_aton(ip))[0]
+
+
+class DhcpPacket:
+    __slots__ = ("op", "xid", "secs", "flags", "ciaddr", "giaddr", "chaddr", "options")
+
+    @property
+    def mac(self):
+        return self.chaddr[:6].hex(":")
+
+    @property
+    def message_type(self):
+        value = self.options.get(OPT_MESSAGE_TYPE)
+        return value[0] if value else None
+
+    def text(self, code):
+        value = self.options.get(code)
+        return value.decode("latin-1").rstrip("\0") if value else None
+
+
+def parse_packet(data):
+    """DhcpPacket for a BOOTREQUEST with the DHCP magic cookie, None for anything else."""
+    if len(data) < BOOTP.size + 4 or data[0] != 1 or data[BOOTP.size:BOOTP.size + 4] != MAGIC_COOKIE:
+        return None
+    op, _htype, _hlen, _hops, xid, secs, flags, ciaddr, _yiaddr, _siaddr, giaddr, chaddr, _sname, _file = BOOTP.unpack_from(data)
+    options = {}
+    i, end = BOOTP.size + 4, len(data)
+    while i < end:
+        code = data[i]
+        if code == OPT_END:
+            break
+        if code == 0:
+            i += 1
+            continue
+        if i + 1 >= end:
+            break
+        length = data[i + 1]
+        # Long options may be split across several instances (RFC 3396)
+        options[code] = options.get(code, b"") + data[i + 2:i + 2 + length]
+        i += 2 + length
+    packet = DhcpPacket()
+    packet.op, packet.xid, packet.secs, packet.flags = op, xid, secs, flags
+    packet.ciaddr, packet.giaddr, packet.chaddr, packet.options = ciaddr, giaddr, chaddr, options
+    return packet
+
+
+def build_reply(request, message_type, yiaddr=0, siaddr=0, boot_file="", options=()):
+    head = BOOTP.pack(2, 1, 6, 0, request.xid, 0, request.flags, request.ciaddr if message_type != NAK else 0,
+                      yiaddr, siaddr, request.giaddr, request.chaddr, b"", boot_file.encode()[:127])
+    body = bytearray(MAGIC_COOKIE)
+    body += bytes([OPT_MESSAGE_TYPE, 1, message_type])
+    for code, value in options:
+        for i in range(0, len(value), 255):
+            part = value[i:i + 255]
+            body += bytes([code, len(part)]) + part
+    body.append(OPT_END)
+    return head + bytes(body)
+
+
+class AddressPool:
+    """Offsets 0..size-1 of a range; a set bit marks an address in use."""
+
+    def __init__(self, size):
+        self.size = size
+        self.bits = bytearray((size + 7) // 8)
+        if size % 8:
+            # Bits past the end of the range are never free
+            self.bits[-1] = 0xFF & ~((1 << (size % 8)) - 1)
+        # Bytes with a free bit, lowest on top so addresses are handed out in order
+        self._open = list(range(len(self.bits) - 1, -1, -1))
+        self._queued = bytearray(b"\x01" * len(self.bits))
+        self.free = size
+
+    def allocate(self):
+        while self._open:
+            index = self._open[-1]
+            value = self.bits[index]
+            if value == 0xFF:
+                self._open.pop()
+                self._queued[index] = 0
+                continue
+            bit = FIRST_FREE[value]
+            self.bits[index] = value | (1 << bit)
+            self.free -= 1
+            return index * 8 + bit
+        return None
+
+    def take(self, offset):
+        index, mask = offset >> 3, 1 << (offset & 7)
+        if self.bits[index] & mask:
+            return False
+        self.bits[index] |= mask
+        self.free -= 1
+        return True
+
+    def release(self, offset):
+        index, mask = offset >> 3, 1 << (offset & 7)
+        if not self.bits[index] & mask:
+            return
+        self.bits[index] &= ~mask
+        self.free += 1
+        if not self._queued[index]:
+            self._queued[index] = 1
+            self._open.append(index)
+
+    def in_use(self, offset):
+        return bool(self.bits[offset >> 3] & (1 << (offset & 7)))
+
+
+class Lease:
+    __slots__ = ("mac", "ip", "expires", "bound", "hostname")
+
+    def __init__(self, mac, ip, expires, bound=False, hostname=None):
+        self.mac = mac
+        self.ip = ip
+        self.expires = expires
+        self.bound = bound
+        self.hostname = hostname
+
+
+class _Protocol(asyncio.DatagramProtocol):
+    def __init__(self, server, port):
+        self.server = server
+        self.port = port
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            self.server.handle(data, addr, self)
+        except Exception as e:
+            print(f"DHCP packet from {addr[0]} failed: {e}")
+
+
+class DhcpServer:
+    def __init__(self, mode="proxy", host="0.0.0.0", port=SERVER_PORT, proxy_port=PROXY_PORT, client_port=CLIENT_PORT,
+                 broadcast="255.255.255.255", interface=None, lease_file=None, lease_time=12 * 3600, offer_time=60,
+                 maxlen=500, clock=time.time):
+        self.mode = mode
+        self.host = host
+        self.port = port
+        self.proxy_port = proxy_port
+        self.client_port = client_port
+        self.broadcast = broadcast
+        self.interface = interface
+        self.lease_file = lease_file
+        self.lease_time = lease_time
+        self.offer_time = offer_time
+        self.clock = clock
+        self.server_ip = None
+        self.boot_file = "bootx64.efi"
+        self.ipxe_boot_file = None
+        self.netmask = "255.255.255.0"
+        self.router = None
+        self.dns = []
+        self.range = None
+        self.pool = None
+        self.leases = {}
+        self.by_offset = {}
+        self._expiry = []
+        self._dirty = False
+        # Bumped with every lease change, so a save only clears _dirty if nothing changed while it wrote
+        self._changes = 0
+        self._saver = None
+        self.protocols = []
+        self.state = "stopped"
+        self.lines = deque(maxlen=maxlen)
+        # Packets received and replies sent, by message type
+        self.totals = {}
+        self.sent = {}
+        # `listener(lines)` gets the dnsmasq-style log lines of every packet handled
+        self.listeners = []
+        self._load_leases()
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    # --- configuration (hot, no socket restart) ---
+
+    def configure(self, server_ip, start_ip=None, end_ip=None, boot_file=None, ipxe_boot_file=None, netmask=None, router=None, dns=None):
+        self.server_ip = server_ip
+        if boot_file:
+            self.boot_file = boot_file
+        self.ipxe_boot_file = ipxe_boot_file
+        if netmask:
+            self.netmask = netmask
+        self.router = router
+        self.dns = list(dns or [])
+        new_range = (_ip_int(start_ip), _ip_int(end_ip)) if start_ip and end_ip else None
+        if new_range != self.range:
+            self._set_range(new_range)
+
+    def _set_range(self, new_range):
+        self.range = new_range
+        self.pool = AddressPool(new_range[1] - new_range[0] + 1) if new_range and new_range[1] >= new_range[0] else None
+        self.by_offset = {}
+        self._expiry = []
+        kept = {}
+        for mac, lease in self.leases.items():
+            offset = self._offset(lease.ip)
+            if offset is not None and lease.mac is not None and self.pool.take(offset):
+                kept[mac] = lease
+                self.by_offset[offset] = mac
+                heapq.heappush(self._expiry, (lease.expires, mac))
+        self.leases = kept
+        self._dirty = True
+        self._changes += 1
+
+    def _offset(self, ip):
+        if self.pool is None:
+            return None
+        offset = ip - self.range[0]
+        return offset if 0 <= offset < self.pool.size else None
+
+    # --- leases ---
+
+    def _reclaim(self, now):
+        while self._expiry and self._expiry[0][0] <= now:
+            expires, mac = heapq.heappop(self._expiry)
+            lease = self.leases.get(mac)
+            if lease is not None and lease.expires == expires:
+                self._drop(lease)
+
+    def _drop(self, lease):
+        offset = self._offset(lease.ip)
+        del self.leases[lease.mac]
+        if offset is not None and self.by_offset.get(offset) == lease.mac:
+            del self.by_offset[offset]
+            self.pool.release(offset)
+        self._dirty = True
+        self._changes += 1
+
+    def _hold(self, mac, ip, expires, bound, hostname=None):
+        lease = self.leases.get(mac)
+        if lease is None or lease.ip != ip:
+            if lease is not None:
+                self._drop(lease)
+            lease = self.leases[mac] = Lease(mac, ip, expires, bound, hostname)
+            self.by_offset[self._offset(ip)] = mac
+        lease.expires, lease.bound = expires, bound
+        lease.hostname = hostname or lease.hostname
+        heapq.heappush(self._expiry, (expires, mac))
+        self._dirty = True
+        self._changes += 1
+        return lease
+
+    def _offer_address(self, mac, requested, now):
+        self._reclaim(now)
+        lease = self.leases.get(mac)
+        if lease is not None:
+            return lease.ip
+        offset = self._offset(requested) if requested else None
+        if offset is None or not self.pool.take(offset):
+            offset = self.pool.allocate()
+        return None if offset is None else self.range[0] + offset
+
+    def _claim(self, mac, ip):
+        """True when `ip` may be bound to `mac`: its own lease, or a free address in the range."""
+        lease = self.leases.get(mac)
+        if lease is not None and lease.ip == ip:
+            return True
+        offset = self._offset(ip)
+        if offset is None:
+            return False
+        owner = self.by_offset.get(offset)
+        if owner is not None:
+            return owner == mac
+        return self.pool.take(offset)
+
+    def _load_leases(self):
+        if not self.lease_file:
+            return
+        try:
+            with open(self.lease_file) as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) >= 4:
+                        hostname = None if parts[3] == "*" else parts[3]
+                        self.leases[parts[1].lower()] = Lease(parts[1].lower(), _ip_int(parts[2]), int(parts[0]), True, hostname)
+        except (OSError, ValueError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"DHCP lease file {self.lease_file} unreadable: {e}")
+
+    def _lease_text(self):
+        return "".join(f"{int(l.expires)} {l.mac} {_ip(l.ip)} {l.hostname or '*'} *\n"
+                       for l in self.leases.values() if l.bound)
+
+    def save_leases(self):
+        if not self.lease_file or not self._dirty:
+            return
+        atomic_write(self.lease_file, self._lease_text())
+        self._dirty = False
+
+    async def _save_in_background(self):
+        # The snapshot is taken here on the loop thread, which owns self.leases; only the write goes to a thread
+        if not self.lease_file or not self._dirty:
+            return
+        changes, text = self._changes, self._lease_text()
+        await asyncio.to_thread(atomic_write, self.lease_file, text)
+        if self._changes == changes:
+            self._dirty = False
+
+    def reset(self):
+        self.leases = {}
+        self._set_range(self.range)
+        self.save_leases()
+
+    # --- packets ---
+
+    def _log(self, packet, name, ip=None, info=None):
+        line = f"dnsmasq-dhcp: {packet.xid} {name}({self.interface or 'any'})"
+        if ip:
+            line += f" {_ip(ip) if isinstance(ip, int) else ip}"
+        line += f" {packet.mac}"
+        if info:
+            line += f" {info}"
+        return line
+
+    def _base_options(self, packet):
+        options = [(OPT_SERVER_ID, socket.inet_aton(self.server_ip))]
+        vendor = packet.text(OPT_VENDOR_CLASS) or ""
+        if vendor.startswith("PXEClient"):
+            options += [(OPT_VENDOR_CLASS, b"PXEClient"), (OPT_VENDOR_INFO, PXE_VENDOR_INFO)]
+            if OPT_CLIENT_UUID in packet.options:
+                options.append((OPT_CLIENT_UUID, packet.options[OPT_CLIENT_UUID]))
+        options += [(OPT_TFTP_SERVER, self.server_ip.encode()), (OPT_BOOT_FILE, self._boot_file(packet).encode())]
+        return options
+
+    def _boot_file(self, packet):
+        if self.ipxe_boot_file and packet.text(OPT_USER_CLASS) == "iPXE":
+            return self.ipxe_boot_file
+        return self.boot_file
+
+    def _lease_options(self, packet, lease_time=None):
+        options = self._base_options(packet)
+        if lease_time:
+            options += [(OPT_LEASE_TIME, struct.pack("!I", lease_time)), (OPT_RENEWAL, struct.pack("!I", lease_time // 2)),
+                        (OPT_REBINDING, struct.pack("!I", lease_time * 7 // 8))]
+        # Like dnsmasq, the router defaults to this server
+        options += [(OPT_MASK, socket.inet_aton(self.netmask)), (OPT_ROUTER, socket.inet_aton(self.router or self.server_ip))]
+        if self.dns:
+            options.append((OPT_DNS, b"".join(socket.inet_aton(ip) for ip in self.dns)))
+        return options
+
+    def handle(self, data, addr, protocol):
+        if self.server_ip is None:
+            return
+        packet = parse_packet(data)
+        if packet is None or packet.message_type not in MESSAGE_NAMES:
+            return
+        kind = packet.message_type
+        self.totals[MESSAGE_NAMES[kind]] = self.totals.get(MESSAGE_NAMES[kind], 0) + 1
+        lines = []
+        vendor, user = packet.text(OPT_VENDOR_CLASS), packet.text(OPT_USER_CLASS)
+        if vendor:
+            lines.append(f"dnsmasq-dhcp: {packet.xid} vendor class: {vendor}")
+        if user:
+            lines.append(f"dnsmasq-dhcp: {packet.xid} user class: {user}")
+        requested = packet.options.get(OPT_REQUESTED_IP)
+        requested = struct.unpack("!I", requested)[0] if requested and len(requested) == 4 else None
+        lines.append(self._log(packet, MESSAGE_NAMES[kind], requested or packet.ciaddr or None))
+
+        if self.mode == "full" and protocol.port == self.port and self.pool is not None:
+            reply = self._full(packet, kind, lines)
+        else:
+            reply = self._proxy(packet, kind, protocol, lines)
+        if reply is not None:
+            reply_type = reply[BOOTP.size + 6]
+            self.sent[MESSAGE_NAMES[reply_type]] = self.sent.get(MESSAGE_NAMES[reply_type], 0) + 1
+            protocol.transport.sendto(reply, self._destination(packet, reply_type, addr, protocol))
+        self._emit(lines)
+
+    def _destination(self, packet, reply_type, addr, protocol):
+        if protocol.port != self.port:
+            return addr
+        if packet.giaddr:
+            return (_ip(packet.giaddr), self.port)
+        if packet.ciaddr and reply_type != NAK:
+            return (_ip(packet.ciaddr), self.client_port)
+        return (self.broadcast, self.client_port)
+
+    def _proxy(self, packet, kind, protocol, lines):
+        if not (packet.text(OPT_VENDOR_CLASS) or "").startswith("PXEClient"):
+            return None
+        if kind == DISCOVER and protocol.port == self.port:
+            reply_type = OFFER
+        elif kind == REQUEST and (protocol.port != self.port or self._for_us(packet)):
+            reply_type = ACK
+        else:
+            return None
+        lines.append(self._log(packet, "PXE", info=f"proxy {self._boot_file(packet)}"))
+        return build_reply(packet, reply_type, siaddr=_ip_int(self.server_ip), boot_file=self._boot_file(packet),
+                           options=self._base_options(packet))
+
+    def _for_us(self, packet):
+        server_id = packet.options.get(OPT_SERVER_ID)
+        return server_id == socket.inet_aton(self.server_ip)
+
+    def _full(self, packet, kind, lines):
+        now = self.clock()
+        mac = packet.mac
+        hostname = packet.text(OPT_HOSTNAME)
+        requested = packet.options.get(OPT_REQUESTED_IP)
+        requested = struct.unpack("!I", requested)[0] if requested and len(requested) == 4 else None
+        siaddr = _ip_int(self.server_ip)
+
+        if kind == DISCOVER:
+            ip = self._offer_address(mac, requested, now)
+            if ip is None:
+                lines[-1] += " no address available"
+                return None
+            self._hold(mac, ip, now + self.offer_time, False)
+            lines.append(self._log(packet, "DHCPOFFER", ip))
+            return build_reply(packet, OFFER, ip, siaddr, self._boot_file(packet), self._lease_options(packet, self.lease_time))
+
+        if kind == REQUEST:
+            server_id = packet.options.get(OPT_SERVER_ID)
+            if server_id is not None and server_id != socket.inet_aton(self.server_ip):
+                # The client took another server's offer
+                lease = self.leases.get(mac)
+                if lease is not None and not lease.bound:
+                    self._drop(lease)
+                return None
+            ip = requested or packet.ciaddr
+            self._reclaim(now)
+            if not ip or not self._claim(mac, ip):
+                lines.append(self._log(packet, "DHCPNAK", ip or None, "address not available"))
+                return build_reply(packet, NAK, options=[(OPT_SERVER_ID, socket.inet_aton(self.server_ip))])
+            self._hold(mac, ip, now + self.lease_time, True, hostname)
+            lines.append(self._log(packet, "DHCPACK", ip, hostname))
+            return build_reply(packet, ACK, ip, siaddr, self._boot_file(packet), self._lease_options(packet, self.lease_time))
+
+        if kind in (RELEASE, DECLINE):
+            lease = self.leases.get(mac)
+            if lease is not None:
+                self._drop(lease)
+                if kind == DECLINE:
+                    # Someone else answers ARP for it: keep the address out of the pool for a while
+                    offset = self._offset(lease.ip)
+                    if offset is not None and self.pool.take(offset):
+                        self._hold(f"declined-{offset}", lease.ip, now + 600, False)
+            return None
+
+        if kind == INFORM:
+            lines.append(self._log(packet, "DHCPACK", packet.ciaddr or None))
+            return build_reply(packet, ACK, 0, siaddr, self._boot_file(packet), self._lease_options(packet))
+        return None
+
+    def _emit(self, lines):
+        self.lines.extend(lines)
+        for listener in self.listeners:
+            try:
+                listener(lines)
+            except Exception as e:
+                print(f"DHCP server listener error: {e}")
+
+    # --- lifecycle ---
+
+    def _socket(self, port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        # Room for a lab's worth of DISCOVERs arriving at once after a power cycle
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER)
+        if self.interface and hasattr(socket, "SO_BINDTODEVICE"):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE, self.interface.encode())
+        sock.bind((self.host, port))
+        sock.setblocking(False)
+        return sock
+
+    async def start(self):
+        if self.protocols:
+            return
+        loop = asyncio.get_running_loop()
+        for port in (self.port, self.proxy_port):
+            if port:
+                _, protocol = await loop.create_datagram_endpoint(lambda p=port: _Protocol(self, p), sock=self._socket(port))
+                self.protocols.append(protocol)
+        self._saver = asyncio.create_task(self._save_loop())
+        self.state = "running"
+        print(f"DHCP server ({self.mode}) listening on {self.host}:{self.port}" + (f" and :{self.proxy_port}" if self.proxy_port else ""))
+
+    async def _save_loop(self):
+        while True:
+            await asyncio.sleep(5)
+            try:
+                await self._save_in_background()
+            except Exception as e:
+                print(f"DHCP lease save failed: {e}")
+
+    async def stop(self):
+        for protocol in self.protocols:
+            protocol.transport.close()
+        self.protocols = []
+        if self._saver:
+            self._saver.cancel()
+            self._saver = None
+        self.save_leases()
+        self.state = "exited"
+
+    async def restart(self):
+        await self.stop()
+        await self.start()
+
+    def status(self):
+        if self.server_ip is None or (self.mode == "full" and self.pool is None):
+            return {"status": "unconfigured", "mode": self.mode}
+        status = {"status": self.state, "mode": self.mode, "received": dict(self.totals), "sent": dict(self.sent)}
+        if self.pool is not None:
+            status["pool"] = {"size": self.pool.size, "free": self.pool.free, "leases": sum(1 for l in self.leases.values() if l.bound)}
+        return status
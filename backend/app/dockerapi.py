@@ -0,0 +1,373 @@
+"""
+Minimal async Docker Engine API client over the UNIX socket.
+
+Requests share one keep-alive HTTP/1.1 connection (reconnected on demand);
+long-lived streams (events, log follow) get their own. ContainerMonitor keeps
+one container's state and log tail current from the events stream and an
+incremental log follow, so status and log endpoints read memory instead of
+forking `docker inspect` / `docker logs`. `docker compose` has no Engine API
+equivalent and stays a subprocess in main.py.
+"""
+
+import asyncio
+import json
+import time
+from collections import deque
+from datetime import datetime, timezone
+from urllib.parse import quote, urlencode
+
+DOCKER_SOCKET = "/var/run/docker.sock"
+API_VERSION = "v1.41"
+STREAM_LIMIT = 1024 * 1024
+
+# Container event -> state as reported by `docker inspect -f {{.State.Status}}`
+EVENT_STATES = {
+    "create": "created",
+    "start": "running",
+    "restart": "running",
+    "unpause": "running",
+    "pause": "paused",
+    "die": "exited",
+    "stop": "exited",
+    "destroy": "not_found",
+}
+
+
+class DockerError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _log_stamp(stamp):
+    """RFC3339Nano (as in `timestamps=1` logs) -> (seconds, nanoseconds)."""
+    whole, _, frac = stamp.rstrip("Z").partition(".")
+    seconds = int(datetime.strptime(whole, "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc).timestamp())
+    return seconds, int(frac.ljust(9, "0")[:9]) if frac else 0
+
+
+class LogDemuxer:
+    """Splits a `docker logs` body into lines; handles the 8-byte stream frames of non-TTY containers."""
+
+    def __init__(self):
+        self.buffer = b""
+        self.pending = b""
+        self.framed = None
+
+    def feed(self, data):
+        self.buffer += data
+        if self.framed is None:
+            if len(self.buffer) < 8:
+                return []
+            self.framed = self.buffer[0] in (0, 1, 2) and self.buffer[1:4] == b"\0\0\0"
+        if self.framed:
+            while len(self.buffer) >= 8:
+                size = int.from_bytes(self.buffer[4:8], "big")
+                if len(self.buffer) < 8 + size:
+                    break
+                self.pending += self.buffer[8:8 + size]
+                self.buffer = self.buffer[8 + size:]
+        else:
+            self.pending += self.buffer
+            self.buffer = b""
+        *lines, self.pending = self.pending.split(b"\n")
+        return [line.decode("utf-8", "replace").rstrip("\r") for line in lines]
+
+
+class DockerClient:
+    def __init__(self, socket_path=DOCKER_SOCKET, timeout=15):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._conn = None
+        self._lock = asyncio.Lock()
+
+    # --- HTTP over the UNIX socket ---
+
+    def _url(self, path, params=None):
+        query = f"?{urlencode(params)}" if params else ""
+        return f"/{API_VERSION}{path}{query}"
+
+    async def _send(self, writer, method, url, body=None):
+        data = json.dumps(body).encode() if body is not None else b""
+        head = f"{method} {url} HTTP/1.1\r\nHost: docker\r\nContent-Length: {len(data)}\r\n"
+        if body is not None:
+            head += "Content-Type: application/json\r\n"
+        writer.write(head.encode() + b"\r\n" + data)
+        await writer.drain()
+
+    async def _read_head(self, reader):
+        head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        status = int(head[0].split()[1])
+        headers = {}
+        for line in head[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+        return status, headers
+
+    async def _iter_body(self, reader, headers):
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readuntil(b"\r\n")
+                    return
+                chunk = await reader.readexactly(size)
+                await reader.readexactly(2)
+                yield chunk
+        elif "content-length" in headers:
+            remaining = int(headers["content-length"])
+            while remaining:
+                chunk = await reader.read(min(remaining, STREAM_LIMIT))
+                if not chunk:
+                    raise ConnectionError("Docker closed the connection mid-body")
+                remaining -= len(chunk)
+                yield chunk
+        elif headers.get("connection", "").lower() == "close":
+            while chunk := await reader.read(STREAM_LIMIT):
+                yield chunk
+
+    def _close(self):
+        if self._conn:
+            self._conn[1].close()
+        self._conn = None
+
+    async def _exchange(self, method, url, body):
+        for attempt in range(2):
+            if self._conn is None:
+                self._conn = await asyncio.open_unix_connection(self.socket_path, limit=STREAM_LIMIT)
+            reader, writer = self._conn
+            try:
+                await self._send(writer, method, url, body)
+                status, headers = await self._read_head(reader)
+                data = b"".join([chunk async for chunk in self._iter_body(reader, headers)])
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # The daemon drops idle keep-alive connections; retry once on a fresh one
+                self._close()
+                if attempt:
+                    raise
+                continue
+            if headers.get("connection", "").lower() == "close":
+                self._close()
+            return status, data
+
+    async def request(self, method, path, params=None, body=None):
+        """(status, parsed JSON or None); DockerError for 4xx/5xx."""
+        async with self._lock:
+            try:
+                status, data = await asyncio.wait_for(self._exchange(method, self._url(path, params), body), self.timeout)
+            except asyncio.TimeoutError:
+                self._close()
+                raise DockerError(504, f"Docker API timed out: {method} {path}")
+        payload = json.loads(data) if data and data[:1] in (b"{", b"[") else None
+        if status >= 400:
+            message = payload.get("message") if isinstance(payload, dict) else data.decode("utf-8", "replace").strip()
+            raise DockerError(status, message or f"HTTP {status}")
+        return status, payload
+
+    async def stream(self, path, params=None):
+        """Yields raw body chunks of a long-lived response on a dedicated connection."""
+        reader, writer = await asyncio.open_unix_connection(self.socket_path, limit=STREAM_LIMIT)
+        try:
+            await self._send(writer, "GET", self._url(path, params))
+            status, headers = await self._read_head(reader)
+            if status >= 400:
+                body = b"".join([chunk async for chunk in self._iter_body(reader, headers)])
+                raise DockerError(status, body.decode("utf-8", "replace").strip())
+            async for chunk in self._iter_body(reader, headers):
+                yield chunk
+        finally:
+            writer.close()
+
+    async def close(self):
+        async with self._lock:
+            self._close()
+
+    # --- containers ---
+
+    async def inspect(self, name):
+        try:
+            return (await self.request("GET", f"/containers/{quote(name)}/json"))[1]
+        except DockerError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    async def start(self, name):
+        await self.request("POST", f"/containers/{quote(name)}/start")
+
+    async def stop(self, name, timeout=10):
+        await self.request("POST", f"/containers/{quote(name)}/stop", {"t": timeout})
+
+    async def restart(self, name, timeout=10):
+        await self.request("POST", f"/containers/{quote(name)}/restart", {"t": timeout})
+
+    async def remove(self, name, force=False):
+        try:
+            await self.request("DELETE", f"/containers/{quote(name)}", {"force": int(force)})
+        except DockerError as e:
+            if e.status != 404:
+                raise
+
+    async def create(self, name, config):
+        return (await self.request("POST", "/containers/create", {"name": name}, config))[1]
+
+    async def events(self, filters, since=None):
+        params = {"filters": json.dumps(filters)}
+        if since is not None:
+            params["since"] = f"{since:.0f}"
+        buffer = b""
+        async for chunk in self.stream("/events", params):
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line)
+
+    async def follow_logs(self, name, since=None, tail="all"):
+        """Yields lists of (timestamp, line) as the container writes them; ends when it stops."""
+        params = {"follow": 1, "stdout": 1, "stderr": 1, "timestamps": 1, "tail": tail}
+        if since:
+            params["since"] = since
+        demux = LogDemuxer()
+        async for chunk in self.stream(f"/containers/{quote(name)}/logs", params):
+            lines = demux.feed(chunk)
+            if lines:
+                yield [line.partition(" ")[::2] for line in lines]
+
+
+class ContainerMonitor:
+    """Keeps one container's state and a bounded log tail current; `start()` from the event loop."""
+
+    def __init__(self, client, name, maxlen=500, initial_tail=200, retry=5):
+        self.client = client
+        self.name = name
+        self.initial_tail = initial_tail
+        self.retry = retry
+        self.state = "unknown"
+        self.error = None
+        self.lines = deque(maxlen=maxlen)
+        self._last_stamp = None
+        self._last_seen = 0
+        self._followed = False
+        self._follow = None
+        self._task = None
+        self._started = asyncio.Event()
+        # `listener(lines, stamps)` gets every batch of new log lines with their docker timestamps (epoch
+        # seconds); `state_listener(state)` every change
+        self.listeners = []
+        self.state_listeners = []
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def add_state_listener(self, listener):
+        self.state_listeners.append(listener)
+
+    def status(self):
+        if self.state == "error":
+            return {"status": "error", "message": self.error}
+        return {"status": self.state}
+
+    def _set_state(self, state):
+        if state == self.state:
+            return
+        self.state = state
+        for listener in self.state_listeners:
+            try:
+                listener(state)
+            except Exception as e:
+                print(f"Container state listener error: {e}")
+        if state == "running":
+            self._started.set()
+            self._start_follow()
+
+    def _start_follow(self):
+        if self._follow is None or self._follow.done():
+            self._follow = asyncio.create_task(self._follow_logs())
+
+    async def _follow_logs(self):
+        # A follow ends when the container stops; keep following while it is (again) running
+        while self.state == "running":
+            # Resume at the last timestamp seen (inclusive) and skip the lines already
+            # delivered for it, so restarts neither repeat nor lose lines
+            last = self._last_stamp
+            since = f"{last[0]}.{last[1]:09d}" if last else None
+            skip = self._last_seen
+            # Only the first follow starts from a bounded tail; later ones want everything since the restart
+            tail = "all" if self._followed else self.initial_tail
+            self._followed = True
+            self._started.clear()
+            try:
+                async for batch in self.client.follow_logs(self.name, since=since, tail=tail):
+                    fresh, stamps = [], []
+                    for stamp, line in batch:
+                        try:
+                            key = _log_stamp(stamp)
+                        except ValueError:
+                            continue
+                        if last and key < last:
+                            continue
+                        if key == self._last_stamp:
+                            if skip:
+                                skip -= 1
+                                continue
+                            self._last_seen += 1
+                        else:
+                            self._last_stamp, self._last_seen, skip = key, 1, 0
+                        fresh.append(line)
+                        stamps.append(key[0] + key[1] / 1e9)
+                    self.lines.extend(fresh)
+                    self._emit(fresh, stamps)
+            except Exception as e:
+                print(f"Log follow for {self.name} ended: {e}")
+            try:
+                await asyncio.wait_for(self._started.wait(), 1)
+            except asyncio.TimeoutError:
+                pass
+
+    def _emit(self, lines, stamps):
+        if not lines:
+            return
+        for listener in self.listeners:
+            try:
+                listener(lines, stamps)
+            except Exception as e:
+                print(f"Container log listener error: {e}")
+
+    async def _sync(self):
+        since = time.time()
+        info = await self.client.inspect(self.name)
+        self._set_state(info["State"]["Status"] if info else "not_found")
+        return since
+
+    async def run(self):
+        failed = None
+        while True:
+            try:
+                since = await self._sync()
+                self.error = None
+                failed = None
+                async for event in self.client.events({"type": ["container"], "container": [self.name]}, since=since - 1):
+                    state = EVENT_STATES.get(event.get("Action") or event.get("status", ""))
+                    if state:
+                        self._set_state(state)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if str(e) != failed:
+                    print(f"Docker monitor for {self.name}: {e}")
+                failed = str(e)
+                self.error = failed
+                self._set_state("error")
+            await asyncio.sleep(self.retry)
+
+    def start(self):
+        # The loop only holds weak references to tasks; keep ours
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    def stop(self):
+        for task in (self._task, self._follow):
+            if task:
+                task.cancel()
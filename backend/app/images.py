@@ -0,0 +1,272 @@
+"""
+Content-addressed boot image library with hot-swappable activation.
+
+Library (on disk, under UPLOAD_DIR/images):
+
+    images/<id>/{vmlinuz, initrd.img, filesystem.squashfs, image.json}
+    images/library.json            active image id
+
+<id> is derived from the component hashes, so importing the same boot set
+twice is free. Components are hard-linked in from the staging files in
+UPLOAD_DIR (same filesystem, no data copy).
+
+RAM_DISK (served as /pxe/):
+
+    generations/<id>/...           resident images (LRU within the tmpfs budget)
+    current -> generations/<id>    swapped atomically on activation
+    vmlinuz -> current/vmlinuz     stable legacy paths (also initrd.img, squashfs)
+
+Clients that already started downloading from an older generation keep
+their open file, and the iPXE script pins the generation path, so a swap
+never mixes kernel and initrd from different images.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import struct
+import threading
+import time
+
+from .deploy import HASH_CACHE, MANIFEST, copy_atomic, deploy_components, source_hash
+
+COMPONENTS = ["vmlinuz", "initrd.img", "filesystem.squashfs"]
+META = "image.json"
+STATE = "library.json"
+
+
+class ImageError(Exception):
+    pass
+
+
+def kernel_version(path):
+    """Read the version string embedded in an x86 bzImage header, if any."""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(0x210)
+            if len(header) < 0x210 or header[0x202:0x206] != b"HdrS":
+                return None
+            pointer = struct.unpack_from("<H", header, 0x20E)[0]
+            if not pointer:
+                return None
+            f.seek(pointer + 0x200)
+            raw = f.read(256).split(b"\x00")[0]
+            return raw.decode("ascii", "replace").split(" ")[0] or None
+    except OSError:
+        return None
+
+
+def _atomic_symlink(target, link_path):
+    tmp = f"{link_path}.tmp-{os.getpid()}"
+    try:
+        os.unlink(tmp)
+    except FileNotFoundError:
+        pass
+    os.symlink(target, tmp)
+    os.replace(tmp, link_path)
+
+
+class ImageLibrary:
+    def __init__(self, upload_dir, ram_disk, ram_budget=0.9):
+        self.root = os.path.join(upload_dir, "images")
+        self.ram_disk = ram_disk
+        self.generations = os.path.join(ram_disk, "generations")
+        self.ram_budget = ram_budget
+        # Images that must stay resident besides the active one (e.g. referenced by boot rules)
+        self.pinned = set()
+        self.lock = threading.RLock()
+        os.makedirs(self.root, exist_ok=True)
+
+    # --- state ---
+
+    def _state(self):
+        try:
+            with open(os.path.join(self.root, STATE), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"active": None}
+
+    def _save_state(self, state):
+        path = os.path.join(self.root, STATE)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(f"{path}.tmp", path)
+
+    def _save_meta(self, image_dir, meta):
+        path = os.path.join(image_dir, META)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(f"{path}.tmp", path)
+
+    def active_id(self):
+        return self._state().get("active")
+
+    def get(self, image_id):
+        try:
+            with open(os.path.join(self.root, image_id, META), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def resident_ids(self):
+        # The deploy manifest is written last, so half-copied generations are not resident yet
+        try:
+            names = os.listdir(self.generations)
+        except FileNotFoundError:
+            return []
+        return [d for d in names if os.path.exists(os.path.join(self.generations, d, MANIFEST))]
+
+    def list(self):
+        active = self.active_id()
+        resident = set(self.resident_ids())
+        images = []
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            names = []
+        for image_id in names:
+            meta = self.get(image_id)
+            if meta is None:
+                continue
+            meta["active"] = image_id == active
+            meta["resident"] = image_id in resident
+            images.append(meta)
+        images.sort(key=lambda m: m.get("last_activated") or m["created"], reverse=True)
+        return images
+
+    # --- import / delete ---
+
+    def add(self, src_dir, name=None, source=None):
+        """Import the boot set in `src_dir` (hard-linked, no data copy). Returns the image metadata."""
+        components = {}
+        for component in COMPONENTS:
+            path = os.path.join(src_dir, component)
+            if not os.path.exists(path):
+                raise ImageError(f"Missing component: {component}")
+            components[component] = {"size": os.path.getsize(path), "sha256": source_hash(path)}
+        image_id = hashlib.sha256("".join(components[c]["sha256"] for c in COMPONENTS).encode()).hexdigest()[:16]
+
+        with self.lock:
+            image_dir = os.path.join(self.root, image_id)
+            meta = self.get(image_id)
+            if meta is None:
+                staging = f"{image_dir}.importing"
+                shutil.rmtree(staging, ignore_errors=True)
+                os.makedirs(staging)
+                for component in COMPONENTS:
+                    copy_atomic(os.path.join(src_dir, component), os.path.join(staging, component), hardlink=True)
+                # Links share size and mtime, so the hashes computed above stay valid
+                if os.path.exists(os.path.join(src_dir, HASH_CACHE)):
+                    shutil.copy2(os.path.join(src_dir, HASH_CACHE), os.path.join(staging, HASH_CACHE))
+                meta = {
+                    "id": image_id,
+                    "created": time.time(),
+                    "size": sum(c["size"] for c in components.values()),
+                    "components": components,
+                    "kernel_version": kernel_version(os.path.join(staging, "vmlinuz")),
+                    "last_activated": None,
+                }
+                meta.update({"name": name or f"image-{image_id[:8]}", "source": source or {}})
+                self._save_meta(staging, meta)
+                os.replace(staging, image_dir)
+            else:
+                meta.update({"name": name or meta["name"], "source": source or meta.get("source", {})})
+                self._save_meta(image_dir, meta)
+        return meta
+
+    def delete(self, image_id):
+        with self.lock:
+            if image_id == self.active_id():
+                raise ImageError("Cannot delete the active image")
+            if image_id in self.pinned:
+                raise ImageError("Image is referenced by boot rules")
+            meta = self.get(image_id)
+            if meta is None:
+                raise ImageError("Image not found")
+            self.evict(image_id)
+            shutil.rmtree(os.path.join(self.root, image_id))
+            base = self.get(meta["variant_of"]) if meta.get("variant_of") else None
+            if base is not None:
+                base.get("variants", {}).pop(meta.get("variant"), None)
+                self._save_meta(os.path.join(self.root, base["id"]), base)
+
+    def add_variant(self, image_id, label, variant_id, report):
+        """Record `variant_id` as the repacked `label` variant of `image_id`, for A/B boot rules."""
+        with self.lock:
+            base, variant = self.get(image_id), self.get(variant_id)
+            if base is None or variant is None:
+                raise ImageError("Image not found")
+            base.setdefault("variants", {})[label] = {"id": variant_id, "size": variant["size"]}
+            variant.update({"variant_of": image_id, "variant": label, "optimize": report})
+            self._save_meta(os.path.join(self.root, image_id), base)
+            self._save_meta(os.path.join(self.root, variant_id), variant)
+            return variant
+
+    # --- residency ---
+
+    def evict(self, image_id):
+        shutil.rmtree(os.path.join(self.generations, image_id), ignore_errors=True)
+
+    def _ensure_room(self, image_id, size):
+        """Evict least recently activated images until `size` more bytes fit in the tmpfs budget."""
+        budget = shutil.disk_usage(self.ram_disk).total * self.ram_budget
+        protected = {self.active_id()} | self.pinned
+        resident = [i for i in self.resident_ids() if i != image_id]
+        used = 0
+        for i in resident:
+            meta = self.get(i)
+            used += meta["size"] if meta else 0
+        candidates = sorted(
+            (i for i in resident if i not in protected),
+            key=lambda i: (self.get(i) or {}).get("last_activated") or 0,
+        )
+        while used + size > budget and candidates:
+            victim = candidates.pop(0)
+            print(f"Image library: evicting {victim} from RAM")
+            used -= (self.get(victim) or {}).get("size", 0)
+            self.evict(victim)
+        if used + size > budget:
+            raise ImageError("Image does not fit in the RAM disk next to the active and pinned images")
+
+    def load(self, image_id, progress=None, verify=False):
+        """Make `image_id` resident in RAM_DISK/generations without switching to it (`verify` re-hashes resident copies)."""
+        with self.lock:
+            meta = self.get(image_id)
+            if meta is None:
+                raise ImageError("Image not found")
+            self._ensure_room(image_id, meta["size"])
+            target = os.path.join(self.generations, image_id)
+            os.makedirs(target, exist_ok=True)
+            return deploy_components(os.path.join(self.root, image_id), target, COMPONENTS, progress=progress, verify=verify)
+
+    def activate(self, image_id, progress=None, verify=False):
+        """Make `image_id` resident and atomically point /pxe/ at it."""
+        with self.lock:
+            report = self.load(image_id, progress=progress, verify=verify)
+            meta = self.get(image_id)
+
+            _atomic_symlink(os.path.join("generations", image_id), os.path.join(self.ram_disk, "current"))
+            for component in COMPONENTS:
+                link = os.path.join(self.ram_disk, component)
+                if not os.path.islink(link) or os.readlink(link) != os.path.join("current", component):
+                    _atomic_symlink(os.path.join("current", component), link)
+
+            meta["last_activated"] = time.time()
+            self._save_meta(os.path.join(self.root, image_id), meta)
+            state = self._state()
+            state["active"] = image_id
+            self._save_state(state)
+            return {"image": meta, "deploy": report}
+
+    def unload(self):
+        """Drop every resident generation and the /pxe/ links (the library itself is kept)."""
+        with self.lock:
+            for component in COMPONENTS + ["current"]:
+                path = os.path.join(self.ram_disk, component)
+                if os.path.islink(path) or os.path.isfile(path):
+                    os.unlink(path)
+            shutil.rmtree(self.generations, ignore_errors=True)
+            state = self._state()
+            state["active"] = None
+            self._save_state(state)
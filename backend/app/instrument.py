@@ -0,0 +1,211 @@
+"""
+Request spans, hot-path summaries and an on-demand sampling profiler.
+
+`tracer` is shared by every module. Request timings from LatencyMiddleware,
+`run()` (subprocess.run), file copies and psutil reads are recorded as spans
+(kind, name, duration and attributes such as bytes or the exit code) in a
+bounded ring. `hotpaths()` groups the recent ones by operation.
+The tracer is off unless INSTRUMENT=1 or it is switched on at runtime; a
+disabled `span()` returns a shared no-op object, so instrumented code pays
+one attribute check.
+
+`SamplingProfiler` walks `sys._current_frames()` from a background thread
+and counts wall-clock stacks (idle threads included) in the collapsed
+format read by flamegraph.pl, speedscope and inferno.
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+
+
+class Span:
+    __slots__ = ("tracer", "kind", "name", "attrs", "started")
+
+    def __init__(self, tracer, kind, name, attrs):
+        self.tracer = tracer
+        self.kind = kind
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.attrs.setdefault("error", exc_type.__name__)
+        self.tracer.record(self.kind, self.name, time.perf_counter() - self.started, **self.attrs)
+        return False
+
+
+class _NoopSpan:
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP = _NoopSpan()
+
+
+def _failed(attrs):
+    return bool(attrs.get("error")) or attrs.get("exit_code", 0) != 0 or attrs.get("status", 0) >= 500
+
+
+class Tracer:
+    def __init__(self, enabled=False, max_spans=50000):
+        self.enabled = enabled
+        # (end wall time, kind, name, seconds, attrs); deque.append is atomic, so recording takes no lock
+        self.spans = deque(maxlen=max_spans)
+
+    def span(self, kind, name, **attrs):
+        if not self.enabled:
+            return NOOP
+        return Span(self, kind, name, attrs)
+
+    def record(self, kind, name, seconds, **attrs):
+        if self.enabled:
+            self.spans.append((time.time(), kind, name, seconds, attrs))
+
+    def hotpaths(self, minutes=15, limit=20, kind=None):
+        """Recent spans grouped by (kind, name), slowest total first, plus the slowest single spans."""
+        since = time.time() - minutes * 60
+        recent = [s for s in list(self.spans) if s[0] >= since and (kind is None or s[1] == kind)]
+        groups = {}
+        for ts, span_kind, name, seconds, attrs in recent:
+            group = groups.setdefault((span_kind, name), {"durations": [], "bytes": 0, "failures": 0})
+            group["durations"].append(seconds)
+            group["bytes"] += attrs.get("bytes", 0)
+            group["failures"] += _failed(attrs)
+        operations = []
+        for (span_kind, name), group in groups.items():
+            durations = sorted(group["durations"])
+            operations.append({
+                "kind": span_kind,
+                "name": name,
+                "count": len(durations),
+                "total_ms": round(sum(durations) * 1000, 2),
+                "p50_ms": round(durations[len(durations) // 2] * 1000, 2),
+                "p95_ms": round(durations[min(int(len(durations) * 0.95), len(durations) - 1)] * 1000, 2),
+                "max_ms": round(durations[-1] * 1000, 2),
+                "bytes": group["bytes"],
+                "failures": group["failures"],
+            })
+        operations.sort(key=lambda o: o["total_ms"], reverse=True)
+        slowest = sorted(recent, key=lambda s: s[3], reverse=True)[:limit]
+        return {
+            "enabled": self.enabled,
+            "minutes": minutes,
+            "spans": len(recent),
+            "operations": operations[:limit],
+            "slowest": [{"ts": ts, "kind": span_kind, "name": name, "ms": round(seconds * 1000, 2), **attrs}
+                        for ts, span_kind, name, seconds, attrs in slowest],
+        }
+
+
+tracer = Tracer()
+
+
+def span(kind, name, **attrs):
+    return tracer.span(kind, name, **attrs)
+
+
+def run(args, **kwargs):
+    """subprocess.run inside a "subprocess" span named after the program (and its subcommand, e.g. `7z x`)."""
+    if not tracer.enabled:
+        return subprocess.run(args, **kwargs)
+    name = os.path.basename(str(args[0]))
+    if len(args) > 1 and not str(args[1]).startswith("-") and os.sep not in str(args[1]):
+        name = f"{name} {args[1]}"
+    with tracer.span("subprocess", name) as s:
+        try:
+            res = subprocess.run(args, **kwargs)
+        except subprocess.CalledProcessError as e:
+            s.set(exit_code=e.returncode)
+            raise
+        s.set(exit_code=res.returncode)
+        return res
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.stacks = {}
+        self.samples = 0
+        self.started = None
+        self.interval = None
+        self.deadline = None
+        # Collapsed output of the last finished run
+        self.last = None
+        self._labels = {}
+
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, interval=0.01, max_seconds=300):
+        """Start sampling every `interval` seconds; stops by itself after `max_seconds`. False if already running."""
+        with self.lock:
+            if self.running():
+                return False
+            self.stacks, self.samples = {}, 0
+            self.interval, self.started = interval, time.time()
+            self.deadline = time.monotonic() + max_seconds
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+            self.thread.start()
+            return True
+
+    def stop(self):
+        """Stop sampling and return the collapsed stacks ("frame;frame;frame count" per line)."""
+        with self.lock:
+            thread = self.thread
+            self.stop_event.set()
+        if thread:
+            thread.join()
+        return self.last
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self.stop_event.wait(self.interval) and time.monotonic() < self.deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                key = ";".join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+        self.last = "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+    def status(self):
+        return {
+            "running": self.running(),
+            "started": self.started,
+            "interval": self.interval,
+            "samples": self.samples,
+            "stacks": len(self.stacks),
+            "has_profile": self.last is not None,
+        }
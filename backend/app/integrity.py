@@ -0,0 +1,59 @@
+"""
+Content hashes and integrity checks for boot components.
+
+Files are hashed through a read-only mmap, so a 1-2 GB squashfs is never
+copied into Python buffers. hashlib releases the GIL on large updates, which
+lets the deploy threads hash components in parallel. Every deployed
+directory keeps the deploy manifest ({name: {size, mtime_ns, sha256}}) and a
+SHA256SUMS file (`sha256sum -c` format) that clients and tools can check
+against.
+"""
+
+import hashlib
+import mmap
+import os
+
+HASH_CHUNK = 8 * 1024 * 1024
+CHECKSUMS = "SHA256SUMS"
+
+
+def hash_file(path, algorithm="sha256", chunk=HASH_CHUNK):
+    """Hex digest of `path` (sha256, blake2b, ...), streamed through an mmap."""
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return digest.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if hasattr(mapped, "madvise"):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            view = memoryview(mapped)
+            try:
+                for offset in range(0, size, chunk):
+                    digest.update(view[offset:offset + chunk])
+            finally:
+                view.release()
+    return digest.hexdigest()
+
+
+def write_checksums(directory, manifest):
+    """Write SHA256SUMS for the manifest entries in `directory`."""
+    lines = "".join(f"{entry['sha256']}  {name}\n" for name, entry in sorted(manifest.items()))
+    path = os.path.join(directory, CHECKSUMS)
+    with open(f"{path}.tmp", "w") as f:
+        f.write(lines)
+    os.replace(f"{path}.tmp", path)
+
+
+def verify_file(path, entry):
+    """'ok', 'missing', 'size' (length differs) or 'hash' (content differs) for one manifest entry."""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return "missing"
+    if size != entry.get("size"):
+        return "size"
+    if hash_file(path) != entry.get("sha256"):
+        return "hash"
+    return "ok"
+
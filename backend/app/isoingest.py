@@ -0,0 +1,392 @@
+"""
+ISO ingestion pipeline.
+
+The upload is streamed straight to disk while its SHA-256 is computed, then
+only the three boot members (kernel, initrd, squashfs) are pulled out of the
+ISO. The ISO9660 directory tree (Joliet / Rock Ridge names when present) is
+read directly and each member's extent is copied into its final location with
+copy_file_range; ISOs that cannot be parsed fall back to `7z x` with an
+explicit member list instead of a full extraction.
+"""
+
+import fnmatch
+import hashlib
+import os
+import shutil
+import struct
+import asyncio
+import time
+
+from .instrument import run, span
+
+SECTOR = 2048
+CHUNK = 4 * 1024 * 1024
+COPY_CHUNK = 64 * 1024 * 1024
+
+# Same search order as the old glob-based lookup; shortest path wins
+BOOT_MEMBERS = [
+    ("vmlinuz", "vmlinuz", ["live/vmlinuz*", "casper/vmlinuz*", "vmlinuz*", "kernel*"]),
+    ("initrd", "initrd.img", ["live/initrd*", "casper/initrd*", "initrd*", "initramfs*"]),
+    ("rootfs", "filesystem.squashfs", ["live/*.squashfs", "casper/*.squashfs", "*.squashfs"]),
+]
+
+
+class IsoError(Exception):
+    pass
+
+
+class StageTimer:
+    """Collects bytes/seconds per pipeline stage and reports throughput."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def record(self, name, nbytes, seconds):
+        self.stages[name] = {
+            "bytes": nbytes,
+            "seconds": round(seconds, 3),
+            "mb_per_s": round(nbytes / seconds / 1e6, 1) if seconds > 0 else None,
+        }
+        print(f"ISO pipeline: {name} {nbytes / 1e6:.1f} MB in {seconds:.2f}s")
+
+    def report(self):
+        return dict(self.stages)
+
+
+# --- Upload ---
+
+async def iter_upload(file, chunk_size=CHUNK):
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def _write_all(fd, digest, data):
+    digest.update(data)
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+async def save_stream(chunks, dest_path, progress=None, buffer_size=CHUNK):
+    """Write an async iterator of bytes to `dest_path`, hashing on the fly. Returns (size, sha256).
+
+    Hashing and writing happen in a worker thread, one buffer at a time, so
+    the event loop keeps serving other requests during multi-GB uploads.
+    The data goes to a temp file that replaces `dest_path` only when complete:
+    `dest_path` may be hard-linked into the image library and must never be
+    written through.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    pending = []
+    pending_size = 0
+    tmp_path = os.path.join(os.path.dirname(dest_path), f".{os.path.basename(dest_path)}.part")
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        async for chunk in chunks:
+            pending.append(chunk)
+            pending_size += len(chunk)
+            if pending_size >= buffer_size:
+                await asyncio.to_thread(_write_all, fd, digest, b"".join(pending))
+                size += pending_size
+                pending, pending_size = [], 0
+                if progress:
+                    progress(size)
+        if pending:
+            await asyncio.to_thread(_write_all, fd, digest, b"".join(pending))
+            size += pending_size
+            if progress:
+                progress(size)
+    except BaseException:
+        os.close(fd)
+        os.unlink(tmp_path)
+        raise
+    os.close(fd)
+    os.chmod(tmp_path, 0o666)
+    os.replace(tmp_path, dest_path)
+    return size, digest.hexdigest()
+
+
+# --- ISO9660 ---
+
+class IsoEntry:
+    __slots__ = ("path", "extents", "size", "is_dir")
+
+    def __init__(self, path, extents, is_dir):
+        self.path = path
+        self.extents = extents
+        self.size = sum(length for _, length in extents)
+        self.is_dir = is_dir
+
+
+class IsoImage:
+    def __init__(self, path):
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY)
+        try:
+            self._read_descriptors()
+        except Exception:
+            os.close(self.fd)
+            raise
+
+    def close(self):
+        os.close(self.fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _read(self, offset, size):
+        return os.pread(self.fd, size, offset)
+
+    def _read_descriptors(self):
+        primary = None
+        joliet = None
+        for sector in range(16, 64):
+            desc = self._read(sector * SECTOR, SECTOR)
+            if len(desc) < SECTOR or desc[1:6] != b"CD001":
+                break
+            kind = desc[0]
+            if kind == 1 and primary is None:
+                primary = desc
+            elif kind == 2 and desc[88:91] in (b"%/@", b"%/C", b"%/E"):
+                joliet = desc
+            elif kind == 255:
+                break
+        if primary is None:
+            raise IsoError("No ISO9660 primary volume descriptor")
+        self.joliet = joliet is not None
+        desc = joliet or primary
+        self.block_size = struct.unpack_from("<H", desc, 128)[0] or SECTOR
+        root = desc[156:156 + 34]
+        self.root_lba = struct.unpack_from("<I", root, 2)[0]
+        self.root_size = struct.unpack_from("<I", root, 10)[0]
+
+    def _records(self, lba, size):
+        data = self._read(lba * self.block_size, size)
+        pos = 0
+        while pos < len(data):
+            length = data[pos]
+            if length == 0:
+                # Records never span sectors: skip the padding
+                pos = (pos // self.block_size + 1) * self.block_size
+                continue
+            yield data[pos:pos + length]
+            pos += length
+
+    def _name(self, record):
+        name_len = record[32]
+        raw = record[33:33 + name_len]
+        if raw in (b"\x00", b"\x01"):
+            return None
+        if self.joliet:
+            name = raw.decode("utf-16-be", "replace")
+        else:
+            name = self._rock_ridge_name(record, name_len) or raw.decode("ascii", "replace").lower()
+        name = name.split(";")[0]
+        if name.endswith(".") and "." not in name[:-1]:
+            name = name[:-1]
+        return name
+
+    def _rock_ridge_name(self, record, name_len):
+        pos = 33 + name_len + (1 - name_len % 2)
+        parts = []
+        while pos + 4 <= len(record):
+            sig = record[pos:pos + 2]
+            length = record[pos + 2]
+            if length < 4:
+                break
+            if sig == b"NM":
+                parts.append(record[pos + 5:pos + length].decode("utf-8", "replace"))
+            pos += length
+        return "".join(parts) or None
+
+    def walk(self):
+        """Yield every IsoEntry below the root, directories included."""
+        pending = [("", self.root_lba, self.root_size)]
+        visited = set()
+        while pending:
+            prefix, lba, size = pending.pop()
+            if lba in visited:
+                continue
+            visited.add(lba)
+            extents = []
+            for record in self._records(lba, size):
+                name = self._name(record)
+                if name is None:
+                    continue
+                extent = struct.unpack_from("<I", record, 2)[0]
+                length = struct.unpack_from("<I", record, 10)[0]
+                flags = record[25]
+                extents.append((extent * self.block_size, length))
+                if flags & 0x80:
+                    # Multi-extent file (> 4 GiB): more records follow
+                    continue
+                path = f"{prefix}{name}"
+                is_dir = bool(flags & 0x02)
+                if is_dir:
+                    pending.append((path + "/", extent, length))
+                yield IsoEntry(path, extents, is_dir)
+                extents = []
+
+
+def _matches(path, pattern):
+    wanted = pattern.split("/")
+    parts = path.split("/")
+    if len(parts) < len(wanted):
+        return False
+    return all(fnmatch.fnmatchcase(part, want) for part, want in zip(parts[-len(wanted):], wanted))
+
+
+def select_members(paths):
+    """Pick the kernel/initrd/squashfs member for each boot component. Returns {key: path}."""
+    selected = {}
+    for key, _, patterns in BOOT_MEMBERS:
+        for pattern in patterns:
+            matches = [p for p in paths if _matches(p, pattern)]
+            if matches:
+                selected[key] = min(matches, key=len)
+                break
+    return selected
+
+
+def copy_extent(src_fd, dst_fd, src_offset, length, dst_offset, progress=None):
+    """Copy a byte range between files, in kernel space when possible."""
+    while length > 0:
+        try:
+            n = os.copy_file_range(src_fd, dst_fd, min(length, COPY_CHUNK), src_offset, dst_offset)
+        except OSError:
+            n = 0
+        if n <= 0:
+            data = os.pread(src_fd, min(length, CHUNK), src_offset)
+            if not data:
+                raise IsoError("Unexpected end of ISO image")
+            n = os.pwrite(dst_fd, data, dst_offset)
+        src_offset += n
+        dst_offset += n
+        length -= n
+        if progress:
+            progress(n)
+
+
+def copy_file(src_path, dest_path, progress=None):
+    """Copy a whole file (contents, mode and times) via copy_extent."""
+    src_fd = os.open(src_path, os.O_RDONLY)
+    try:
+        size = os.fstat(src_fd).st_size
+        dst_fd = os.open(dest_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+        try:
+            with span("copy", os.path.basename(dest_path), bytes=size):
+                copy_extent(src_fd, dst_fd, 0, size, 0, progress)
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    shutil.copystat(src_path, dest_path)
+    return size
+
+
+def scan_iso9660(iso_path):
+    """Return ({key: member}, {key: size}) for the boot members of an ISO9660 image."""
+    with IsoImage(iso_path) as iso:
+        files = {entry.path: entry for entry in iso.walk() if not entry.is_dir}
+    selected = select_members(list(files))
+    return selected, {key: files[member].size for key, member in selected.items()}
+
+
+def extract_iso9660(iso_path, dest_dir, progress=None):
+    """Extract the boot members by reading the ISO9660 tree. Returns ({key: member}, bytes)."""
+    with IsoImage(iso_path) as iso:
+        files = {entry.path: entry for entry in iso.walk() if not entry.is_dir}
+        selected = select_members(list(files))
+        total = 0
+        for key, dest_name, _ in BOOT_MEMBERS:
+            member = selected.get(key)
+            if member is None:
+                continue
+            entry = files[member]
+            dest_path = os.path.join(dest_dir, dest_name)
+            tmp_path = dest_path + ".part"
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+            try:
+                offset = 0
+                with span("copy", f"iso:{dest_name}", bytes=entry.size):
+                    for src_offset, length in entry.extents:
+                        copy_extent(iso.fd, fd, src_offset, length, offset, progress)
+                        offset += length
+            except BaseException:
+                os.close(fd)
+                os.unlink(tmp_path)
+                raise
+            os.close(fd)
+            os.replace(tmp_path, dest_path)
+            os.chmod(dest_path, 0o666)
+            total += entry.size
+        return selected, total
+
+
+def list_7z(iso_path):
+    res = run(["7z", "l", "-slt", "-ba", iso_path], capture_output=True, text=True, check=True)
+    paths = []
+    path = None
+    for line in res.stdout.splitlines() + [""]:
+        if line.startswith("Path = "):
+            path = line[7:]
+        elif line.startswith("Folder = ") and path is not None:
+            if line[9:].strip() != "+":
+                paths.append(path.replace("\\", "/"))
+            path = None
+    return paths
+
+
+def extract_7z(iso_path, dest_dir):
+    """Fallback: let 7z extract only the selected members, then rename them into place."""
+    selected = select_members(list_7z(iso_path))
+    if not selected:
+        return selected, 0
+    staging = os.path.join(dest_dir, ".iso-members")
+    shutil.rmtree(staging, ignore_errors=True)
+    try:
+        run(["7z", "x", iso_path, f"-o{staging}", "-y", *selected.values()], capture_output=True, check=True)
+        total = 0
+        for key, dest_name, _ in BOOT_MEMBERS:
+            member = selected.get(key)
+            if member is None:
+                continue
+            dest_path = os.path.join(dest_dir, dest_name)
+            os.replace(os.path.join(staging, member), dest_path)
+            os.chmod(dest_path, 0o666)
+            total += os.path.getsize(dest_path)
+        return selected, total
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def extract_boot_files(iso_path, dest_dir, timer=None, progress=None):
+    """Extract kernel/initrd/squashfs from `iso_path` straight into `dest_dir`."""
+    start = time.perf_counter()
+    method = "iso9660"
+    try:
+        selected, total = extract_iso9660(iso_path, dest_dir, progress)
+    except (IsoError, OSError, struct.error) as e:
+        print(f"ISO9660 reader failed ({e}), falling back to targeted 7z extraction")
+        selected, total = {}, 0
+    if not selected and shutil.which("7z"):
+        # Not ISO9660 or nothing found in it (e.g. UDF-only media)
+        method = "7z"
+        selected, total = extract_7z(iso_path, dest_dir)
+        if progress:
+            progress(total)
+    if timer is not None:
+        timer.record("extract", total, time.perf_counter() - start)
+    return {
+        "method": method,
+        "members": selected,
+        "found": {key: key in selected for key, _, _ in BOOT_MEMBERS},
+    }
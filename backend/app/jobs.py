@@ -0,0 +1,187 @@
+"""
+Background jobs for long-running file work (ISO extraction, RAM deployment).
+
+Jobs run on a small thread pool so the event loop never blocks on file I/O.
+Each job reports bytes done / total, rate and ETA, can be cancelled, and jobs
+sharing an exclusive group (e.g. everything touching the boot set) never run
+concurrently.
+"""
+
+import itertools
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+ACTIVE_STATES = ("queued", "running")
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobConflict(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, job_id, kind, group=None, total=0, description=""):
+        self.id = job_id
+        self.kind = kind
+        self.group = group
+        self.description = description
+        self.status = "queued"
+        self.phase = ""
+        self.bytes_done = 0
+        self.bytes_total = total
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self._cancel = threading.Event()
+        self._phase_started = time.monotonic()
+        self._phase_done = 0
+
+    @property
+    def active(self):
+        return self.status in ACTIVE_STATES
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled(f"Job {self.id} cancelled")
+
+    def set_phase(self, phase, total=None):
+        self.phase = phase
+        if total is not None:
+            self.bytes_total = total
+            self.bytes_done = 0
+        self._phase_started = time.monotonic()
+        self._phase_done = self.bytes_done
+
+    def advance(self, nbytes):
+        """Progress callback for copy loops; raises JobCancelled once the job is cancelled."""
+        self.bytes_done += nbytes
+        self.check_cancelled()
+
+    def to_dict(self):
+        elapsed = time.monotonic() - self._phase_started
+        rate = (self.bytes_done - self._phase_done) / elapsed if elapsed > 0 else 0
+        remaining = max(self.bytes_total - self.bytes_done, 0)
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "description": self.description,
+            "status": self.status,
+            "phase": self.phase,
+            "bytes_done": self.bytes_done,
+            "bytes_total": self.bytes_total,
+            "percent": round(self.bytes_done * 100 / self.bytes_total, 1) if self.bytes_total else None,
+            "rate": round(rate) if self.status == "running" else None,
+            "eta": round(remaining / rate, 1) if self.status == "running" and rate > 0 else None,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    def __init__(self, max_workers=2, history=50):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.history = history
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """`callback(job)` is called from the worker thread when a job finishes."""
+        self._listeners.append(callback)
+
+    def create(self, kind, group=None, total=0, description=""):
+        """Register a job without starting it (e.g. while its upload is still streaming)."""
+        with self.lock:
+            if group is not None:
+                for job in self.jobs.values():
+                    if job.group == group and job.active:
+                        raise JobConflict(f"Another {job.kind} job ({job.id}) is still running")
+            job = Job(f"{kind}-{next(self._ids)}-{int(time.time())}", kind, group, total, description)
+            self.jobs[job.id] = job
+            while len(self.jobs) > self.history:
+                oldest = next(iter(self.jobs.values()))
+                if oldest.active:
+                    break
+                self.jobs.popitem(last=False)
+            return job
+
+    def start(self, job, fn, *args):
+        """Run `fn(job, *args)` on the pool; its return value becomes job.result."""
+        self.pool.submit(self._run, job, fn, args)
+        return job
+
+    def submit(self, kind, fn, *args, group=None, total=0, description=""):
+        return self.start(self.create(kind, group, total, description), fn, *args)
+
+    def fail(self, job, error):
+        job.status = "failed"
+        job.error = str(error)
+        job.finished = time.time()
+        self._notify(job)
+
+    def mark_cancelled(self, job):
+        """Finish a job that stopped on JobCancelled outside the pool (e.g. while its upload was streaming)."""
+        job.status = "cancelled"
+        job.finished = time.time()
+        self._notify(job)
+
+    def _run(self, job, fn, args):
+        if job.cancelled:
+            self.mark_cancelled(job)
+            return
+        job.status = "running"
+        job.started = job.started or time.time()
+        try:
+            job.result = fn(job, *args)
+            job.status = "succeeded"
+        except JobCancelled:
+            job.status = "cancelled"
+        except Exception as e:
+            traceback.print_exc()
+            job.status = "failed"
+            job.error = str(e)
+        job.finished = time.time()
+        self._notify(job)
+
+    def _notify(self, job):
+        for callback in self._listeners:
+            try:
+                callback(job)
+            except Exception as e:
+                print(f"Job listener error: {e}")
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def list(self, kind=None, active_only=False):
+        with self.lock:
+            jobs = list(self.jobs.values())
+        return [job for job in reversed(jobs) if (kind is None or job.kind == kind) and (not active_only or job.active)]
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is not None and job.active:
+            job.cancel()
+            if job.status == "queued" and job.started is None:
+                job.status = "cancelled"
+                job.finished = time.time()
+        return job
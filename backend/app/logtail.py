@@ -0,0 +1,191 @@
+"""
+Incremental log follower for the PXE orchestrator.
+
+Keeps a byte offset into a line-oriented log (nginx access.log by default),
+parses only the lines appended since the previous poll and keeps a bounded
+ring of parsed entries in memory. Truncation (factory reset) and rotation
+(inode change) are detected on every poll.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from itertools import islice
+
+ACCESS_LOG = os.getenv("ACCESS_LOG", "/var/log/nginx/access.log")
+
+# Pattern: 10.92.162.133 - - [13/Feb/2026:19:03:14 +0700] "GET /pxe/vmlinuz HTTP/1.1" 200 12011456 "-" "iPXE/1.21.1+ (g91081)"
+ACCESS_PATTERN = re.compile(
+    r'(?P<ip>\d+\.\d+\.\d+\.\d+) .*? \[(?P<time>.*?)\] "(?P<method>\w+) (?P<path>.*?) HTTP/.*?" (?P<status>\d+) (?P<size>\d+)'
+)
+
+# Max bytes read from the log in a single read() call
+READ_CHUNK = 8 * 1024 * 1024
+
+_stamp_cache = {}
+
+
+def parse_log_time(stamp: str) -> float:
+    """Convert an nginx `$time_local` string to a unix timestamp (cached per second)."""
+    ts = _stamp_cache.get(stamp)
+    if ts is None:
+        try:
+            ts = datetime.strptime(stamp, "%d/%b/%Y:%H:%M:%S %z").timestamp()
+        except ValueError:
+            try:
+                ts = datetime.strptime(stamp.split(" ")[0], "%d/%b/%Y:%H:%M:%S").timestamp()
+            except ValueError:
+                return time.time()
+        if len(_stamp_cache) > 4096:
+            _stamp_cache.clear()
+        _stamp_cache[stamp] = ts
+    return ts
+
+
+def parse_access_line(line: str):
+    match = ACCESS_PATTERN.search(line)
+    if not match:
+        return None
+    data = match.groupdict()
+    data["ts"] = parse_log_time(data["time"])
+    # Clean up time for the dashboard
+    data["time"] = data["time"].split(" ")[0]
+    return data
+
+
+class LogFollower:
+    """Follows a log file by byte offset and fans parsed entries out to listeners."""
+
+    def __init__(self, path, parser, maxlen=2000, interval=0.5, backfill=4 * 1024 * 1024):
+        self.path = path
+        self.parser = parser
+        self.interval = interval
+        self.backfill = backfill
+        self.entries = deque(maxlen=maxlen)
+        self.lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self.lines_parsed = 0
+        self._offset = None
+        self._inode = None
+        self._partial = b""
+        self._listeners = []
+        self._reset_listeners = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_listener(self, callback, on_reset=None):
+        """`callback(entries)` is called with every batch of newly parsed entries."""
+        self._listeners.append(callback)
+        if on_reset is not None:
+            self._reset_listeners.append(on_reset)
+
+    def reset(self):
+        """Forget everything read so far and restart from the beginning of the file."""
+        with self._poll_lock:
+            with self.lock:
+                self.entries.clear()
+            self._offset = 0
+            self._inode = None
+            self._partial = b""
+        for callback in self._reset_listeners:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Log follower reset listener error: {e}")
+
+    def poll(self) -> int:
+        """Read and parse whatever was appended since the last poll. Returns the number of new entries."""
+        with self._poll_lock:
+            return self._poll()
+
+    def _poll(self) -> int:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return 0
+
+        if self._offset is None:
+            # First look at the file: only backfill the tail of a large log
+            self._inode = st.st_ino
+            self._offset = max(0, st.st_size - self.backfill)
+            skip_first = self._offset > 0
+        else:
+            skip_first = False
+            if st.st_ino != self._inode or st.st_size < self._offset:
+                # Rotated or truncated
+                self._inode = st.st_ino
+                self._offset = 0
+                self._partial = b""
+
+        if st.st_size == self._offset:
+            return 0
+
+        total = 0
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                while True:
+                    data = f.read(READ_CHUNK)
+                    if not data:
+                        break
+                    self._offset += len(data)
+                    data = self._partial + data
+                    lines = data.split(b"\n")
+                    self._partial = lines.pop()
+                    if skip_first and lines:
+                        lines = lines[1:]
+                        skip_first = False
+                    total += self._ingest(lines)
+        except OSError as e:
+            print(f"Log follower read error on {self.path}: {e}")
+        return total
+
+    def _ingest(self, lines) -> int:
+        parser = self.parser
+        parsed = []
+        for raw in lines:
+            entry = parser(raw.decode("utf-8", "replace"))
+            if entry is not None:
+                parsed.append(entry)
+        if not parsed:
+            return 0
+        with self.lock:
+            self.entries.extend(parsed)
+            self.lines_parsed += len(parsed)
+        for callback in self._listeners:
+            try:
+                callback(parsed)
+            except Exception as e:
+                print(f"Log follower listener error: {e}")
+        return len(parsed)
+
+    def recent(self, limit=None, predicate=None):
+        """Newest-first list of entries from the ring, optionally filtered."""
+        with self.lock:
+            items = reversed(self.entries)
+            if predicate is not None:
+                items = filter(predicate, items)
+            return list(islice(items, limit))
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"follow:{os.path.basename(self.path)}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Log follower error on {self.path}: {e}")
+            self._stop.wait(self.interval)
@@ -5,21 +5,47 @@ Copyright (c) 2026. All rights reserved.
 """
 
 import os
+import json
+import hashlib
+import secrets
+import asyncio
 import shutil
 import psutil
 import socket
 import time
-from fastapi import FastAPI, UploadFile, File, HTTPException, Header, Depends
+import itertools
+from fastapi import FastAPI, UploadFile, File, HTTPException, Header, Depends, Query, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-from typing import List
-import subprocess
-import glob
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from typing import List, Optional
 from datetime import datetime, timedelta
 import re
 from datetime import datetime, timedelta
 import re
+from urllib.parse import unquote
+from .logtail import ACCESS_LOG, LogFollower, parse_access_line
+from .clients import ClientWindowIndex
+from .push import PushHub
+from .images import ImageError, ImageLibrary
+from .routing import BootRouter, RuleError
+from .cluster import CHUNK_SIZE, ClusterNode, TxRate, image_chunks
+from .bootserver import BootFileServer
+from .isoingest import StageTimer, extract_boot_files, iter_upload, save_stream, scan_iso9660
+from .jobs import JobCancelled, JobConflict, JobManager
+from .boottrack import BOOTED, STAGES, TFTP_STAGES, BootTracker, http_stage, parse_tftp_line
+from .metrics import DURATION_BUCKETS, LatencyMiddleware, Registry
+from .configstore import ConfigStore, ServerConfig, atomic_write
+from .dockerapi import DOCKER_SOCKET, ContainerMonitor, DockerClient, DockerError
+from .timeseries import HistorySampler, HistoryStore
+from .dhcpindex import DhcpIndex, parse_dhcp_event, parse_dhcp_log_line, parse_lease_file
+from .dhcpserver import DhcpServer
+from .tftpserver import TftpServer
+from .uploads import UploadError, UploadManager
+from .swarm import SwarmError, SwarmTracker
+from .precompute import Precomputed, etag_for
+from .instrument import SamplingProfiler, run, span, tracer
+from .optimize import CLIENT_FACTOR, DEFAULT_BLOCK_SIZE, OptimizeError, analyse_image, repack_image
 
 app = FastAPI(title="UTBK PXE Server API")
 
@@ -30,87 +56,238 @@ METADATA_FILE = os.path.join(UPLOAD_DIR, "iso_metadata.json")
 CONFIG_FILE = os.path.join(UPLOAD_DIR, "config.json")
 APP_PASSWORD = os.getenv("APP_PASSWORD", "admin123")
 DNSMASQ_CONF = os.path.join(os.getenv("APP_DIR", "/app"), "scripts", "dnsmasq.conf")
+FRONTEND_DIR = os.getenv("FRONTEND_DIR", os.path.join(os.getenv("APP_DIR", "/app"), "frontend"))
  
-# Volatile session statistics
-MAX_CLIENTS_SESSION = 0
-MIN_CLIENTS_SESSION = 0
-SESSION_STARTED = False
+# Active-client window in seconds and how long per-client history is kept
+CLIENT_WINDOW = int(os.getenv("CLIENT_WINDOW", "120"))
+CLIENT_HISTORY = int(os.getenv("CLIENT_HISTORY", "3600"))
+
+# Single follower shared by /api/stats and /api/logs (replaces per-request `tail`)
+access_log = LogFollower(ACCESS_LOG, parse_access_line, maxlen=2000)
+
+# Volatile session statistics (min/max clients) live in the index
+client_index = ClientWindowIndex(window=CLIENT_WINDOW, horizon=CLIENT_HISTORY)
+access_log.add_listener(client_index.ingest, on_reset=client_index.reset)
+
+# Per-client boot progress, fed from the access log and (when present) TFTP/DHCP logs
+TFTP_LOG = os.getenv("TFTP_LOG", "/var/log/messages")
+DHCP_LOG = os.getenv("DHCP_LOG", "")
+BOOT_STALL_AFTER = int(os.getenv("BOOT_STALL_AFTER", "120"))
+boot_tracker = BootTracker(RAM_DISK, stall_after=BOOT_STALL_AFTER)
+access_log.add_listener(boot_tracker.ingest_access, on_reset=boot_tracker.reset)
+tftp_log = LogFollower(TFTP_LOG, parse_tftp_line, maxlen=200, interval=1.0)
+tftp_log.add_listener(boot_tracker.ingest_tftp)
+dhcp_log = LogFollower(DHCP_LOG, parse_dhcp_log_line, maxlen=200, interval=1.0) if DHCP_LOG else None
+
+# Lease, handshake and pool analytics over every dnsmasq DHCP event (log-dhcp)
+# DHCP_SERVER=proxy|full answers DHCP in-process instead of the pxe-dhcp container
+DHCP_SERVER_MODE = os.getenv("DHCP_SERVER", "")
+DHCP_LEASE_FILE = os.getenv("DHCP_LEASE_FILE", os.path.join(UPLOAD_DIR, "dhcp.leases") if DHCP_SERVER_MODE == "full" else "")
+dhcp_index = DhcpIndex()
+
+# Prometheus metrics, updated as events arrive so /metrics only formats them
+metrics = Registry()
+pxe_requests = metrics.counter("pxe_requests_total", "Boot file requests by file and HTTP status", ["file", "status"])
+pxe_bytes = metrics.counter("pxe_bytes_served_total", "Bytes served per boot file and HTTP status", ["file", "status"])
+boot_stage_reached = metrics.counter("pxe_boot_stage_reached_total", "Clients reaching each boot stage", ["stage"])
+boots_completed = metrics.counter("pxe_boots_completed_total", "Clients that fetched the root filesystem")
+dhcp_leases = metrics.counter("pxe_dhcp_leases_total", "DHCPACKs seen in the DHCP log")
+tftp_transfers = metrics.counter("pxe_tftp_transfers_total", "Transfers by the in-process TFTP server by file and result", ["file", "status"])
+iso_stage_seconds = metrics.histogram("pxe_iso_stage_seconds", "ISO ingestion stage durations (upload, extract, deploy)", ["stage"], buckets=DURATION_BUCKETS)
+job_seconds = metrics.histogram("pxe_job_seconds", "Background job durations", ["kind", "status"], buckets=DURATION_BUCKETS)
+api_latency = metrics.histogram("pxe_api_request_seconds", "API handler latency until the response starts", ["method", "route", "status"])
+
+# INSTRUMENT=1 records request/subprocess/copy/psutil spans for /api/debug/hotpaths (also switchable at runtime)
+tracer.enabled = os.getenv("INSTRUMENT", "0") == "1"
+profiler = SamplingProfiler()
+
+def record_request_span(method, route, status, seconds):
+    tracer.record("request", f"{method} {route}", seconds, status=status)
+metrics.gauge("pxe_boot_clients", "Tracked clients by current boot stage", ["stage"],
+              callback=lambda: {(stage or "seen",): len(members) for stage, members in boot_tracker.by_stage.items()})
+metrics.gauge("pxe_boots_in_progress", "Tracked clients that have not reached the root filesystem yet",
+              callback=lambda: len(boot_tracker.clients) - len(boot_tracker.by_stage[BOOTED]))
+metrics.gauge("pxe_active_clients", "Clients with /pxe/ traffic in the active window", callback=lambda: client_index.active_count())
+
+def record_boot_requests(entries):
+    for entry in entries:
+        target = http_stage(entry["path"])
+        if target is None:
+            continue
+        name = os.path.basename(target[1]) if target[1] else "ipxe-script"
+        pxe_requests.inc(file=name, status=entry["status"])
+        pxe_bytes.inc(int(entry["size"]), file=name, status=entry["status"])
+
+def record_boot_stage(record, stage):
+    boot_stage_reached.inc(stage=stage)
+    if stage == BOOTED:
+        boots_completed.inc()
+
+def record_dhcp_leases(entries):
+    dhcp_leases.inc(len(entries))
+
+def ingest_dhcp_events(events):
+    dhcp_index.ingest(events)
+    acks = [e for e in events if e["type"] == "DHCPACK" and e["ip"] and e["mac"]]
+    if acks:
+        boot_tracker.ingest_dhcp(acks)
+        record_dhcp_leases(acks)
+
+access_log.add_listener(record_boot_requests)
+boot_tracker.add_stage_listener(record_boot_stage)
+if dhcp_log:
+    dhcp_log.add_listener(ingest_dhcp_events)
+
+# pxe-dhcp is managed over the Docker Engine API; state and logs are followed, not polled
+DHCP_CONTAINER = "pxe-dhcp"
+docker = DockerClient(os.getenv("DOCKER_SOCKET", DOCKER_SOCKET))
+dhcp_container = ContainerMonitor(docker, DHCP_CONTAINER)
+docker_loop = None
+
+def ingest_dhcp_lines(lines, stamps=None):
+    # Docker passes each line's own timestamp, so backfilled lines keep their original times
+    events = [event for event in map(parse_dhcp_event, lines, stamps or [None] * len(lines)) if event]
+    if events:
+        ingest_dhcp_events(events)
+
+dhcp_server = None
+if DHCP_SERVER_MODE:
+    dhcp_server = DhcpServer(
+        DHCP_SERVER_MODE,
+        interface=os.getenv("DHCP_INTERFACE") or None,
+        lease_file=DHCP_LEASE_FILE or None
+    )
+    dhcp_server.add_listener(ingest_dhcp_lines)
+elif not dhcp_log:
+    dhcp_container.add_listener(ingest_dhcp_lines)
+
+def dhcp_action(action):
+    # Fire-and-forget for sync code (config writes, worker threads); results only matter for logging
+    async def run():
+        try:
+            await getattr(docker, action)(DHCP_CONTAINER)
+        except Exception as e:
+            print(f"DHCP {action} failed: {e}")
+    if docker_loop and not docker_loop.is_closed():
+        asyncio.run_coroutine_threadsafe(run(), docker_loop)
 
 async def verify_token(x_dashboard_token: str = Header(None)):
     if not x_dashboard_token or x_dashboard_token != APP_PASSWORD:
         raise HTTPException(status_code=401, detail="Unauthorized: Invalid dashboard token")
     return x_dashboard_token
 
+# EventSource cannot send custom headers. Instead of the dashboard password (which would end up in
+# access logs), streams take a short-lived, single-use ticket from POST /api/stream/ticket
+STREAM_TICKET_TTL = 30
+stream_tickets = {}
+
+def issue_stream_ticket():
+    now = time.monotonic()
+    for ticket, expires in list(stream_tickets.items()):
+        if expires < now:
+            del stream_tickets[ticket]
+    ticket = secrets.token_urlsafe(24)
+    stream_tickets[ticket] = now + STREAM_TICKET_TTL
+    return ticket
+
+async def verify_stream_token(ticket: str = Query(None), x_dashboard_token: str = Header(None)):
+    if x_dashboard_token and x_dashboard_token == APP_PASSWORD:
+        return x_dashboard_token
+    expires = stream_tickets.pop(ticket, None) if ticket else None
+    if expires is None or expires < time.monotonic():
+        raise HTTPException(status_code=401, detail="Unauthorized: Invalid or expired stream ticket")
+    return ticket
+
+DHCP_JSON_FILE = os.path.join(os.getenv("APP_DIR", "/app"), "scripts", "dhcp.json")
+DHCP_COMPOSE_FILE = os.path.join(os.getenv("APP_DIR", "/app"), "docker-compose.dhcp.yml")
+
+# Config files are parsed once and re-read only when they change on disk
+config_store = ConfigStore()
+config_store.watch("server", CONFIG_FILE, ServerConfig.model_validate_json)
+config_store.watch("iso", METADATA_FILE, json.loads, {})
+config_store.watch("dhcp", DHCP_JSON_FILE, json.loads)
+config_store.watch("dnsmasq", DNSMASQ_CONF)
+config_store.watch("compose", DHCP_COMPOSE_FILE)
+if DHCP_LEASE_FILE:
+    config_store.watch("leases", DHCP_LEASE_FILE, parse_lease_file, [])
+
 def detect_host_ip():
-    interfaces = psutil.net_if_addrs()
+    interfaces = config_store.interfaces
     priority_patterns = [r'^eth', r'^ens', r'^eno', r'^enp']
     
     for pattern in priority_patterns:
         for iface, addrs in interfaces.items():
             if re.match(pattern, iface):
                 for addr in addrs:
-                    if addr.family == socket.AF_INET:
-                        if addr.address == '127.0.0.1':
-                            continue
-                        return addr.address
+                    if addr == '127.0.0.1':
+                        continue
+                    return addr
     
     for iface, addrs in interfaces.items():
         if iface == 'lo' or iface.startswith('docker') or iface.startswith('br-') or iface.startswith('veth'):
             continue
         for addr in addrs:
-            if addr.family == socket.AF_INET and addr.address != '127.0.0.1':
-                return addr.address
+            if addr != '127.0.0.1':
+                return addr
                 
     return "127.0.0.1"
 
 def get_config():
-    import json
-    config = None
-    if os.path.exists(CONFIG_FILE):
-        try:
-            with open(CONFIG_FILE, "r") as f:
-                config = json.load(f)
-        except:
-            pass
-    
-    if config and "server_ip" in config:
-        saved_ip = config["server_ip"]
-        interfaces = psutil.net_if_addrs()
-        all_host_ips = []
-        for iface_addrs in interfaces.values():
-            for addr in iface_addrs:
-                if addr.family == socket.AF_INET:
-                    all_host_ips.append(addr.address)
-        
-        if saved_ip not in all_host_ips and saved_ip != "127.0.0.1":
-            print(f"Portability Alert: Saved IP {saved_ip} not found on this host. Re-detecting...")
-            detected_ip = detect_host_ip()
-            if detected_ip != saved_ip:
-                config["server_ip"] = detected_ip
-                save_config(config)
-                print(f"Network Adjusted: New IP {detected_ip} applied.")
-        return config
-
-    detected_ip = detect_host_ip()
-    new_config = {"server_ip": detected_ip}
-    save_config(new_config)
-    return new_config
+    config = config_store.get("server")
+    if config is None:
+        config = ServerConfig(server_ip=detect_host_ip())
+        save_config(config)
+    return config
+
+def check_server_ip():
+    # Portability: a data dir moved to another host keeps an IP this host does not have
+    config = get_config()
+    saved_ip = config.server_ip
+    if saved_ip != "127.0.0.1" and saved_ip not in config_store.host_ips():
+        print(f"Portability Alert: Saved IP {saved_ip} not found on this host. Re-detecting...")
+        detected_ip = detect_host_ip()
+        if detected_ip != saved_ip:
+            save_config(config.model_copy(update={"server_ip": detected_ip}))
+            print(f"Network Adjusted: New IP {detected_ip} applied.")
 
 def save_config(config):
-    import json
-    with open(CONFIG_FILE, "w") as f:
-        json.dump(config, f)
-    ip = config.get("server_ip", "127.0.0.1")
+    config_store.write("server", config.model_dump_json())
+    apply_server_config(config.server_ip)
+
+def apply_server_config(ip):
     update_ipxe_files(ip)
-    update_dhcp_listen_address(ip)
+    if dhcp_server:
+        configure_dhcp_server()
+    else:
+        update_dhcp_listen_address(ip)
+
+def configure_dhcp_server():
+    # Applied in place: no restart, in-flight handshakes continue
+    server_ip = get_config().server_ip
+    config = read_dhcp_config()
+    with span("psutil", "net_if_addrs"):
+        netmask = next((a.netmask for addrs in psutil.net_if_addrs().values() for a in addrs
+                        if a.family == socket.AF_INET and a.address == server_ip and a.netmask), None)
+    dns = [ip.strip() for ip in os.getenv("DHCP_DNS", "").split(",") if ip.strip()]
+    def apply():
+        try:
+            dhcp_server.configure(server_ip, config["start_ip"], config["end_ip"], netmask=os.getenv("DHCP_NETMASK") or netmask,
+                                  router=os.getenv("DHCP_ROUTER") or None, dns=dns,
+                                  ipxe_boot_file=os.getenv("DHCP_IPXE_BOOT_FILE") or None)
+        except OSError as e:
+            print(f"Invalid DHCP server configuration: {e}")
+    # Packets are handled on the event loop; swap the configuration there too
+    if docker_loop and not docker_loop.is_closed():
+        docker_loop.call_soon_threadsafe(apply)
+    else:
+        apply()
 
 def update_dhcp_listen_address(ip):
-    # Ensure DNSMASQ_CONF is defined at module level beforehand, which we'll move up
-    if not os.path.exists(DNSMASQ_CONF):
+    current = config_store.text("dnsmasq")
+    if current is None:
         return
     try:
-        with open(DNSMASQ_CONF, "r") as f:
-            lines = f.readlines()
+        lines = current.splitlines(keepends=True)
         new_lines = []
         found = False
         has_bind = False
@@ -127,63 +304,315 @@ def update_dhcp_listen_address(ip):
             new_lines.append(f"listen-address={ip}\n")
         if not has_bind:
             new_lines.append("bind-interfaces\n")
-        with open(DNSMASQ_CONF, "w") as f:
-            f.writelines(new_lines)
+        if not config_store.write("dnsmasq", "".join(new_lines)):
+            return
             
         # Only restart if there's an actual DHCP range configured
         has_range = any(line.startswith("dhcp-range=") for line in new_lines)
         if has_range:
-            subprocess.run(["docker", "restart", "pxe-dhcp"], capture_output=True, check=False)
+            dhcp_action("restart")
         else:
-             subprocess.run(["docker", "stop", "pxe-dhcp"], capture_output=True, check=False)
+            dhcp_action("stop")
     except Exception as e:
         print(f"Error updating DHCP listen address: {e}")
 
-def update_ipxe_files(ip):
-    content = f"#!ipxe\n\ndhcp || reboot\n\nset boot_server ${{next-server}}\n\nkernel http://${{boot_server}}/pxe/vmlinuz initrd=initrd.img root=/dev/ram0 boot=live fetch=http://${{boot_server}}/pxe/filesystem.squashfs quiet splash vt.global_cursor_default=0\ninitrd http://${{boot_server}}/pxe/initrd.img\nboot\n"
+def update_ipxe_files(ip=None):
+    # Rehashes and recompresses changed boot files and may reload nginx: async handlers call it in a thread
+    # Pin the active generation so a client mid-boot never mixes kernel and initrd across an image swap
+    active = images.active_id()
+    resident = images.resident_ids()
+    checksums = {}
+    for image_id in set(resident) | {active}:
+        meta = images.get(image_id) if image_id else None
+        if meta:
+            checksums[image_id] = {name: c["sha256"] for name, c in meta["components"].items()}
+    boot_router.set_images(active, resident, checksums)
+    if swarm:
+        swarm.retire({i for i in list(swarm.manifests) if images.get(i)})
+    base = f"pxe/generations/{active}" if active else "pxe"
+    files = f"${{boot_server}}:{BOOT_SERVER_PORT}" if BOOT_SERVER_PORT else "${boot_server}"
+    # Per-client script from /api/ipxe; the inline boot set is the fallback when the API is down
+    content = f"#!ipxe\n\ndhcp || reboot\n\nset boot_server ${{next-server}}\n\nchain http://${{boot_server}}/api/ipxe?mac=${{mac}}&ip=${{ip}} || goto static\n\n:static\nkernel http://{files}/{base}/vmlinuz initrd=initrd.img root=/dev/ram0 boot=live fetch=http://{files}/{base}/filesystem.squashfs quiet splash vt.global_cursor_default=0\ninitrd http://{files}/{base}/initrd.img\nboot\n"
     for filename in ["autoexec.ipxe", "boot.ipxe"]:
-        with open(os.path.join(TFTP_BOOT, filename), "w") as f:
-            f.write(content)
+        atomic_write(os.path.join(TFTP_BOOT, filename), content)
+    refresh_precomputed()
 
-def save_iso_name(name: str):
-    import json
-    with open(METADATA_FILE, "w") as f:
-        json.dump({"active_iso": name}, f)
+def save_iso_name(name: str, **extra):
+    config_store.write("iso", json.dumps({"active_iso": name, **extra}))
 
 def get_iso_name():
-    import json
-    if os.path.exists(METADATA_FILE):
-        with open(METADATA_FILE, "r") as f:
-            return json.load(f).get("active_iso", "None")
-    return "None"
+    return config_store.get("iso").get("active_iso", "None")
 
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(RAM_DISK, exist_ok=True)
 os.makedirs(TFTP_BOOT, exist_ok=True)
 
+BOOT_COMPONENTS = ["vmlinuz", "initrd.img", "filesystem.squashfs"]
+
+# Long-running file work (extraction, RAM copies) runs here, off the event loop
+jobs = JobManager(max_workers=2)
+
+# Chunked, resumable uploads (sessions survive restarts; hidden from the file list)
+uploads = UploadManager(os.path.join(UPLOAD_DIR, ".uploads"))
+
+def record_job(job):
+    if job.started and job.finished:
+        job_seconds.observe(job.finished - job.started, kind=job.kind, status=job.status)
+jobs.add_listener(record_job)
+
+# Extracted boot sets; the active one is served from RAM_DISK/current
+RAM_BUDGET = float(os.getenv("RAM_BUDGET", "0.9"))
+images = ImageLibrary(UPLOAD_DIR, RAM_DISK, ram_budget=RAM_BUDGET)
+
+# Per-MAC / per-subnet image and kernel argument rules for /api/ipxe
+BOOT_RULES_FILE = os.path.join(UPLOAD_DIR, "boot_rules.json")
+boot_router = BootRouter(BOOT_RULES_FILE)
+images.pinned = boot_router.images()
+
+# Optional built-in /pxe/ file server (sendfile, Range, per-client/global rate limits, admission control)
+BOOT_SERVER_PORT = int(os.getenv("BOOT_SERVER_PORT", "0"))
+
+def ingest_boot_request(entry):
+    client_index.ingest([entry])
+    boot_tracker.ingest_access([entry])
+    record_boot_requests([entry])
+
+# TFTP_SERVER_PORT=69 serves TFTP_BOOT in-process (entrypoint.sh then skips in.tftpd)
+TFTP_SERVER_PORT = int(os.getenv("TFTP_SERVER_PORT", "0"))
+
+def record_tftp_transfer(entry):
+    tftp_transfers.inc(file=os.path.basename(entry["file"]), status=entry["status"])
+    stage = TFTP_STAGES.get(os.path.basename(entry["file"]))
+    # Timed-out or aborted transfers (e.g. the tsize probe UEFI firmware sends first) do not advance the client
+    if stage is not None and entry["status"] == "complete":
+        boot_tracker.record_stage(entry["ip"], stage, entry["ts"], transferred=entry["bytes"])
+
+tftp_server = None
+if TFTP_SERVER_PORT:
+    tftp_server = TftpServer(
+        TFTP_BOOT,
+        port=TFTP_SERVER_PORT,
+        max_blksize=int(os.getenv("TFTP_MAX_BLKSIZE", "65464")),
+        max_window=int(os.getenv("TFTP_MAX_WINDOW", "64")),
+        on_transfer=record_tftp_transfer
+    )
+
+boot_server = None
+if BOOT_SERVER_PORT:
+    boot_server = BootFileServer(
+        RAM_DISK,
+        port=BOOT_SERVER_PORT,
+        client_rate=int(float(os.getenv("BOOT_SERVER_CLIENT_RATE", "0")) * 1024 * 1024),
+        global_rate=int(float(os.getenv("BOOT_SERVER_RATE", "0")) * 1024 * 1024),
+        max_streams=int(os.getenv("BOOT_SERVER_MAX_STREAMS", "0")),
+        queue_timeout=int(os.getenv("BOOT_SERVER_QUEUE_TIMEOUT", "300")),
+        on_request=ingest_boot_request
+    )
+    boot_router.boot_port = BOOT_SERVER_PORT
+
+# ETags, lengths and .gz variants of everything under RAM_DISK and TFTP_BOOT, refreshed at deploy time
+precomputed = Precomputed({"pxe": RAM_DISK, "tftp": TFTP_BOOT})
+if boot_server:
+    boot_server.precomputed = precomputed
+NGINX_TEMPLATE = os.path.join(os.getenv("APP_DIR", "/app"), "scripts", "nginx-pxe-cache.conf")
+NGINX_INCLUDE = os.getenv("NGINX_INCLUDE", "/etc/nginx/pxe.d/cache.conf")
+
+def refresh_precomputed():
+    try:
+        summary = precomputed.refresh()
+        # The include directory only exists where nginx serves /pxe/ (created by entrypoint.sh)
+        if os.path.exists(NGINX_TEMPLATE) and os.path.isdir(os.path.dirname(NGINX_INCLUDE)):
+            summary["nginx_reloaded"] = precomputed.render_nginx(NGINX_TEMPLATE, NGINX_INCLUDE)
+        print(f"Precomputed boot files: {summary}")
+    except OSError as e:
+        print(f"Precomputing boot files failed: {e}")
+
+# SWARM=1: booted clients share squashfs chunks with later ones; the server is the seed of last resort
+swarm = SwarmTracker() if os.getenv("SWARM", "0") == "1" else None
+boot_router.swarm = swarm is not None
+
+def swarm_manifest(image_id):
+    manifest = swarm.manifest(image_id)
+    if manifest is None:
+        if images.get(image_id) is None:
+            raise SwarmError(404, "Image not found")
+        image_dir = os.path.join(images.root, image_id)
+        chunks = image_chunks(image_dir, BOOT_COMPONENTS)
+        swarm.publish(image_id, os.path.join(image_dir, "filesystem.squashfs"), CHUNK_SIZE, chunks["filesystem.squashfs"])
+        manifest = swarm.manifest(image_id)
+    return manifest
+
+# Cluster mode: replicas mirror the primary's active image, clients are spread over healthy nodes
+CLUSTER_PEERS = [p.strip() for p in os.getenv("CLUSTER_PEERS", "").split(",") if p.strip()]
+CLUSTER_ROLE = os.getenv("CLUSTER_ROLE", "primary")
+CLUSTER_SPREAD = os.getenv("CLUSTER_SPREAD", "hash")
+NODE_BOOT_HOST = os.getenv("NODE_BOOT_HOST", "")
+NODE_URL = os.getenv("NODE_URL", "")
+tx_rate = TxRate()
+
+def collect_node_status():
+    with span("psutil", "cpu_percent"):
+        cpu = psutil.cpu_percent(interval=None)
+    boot_host = NODE_BOOT_HOST or get_config().server_ip
+    return {
+        "node": NODE_URL or f"http://{boot_host}:8000",
+        "role": CLUSTER_ROLE,
+        "boot_host": boot_host,
+        "active_image": images.active_id(),
+        "resident": images.resident_ids(),
+        "load": {
+            "clients": client_index.active_count(),
+            "tx_rate": tx_rate.sample(),
+            "cpu": cpu
+        },
+        "ts": time.time()
+    }
+
+def sync_cluster_image(job, peer_url, image_id):
+    if images.get(image_id) is None:
+        manifest = cluster.fetch_manifest(peer_url, image_id)
+        job.set_phase("sync", total=manifest["size"])
+        dest = os.path.join(UPLOAD_DIR, ".cluster-sync", image_id)
+        cluster.download_image(peer_url, manifest, dest, progress=job.advance)
+        meta = images.add(dest, manifest["name"], source={**manifest["source"], "peer": peer_url})
+        shutil.rmtree(dest, ignore_errors=True)
+        if meta["id"] != image_id:
+            images.delete(meta["id"])
+            raise Exception(f"Image from {peer_url} does not match {image_id}")
+    return activate_image(job, image_id)
+
+def on_cluster_behind(peer_url, image_id):
+    recent = jobs.list(kind="sync")
+    if recent and recent[0].status == "failed" and time.time() - recent[0].finished < 60:
+        return
+    try:
+        jobs.submit("sync", sync_cluster_image, peer_url, image_id, group="bootset", description=f"Sync image {image_id} from {peer_url}")
+    except JobConflict:
+        pass
+
+cluster = None
+if CLUSTER_PEERS:
+    cluster = ClusterNode(NODE_URL, CLUSTER_ROLE, CLUSTER_PEERS, APP_PASSWORD, collect_node_status, spread=CLUSTER_SPREAD, on_behind=on_cluster_behind)
+    boot_router.server_picker = cluster.pick
+
+# Dashboard history (1s/10s/1m rings in a fixed-size mmap file, sampled every second)
+HISTORY_FILE = os.path.join(UPLOAD_DIR, "history.bin")
+HISTORY_FIELDS = ["clients", "served_bps", "net_rx_bps", "net_tx_bps", "ram_used", "tmpfs_used"]
+history = HistoryStore(HISTORY_FILE, HISTORY_FIELDS)
+history_last = {}
+
+def collect_history():
+    now = time.monotonic()
+    with span("psutil", "net_io_counters, virtual_memory, disk_usage"):
+        net = psutil.net_io_counters()
+        ram_used = psutil.virtual_memory().used
+        tmpfs_used = psutil.disk_usage(RAM_DISK).used
+    with pxe_bytes.lock:
+        served = sum(pxe_bytes.values.values())
+    counters = {"served_bps": served, "net_rx_bps": net.bytes_recv, "net_tx_bps": net.bytes_sent}
+    sample = {
+        "clients": client_index.active_count(),
+        "ram_used": ram_used,
+        "tmpfs_used": tmpfs_used
+    }
+    if not history_last:
+        history_last.update(counters, ts=now)
+        return None
+    elapsed = max(now - history_last["ts"], 1e-3)
+    for field, value in counters.items():
+        # Counters restart from zero when the access log is reset or the NIC goes away
+        previous = history_last[field] if value >= history_last[field] else 0
+        sample[field] = (value - previous) / elapsed
+    history_last.update(counters, ts=now)
+    return sample
+
+history_sampler = HistorySampler(history, collect_history)
+
+# Startup and /api/deploy re-hash RAM copies that look unchanged, so a corrupted tmpfs file is copied again
+VERIFY_RAM_COPIES = os.getenv("VERIFY_RAM_COPIES", "1") != "0"
+integrity_report = {}
+
+def record_integrity(image_id, report):
+    integrity_report.clear()
+    integrity_report.update({
+        "image": image_id,
+        "components": {name: r["action"] for name, r in report["components"].items()},
+        "ts": time.time()
+    })
+
+def activate_image(job, image_id, verify=False):
+    meta = images.get(image_id)
+    job.set_phase("deploy", total=meta["size"] if meta else 0)
+    print(f"Activating image {image_id} in RAM Cache...")
+    result = images.activate(image_id, progress=job.advance, verify=verify)
+    record_integrity(image_id, result["deploy"])
+    update_ipxe_files()
+    meta = result["image"]
+    save_iso_name(meta["name"], sha256=meta["source"].get("iso_sha256"), image_id=image_id)
+    return {"image": meta, "bytes": job.bytes_done, "report": result["deploy"]}
+
+def sync_components_to_ram(job, names=BOOT_COMPONENTS):
+    # Startup (names=None) keeps the active image; /api/deploy imports the staged files first
+    image_id = images.active_id() if names is None else None
+    if image_id is None or images.get(image_id) is None:
+        if not all(os.path.exists(os.path.join(UPLOAD_DIR, n)) for n in BOOT_COMPONENTS):
+            return {"deployed": [], "bytes": 0, "report": None}
+        # Installs from before the library: the staged set is the active ISO
+        name = get_iso_name() if names is None and get_iso_name() != "None" else None
+        image_id = images.add(UPLOAD_DIR, name)["id"]
+    return activate_image(job, image_id, verify=VERIFY_RAM_COPIES)
+
 @app.on_event("startup")
 async def startup_event():
-    config = get_config()
-    ip = config.get("server_ip", "127.0.0.1")
-    update_ipxe_files(ip)
-    update_dhcp_listen_address(ip)
+    loop = asyncio.get_running_loop()
+    def on_job_finished(job):
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(push_hub.invalidate, "files", "stats", "jobs", "images")
+    jobs.add_listener(on_job_finished)
+    access_log.start()
+    if tftp_server:
+        await tftp_server.start()
+    else:
+        tftp_log.start()
+    if dhcp_log:
+        dhcp_log.start()
+    if cluster:
+        cluster.start()
+    history_sampler.start()
+    global docker_loop
+    docker_loop = loop
+    if dhcp_server:
+        await dhcp_server.start()
+    else:
+        dhcp_container.add_state_listener(lambda state: push_hub.invalidate("dhcp_status"))
+        dhcp_container.start()
+    if boot_server:
+        await boot_server.start()
+    asyncio.create_task(push_hub.run())
+
+    def apply_network_config():
+        check_server_ip()
+        apply_server_config(get_config().server_ip)
+    await asyncio.to_thread(apply_network_config)
+    sync_dhcp_index()
+
+    def on_config_changed(name):
+        # Edits made outside the API (or NIC changes) are applied like API writes
+        if name in ("server", "interfaces"):
+            check_server_ip()
+            apply_server_config(get_config().server_ip)
+        if name in ("dhcp", "dnsmasq", "leases"):
+            sync_dhcp_index()
+        if name == "dhcp" and dhcp_server:
+            configure_dhcp_server()
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(push_hub.invalidate, "networks", "dhcp_status")
+    config_store.add_listener(on_config_changed)
+    config_store.start()
     
+    await asyncio.to_thread(refresh_precomputed)
     print("Startup sequence: Checking for boot components...")
-    files_map = {
-        "vmlinuz": "vmlinuz",
-        "initrd.img": "initrd.img",
-        "filesystem.squashfs": "filesystem.squashfs"
-    }
-    for src_name, dest_name in files_map.items():
-        src_path = os.path.join(UPLOAD_DIR, src_name)
-        dest_path = os.path.join(RAM_DISK, dest_name)
-        if os.path.exists(src_path):
-            try:
-                print(f"Syncing {src_name} to RAM Cache...")
-                shutil.copy2(src_path, dest_path)
-                os.chmod(dest_path, 0o666)
-            except Exception as e:
-                print(f"Failed to auto-load {src_name}: {e}")
+    jobs.submit("deploy", sync_components_to_ram, None, group="bootset", description="Startup RAM sync")
 
 
 class SystemStats(BaseModel):
@@ -197,50 +626,12 @@ class SystemStats(BaseModel):
     min_clients: int
     max_clients: int
 
-@app.get("/api/stats", response_model=SystemStats)
-async def get_stats(token: str = Depends(verify_token)):
-    global MAX_CLIENTS_SESSION, MIN_CLIENTS_SESSION, SESSION_STARTED
-    mem = psutil.virtual_memory()
-    tmpfs = psutil.disk_usage(RAM_DISK)
-    unique_clients = 0
-    try:
-        log_file = "/var/log/nginx/access.log"
-        if os.path.exists(log_file):
-            result = subprocess.run(["tail", "-n", "200", log_file], capture_output=True, text=True)
-            lines = result.stdout.splitlines()
-            
-            now = datetime.now()
-            # Increased window to 120 seconds to prevent flickering
-            threshold = now - timedelta(seconds=120)
-            unique_ips = set()
-            
-            for line in lines:
-                if "/pxe/" in line:
-                    match = re.search(r'(\d+\.\d+\.\d+\.\d+) .*? \[(.*?)\]', line)
-                    if match:
-                        ip = match.group(1)
-                        ts_str = match.group(2).split(' ')[0]
-                        try:
-                            log_time = datetime.strptime(ts_str, "%d/%b/%Y:%H:%M:%S")
-                            if log_time > threshold:
-                                unique_ips.add(ip)
-                        except:
-                            continue
-            unique_clients = len(unique_ips)
-    except Exception as e:
-        print(f"Error calculating realtime clients: {e}")
-
-    # Update session-based min/max
-    if not SESSION_STARTED:
-        if unique_clients > 0:
-            MIN_CLIENTS_SESSION = unique_clients
-            MAX_CLIENTS_SESSION = unique_clients
-            SESSION_STARTED = True
-    else:
-        if unique_clients > MAX_CLIENTS_SESSION:
-            MAX_CLIENTS_SESSION = unique_clients
-        if unique_clients < MIN_CLIENTS_SESSION and unique_clients > 0:
-            MIN_CLIENTS_SESSION = unique_clients
+def collect_stats():
+    with span("psutil", "virtual_memory, disk_usage"):
+        mem = psutil.virtual_memory()
+        tmpfs = psutil.disk_usage(RAM_DISK)
+    unique_clients = client_index.active_count()
+    min_clients, max_clients = client_index.session_range()
 
     return {
         "ram_used": mem.used,
@@ -250,10 +641,82 @@ async def get_stats(token: str = Depends(verify_token)):
         "tmpfs_total": tmpfs.total,
         "tmpfs_percent": tmpfs.percent,
         "unique_clients": unique_clients,
-        "min_clients": MIN_CLIENTS_SESSION,
-        "max_clients": MAX_CLIENTS_SESSION
+        "min_clients": min_clients,
+        "max_clients": max_clients
     }
 
+@app.get("/api/stats", response_model=SystemStats)
+async def get_stats(token: str = Depends(verify_token)):
+    return collect_stats()
+
+@app.get("/api/history")
+async def get_history(fields: str = None, seconds: int = 3600, end: float = None, points: int = 1000, step: int = None, token: str = Depends(verify_token)):
+    names = [f.strip() for f in fields.split(",")] if fields else HISTORY_FIELDS
+    unknown = [n for n in names if n not in HISTORY_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    if step is not None and step not in [r.step for r in history.rings]:
+        raise HTTPException(status_code=400, detail=f"step must be one of {[r.step for r in history.rings]}")
+    if seconds <= 0 or points <= 0:
+        raise HTTPException(status_code=400, detail="seconds and points must be positive")
+    # Nothing is recorded past now: a future end would only return an empty window
+    now = time.time()
+    end = min(end, now) if end else now
+    return history.query(names, start=end - seconds, end=end, max_points=min(points, 10000), step=step)
+
+@app.get("/api/clients")
+async def get_clients(window: int = None, offset: int = 0, limit: int = 100, token: str = Depends(verify_token)):
+    if window is not None and not 1 <= window <= CLIENT_HISTORY:
+        raise HTTPException(status_code=400, detail=f"window must be between 1 and {CLIENT_HISTORY} seconds")
+    total, clients = client_index.active_clients(window=window, offset=max(offset, 0), limit=min(max(limit, 1), 1000))
+    return {
+        "window": window or CLIENT_WINDOW,
+        "total": total,
+        "offset": offset,
+        "clients": clients
+    }
+
+@app.get("/api/boot/summary")
+async def get_boot_summary(token: str = Depends(verify_token)):
+    return boot_tracker.summary()
+
+@app.get("/api/boot/clients")
+async def get_boot_clients(stage: str = None, stalled: bool = False, offset: int = 0, limit: int = 100, token: str = Depends(verify_token)):
+    if stage is not None and stage != "seen" and stage not in STAGES:
+        raise HTTPException(status_code=400, detail="Invalid stage")
+    total, clients = boot_tracker.list_clients(stage=stage, stalled=stalled, offset=max(offset, 0), limit=min(max(limit, 1), 1000))
+    return {"total": total, "offset": offset, "clients": clients}
+
+@app.get("/api/boot/clients/{key}")
+async def get_boot_client(key: str, token: str = Depends(verify_token)):
+    client = boot_tracker.client(key)
+    if client is None:
+        raise HTTPException(status_code=404, detail="Client not found")
+    return client
+
+@app.get("/api/boot/stream")
+async def stream_boot_progress(request: Request, since: int = 0, token: str = Depends(verify_stream_token)):
+    async def events():
+        version = since
+        last_summary = None
+        idle = 0
+        while not await request.is_disconnected():
+            version, changed = boot_tracker.changes_since(version)
+            summary = boot_tracker.summary()
+            if changed:
+                yield f"id: {version}\nevent: clients\ndata: {json.dumps(changed)}\n\n"
+            if summary != last_summary:
+                last_summary = summary
+                yield f"event: summary\ndata: {json.dumps(summary)}\n\n"
+            elif not changed:
+                idle += 1
+                if idle >= 15:
+                    idle = 0
+                    yield ": keepalive\n\n"
+            await asyncio.sleep(1)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.post("/api/upload/{file_type}")
 async def upload_file(file_type: str, file: UploadFile = File(...), token: str = Depends(verify_token)):
     if file_type not in ["vmlinuz", "initrd", "rootfs", "iso"]:
@@ -262,147 +725,543 @@ async def upload_file(file_type: str, file: UploadFile = File(...), token: str =
     if file_type == "iso":
         return await handle_iso_upload(file)
 
+    file_path = os.path.join(UPLOAD_DIR, component_filename(file_type))
+    
+    await save_stream(iter_upload(file), file_path)
+    
+    push_hub.invalidate("files")
+    return {"filename": file.filename, "type": file_type}
+
+def component_filename(file_type):
     ext = ""
     if file_type == "vmlinuz": ext = ""
     elif file_type == "initrd": ext = ".img"
     elif file_type == "rootfs": ext = ".squashfs"
-    
-    filename = "filesystem.squashfs" if file_type == "rootfs" else f"{file_type}{ext}"
-    file_path = os.path.join(UPLOAD_DIR, filename)
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    return {"filename": file.filename, "type": file_type}
+    return "filesystem.squashfs" if file_type == "rootfs" else f"{file_type}{ext}"
 
 async def handle_iso_upload(file: UploadFile):
-    if get_iso_name() != "None" or any(os.path.exists(os.path.join(RAM_DISK, f)) for f in ["vmlinuz", "initrd.img", "filesystem.squashfs"]):
-        raise HTTPException(
-            status_code=403, 
-            detail="System Lock: An ISO is already active. Please perform a 'Factory Reset' to clear the system before uploading a new one."
-        )
+    return await ingest_iso(file.filename, iter_upload(file))
+
+@app.post("/api/upload/iso/stream")
+async def upload_iso_stream(request: Request, x_filename: str = Header(None), token: str = Depends(verify_token)):
+    # Raw request body (no multipart spooling): written to disk as it arrives
+    return await ingest_iso(unquote(x_filename or ""), request.stream())
 
-    if not file.filename.lower().endswith('.iso'):
+async def ingest_iso(filename, chunks):
+    if not filename.lower().endswith('.iso'):
         raise HTTPException(status_code=400, detail="Forbidden format: Only .iso files are allowed for orchestration.")
 
+    try:
+        job = jobs.create("iso", group="bootset", description=filename)
+    except JobConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    job.status = "running"
+    job.started = time.time()
+    job.set_phase("upload")
+
     iso_path = os.path.join(UPLOAD_DIR, "uploaded.iso")
-    extract_path = os.path.join(UPLOAD_DIR, "iso_extract")
+    clear_iso_staging()
+
+    def upload_progress(size):
+        job.bytes_done = size
+        job.check_cancelled()
+
+    timer = StageTimer()
+    started = time.perf_counter()
+    try:
+        size, sha256 = await save_stream(chunks, iso_path, progress=upload_progress)
+    except JobCancelled:
+        discard_upload(iso_path)
+        jobs.mark_cancelled(job)
+        raise HTTPException(status_code=409, detail="Upload cancelled")
+    except Exception as e:
+        discard_upload(iso_path)
+        jobs.fail(job, e)
+        raise HTTPException(status_code=500, detail=f"ISO upload failed: {str(e)}")
+    timer.record("upload", size, time.perf_counter() - started)
     
-    components = ["vmlinuz", "initrd.img", "filesystem.squashfs", "rootfs.squashfs"]
+    os.chmod(iso_path, 0o666)
+
+    jobs.start(job, process_iso, filename, iso_path, sha256, timer)
+    return JSONResponse(status_code=202, content={
+        "status": "accepted",
+        "message": "ISO received, extraction and RAM loading running in background",
+        "job_id": job.id,
+        "filename": filename,
+        "sha256": sha256
+    })
+
+def discard_upload(path):
+    # A failed or cancelled upload must not leave an ISO behind for the next extraction to pick up
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Warning: could not remove {path}: {e}")
+
+def clear_iso_staging():
+    # Only the staging copies are cleared; the active image keeps serving from RAM until the swap
+    components = BOOT_COMPONENTS + ["rootfs.squashfs"]
     for f in components:
         try:
             p_path = os.path.join(UPLOAD_DIR, f)
             if os.path.exists(p_path): 
                 os.remove(p_path)
-            
-            r_path = os.path.join(RAM_DISK, f)
-            if os.path.exists(r_path): 
-                os.remove(r_path)
         except Exception as e:
             print(f"Warning during cleanup: {e}")
+    push_hub.invalidate("files")
 
-    with open(iso_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
+class UploadCreate(BaseModel):
+    filename: str
+    size: int
+    kind: str = "iso"
+    chunk_size: Optional[int] = None
+
+def upload_session(session_id):
+    try:
+        return uploads.get(session_id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status, detail=str(e))
+
+@app.post("/api/uploads", status_code=201)
+async def create_upload(data: UploadCreate, token: str = Depends(verify_token)):
+    if data.kind not in ["vmlinuz", "initrd", "rootfs", "iso"]:
+        raise HTTPException(status_code=400, detail="Invalid file type")
+    if data.kind == "iso" and not data.filename.lower().endswith('.iso'):
+        raise HTTPException(status_code=400, detail="Forbidden format: Only .iso files are allowed for orchestration.")
+    try:
+        session = await asyncio.to_thread(uploads.create, os.path.basename(data.filename), data.size, data.kind, data.chunk_size)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status, detail=str(e))
+    return session.to_dict()
+
+@app.get("/api/uploads")
+async def list_uploads(token: str = Depends(verify_token)):
+    return {"uploads": uploads.list()}
+
+@app.get("/api/uploads/{session_id}")
+async def get_upload(session_id: str, token: str = Depends(verify_token)):
+    return upload_session(session_id).to_dict()
+
+@app.put("/api/uploads/{session_id}/chunks/{index}")
+async def put_upload_chunk(session_id: str, index: int, request: Request, x_chunk_sha256: str = Header(None), token: str = Depends(verify_token)):
+    session = upload_session(session_id)
+    # One chunk (at most MAX_CHUNK_SIZE) in memory, written in place with pwrite
+    data = await request.body()
+    try:
+        await asyncio.to_thread(session.write, index, data, x_chunk_sha256)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status, detail=str(e))
+    return {"index": index, "received": session.count, "chunks": session.chunks}
+
+@app.delete("/api/uploads/{session_id}")
+async def delete_upload(session_id: str, token: str = Depends(verify_token)):
+    try:
+        await asyncio.to_thread(uploads.delete, session_id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status, detail=str(e))
+    return {"status": "success"}
+
+@app.post("/api/uploads/{session_id}/complete")
+async def complete_upload(session_id: str, token: str = Depends(verify_token)):
+    session = upload_session(session_id)
+    job = None
+    if session.kind == "iso":
+        try:
+            job = jobs.create("iso", group="bootset", description=session.filename)
+        except JobConflict as e:
+            raise HTTPException(status_code=409, detail=str(e))
+    try:
+        session = uploads.take(session_id)
+    except UploadError as e:
+        if job:
+            jobs.fail(job, e)
+        raise HTTPException(status_code=e.status, detail=str(e))
+
+    if job is None:
+        path, sha256 = await asyncio.to_thread(session.finalize)
+        os.replace(path, os.path.join(UPLOAD_DIR, component_filename(session.kind)))
+        push_hub.invalidate("files")
+        return {"filename": session.filename, "type": session.kind, "sha256": sha256}
+
+    clear_iso_staging()
+    timer = StageTimer()
+    timer.record("upload", session.size, time.time() - session.meta["created"])
+    jobs.start(job, process_chunked_iso, session, timer)
+    return JSONResponse(status_code=202, content={
+        "status": "accepted",
+        "message": "ISO received, extraction and RAM loading running in background",
+        "job_id": job.id,
+        "filename": session.filename
+    })
+
+def process_chunked_iso(job, session, timer):
+    # Most of the file was hashed while chunks arrived; only the tail is left
+    job.set_phase("verify", total=session.unhashed)
+    started = time.perf_counter()
+    path, sha256 = session.finalize(progress=job.advance)
+    timer.record("verify", session.size, time.perf_counter() - started)
+    iso_path = os.path.join(UPLOAD_DIR, "uploaded.iso")
+    os.replace(path, iso_path)
     os.chmod(iso_path, 0o666)
-    
-    if os.path.exists(extract_path):
-        shutil.rmtree(extract_path)
-    os.makedirs(extract_path)
-    
+    return process_iso(job, session.filename, iso_path, sha256, timer)
+
+def process_iso(job, filename, iso_path, sha256, timer):
     try:
-        subprocess.run(["7z", "x", iso_path, f"-o{extract_path}", "-y"], check=True)
-        
-        found = {"vmlinuz": False, "initrd": False, "rootfs": False}
-        
-        for pattern in ["**/live/vmlinuz*", "**/casper/vmlinuz*", "**/vmlinuz*", "**/kernel*"]:
-            matches = glob.glob(os.path.join(extract_path, pattern), recursive=True)
-            if matches:
-                 matches.sort(key=len)
-                 dest_path = os.path.join(UPLOAD_DIR, "vmlinuz")
-                 shutil.copy2(matches[0], dest_path)
-                 os.chmod(dest_path, 0o666)
-                 found["vmlinuz"] = True
-                 break
-        
-        for pattern in ["**/live/initrd*", "**/casper/initrd*", "**/initrd*", "**/initramfs*"]:
-            matches = glob.glob(os.path.join(extract_path, pattern), recursive=True)
-            if matches:
-                 matches.sort(key=len)
-                 dest_path = os.path.join(UPLOAD_DIR, "initrd.img")
-                 shutil.copy2(matches[0], dest_path)
-                 os.chmod(dest_path, 0o666)
-                 found["initrd"] = True
-                 break
-                 
-        for pattern in ["**/live/*.squashfs", "**/casper/*.squashfs", "**/*.squashfs"]:
-            matches = glob.glob(os.path.join(extract_path, pattern), recursive=True)
-            if matches:
-                 matches.sort(key=len)
-                 dest_path = os.path.join(UPLOAD_DIR, "filesystem.squashfs")
-                 shutil.copy2(matches[0], dest_path)
-                 os.chmod(dest_path, 0o666)
-                 found["rootfs"] = True
-                 break
-
-        files_map = {
-            "vmlinuz": "vmlinuz",
-            "initrd.img": "initrd.img",
-            "filesystem.squashfs": "filesystem.squashfs"
-        }
-        for src_name, dest_name in files_map.items():
-            shutil.copy2(os.path.join(UPLOAD_DIR, src_name), os.path.join(RAM_DISK, dest_name))
+        try:
+            _, sizes = scan_iso9660(iso_path)
+            total = sum(sizes.values())
+        except Exception:
+            total = 0
+        job.set_phase("extract", total=total)
+        result = extract_boot_files(iso_path, UPLOAD_DIR, timer, progress=job.advance)
+        found = result["found"]
+        if not all(found.values()):
+            missing = ", ".join(k for k, v in found.items() if not v)
+            raise Exception(f"Boot components not found in ISO: {missing}")
 
-        save_iso_name(file.filename)
-        
-        return {
-            "status": "success",
-            "message": "ISO extracted and loaded to RAM automatically",
-            "extracted": found,
-            "filename": file.filename
-        }
-    except Exception as e:
-        if os.path.exists(extract_path): shutil.rmtree(extract_path)
-        raise HTTPException(status_code=500, detail=f"ISO Extraction failed: {str(e)}")
+        image = images.add(UPLOAD_DIR, filename, source={"iso": filename, "iso_sha256": sha256})
+        started = time.perf_counter()
+        deployed = activate_image(job, image["id"])
+        timer.record("deploy", deployed["bytes"], time.perf_counter() - started)
+        result["deploy"] = deployed["report"]
+        if OPTIMIZE_ON_UPLOAD:
+            # The original stays active; the repacked variant is there to A/B through boot rules
+            started = time.perf_counter()
+            try:
+                options = {"squashfs_codec": OPTIMIZE_ON_UPLOAD, "initrd_codec": OPTIMIZE_ON_UPLOAD}
+                result["optimize"] = optimize_image(job, image["id"], options)["report"]
+                timer.record("optimize", image["size"], time.perf_counter() - started)
+            except (OptimizeError, ImageError, OSError) as e:
+                print(f"Boot image optimisation skipped: {e}")
+                result["optimize"] = {"error": str(e)}
+    except BaseException:
+        # Leave no half-extracted staging files behind, so the upload can simply be retried
+        for name in BOOT_COMPONENTS:
+            try:
+                os.remove(os.path.join(UPLOAD_DIR, name))
+            except OSError:
+                pass
+        raise
+
+    stages = timer.report()
+    for name, stage in stages.items():
+        iso_stage_seconds.observe(stage["seconds"], stage=name)
+    return {
+        "status": "success",
+        "message": "ISO extracted and loaded to RAM automatically",
+        "extracted": found,
+        "members": result["members"],
+        "method": result["method"],
+        "filename": filename,
+        "sha256": sha256,
+        "image_id": image["id"],
+        "stages": stages,
+        "deploy": result["deploy"],
+        "optimize": result.get("optimize")
+    }
+
+# OPTIMIZE_ON_UPLOAD=zstd|lz4|xz|gzip repacks every uploaded ISO's squashfs and initrd into a variant image
+OPTIMIZE_ON_UPLOAD = os.getenv("OPTIMIZE_ON_UPLOAD", "")
+
+class OptimizeRequest(BaseModel):
+    squashfs_codec: str = "zstd"
+    squashfs_level: Optional[int] = None
+    block_size: int = DEFAULT_BLOCK_SIZE
+    initrd_codec: str = "zstd"
+    initrd_level: Optional[int] = None
+    client_factor: float = CLIENT_FACTOR
+
+def optimize_image(job, image_id, options):
+    meta = images.get(image_id)
+    work = os.path.join(UPLOAD_DIR, ".optimize", image_id)
+    job.set_phase("optimize", total=meta["components"]["initrd.img"]["size"] + meta["components"]["filesystem.squashfs"]["size"])
+    print(f"Optimising image {image_id} ({options})...")
+    try:
+        report = repack_image(os.path.join(images.root, image_id), work, progress=job.advance, **options)
+        name = f"{meta['name']} [{report['label']}]"
+        variant = images.add(work, name, source={**meta.get("source", {}), "optimized_from": image_id})
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    if variant["id"] == image_id:
+        raise OptimizeError("Repacking produced the same image")
+    variant = images.add_variant(image_id, report["label"], variant["id"], report)
+    for part in ("initrd", "squashfs"):
+        before, after = report[part]["before"], report[part]["after"]
+        print(f"Optimise {part}: {before['codec']} {before['size'] / 1e6:.1f} MB (~{before['client_seconds']}s on a client) -> "
+              f"{after['codec']} {after['size'] / 1e6:.1f} MB (~{after['client_seconds']}s)")
+    return {"image": variant, "report": report}
 
 @app.post("/api/deploy")
 async def deploy_to_ram(token: str = Depends(verify_token)):
+    for src_name in BOOT_COMPONENTS:
+        if not os.path.exists(os.path.join(UPLOAD_DIR, src_name)):
+             return JSONResponse(status_code=400, content={"message": f"Missing component: {src_name}. Please upload ISO first."})
     try:
-        files_map = {
-            "vmlinuz": "vmlinuz",
-            "initrd.img": "initrd.img",
-            "filesystem.squashfs": "filesystem.squashfs"
+        job = jobs.submit("deploy", sync_components_to_ram, BOOT_COMPONENTS, group="bootset", description="Load PXE components to RAM")
+    except JobConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return JSONResponse(status_code=202, content={"status": "accepted", "message": "Loading PXE components to RAM Cache", "job_id": job.id})
+
+def collect_images():
+    return push_hub.views.get("images", build_images)
+
+def build_images():
+    with span("psutil", "disk_usage"):
+        usage = psutil.disk_usage(RAM_DISK)
+    return {
+        "active": images.active_id(),
+        "images": images.list(),
+        "ram_budget": int(usage.total * RAM_BUDGET)
+    }
+
+@app.get("/api/images")
+async def list_images(token: str = Depends(verify_token)):
+    return collect_images()
+
+@app.post("/api/images/{image_id}/activate")
+async def activate_library_image(image_id: str, token: str = Depends(verify_token)):
+    meta = images.get(image_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    try:
+        job = jobs.submit("deploy", activate_image, image_id, group="bootset", description=f"Activate {meta['name']}")
+    except JobConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return JSONResponse(status_code=202, content={"status": "accepted", "message": f"Activating {meta['name']}", "job_id": job.id})
+
+@app.get("/api/images/{image_id}/analysis")
+async def get_image_analysis(image_id: str, token: str = Depends(verify_token)):
+    if images.get(image_id) is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    try:
+        return await asyncio.to_thread(analyse_image, os.path.join(images.root, image_id))
+    except OptimizeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/api/images/{image_id}/optimize")
+async def optimize_library_image(image_id: str, options: OptimizeRequest, token: str = Depends(verify_token)):
+    meta = images.get(image_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    try:
+        job = jobs.submit("optimize", optimize_image, image_id, options.dict(), group="optimize", description=f"Optimise {meta['name']}")
+    except JobConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return JSONResponse(status_code=202, content={"status": "accepted", "message": f"Optimising {meta['name']}", "job_id": job.id})
+
+@app.delete("/api/images/{image_id}")
+async def delete_image(image_id: str, token: str = Depends(verify_token)):
+    if images.get(image_id) is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    try:
+        await asyncio.to_thread(images.delete, image_id)
+    except ImageError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await asyncio.to_thread(update_ipxe_files)
+    push_hub.invalidate("images", "files", "stats")
+    return {"status": "success", "message": f"Image {image_id} deleted"}
+
+@app.get("/api/jobs")
+async def list_jobs(kind: str = None, active: bool = False, token: str = Depends(verify_token)):
+    return {"jobs": [job.to_dict() for job in jobs.list(kind=kind, active_only=active)]}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, token: str = Depends(verify_token)):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str, token: str = Depends(verify_token)):
+    job = jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+class BootParams(BaseModel):
+    image: Optional[str] = None
+    kernel_args: Optional[str] = None
+    server: Optional[str] = None
+
+class BootRule(BootParams):
+    match: str
+
+class BootRules(BaseModel):
+    default: BootParams = BootParams()
+    rules: List[BootRule] = []
+
+@app.get("/api/ipxe")
+async def ipxe_script(request: Request, mac: str = None, ip: str = None):
+    # Chained from autoexec.ipxe by booting clients, which cannot send the dashboard token
+    ip = ip or request.headers.get("x-real-ip") or request.client.host
+    script = boot_router.script(mac, ip)
+    etag = etag_for(hashlib.sha256(script.encode()).hexdigest())
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return PlainTextResponse(script, headers=headers)
+
+@app.get("/api/boot/rules")
+async def get_boot_rules(token: str = Depends(verify_token)):
+    return boot_router.rules
+
+@app.get("/api/boot/resolve")
+async def resolve_boot_rule(mac: str = None, ip: str = None, token: str = Depends(verify_token)):
+    return {"params": boot_router.resolve(mac, ip), "script": boot_router.script(mac, ip)}
+
+def load_rule_images(job):
+    resident = set(images.resident_ids())
+    missing = [i for i in boot_router.images() if i not in resident]
+    job.set_phase("deploy", total=sum(images.get(i)["size"] for i in missing))
+    for image_id in missing:
+        images.load(image_id, progress=job.advance)
+    update_ipxe_files()
+    return {"loaded": missing}
+
+@app.put("/api/boot/rules")
+async def save_boot_rules(rules: BootRules, token: str = Depends(verify_token)):
+    data = rules.dict()
+    for params in [data["default"]] + data["rules"]:
+        if params["image"] is not None and images.get(params["image"]) is None:
+            raise HTTPException(status_code=400, detail=f"Unknown image: {params['image']}")
+    try:
+        boot_router.save(data)
+    except RuleError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    images.pinned = boot_router.images()
+    push_hub.invalidate("images")
+    job_id = None
+    if images.pinned - set(images.resident_ids()):
+        try:
+            job_id = jobs.submit("deploy", load_rule_images, group="bootset", description="Load images used by boot rules").id
+        except JobConflict:
+            print("Boot rules saved while another boot set job is running; images load on next activation")
+    await asyncio.to_thread(update_ipxe_files)
+    return {"status": "success", "message": "Boot rules updated", "job_id": job_id}
+
+@app.get("/api/bootserver/stats")
+async def get_boot_server_stats(token: str = Depends(verify_token)):
+    if boot_server is None:
+        return {"enabled": False}
+    return {"enabled": True, "port": BOOT_SERVER_PORT, **boot_server.stats()}
+
+@app.get("/api/tftp/stats")
+async def get_tftp_stats(token: str = Depends(verify_token)):
+    if tftp_server is None:
+        return {"enabled": False}
+    return {"enabled": True, "port": TFTP_SERVER_PORT, **tftp_server.stats()}
+
+class SwarmAnnounce(BaseModel):
+    peer_id: str
+    port: int
+    have: List[int] = []
+    uploaded: int = 0
+    downloaded: int = 0
+
+# Swarm endpoints are called by booting clients, which cannot send the dashboard token
+@app.get("/api/swarm/stats")
+async def get_swarm_stats(token: str = Depends(verify_token)):
+    if swarm is None:
+        return {"enabled": False}
+    return {"enabled": True, **swarm.stats()}
+
+@app.get("/api/swarm/{image_id}")
+async def get_swarm_manifest(image_id: str):
+    if swarm is None:
+        raise HTTPException(status_code=404, detail="Swarm distribution is disabled")
+    try:
+        return await asyncio.to_thread(swarm_manifest, image_id)
+    except SwarmError as e:
+        raise HTTPException(status_code=e.status, detail=str(e))
+
+@app.post("/api/swarm/{image_id}/announce")
+async def swarm_announce(image_id: str, body: SwarmAnnounce, request: Request):
+    if swarm is None:
+        raise HTTPException(status_code=404, detail="Swarm distribution is disabled")
+    host = request.headers.get("x-real-ip") or request.client.host
+    try:
+        return swarm.announce(image_id, body.peer_id, f"http://{host}:{body.port}", body.have, body.uploaded, body.downloaded)
+    except SwarmError as e:
+        raise HTTPException(status_code=e.status, detail=str(e))
+
+@app.get("/api/swarm/{image_id}/chunks/{digest}")
+async def get_swarm_chunk(image_id: str, digest: str):
+    if swarm is None:
+        raise HTTPException(status_code=404, detail="Swarm distribution is disabled")
+    try:
+        await asyncio.to_thread(swarm_manifest, image_id)
+    except SwarmError as e:
+        raise HTTPException(status_code=e.status, detail=str(e))
+    data = await asyncio.to_thread(swarm.read_chunk, image_id, digest)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Chunk not found")
+    return Response(content=data, media_type="application/octet-stream")
+
+@app.get("/api/cluster/status")
+async def get_cluster_status(token: str = Depends(verify_token)):
+    node = cluster.local if cluster and cluster.local else await asyncio.to_thread(collect_node_status)
+    return {**node, "peers": cluster.peer_report() if cluster else []}
+
+@app.get("/api/cluster/images/{image_id}")
+async def get_cluster_manifest(image_id: str, token: str = Depends(verify_token)):
+    meta = images.get(image_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    chunks = await asyncio.to_thread(image_chunks, os.path.join(images.root, image_id), BOOT_COMPONENTS)
+    return {
+        "id": image_id,
+        "name": meta["name"],
+        "source": meta.get("source", {}),
+        "size": meta["size"],
+        "chunk_size": CHUNK_SIZE,
+        "components": {
+            name: {**meta["components"][name], "chunks": chunks[name]} for name in BOOT_COMPONENTS
         }
-        
-        for src_name, dest_name in files_map.items():
-            src_path = os.path.join(UPLOAD_DIR, src_name)
-            if not os.path.exists(src_path):
-                 return JSONResponse(status_code=400, content={"message": f"Missing component: {src_name}. Please upload ISO first."})
-            
-            dest_path = os.path.join(RAM_DISK, dest_name)
-            shutil.copy2(src_path, dest_path)
-            
-        return {"status": "success", "message": "PXE components loaded to RAM Cache"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    }
+
+@app.get("/api/cluster/images/{image_id}/{component}/{index}")
+async def get_cluster_chunk(image_id: str, component: str, index: int, token: str = Depends(verify_token)):
+    meta = images.get(image_id)
+    stored = meta["components"].get(component) if meta and component in BOOT_COMPONENTS else None
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    if index < 0 or index * CHUNK_SIZE >= stored["size"]:
+        raise HTTPException(status_code=416, detail="Chunk out of range")
+    def read_chunk():
+        with open(os.path.join(images.root, image_id, component), "rb") as f:
+            return os.pread(f.fileno(), CHUNK_SIZE, index * CHUNK_SIZE)
+    data = await asyncio.to_thread(read_chunk)
+    if not data:
+        raise HTTPException(status_code=416, detail="Chunk out of range")
+    return Response(content=data, media_type="application/octet-stream")
 
 @app.post("/api/unload")
 async def unload_from_ram(token: str = Depends(verify_token)):
     try:
-        files = ["vmlinuz", "initrd.img", "filesystem.squashfs"]
-        for f in files:
-            path = os.path.join(RAM_DISK, f)
-            if os.path.exists(path):
-                os.remove(path)
+        await asyncio.to_thread(images.unload)
+        await asyncio.to_thread(update_ipxe_files)
+        push_hub.invalidate("files", "stats", "images")
         return {"status": "success", "message": "RAM Cache cleared"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/reset")
 async def factory_reset(token: str = Depends(verify_token)):
+    for job in jobs.list(active_only=True):
+        job.cancel()
     try:
         for item in os.listdir(UPLOAD_DIR):
             item_path = os.path.join(UPLOAD_DIR, item)
+            if item_path == uploads.root:
+                uploads.reset()
+                continue
+            if item_path == HISTORY_FILE:
+                # Mapped by the sampler; cleared in place instead
+                history.clear()
+                continue
             try:
                 if os.path.isfile(item_path) or os.path.islink(item_path):
                     os.unlink(item_path)
@@ -416,87 +1275,109 @@ async def factory_reset(token: str = Depends(verify_token)):
             try:
                 if os.path.isfile(item_path) or os.path.islink(item_path):
                     os.unlink(item_path)
+                elif os.path.isdir(item_path):
+                    shutil.rmtree(item_path)
             except Exception as e:
                 print(f"Failed to delete RAM item {item_path}: {e}")
+        os.makedirs(images.root, exist_ok=True)
+        config_store.reload("server", "iso")
+        boot_router.load()
+        images.pinned = boot_router.images()
+        await asyncio.to_thread(update_ipxe_files)
         
         try:
-            log_file = "/var/log/nginx/access.log"
-            if os.path.exists(log_file):
-                with open(log_file, "w") as f:
+            if os.path.exists(ACCESS_LOG):
+                with open(ACCESS_LOG, "w") as f:
                     f.truncate(0)
+            access_log.reset()
         except Exception as e:
             print(f"Failed to clear nginx logs: {e}")
             
         try:
             # Enforce DHCP stop and remove on reset
-            subprocess.run(["docker", "stop", "pxe-dhcp"], capture_output=True, check=False)
-            subprocess.run(["docker", "rm", "-f", "pxe-dhcp"], capture_output=True, check=False)
+            if not dhcp_server:
+                await docker.remove(DHCP_CONTAINER, force=True)
             # Remove DHCP config so UI shows 'Not Configured' after reset
-            if os.path.exists(DHCP_JSON_FILE):
-                os.remove(DHCP_JSON_FILE)
+            config_store.remove("dhcp")
             # Reset dnsmasq.conf to defaults to avoid leftover range logic errors
-            if os.path.exists(DNSMASQ_CONF):
-                with open(DNSMASQ_CONF, "w") as f:
-                    f.writelines([
-                        "dhcp-option=66,127.0.0.1\n",
-                        "dhcp-option=67,bootx64.efi\n",
-                        "log-dhcp\n",
-                        "bind-interfaces\n"
-                    ])
+            if config_store.text("dnsmasq") is not None:
+                config_store.write("dnsmasq", "".join([
+                    "dhcp-option=66,127.0.0.1\n",
+                    "dhcp-option=67,bootx64.efi\n",
+                    "log-dhcp\n",
+                    "bind-interfaces\n"
+                ]))
+            dhcp_index.reset()
+            sync_dhcp_index()
+            if dhcp_server:
+                dhcp_server.reset()
+                configure_dhcp_server()
         except Exception as e:
             print(f"DHCP reset warning: {e}")
             
+        push_hub.invalidate()
         return {"status": "success", "message": "Full system wipe complete. All folders and logs cleared."}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Reset failed: {str(e)}")
 
-@app.get("/api/files")
-async def list_files(token: str = Depends(verify_token)):
-    uploaded = os.listdir(UPLOAD_DIR)
+def collect_files():
+    return push_hub.views.get("files", build_files)
+
+def build_files():
+    uploaded = [f for f in os.listdir(UPLOAD_DIR) if not f.startswith(".") and f != "images"]
     boot_components = ["vmlinuz", "initrd.img", "filesystem.squashfs"]
-    deployed = [f for f in os.listdir(RAM_DISK) if f in boot_components]
+    deployed = [f for f in os.listdir(RAM_DISK) if f in boot_components and os.path.exists(os.path.join(RAM_DISK, f))]
+    active = images.active_id()
+    meta = images.get(active) if active else None
+    checked = integrity_report.get("components", {}) if integrity_report.get("image") == active else {}
+    hashes = {
+        name: {"size": c["size"], "sha256": c["sha256"], "ram": checked.get(name)}
+        for name, c in (meta["components"].items() if meta else [])
+    }
     return {
         "uploaded": uploaded, 
         "deployed": deployed,
-        "active_iso": get_iso_name()
+        "active_iso": get_iso_name(),
+        "active_image": active,
+        "hashes": hashes,
+        "verified": integrity_report.get("ts") if checked else None
     }
 
-@app.get("/api/logs")
-async def get_logs(token: str = Depends(verify_token)):
+@app.get("/api/files")
+async def list_files(token: str = Depends(verify_token)):
+    return collect_files()
+
+@app.get("/api/files/precomputed")
+async def list_precomputed(token: str = Depends(verify_token)):
+    return precomputed.list()
+
+@app.post("/api/files/verify")
+async def verify_ram_copies(token: str = Depends(verify_token)):
+    active = images.active_id()
+    if active is None:
+        raise HTTPException(status_code=400, detail="No active image")
     try:
-        log_file = "/var/log/nginx/access.log"
-        if not os.path.exists(log_file):
-            return {"logs": []}
-            
-        # Read last 100 lines for dashboard
-        result = subprocess.run(["tail", "-n", "100", log_file], capture_output=True, text=True)
-        all_lines = result.stdout.splitlines()
-        
-        parsed_logs = []
-        # Pattern: 10.92.162.133 - - [13/Feb/2026:19:03:14 +0700] "GET /pxe/vmlinuz HTTP/1.1" 200 12011456 "-" "iPXE/1.21.1+ (g91081)"
-        log_pattern = re.compile(r'(?P<ip>\d+\.\d+\.\d+\.\d+) .*? \[(?P<time>.*?)\] "(?P<method>\w+) (?P<path>.*?) HTTP/.*?" (?P<status>\d+) (?P<size>\d+)')
+        job = jobs.submit("verify", activate_image, active, True, group="bootset", description="Verify RAM copies")
+    except JobConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return JSONResponse(status_code=202, content={"status": "accepted", "message": "Verifying RAM copies", "job_id": job.id})
 
-        for line in all_lines:
-            # Skip noise: Filter all /api/ traffic and common internal requests
-            if any(x in line for x in ["/api/", "/favicon.ico", "/nginx_status", "/logo.png"]):
-                continue
-                
-            match = log_pattern.search(line)
-            if match:
-                data = match.groupdict()
-                # Clean up time
-                data['time'] = data['time'].split(' ')[0]
-                parsed_logs.append(data)
-        
-        parsed_logs.reverse()
-        return {"logs": parsed_logs[:50]}
+def collect_logs():
+    try:
+        # Skip noise: Filter all /api/ traffic and common internal requests
+        noise = ("/api/", "/favicon.ico", "/nginx_status", "/logo.png")
+        parsed_logs = access_log.recent(50, lambda entry: not any(x in entry["path"] for x in noise))
+        return {"logs": parsed_logs}
     except Exception as e:
         print(f"Log parsing error: {e}")
         return {"logs": []}
 
-@app.get("/api/networks")
-async def get_networks(token: str = Depends(verify_token)):
-    interfaces = psutil.net_if_addrs()
+@app.get("/api/logs")
+async def get_logs(token: str = Depends(verify_token)):
+    return collect_logs()
+
+def collect_networks():
+    interfaces = config_store.interfaces
     networks = []
     
     for iface, addrs in interfaces.items():
@@ -504,13 +1385,16 @@ async def get_networks(token: str = Depends(verify_token)):
             continue
             
         for addr in addrs:
-            if addr.family == socket.AF_INET:
-                networks.append({
-                    "iface": iface,
-                    "ip": addr.address
-                })
+            networks.append({
+                "iface": iface,
+                "ip": addr
+            })
     return networks
 
+@app.get("/api/networks")
+async def get_networks(token: str = Depends(verify_token)):
+    return collect_networks()
+
 @app.get("/api/config")
 async def read_config(token: str = Depends(verify_token)):
     return get_config()
@@ -519,9 +1403,46 @@ async def read_config(token: str = Depends(verify_token)):
 async def update_config(config: dict, token: str = Depends(verify_token)):
     if "server_ip" not in config:
         raise HTTPException(status_code=400, detail="server_ip is required")
-    save_config(config)
+    try:
+        server_config = ServerConfig.model_validate(config)
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid configuration: {e.errors()[0]['msg']}")
+    await asyncio.to_thread(save_config, server_config)
     return {"status": "success", "message": "Configuration updated and iPXE scripts refreshed"}
 
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/debug/hotpaths")
+async def get_hotpaths(minutes: float = 15, limit: int = 20, kind: Optional[str] = None, token: str = Depends(verify_token)):
+    summary = await asyncio.to_thread(tracer.hotpaths, minutes=max(minutes, 0), limit=min(max(limit, 1), 200), kind=kind)
+    return {**summary, "profiler": profiler.status()}
+
+@app.post("/api/debug/instrument")
+async def set_instrumentation(enabled: bool, token: str = Depends(verify_token)):
+    tracer.enabled = enabled
+    return {"enabled": tracer.enabled}
+
+@app.get("/api/debug/profile")
+async def get_profile(token: str = Depends(verify_token)):
+    return profiler.status()
+
+@app.post("/api/debug/profile/start")
+async def start_profile(interval_ms: float = 10, seconds: float = 120, token: str = Depends(verify_token)):
+    # At most 10 minutes: the profiler stops by itself even if nobody calls /stop
+    if not profiler.start(interval=max(interval_ms, 1) / 1000, max_seconds=min(max(seconds, 1), 600)):
+        raise HTTPException(status_code=409, detail="Profiler is already running")
+    return profiler.status()
+
+@app.post("/api/debug/profile/stop")
+async def stop_profile(token: str = Depends(verify_token)):
+    collapsed = await asyncio.to_thread(profiler.stop)
+    if collapsed is None:
+        raise HTTPException(status_code=404, detail="No profile recorded")
+    filename = f"profile-{datetime.fromtimestamp(profiler.started).strftime('%Y%m%d-%H%M%S')}.folded"
+    return PlainTextResponse(collapsed, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
 @app.get("/api/verify-auth")
 async def verify_auth(token: str = Depends(verify_token)):
     return {"status": "success", "message": "Authenticated"}
@@ -533,51 +1454,37 @@ class DHCPConfig(BaseModel):
     dns_ip: str
     enable_dns: bool = False
 
-DHCP_JSON_FILE = os.path.join(os.getenv("APP_DIR", "/app"), "scripts", "dhcp.json")
-
 def read_dhcp_config():
     config = {"start_ip": "", "end_ip": "", "dns_ip": "", "enable_dns": False}
     
-    # Try to read ENABLE_DNS from docker-compose.dhcp.yml
-    compose_file = os.path.join(os.getenv("APP_DIR", "/app"), "docker-compose.dhcp.yml")
-    if os.path.exists(compose_file):
-        try:
-            with open(compose_file, "r") as f:
-                content = f.read()
-                if "ENABLE_DNS=true" in content:
-                    config["enable_dns"] = True
-                elif "ENABLE_DNS=false" in content:
-                    config["enable_dns"] = False
-        except Exception as e:
-            print(f"Error reading docker-compose.dhcp.yml: {e}")
-    if os.path.exists(DHCP_JSON_FILE):
-        try:
-            with open(DHCP_JSON_FILE, "r") as f:
-                import json
-                saved = json.load(f)
-                config.update(saved)
-        except Exception as e:
-            print(f"Error reading dhcp.json: {e}")
+    # ENABLE_DNS from docker-compose.dhcp.yml
+    compose = config_store.get("compose") or ""
+    if "ENABLE_DNS=true" in compose:
+        config["enable_dns"] = True
+    elif "ENABLE_DNS=false" in compose:
+        config["enable_dns"] = False
+    saved = config_store.get("dhcp")
+    if saved is not None:
+        config.update(saved)
     else:
         # Fallback to parse dnsmasq.conf if dhcp.json doesn't exist yet
-        if not os.path.exists(DNSMASQ_CONF):
-            return config
-        try:
-            with open(DNSMASQ_CONF, "r") as f:
-                lines = f.readlines()
-                for line in lines:
-                    line = line.strip()
-                    if line.startswith("dhcp-range="):
-                        parts = line.split("=")[1].split(",")
-                        if len(parts) >= 2:
-                            config["start_ip"] = parts[0].strip()
-                            config["end_ip"] = parts[1].strip()
-                    elif line.startswith("address=/cbtsrv.snpmb.id/"):
-                        config["dns_ip"] = line.split("/")[-1].strip()
-        except:
-            pass
+        for line in (config_store.get("dnsmasq") or "").splitlines():
+            line = line.strip()
+            if line.startswith("dhcp-range="):
+                parts = line.split("=")[1].split(",")
+                if len(parts) >= 2:
+                    config["start_ip"] = parts[0].strip()
+                    config["end_ip"] = parts[1].strip()
+            elif line.startswith("address=/cbtsrv.snpmb.id/"):
+                config["dns_ip"] = line.split("/")[-1].strip()
     return config
 
+def sync_dhcp_index():
+    config = read_dhcp_config()
+    dhcp_index.set_range(config["start_ip"], config["end_ip"])
+    if DHCP_LEASE_FILE:
+        dhcp_index.load_leases(config_store.get("leases"))
+
 @app.get("/api/dhcp")
 async def get_dhcp_config(token: str = Depends(verify_token)):
     return JSONResponse(read_dhcp_config())
@@ -592,19 +1499,22 @@ async def save_dhcp_config(config: DHCPConfig, token: str = Depends(verify_token
          raise HTTPException(status_code=400, detail="Invalid DNS Static IP Address format")
 
     try:
-        import json
-        with open(DHCP_JSON_FILE, "w") as f:
-            json.dump({
-                "start_ip": config.start_ip, 
-                "end_ip": config.end_ip, 
-                "dns_ip": config.dns_ip,
-                "enable_dns": config.enable_dns
-            }, f)
+        config_store.write("dhcp", json.dumps({
+            "start_ip": config.start_ip, 
+            "end_ip": config.end_ip, 
+            "dns_ip": config.dns_ip,
+            "enable_dns": config.enable_dns
+        }))
+        dhcp_index.set_range(config.start_ip, config.end_ip)
+        if dhcp_server:
+            # dnsmasq.conf and the container are not used by the in-process server
+            configure_dhcp_server()
+            push_hub.invalidate("dhcp_status")
+            return {"status": "success", "message": "DHCP configuration applied."}
 
         lines = []
-        if os.path.exists(DNSMASQ_CONF):
-            with open(DNSMASQ_CONF, "r") as f:
-                lines = f.readlines()
+        if config_store.text("dnsmasq") is not None:
+            lines = config_store.text("dnsmasq").splitlines(keepends=True)
         else:
             # Default template if file missing
             lines = [
@@ -614,7 +1524,7 @@ async def save_dhcp_config(config: DHCPConfig, token: str = Depends(verify_token
             ]
 
         # Ensure listen-address is set in dnsmasq.conf (get currently active IP)
-        current_ip = get_config().get("server_ip", "127.0.0.1")
+        current_ip = get_config().server_ip
         has_listen = False
         has_bind = False
         has_tftp_ip = False
@@ -654,16 +1564,14 @@ async def save_dhcp_config(config: DHCPConfig, token: str = Depends(verify_token
         if not has_tftp_ip:
             new_lines.append(f"dhcp-option=66,{current_ip}\n")
              
-        with open(DNSMASQ_CONF, "w") as f:
-            f.writelines(new_lines)
+        # Only changed files restart or recreate the container
+        dnsmasq_changed = config_store.write("dnsmasq", "".join(new_lines))
             
         # --- Handle ENABLE_DNS toggle in docker-compose.dhcp.yml ---
-        compose_file = os.path.join(os.getenv("APP_DIR", "/app"), "docker-compose.dhcp.yml")
-        if os.path.exists(compose_file):
+        compose_changed = False
+        compose_content = config_store.text("compose")
+        if compose_content is not None:
             try:
-                with open(compose_file, "r") as f:
-                    compose_content = f.read()
-                
                 env_val = "true" if config.enable_dns else "false"
                 # Regex replace ENABLE_DNS string
                 new_compose_content = re.sub(
@@ -672,63 +1580,82 @@ async def save_dhcp_config(config: DHCPConfig, token: str = Depends(verify_token
                     compose_content,
                     flags=re.IGNORECASE
                 )
-                
-                with open(compose_file, "w") as f:
-                    f.write(new_compose_content)
-                
-                subprocess.run(
-                    ["docker", "compose", "-f", "docker-compose.yml", "-f", "docker-compose.dhcp.yml", "up", "-d", "dhcp-server"], 
-                    cwd=os.getenv("APP_DIR", "/app"), capture_output=True, check=False
-                )
+                compose_changed = config_store.write("compose", new_compose_content)
             except Exception as e:
                 print(f"Error updating docker-compose ENABLE_DNS env variable: {e}")
+
+        async def compose_up():
+            # Compose has no Engine API equivalent
+            await asyncio.to_thread(
+                run,
+                ["docker", "compose", "-f", "docker-compose.yml", "-f", "docker-compose.dhcp.yml", "up", "-d", "dhcp-server"], 
+                cwd=os.getenv("APP_DIR", "/app"), capture_output=True, check=False
+            )
+
+        async def start_container():
+            try:
+                await docker.start(DHCP_CONTAINER)
+                return True
+            except DockerError as e:
+                print(f"Starting {DHCP_CONTAINER} failed: {e}")
+                return False
+
+        if compose_changed:
+            await compose_up()
                 
         # Restart container automatically if simple file reload
-        res = subprocess.run(["docker", "start", "pxe-dhcp"], capture_output=True, check=False)
-        if res.returncode != 0:
-             # Container likely doesn't exist, try recreating using raw docker run with dynamically mapped host directory
-             inspect_res = subprocess.run(["docker", "inspect", "pxe-orchestrator"], capture_output=True, text=True)
-             if inspect_res.returncode == 0:
-                 import json
-                 data = json.loads(inspect_res.stdout)
+        started = await start_container()
+        if not started and compose_content is not None and not compose_changed:
+            await compose_up()
+            started = await start_container()
+        if not started:
+             # Container likely doesn't exist, try recreating with the host directory mounted at /app/scripts here
+             orchestrator = await docker.inspect("pxe-orchestrator")
+             if orchestrator:
                  host_scripts_dir = None
-                 for m in data[0].get("Mounts", []):
+                 for m in orchestrator.get("Mounts", []):
                      if m["Destination"] == "/app/scripts":
                          host_scripts_dir = m["Source"]
                          break
                  
-                     if host_scripts_dir:
-                         # Remove stopped container if it exists before creating new one
-                         subprocess.run(["docker", "rm", "-f", "pxe-dhcp"], capture_output=True, check=False)
-                         subprocess.run([
-                             "docker", "run", "-d",
-                             "--name", "pxe-dhcp",
-                             "--network", "host",
-                             "--cap-add", "NET_ADMIN",
-                             "-v", f"{host_scripts_dir}:/scripts:ro",
-                             "pxe-dhcp-image:latest"
-                         ], capture_output=True, check=False)
+                 if host_scripts_dir:
+                     # Remove stopped container if it exists before creating new one
+                     await docker.remove(DHCP_CONTAINER, force=True)
+                     await docker.create(DHCP_CONTAINER, {
+                         "Image": "pxe-dhcp-image:latest",
+                         "HostConfig": {
+                             "NetworkMode": "host",
+                             "CapAdd": ["NET_ADMIN"],
+                             "Binds": [f"{host_scripts_dir}:/scripts:ro"]
+                         }
+                     })
+                     await docker.start(DHCP_CONTAINER)
                          
              print(f"Warning: Failed to start pxe-dhcp. Container created via fallback.")
-        subprocess.run(["docker", "restart", "pxe-dhcp"], capture_output=True, check=False)
+        elif dnsmasq_changed and not compose_changed:
+            # A container that was already running only re-reads dnsmasq.conf on restart
+            await docker.restart(DHCP_CONTAINER)
         
+        push_hub.invalidate("dhcp_status", "dhcp_logs")
         return {"status": "success", "message": "DHCP configuration saved and service started."}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/dhcp/status")
-async def get_dhcp_status(token: str = Depends(verify_token)):
-    if not os.path.exists(DHCP_JSON_FILE):
+def collect_dhcp_status():
+    if dhcp_server and DHCP_SERVER_MODE == "proxy":
+        # ProxyDHCP needs no range
+        return dhcp_server.status()
+    if config_store.get("dhcp") is None:
         return {"status": "unconfigured"}
+    if dhcp_server:
+        return dhcp_server.status()
 
-    try:
-        # Check docker container format
-        res = subprocess.run(["docker", "inspect", "-f", "{{.State.Status}}", "pxe-dhcp"], capture_output=True, text=True)
-        if res.returncode == 0:
-            return {"status": res.stdout.strip()}
-        return {"status": "not_found"}
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
+    # Kept current from the Docker events stream
+    return dhcp_container.status()
+
+@app.get("/api/dhcp/status")
+async def get_dhcp_status(token: str = Depends(verify_token)):
+    return collect_dhcp_status()
 
 class DHCPControl(BaseModel):
     action: str # start, stop, restart
@@ -739,24 +1666,79 @@ async def control_dhcp_service(data: DHCPControl, token: str = Depends(verify_to
          raise HTTPException(status_code=400, detail="Invalid action")
          
     try:
-        res = subprocess.run(["docker", data.action, "pxe-dhcp"], capture_output=True, text=True)
-        if res.returncode == 0:
-             return {"status": "success", "message": f"Service {data.action}ed successfully"}
+        if dhcp_server:
+            await getattr(dhcp_server, data.action)()
         else:
-             raise HTTPException(status_code=500, detail=res.stderr.strip())
+            await getattr(docker, data.action)(DHCP_CONTAINER)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    push_hub.invalidate("dhcp_status", "dhcp_logs")
+    return {"status": "success", "message": f"Service {data.action}ed successfully"}
+
+def collect_dhcp_logs():
+    # Followed incrementally (stdout and stderr) by dhcp_container, or logged by the in-process server
+    source = dhcp_server or dhcp_container
+    lines = [line for line in itertools.islice(reversed(source.lines), 50) if line.strip()]
+    return {"logs": lines[::-1]}
 
 @app.get("/api/dhcp/logs")
 async def get_dhcp_logs(token: str = Depends(verify_token)):
+    return collect_dhcp_logs()
+
+@app.get("/api/dhcp/summary")
+async def get_dhcp_summary(token: str = Depends(verify_token)):
+    return dhcp_index.summary()
+
+@app.get("/api/dhcp/timeline")
+async def get_dhcp_timeline(seconds: int = 600, token: str = Depends(verify_token)):
+    return {"bucket": 10, "buckets": dhcp_index.timeline(min(max(seconds, 10), 3600))}
+
+@app.get("/api/dhcp/leases")
+async def get_dhcp_leases(state: str = None, leased: bool = None, pxe: bool = None, never_chained: bool = False,
+                          subnet: str = None, offset: int = 0, limit: int = 100, token: str = Depends(verify_token)):
     try:
-         res = subprocess.run(["docker", "logs", "--tail", "50", "pxe-dhcp"], capture_output=True, text=True)
-         # Dnsmasq outputs to stderr and stdout
-         logs = res.stderr + "\n" + res.stdout
-         lines = [line for line in logs.split('\n') if line.strip()]
-         return {"logs": lines[-50:]}
-    except Exception as e:
-         return {"logs": [f"Error fetching logs: {str(e)}"]}
+        total, clients = dhcp_index.list_clients(state=state, leased=leased, pxe=pxe, never_chained=never_chained, subnet=subnet,
+                                                 offset=max(offset, 0), limit=min(max(limit, 1), 1000))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid subnet (expected CIDR, e.g. 10.0.0.0/22)")
+    return {"total": total, "offset": offset, "clients": clients}
+
+@app.get("/api/dhcp/leases/{key}")
+async def get_dhcp_lease(key: str, token: str = Depends(verify_token)):
+    client = dhcp_index.client(key)
+    if client is None:
+        raise HTTPException(status_code=404, detail="Client not found")
+    return client
+
+@app.get("/api/dhcp/events")
+async def get_dhcp_events(type: str = None, mac: str = None, offset: int = 0, limit: int = 100, token: str = Depends(verify_token)):
+    return {"events": dhcp_index.recent_events(type=type, mac=mac, offset=max(offset, 0), limit=min(max(limit, 1), 1000))}
+
+app.add_middleware(LatencyMiddleware, histogram=api_latency, on_request=record_request_span)
+
+# --- Dashboard push channel (replaces per-tab polling) ---
+# Only what the dashboard listens for; the image library (/api/images) is read on demand from push_hub.views
+push_hub = PushHub()
+push_hub.add_topic("stats", 2, collect_stats)
+push_hub.add_topic("files", 5, collect_files)
+push_hub.add_topic("logs", 3, collect_logs)
+push_hub.add_topic("networks", 10, collect_networks)
+push_hub.add_topic("dhcp_logs", 3, collect_dhcp_logs, blocking=False)
+push_hub.add_topic("dhcp_status", 5, collect_dhcp_status, blocking=False)
+push_hub.add_topic("jobs", 1, lambda: [job.to_dict() for job in jobs.list(active_only=True)], blocking=False)
+
+@app.post("/api/stream/ticket")
+async def create_stream_ticket(token: str = Depends(verify_token)):
+    return {"ticket": issue_stream_ticket(), "expires_in": STREAM_TICKET_TTL}
+
+@app.get("/api/stream")
+async def stream_dashboard(request: Request, topics: str = None, token: str = Depends(verify_stream_token)):
+    sub = push_hub.subscribe(topics.split(",") if topics else None)
+    return StreamingResponse(
+        push_hub.stream(sub, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
-app.mount("/", StaticFiles(directory="/app/frontend", html=True), name="frontend")
+app.mount("/", StaticFiles(directory=FRONTEND_DIR, html=True), name="frontend")
@@ -0,0 +1,337 @@
+"""
+Boot image optimiser: repack filesystem.squashfs and initrd.img for network boot.
+
+ISOs often ship an xz squashfs with 128 KiB blocks and an xz initrd. Both
+are small, but slow for low-end clients to decompress. `analyse_image`
+reads the squashfs superblock and the initrd layout with no external tools.
+The initrd layout is any uncompressed early cpio archives (CPU microcode)
+followed by one compressed archive. `repack_image` rebuilds both files with
+another codec, level and block size, using every core:
+
+- squashfs: unsquashfs, then mksquashfs -comp <codec> -b <block> -processors <n>
+- initrd: the early cpio is kept byte for byte. The main archive is
+  decompressed and recompressed in a format the kernel can unpack
+  (zstd -T0, lz4 -l, xz -T0 --check=crc32, pigz/gzip).
+
+The report compares sizes and estimated client decompression times. Each
+estimate is the uncompressed size divided by a single-core decompression
+speed. That speed is measured here (the whole initrd, and the largest
+files of the squashfs), then divided by `client_factor`, because an exam PC
+is slower than the server.
+"""
+
+import os
+import shutil
+import struct
+import subprocess
+import time
+
+from .instrument import run, span
+
+SQUASHFS_MAGIC = 0x73717368
+SQUASHFS_SUPERBLOCK = struct.Struct("<IIIIIHHHHHHQQ")
+SQUASHFS_COMPRESSORS = {1: "gzip", 2: "lzma", 3: "lzo", 4: "xz", 5: "lz4", 6: "zstd"}
+SQUASHFS_CODECS = ("zstd", "lz4", "xz", "gzip", "lzo")
+INITRD_CODECS = ("zstd", "lz4", "xz", "gzip")
+INITRD_MAGIC = [
+    (b"070701", "cpio"), (b"070702", "cpio"), (b"\x1f\x8b", "gzip"), (b"\xfd7zXZ\x00", "xz"),
+    (b"\x28\xb5\x2f\xfd", "zstd"), (b"\x02\x21\x4c\x18", "lz4"), (b"\x5d\x00\x00", "lzma"), (b"BZh", "bzip2"),
+    (b"\x89LZO", "lzo"),
+]
+DECOMPRESS = {
+    "zstd": ["zstd", "-dcq"], "lz4": ["lz4", "-dcq"], "xz": ["xz", "-dc"], "lzma": ["xz", "--format=lzma", "-dc"],
+    "gzip": ["gzip", "-dc"], "bzip2": ["bzip2", "-dc"], "lzo": ["lzop", "-dc"],
+}
+DEFAULT_LEVELS = {"zstd": 15, "lz4": 9, "xz": 6, "gzip": 9, "lzo": 9}
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+# Single-core speed of a low-end exam PC relative to the server
+CLIENT_FACTOR = 0.35
+SAMPLE_BYTES = 256 * 1024 * 1024
+PIPE_CHUNK = 4 * 1024 * 1024
+
+
+class OptimizeError(Exception):
+    pass
+
+
+def _require(*tools):
+    missing = [t for t in tools if not shutil.which(t)]
+    if missing:
+        raise OptimizeError(f"Missing tools: {', '.join(missing)}")
+
+
+def _run(args):
+    res = run(args, capture_output=True, text=True)
+    if res.returncode != 0:
+        raise OptimizeError(f"{args[0]} failed: {(res.stderr or res.stdout).strip()[-500:]}")
+    return res.stdout
+
+
+# --- analysis ---
+
+def squashfs_info(path):
+    with open(path, "rb") as f:
+        header = f.read(SQUASHFS_SUPERBLOCK.size)
+    if len(header) < SQUASHFS_SUPERBLOCK.size:
+        raise OptimizeError("Not a squashfs image")
+    (magic, inodes, mtime, block_size, fragments, compressor, _, flags, _, major, minor, _,
+     bytes_used) = SQUASHFS_SUPERBLOCK.unpack(header)
+    if magic != SQUASHFS_MAGIC:
+        raise OptimizeError("Not a squashfs image")
+    return {
+        "size": os.path.getsize(path),
+        "bytes_used": bytes_used,
+        "codec": SQUASHFS_COMPRESSORS.get(compressor, f"unknown-{compressor}"),
+        "block_size": block_size,
+        "inodes": inodes,
+        "fragments": fragments,
+        "version": f"{major}.{minor}",
+        "flags": flags,
+        "created": mtime,
+    }
+
+
+def _align4(n):
+    return (n + 3) & ~3
+
+
+def _cpio_end(f, offset):
+    """Offset just past the TRAILER!!! entry of the newc cpio archive at `offset`."""
+    while True:
+        f.seek(offset)
+        header = f.read(110)
+        if len(header) < 110 or header[:6] not in (b"070701", b"070702"):
+            raise OptimizeError(f"Truncated cpio archive at offset {offset}")
+        filesize, namesize = int(header[54:62], 16), int(header[94:102], 16)
+        name = f.read(namesize).rstrip(b"\0")
+        offset = _align4(_align4(offset + 110 + namesize) + filesize)
+        if name == b"TRAILER!!!":
+            return offset
+
+
+def initrd_segments(path):
+    """[{offset, length, format}] of the archives concatenated in an initrd."""
+    size = os.path.getsize(path)
+    segments = []
+    offset = 0
+    with open(path, "rb") as f:
+        while offset < size:
+            f.seek(offset)
+            head = f.read(8)
+            # Archives are padded with zeros (usually to 512 bytes)
+            if head.strip(b"\0") == b"":
+                offset += len(head)
+                continue
+            kind = next((name for magic, name in INITRD_MAGIC if head.startswith(magic)), None)
+            if kind is None:
+                raise OptimizeError(f"Unknown data in initrd at offset {offset}")
+            if kind != "cpio":
+                # A compressed archive runs to the end of the file
+                segments.append({"offset": offset, "length": size - offset, "format": kind})
+                break
+            end = _cpio_end(f, offset)
+            segments.append({"offset": offset, "length": end - offset, "format": kind})
+            offset = end
+    return segments
+
+
+def analyse_image(image_dir):
+    segments = initrd_segments(os.path.join(image_dir, "initrd.img"))
+    return {
+        "squashfs": squashfs_info(os.path.join(image_dir, "filesystem.squashfs")),
+        "initrd": {
+            "size": os.path.getsize(os.path.join(image_dir, "initrd.img")),
+            "codec": segments[-1]["format"] if segments else None,
+            "segments": segments,
+        },
+    }
+
+
+# --- initrd ---
+
+def _compress_args(codec, level, threads):
+    if codec == "zstd":
+        return ["zstd", "-q", "-c", f"-{level}", f"-T{threads}"] + (["--ultra"] if level > 19 else [])
+    if codec == "lz4":
+        # The kernel only unpacks the legacy lz4 frame format
+        return ["lz4", "-q", "-c", "-l", f"-{level}"]
+    if codec == "xz":
+        return ["xz", "-c", f"-{level}", f"-T{threads}", "--check=crc32"]
+    if shutil.which("pigz"):
+        return ["pigz", "-c", f"-{level}", "-p", str(threads)]
+    return ["gzip", "-c", f"-{level}"]
+
+
+def _time_decompress(path, offset, codec):
+    """Seconds for one core to decompress the archive at `offset` of `path` (output discarded)."""
+    args = DECOMPRESS[codec] + (["-T1"] if codec in ("zstd", "xz") else [])
+    # Unbuffered, so the child process reads from exactly `offset`
+    with open(path, "rb", buffering=0) as f, open(os.devnull, "wb") as null:
+        f.seek(offset)
+        started = time.perf_counter()
+        if run(args, stdin=f, stdout=null, stderr=subprocess.DEVNULL).returncode != 0:
+            raise OptimizeError(f"{args[0]} could not decompress the initrd")
+        return time.perf_counter() - started
+
+
+def repack_initrd(src, dest, codec, level, threads):
+    segments = initrd_segments(src)
+    if not segments:
+        raise OptimizeError("Empty initrd")
+    main = segments[-1]
+    prefix = main["offset"]
+    tools = [_compress_args(codec, level, threads)[0]]
+    if main["format"] != "cpio":
+        tools.append(DECOMPRESS[main["format"]][0])
+    _require(*tools)
+    started = time.perf_counter()
+    unpacked = 0
+    with open(src, "rb", buffering=0) as f, open(dest, "wb") as out:
+        # Early microcode and firmware archives stay uncompressed, first in the file
+        remaining = prefix
+        while remaining:
+            data = f.read(min(PIPE_CHUNK, remaining))
+            out.write(data)
+            remaining -= len(data)
+        out.flush()
+        f.seek(prefix)
+        reader = None
+        if main["format"] != "cpio":
+            reader = subprocess.Popen(DECOMPRESS[main["format"]], stdin=f, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        writer = subprocess.Popen(_compress_args(codec, level, threads), stdin=subprocess.PIPE, stdout=out, stderr=subprocess.PIPE)
+        source = reader.stdout if reader else f
+        with span("subprocess", f"{main['format']} | {writer.args[0]}") as s:
+            try:
+                while True:
+                    data = source.read(PIPE_CHUNK)
+                    if not data:
+                        break
+                    unpacked += len(data)
+                    writer.stdin.write(data)
+            finally:
+                writer.stdin.close()
+                if reader:
+                    reader.stdout.close()
+            s.set(bytes=unpacked, exit_code=writer.wait())
+        if writer.returncode != 0:
+            raise OptimizeError(f"{writer.args[0]} failed: {writer.stderr.read().decode().strip()}")
+        if reader and reader.wait() != 0:
+            raise OptimizeError(f"Could not decompress the {main['format']} initrd archive")
+    seconds = time.perf_counter() - started
+    before = _time_decompress(src, prefix, main["format"]) if main["format"] != "cpio" else 0.0
+    after = _time_decompress(dest, prefix, codec)
+    return {
+        "codec": codec,
+        "level": level,
+        "unpacked": unpacked,
+        "before": {"codec": main["format"], "size": os.path.getsize(src), "decompress_seconds": round(before, 3)},
+        "after": {"codec": codec, "size": os.path.getsize(dest), "decompress_seconds": round(after, 3)},
+        "repack_seconds": round(seconds, 2),
+    }
+
+
+# --- squashfs ---
+
+def _largest_files(tree, limit=SAMPLE_BYTES):
+    files = []
+    for root, _, names in os.walk(tree):
+        for name in names:
+            path = os.path.join(root, name)
+            st = os.lstat(path)
+            if not os.path.islink(path) and st.st_size:
+                files.append((st.st_size, os.path.relpath(path, tree)))
+    files.sort(reverse=True)
+    total = sum(size for size, _ in files)
+    sample, taken = [], 0
+    for size, rel in files:
+        if taken >= limit:
+            break
+        sample.append(rel)
+        taken += size
+    return sample, taken, total
+
+
+def _time_squashfs(path, sample):
+    """Seconds for one core to unpack the `sample` files of a squashfs (output discarded)."""
+    with open(os.devnull, "wb") as null:
+        started = time.perf_counter()
+        res = run(["unsquashfs", "-processors", "1", "-cat", path, *sample], stdout=null, stderr=subprocess.PIPE)
+        if res.returncode != 0:
+            raise OptimizeError(f"unsquashfs -cat failed: {res.stderr.decode().strip()[-500:]}")
+        return time.perf_counter() - started
+
+
+def repack_squashfs(src, dest, codec, level, block_size, threads, workdir):
+    _require("unsquashfs", "mksquashfs")
+    tree = os.path.join(workdir, "squashfs-root")
+    shutil.rmtree(tree, ignore_errors=True)
+    started = time.perf_counter()
+    try:
+        _run(["unsquashfs", "-no-progress", "-processors", str(threads), "-d", tree, src])
+        sample, sample_bytes, unpacked = _largest_files(tree)
+        args = ["mksquashfs", tree, dest, "-noappend", "-no-progress", "-comp", codec, "-b", str(block_size),
+                "-processors", str(threads)]
+        if codec in ("zstd", "gzip", "lzo"):
+            args += ["-Xcompression-level", str(level)]
+        elif codec == "lz4" and level >= 9:
+            args.append("-Xhc")
+        _run(args)
+    finally:
+        shutil.rmtree(tree, ignore_errors=True)
+    seconds = time.perf_counter() - started
+    before, after = (_time_squashfs(path, sample) if sample else 0.0 for path in (src, dest))
+    info_before, info_after = squashfs_info(src), squashfs_info(dest)
+    return {
+        "codec": codec,
+        "level": level,
+        "block_size": block_size,
+        "unpacked": unpacked,
+        "sample_bytes": sample_bytes,
+        "before": {"codec": info_before["codec"], "block_size": info_before["block_size"], "size": info_before["size"],
+                   "decompress_seconds": round(before, 3)},
+        "after": {"codec": codec, "block_size": block_size, "size": info_after["size"], "decompress_seconds": round(after, 3)},
+        "repack_seconds": round(seconds, 2),
+    }
+
+
+def _estimate(result, measured_bytes, client_factor):
+    """Scale the measured single-core decompression time to the whole archive on a client."""
+    for side in ("before", "after"):
+        seconds = result[side]["decompress_seconds"]
+        rate = measured_bytes / seconds if seconds > 0 else None
+        result[side]["client_seconds"] = round(result["unpacked"] / rate / client_factor, 2) if rate else None
+
+
+def repack_image(src_dir, dest_dir, squashfs_codec="zstd", squashfs_level=None, block_size=DEFAULT_BLOCK_SIZE,
+                 initrd_codec="zstd", initrd_level=None, client_factor=CLIENT_FACTOR, threads=None, progress=None):
+    """Write a repacked copy of the boot set in `src_dir` to `dest_dir`; returns the size/time report."""
+    if squashfs_codec not in SQUASHFS_CODECS:
+        raise OptimizeError(f"Unsupported squashfs codec: {squashfs_codec}")
+    if initrd_codec not in INITRD_CODECS:
+        raise OptimizeError(f"Unsupported initrd codec: {initrd_codec}")
+    if block_size & (block_size - 1) or not 4096 <= block_size <= 1024 * 1024:
+        raise OptimizeError("Block size must be a power of two between 4 KiB and 1 MiB")
+    _require("unsquashfs", "mksquashfs")
+    squashfs_level = squashfs_level or DEFAULT_LEVELS[squashfs_codec]
+    initrd_level = initrd_level or DEFAULT_LEVELS[initrd_codec]
+    threads = threads or os.cpu_count() or 1
+    shutil.rmtree(dest_dir, ignore_errors=True)
+    os.makedirs(dest_dir)
+    # The kernel is not touched; link it so the variant shares its blocks
+    os.link(os.path.join(src_dir, "vmlinuz"), os.path.join(dest_dir, "vmlinuz"))
+
+    initrd = repack_initrd(os.path.join(src_dir, "initrd.img"), os.path.join(dest_dir, "initrd.img"), initrd_codec,
+                           initrd_level, threads)
+    _estimate(initrd, initrd["unpacked"], client_factor)
+    if progress:
+        progress(initrd["before"]["size"])
+    squashfs = repack_squashfs(os.path.join(src_dir, "filesystem.squashfs"), os.path.join(dest_dir, "filesystem.squashfs"),
+                               squashfs_codec, squashfs_level, block_size, threads, dest_dir)
+    _estimate(squashfs, squashfs["sample_bytes"], client_factor)
+    if progress:
+        progress(squashfs["before"]["size"])
+
+    label = f"{squashfs_codec}-{squashfs_level}-{block_size // 1024}k"
+    if initrd_codec != squashfs_codec or initrd_level != squashfs_level:
+        label += f"+initrd-{initrd_codec}-{initrd_level}"
+    return {"label": label, "client_factor": client_factor, "threads": threads, "initrd": initrd, "squashfs": squashfs}
@@ -0,0 +1,181 @@
+"""
+Precomputed response metadata for boot files.
+
+At deploy time, every file under RAM_DISK and the TFTP root gets three
+things: a strong ETag derived from its SHA-256, its length, and, if the file
+compresses well, a .gz sibling. nginx `gzip_static` and the built-in boot
+file server send that sibling to clients that accept gzip. For the large
+components the SHA-256 comes from the deploy manifest, so they are never
+re-hashed. Entries are keyed by (device, inode, size, mtime), so an
+unchanged file is hashed and compressed only once, even when it is reached
+through one of the legacy symlinks.
+
+`render_nginx` fills in scripts/nginx-pxe-cache.conf (open_file_cache, etag,
+gzip_static) for the include directory of the /pxe/ location. nginx is
+reloaded only when the rendered text changes, so the template holds nothing
+that varies with every deploy. nginx keeps its own mtime-size ETags (its 304
+handling only compares those): a client moving between nginx and the boot
+file server revalidates once with a full response, never gets a wrong 304.
+"""
+
+import gzip
+import json
+import os
+import shutil
+import threading
+
+from .deploy import MANIFEST
+from .instrument import run
+from .integrity import hash_file
+
+GZIP_MAX = 16 * 1024 * 1024
+# Small enough for the iPXE/GRUB scripts, the main text payload; GZIP_MIN_SAVING drops the ones gzip cannot shrink
+GZIP_MIN = 128
+# Keep a .gz only when it saves at least this share of the bytes
+GZIP_MIN_SAVING = 0.1
+# Already compressed (or binary and large): never worth a .gz
+INCOMPRESSIBLE = {".squashfs", ".efi", ".gz", ".xz", ".zst", ".lz4", ".iso", ".img", ".kpxe", ".pxe", ".bin"}
+SKIP_SUFFIXES = (".gz", ".tmp")
+
+
+def etag_for(sha256):
+    return f'"{sha256[:32]}"'
+
+
+class Precomputed:
+    def __init__(self, roots):
+        # {name: directory}, e.g. {"pxe": RAM_DISK, "tftp": TFTP_BOOT}
+        self.roots = roots
+        self.lock = threading.Lock()
+        # real path -> entry
+        self.entries = {}
+        self._known = {}
+
+    def lookup(self, path):
+        """Entry for the real path of a file, or None when it is unknown or changed since the last refresh."""
+        entry = self.entries.get(path)
+        if entry is None:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if st.st_size != entry["size"] or st.st_mtime_ns != entry["mtime_ns"]:
+            return None
+        return entry
+
+    def _manifest_hashes(self, directory):
+        try:
+            with open(os.path.join(directory, MANIFEST)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _compress(self, path, st):
+        gz_path = f"{path}.gz"
+        name = os.path.basename(path)
+        ext = os.path.splitext(name)[1].lower()
+        if ext in INCOMPRESSIBLE or name in ("vmlinuz", "initrd.img") or not GZIP_MIN <= st.st_size <= GZIP_MAX:
+            return None
+        with open(path, "rb") as f:
+            # mtime=0 keeps the output identical for identical input
+            data = gzip.compress(f.read(), compresslevel=9, mtime=0)
+        if len(data) > st.st_size * (1 - GZIP_MIN_SAVING):
+            return None
+        tmp = f"{gz_path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.replace(tmp, gz_path)
+        return len(data)
+
+    def refresh(self):
+        """Index every file under the roots; returns {files, hashed, compressed, gzip_saved}."""
+        with self.lock:
+            entries, known, manifests = {}, {}, {}
+            summary = {"files": 0, "hashed": 0, "compressed": 0, "gzip_saved": 0}
+            for root in self.roots.values():
+                for directory, dirs, names in os.walk(root):
+                    dirs[:] = [d for d in dirs if not d.startswith(".")]
+                    for name in names:
+                        if name.startswith(".") or name.endswith(SKIP_SUFFIXES):
+                            continue
+                        path = os.path.realpath(os.path.join(directory, name))
+                        if path in entries:
+                            continue
+                        try:
+                            st = os.stat(path)
+                        except OSError:
+                            continue
+                        key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+                        entry = self._known.get(key)
+                        if entry is None or entry["path"] != path:
+                            # Symlinked components are listed in the manifest of the directory they point into
+                            real_dir = os.path.dirname(path)
+                            if real_dir not in manifests:
+                                manifests[real_dir] = self._manifest_hashes(real_dir)
+                            listed = manifests[real_dir].get(os.path.basename(path))
+                            if listed and listed.get("size") == st.st_size and listed.get("mtime_ns") == st.st_mtime_ns:
+                                sha256 = listed["sha256"]
+                            else:
+                                sha256 = hash_file(path)
+                                summary["hashed"] += 1
+                            gz_size = self._compress(path, st)
+                            if gz_size:
+                                summary["compressed"] += 1
+                            entry = {"path": path, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha256,
+                                     "etag": etag_for(sha256), "gzip": gz_size}
+                        if entry["gzip"] is None:
+                            self._drop_gzip(path)
+                        else:
+                            summary["gzip_saved"] += entry["size"] - entry["gzip"]
+                        entries[path] = known[key] = entry
+                    for name in names:
+                        # .gz left behind by a file that is gone
+                        if name.endswith(".gz") and not os.path.exists(os.path.join(directory, name[:-3])):
+                            self._drop_gzip(os.path.join(directory, name[:-3]))
+            self.entries, self._known = entries, known
+            summary["files"] = len(entries)
+            return summary
+
+    def _drop_gzip(self, path):
+        try:
+            os.remove(f"{path}.gz")
+        except OSError:
+            pass
+
+    def list(self):
+        result = {}
+        for name, root in self.roots.items():
+            real = os.path.realpath(root)
+            result[name] = {
+                os.path.relpath(path, real): {k: e[k] for k in ("size", "etag", "sha256", "gzip")}
+                for path, e in self.entries.items() if path.startswith(real + os.sep)
+            }
+        return result
+
+    def render_nginx(self, template_path, dest_path, valid=30):
+        """Write the nginx include from the template; reloads nginx and returns True when it changed."""
+        with open(template_path) as f:
+            template = f.read()
+        # Every file, its .gz and the legacy symlinks, with room for the next deploy; rounded up to a
+        # thousand so the include (and nginx) only changes when the boot set grows past a step
+        needed = len(self.entries) * 4
+        content = template.format(max_files=max(1000, -(-needed // 1000) * 1000), valid=valid)
+        try:
+            with open(dest_path) as f:
+                if f.read() == content:
+                    return False
+        except OSError:
+            pass
+        with open(f"{dest_path}.tmp", "w") as f:
+            f.write(content)
+        os.replace(f"{dest_path}.tmp", dest_path)
+        if shutil.which("nginx"):
+            res = run(["nginx", "-t"], capture_output=True, text=True)
+            if res.returncode != 0:
+                os.remove(dest_path)
+                print(f"Rendered nginx include rejected, removed: {res.stderr.strip()}")
+                return False
+            run(["nginx", "-s", "reload"], capture_output=True)
+        return True
@@ -0,0 +1,166 @@
+"""
+Push channel for the dashboard.
+
+One background producer computes every topic (stats, files, logs, ...) once
+per tick and fans the result out to all connected dashboards. A topic is only
+computed while somebody subscribes to it and is only sent when it changed;
+dict payloads are sent as deltas of the changed keys.
+
+`PushHub.views` caches snapshots that cost file or NIC I/O to build (file
+listings, the image library). They are dropped by the same `invalidate()`
+calls that the mutation paths already make, so polled GETs only read memory.
+"""
+
+import asyncio
+import json
+import threading
+import time
+
+
+class Topic:
+    def __init__(self, name, interval, producer, blocking=True):
+        self.name = name
+        self.interval = interval
+        self.producer = producer
+        self.blocking = blocking
+        self.value = None
+        self.encoded = None
+        self.next_run = 0.0
+
+
+class Subscriber:
+    def __init__(self, topics, maxsize=64):
+        self.topics = topics
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+
+class ViewCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+        # Bumped by every invalidation: a build that overlapped one is returned but not kept
+        self.epoch = 0
+
+    def get(self, name, builder):
+        with self.lock:
+            if name in self.values:
+                return self.values[name]
+            epoch = self.epoch
+        value = builder()
+        with self.lock:
+            if epoch == self.epoch:
+                self.values[name] = value
+        return value
+
+    def invalidate(self, *names):
+        with self.lock:
+            self.epoch += 1
+            for name in names or list(self.values):
+                self.values.pop(name, None)
+
+
+class PushHub:
+    def __init__(self, tick=0.5):
+        self.tick = tick
+        self.topics = {}
+        self.subscribers = set()
+        self.produced = 0
+        self.views = ViewCache()
+        self._wake = None
+
+    def add_topic(self, name, interval, producer, blocking=True):
+        """`producer()` returns a JSON-serialisable snapshot; blocking producers run in a worker thread."""
+        self.topics[name] = Topic(name, interval, producer, blocking)
+
+    def subscribe(self, topics=None):
+        wanted = set(self.topics) if not topics else set(topics) & set(self.topics)
+        sub = Subscriber(wanted)
+        self.subscribers.add(sub)
+        # Send what we already have right away, and compute the rest on the next tick
+        for name in wanted:
+            topic = self.topics[name]
+            if topic.encoded is not None:
+                self._offer(sub, self._message(name, topic.value, full=True))
+            else:
+                topic.next_run = 0.0
+        if self._wake is not None:
+            self._wake.set()
+        return sub
+
+    def unsubscribe(self, sub):
+        self.subscribers.discard(sub)
+
+    def invalidate(self, *names):
+        """Force the given topics (all when empty) to be recomputed on the next tick."""
+        self.views.invalidate(*names)
+        for name in names or self.topics:
+            if name in self.topics:
+                self.topics[name].next_run = 0.0
+        if self._wake is not None:
+            self._wake.set()
+
+    async def run(self):
+        self._wake = asyncio.Event()
+        while True:
+            now = time.monotonic()
+            wanted = set()
+            for sub in self.subscribers:
+                wanted |= sub.topics
+            for name in wanted:
+                topic = self.topics[name]
+                if now >= topic.next_run:
+                    topic.next_run = now + topic.interval
+                    await self._produce(topic)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.tick)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _produce(self, topic):
+        try:
+            if topic.blocking:
+                value = await asyncio.to_thread(topic.producer)
+            else:
+                value = topic.producer()
+        except Exception as e:
+            print(f"Push topic {topic.name} failed: {e}")
+            return
+        self.produced += 1
+        encoded = json.dumps(value, sort_keys=True, default=str)
+        if encoded == topic.encoded:
+            return
+        previous = topic.value
+        topic.value = value
+        topic.encoded = encoded
+        if isinstance(value, dict) and isinstance(previous, dict) and previous.keys() == value.keys():
+            delta = {k: v for k, v in value.items() if previous.get(k) != v}
+            message = self._message(topic.name, delta, full=False)
+        else:
+            message = self._message(topic.name, value, full=True)
+        for sub in list(self.subscribers):
+            if topic.name in sub.topics:
+                self._offer(sub, message)
+
+    def _message(self, name, data, full):
+        return f"event: {name}\ndata: {json.dumps({'full': full, 'data': data}, default=str)}\n\n"
+
+    def _offer(self, sub, message):
+        try:
+            sub.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Slow consumer: drop it, the browser reconnects and gets full snapshots
+            sub.overflowed = True
+            self.subscribers.discard(sub)
+
+    async def stream(self, sub, is_disconnected, keepalive=15.0):
+        """Async generator of SSE frames for one subscriber."""
+        try:
+            while not sub.overflowed and not await is_disconnected():
+                try:
+                    yield await asyncio.wait_for(sub.queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(sub)
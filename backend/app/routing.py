@@ -0,0 +1,194 @@
+"""
+Per-client boot routing for dynamic iPXE scripts.
+
+Rules pick the image, extra kernel arguments and HTTP server for a client:
+
+    {"default": {"image": null, "kernel_args": null, "server": null},
+     "rules": [{"match": "aa:bb:cc:dd:ee:ff", ...}, {"match": "10.0.1.0/24", ...}]}
+
+An exact MAC match wins over the longest matching CIDR, which wins over the
+default; unset fields fall through to the next level. Rules are compiled
+into a MAC hash map and one hash map per prefix length, so a lookup is at
+most 33 dict probes regardless of the number of rules, and rendered
+scripts are cached per distinct (image, args, server) combination.
+"""
+
+import ipaddress
+import json
+import os
+import re
+import socket
+import threading
+
+DEFAULT_KERNEL_ARGS = "quiet splash vt.global_cursor_default=0"
+FIELDS = ("image", "kernel_args", "server")
+MAC_PATTERN = re.compile(r'^[0-9a-f]{2}([:-][0-9a-f]{2}){5}$|^[0-9a-f]{12}$')
+
+
+class RuleError(ValueError):
+    pass
+
+
+def normalize_mac(mac):
+    mac = (mac or "").strip().lower()
+    if not MAC_PATTERN.match(mac):
+        return None
+    digits = mac.replace(":", "").replace("-", "")
+    return ":".join(digits[i:i + 2] for i in range(0, 12, 2))
+
+
+def _ip_int(ip):
+    try:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET, (ip or "").strip()), "big")
+    except OSError:
+        return None
+
+
+def render_script(base, kernel_args, server, port=None, checksums=None, swarm=None):
+    """iPXE script for one boot set. `base` is the path under the server, e.g. pxe/generations/<id>.
+
+    `checksums` ({component: sha256}) become settings for clients that verify their downloads
+    (sha256-vmlinuz, sha256-initrd, sha256-filesystem). The same sums are served as <base>/SHA256SUMS.
+    `swarm` (an image id) adds swarm=<tracker url> for clients that fetch the squashfs from peers.
+    """
+    host = server or "${next-server}"
+    url = f"http://{host}:{port}/{base}" if port else f"http://{host}/{base}"
+    sums = "".join(f"set sha256-{name.split('.')[0]} {digest}\n" for name, digest in (checksums or {}).items())
+    if sums:
+        sums += "\n"
+    args = kernel_args or DEFAULT_KERNEL_ARGS
+    if swarm:
+        args += f" swarm=http://{host}/api/swarm/{swarm}"
+    return (
+        "#!ipxe\n\n"
+        f"{sums}"
+        f"kernel {url}/vmlinuz initrd=initrd.img root=/dev/ram0 boot=live fetch={url}/filesystem.squashfs {args}\n"
+        f"initrd {url}/initrd.img\n"
+        "boot\n"
+    )
+
+
+class BootRouter:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.rules = {"default": {}, "rules": []}
+        self._macs = {}
+        self._prefixes = []
+        self._scripts = {}
+        self.active = None
+        self.resident = frozenset()
+        # image id -> {component: sha256}, set into the rendered scripts
+        self.checksums = {}
+        # Optional `picker(mac, image) -> host` spreading clients over cluster nodes
+        self.server_picker = None
+        # Port of the built-in boot file server, when it serves /pxe/ instead of nginx
+        self.boot_port = None
+        # Advertise the squashfs swarm tracker on the kernel command line
+        self.swarm = False
+        self.load()
+
+    # --- rules ---
+
+    def compile(self, rules):
+        """Validate `rules` and build the lookup tables. Raises RuleError on bad input."""
+        default = {k: rules.get("default", {}).get(k) for k in FIELDS}
+        macs = {}
+        by_length = {}
+        for rule in rules.get("rules", []):
+            params = {k: rule.get(k) for k in FIELDS if rule.get(k) is not None}
+            match = (rule.get("match") or "").strip()
+            mac = normalize_mac(match)
+            if mac is not None:
+                macs[mac] = params
+                continue
+            try:
+                network = ipaddress.IPv4Network(match, strict=False)
+            except ValueError:
+                raise RuleError(f"Rule match must be a MAC address or IPv4 CIDR: {match!r}")
+            by_length.setdefault(network.prefixlen, {})[int(network.network_address)] = params
+        prefixes = [
+            (length, (0xFFFFFFFF << (32 - length)) & 0xFFFFFFFF, table)
+            for length, table in sorted(by_length.items(), reverse=True)
+        ]
+        return default, macs, prefixes
+
+    def load(self):
+        try:
+            with open(self.path, "r") as f:
+                rules = json.load(f)
+        except (OSError, ValueError):
+            rules = {"default": {}, "rules": []}
+        try:
+            self.apply(rules)
+        except RuleError as e:
+            print(f"Boot rules ignored: {e}")
+            self.apply({"default": {}, "rules": []})
+
+    def apply(self, rules):
+        default, macs, prefixes = self.compile(rules)
+        with self.lock:
+            self.rules = {"default": default, "rules": list(rules.get("rules", []))}
+            self._macs = macs
+            self._prefixes = prefixes
+            self._scripts = {}
+
+    def save(self, rules):
+        self.apply(rules)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.rules, f)
+        os.replace(tmp, self.path)
+
+    def images(self):
+        """Image ids referenced by any rule (kept resident in RAM)."""
+        ids = {rule.get("image") for rule in self.rules["rules"]}
+        ids.add(self.rules["default"].get("image"))
+        ids.discard(None)
+        return ids
+
+    def set_images(self, active, resident, checksums=None):
+        """Record the active image, resident generations and their checksums; drops rendered scripts."""
+        with self.lock:
+            self.active = active
+            self.resident = frozenset(resident)
+            self.checksums = checksums or {}
+            self._scripts = {}
+
+    # --- lookup ---
+
+    def resolve(self, mac=None, ip=None):
+        """Effective {image, kernel_args, server, matched} for a client."""
+        params = dict(self.rules["default"])
+        matched = "default"
+        address = _ip_int(ip)
+        if address is not None:
+            for length, mask, table in self._prefixes:
+                hit = table.get(address & mask)
+                if hit is not None:
+                    params.update(hit)
+                    matched = f"{ipaddress.IPv4Address(address & mask)}/{length}"
+                    break
+        mac = normalize_mac(mac)
+        hit = self._macs.get(mac)
+        if hit is not None:
+            params.update(hit)
+            matched = mac
+        params["matched"] = matched
+        return params
+
+    def script(self, mac, ip):
+        """Rendered script for a client; images that are not resident fall back to the active one."""
+        params = self.resolve(mac, ip)
+        image = params["image"] if params["image"] in self.resident else self.active
+        server = params["server"]
+        if server is None and self.server_picker is not None:
+            server = self.server_picker(mac, image)
+        key = (image, params["kernel_args"], server, self.boot_port, self.swarm)
+        script = self._scripts.get(key)
+        if script is None:
+            script = render_script(f"pxe/generations/{image}" if image else "pxe", params["kernel_args"], server, self.boot_port,
+                                   self.checksums.get(image), image if self.swarm else None)
+            with self.lock:
+                self._scripts[key] = script
+        return script
@@ -0,0 +1,276 @@
+"""
+Peer-assisted distribution of filesystem.squashfs during boot storms.
+
+The server publishes a manifest of the squashfs, split into fixed-size
+chunks that are addressed by their SHA-256. A client announces which chunks
+it holds. The tracker answers with a few peers that hold chunks the client
+is missing. The client downloads from those peers and verifies every chunk
+against the manifest. It then serves its own chunks to later clients over
+plain HTTP (GET /chunks/<sha256>). The server sends a chunk itself only when
+no peer has it or a peer fails. It is the seed of last resort, so its
+egress no longer grows with the size of the room.
+
+SwarmTracker is the server side, wrapped by /api/swarm/*. SwarmClient is the
+reference client. It uses the standard library only, so it can run from an
+initramfs hook (the iPXE script passes `swarm=<url>` on the kernel command
+line) or from a booted live system that keeps seeding.
+"""
+
+import hashlib
+import http.server
+import json
+import os
+import random
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+PEER_TTL = 30
+MAX_PEERS = 8
+ANNOUNCE_INTERVAL = 2
+
+
+class SwarmError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Peer:
+    __slots__ = ("id", "url", "have", "uploaded", "downloaded", "seen")
+
+    def __init__(self, peer_id, url):
+        self.id = peer_id
+        self.url = url
+        self.have = frozenset()
+        self.uploaded = 0
+        self.downloaded = 0
+        self.seen = 0
+
+
+class SwarmTracker:
+    def __init__(self, interval=ANNOUNCE_INTERVAL, peer_ttl=PEER_TTL, max_peers=MAX_PEERS):
+        self.interval = interval
+        self.peer_ttl = peer_ttl
+        self.max_peers = max_peers
+        self.lock = threading.Lock()
+        self.manifests = {}
+        # key -> {sha256: (path, offset, length)}
+        self.chunks = {}
+        # key -> {peer id: Peer}
+        self.peers = {}
+        self.totals = {"announces": 0, "seed_chunks": 0, "seed_bytes": 0, "peer_bytes": 0}
+
+    def publish(self, key, path, chunk_size, hashes):
+        """Serve `path` as swarm `key`; `hashes` are the SHA-256 of its chunks."""
+        size = os.path.getsize(path)
+        index = {digest: (path, i * chunk_size, min(chunk_size, size - i * chunk_size)) for i, digest in enumerate(hashes)}
+        with self.lock:
+            self.manifests[key] = {"id": key, "file": os.path.basename(path), "size": size, "chunk_size": chunk_size,
+                                   "chunks": list(hashes)}
+            self.chunks[key] = index
+            self.peers.setdefault(key, {})
+
+    def retire(self, keep):
+        """Drop every swarm whose key is not in `keep`."""
+        with self.lock:
+            for key in [k for k in self.manifests if k not in keep]:
+                del self.manifests[key], self.chunks[key], self.peers[key]
+
+    def manifest(self, key):
+        return self.manifests.get(key)
+
+    def _expire(self, peers, now):
+        for peer_id in [p.id for p in peers.values() if now - p.seen > self.peer_ttl]:
+            del peers[peer_id]
+
+    def announce(self, key, peer_id, url, have, uploaded=0, downloaded=0):
+        """Record a peer's chunks and return up to `max_peers` peers holding chunks it lacks."""
+        manifest = self.manifests.get(key)
+        if manifest is None:
+            raise SwarmError(404, "Unknown swarm")
+        count = len(manifest["chunks"])
+        have = frozenset(i for i in have if 0 <= i < count)
+        now = time.time()
+        with self.lock:
+            self.totals["announces"] += 1
+            peers = self.peers[key]
+            self._expire(peers, now)
+            peer = peers.get(peer_id)
+            if peer is None:
+                peer = peers[peer_id] = Peer(peer_id, url)
+            self.totals["peer_bytes"] += max(uploaded - peer.uploaded, 0)
+            peer.url, peer.have, peer.uploaded, peer.downloaded, peer.seen = url, have, uploaded, downloaded, now
+            # Most useful first; among equals the peer that uploaded least, so complete peers share the load
+            candidates = [(len(p.have - have), p.uploaded, random.random(), p) for p in peers.values()
+                          if p is not peer and p.url and p.have - have]
+            candidates.sort(key=lambda c: (-c[0], c[1], c[2]))
+            chosen = [c[3] for c in candidates[:self.max_peers]]
+            return {"interval": self.interval, "peers": [{"id": p.id, "url": p.url, "have": sorted(p.have)} for p in chosen]}
+
+    def read_chunk(self, key, digest):
+        """Chunk bytes served by the seed, or None for an unknown key or hash."""
+        entry = self.chunks.get(key, {}).get(digest)
+        if entry is None:
+            return None
+        path, offset, length = entry
+        with open(path, "rb") as f:
+            data = os.pread(f.fileno(), length, offset)
+        with self.lock:
+            self.totals["seed_chunks"] += 1
+            self.totals["seed_bytes"] += len(data)
+        return data
+
+    def stats(self):
+        now = time.time()
+        swarms = {}
+        with self.lock:
+            for key, peers in self.peers.items():
+                self._expire(peers, now)
+                count = len(self.manifests[key]["chunks"])
+                swarms[key] = {
+                    "size": self.manifests[key]["size"],
+                    "chunks": count,
+                    "peers": len(peers),
+                    "seeders": sum(1 for p in peers.values() if len(p.have) == count),
+                }
+            totals = dict(self.totals)
+        served = totals["seed_bytes"] + totals["peer_bytes"]
+        totals["offload"] = round(totals["peer_bytes"] / served, 3) if served else None
+        return {"swarms": swarms, "totals": totals}
+
+
+class _ChunkHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        data = None
+        if self.path.startswith("/chunks/"):
+            data = self.server.client.read_chunk(self.path[len("/chunks/"):])
+        if data is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SwarmClient:
+    """
+    Reference swarm client: downloads swarm `key` from `server` into `path` and
+    serves the chunks it has on host:port until stop().
+    """
+
+    def __init__(self, server, key, path, host="0.0.0.0", port=0, peer_id=None, workers=4, timeout=10):
+        self.server = server.rstrip("/")
+        self.key = key
+        self.path = path
+        self.host = host
+        self.port = port
+        self.peer_id = peer_id or uuid.uuid4().hex
+        self.workers = workers
+        self.timeout = timeout
+        self.manifest = None
+        self.have = set()
+        self.index = {}
+        self.fd = None
+        self.httpd = None
+        self.lock = threading.Lock()
+        self.stats = {"from_peers": 0, "from_seed": 0, "peer_failures": 0, "uploaded": 0}
+
+    def _get(self, url):
+        with urllib.request.urlopen(url, timeout=self.timeout) as res:
+            return res.read()
+
+    def start(self):
+        self.manifest = json.loads(self._get(f"{self.server}/api/swarm/{self.key}"))
+        self.index = {digest: i for i, digest in enumerate(self.manifest["chunks"])}
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        os.ftruncate(self.fd, self.manifest["size"])
+        self.httpd = http.server.ThreadingHTTPServer((self.host, self.port), _ChunkHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.client = self
+        self.port = self.httpd.server_address[1]
+        threading.Thread(target=self.httpd.serve_forever, name="swarm-seed", daemon=True).start()
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def _span(self, index):
+        offset = index * self.manifest["chunk_size"]
+        return offset, min(self.manifest["chunk_size"], self.manifest["size"] - offset)
+
+    def read_chunk(self, digest):
+        index = self.index.get(digest)
+        if index is None or index not in self.have:
+            return None
+        offset, length = self._span(index)
+        data = os.pread(self.fd, length, offset)
+        with self.lock:
+            self.stats["uploaded"] += len(data)
+        return data
+
+    def announce(self):
+        body = json.dumps({"peer_id": self.peer_id, "port": self.port, "have": sorted(self.have),
+                           "uploaded": self.stats["uploaded"], "downloaded": self.stats["from_peers"] + self.stats["from_seed"]})
+        req = urllib.request.Request(f"{self.server}/api/swarm/{self.key}/announce", data=body.encode(),
+                                     headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.urlopen(req, timeout=self.timeout) as res:
+            return json.loads(res.read())["peers"]
+
+    def _fetch(self, index, holders):
+        digest = self.manifest["chunks"][index]
+        offset, length = self._span(index)
+        for peer in holders[:2]:
+            try:
+                data = self._get(f"{peer['url']}/chunks/{digest}")
+            except OSError:
+                data = None
+            if data is not None and len(data) == length and hashlib.sha256(data).hexdigest() == digest:
+                source = "from_peers"
+                break
+            with self.lock:
+                self.stats["peer_failures"] += 1
+        else:
+            data = self._get(f"{self.server}/api/swarm/{self.key}/chunks/{digest}")
+            if len(data) != length or hashlib.sha256(data).hexdigest() != digest:
+                raise SwarmError(502, f"Chunk {index} from the server failed verification")
+            source = "from_seed"
+        os.pwrite(self.fd, data, offset)
+        with self.lock:
+            self.stats[source] += length
+            self.have.add(index)
+
+    def download(self):
+        """Fetch every missing chunk, rarest among peers first, the rest from the server in random order."""
+        if self.manifest is None:
+            self.start()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="swarm-fetch") as pool:
+            while len(self.have) < len(self.manifest["chunks"]):
+                holders = {}
+                for peer in self.announce():
+                    for index in peer["have"]:
+                        if index not in self.have:
+                            holders.setdefault(index, []).append(peer)
+                missing = [i for i in range(len(self.manifest["chunks"])) if i not in self.have]
+                random.shuffle(missing)
+                missing.sort(key=lambda i: len(holders.get(i, ())) or len(self.manifest["chunks"]) + 1)
+                batch = []
+                for index in missing[:self.workers]:
+                    peers = holders.get(index, [])
+                    random.shuffle(peers)
+                    batch.append(pool.submit(self._fetch, index, peers))
+                for future in batch:
+                    future.result()
+        self.announce()
+        return dict(self.stats)
@@ -0,0 +1,321 @@
+"""
+Optional in-process TFTP server for TFTP_BOOT (an alternative to in.tftpd).
+
+- RFC 2347/2348/2349 options: blksize (up to `max_blksize`), timeout and
+  tsize. RFC 7440 windowsize lets the sender put up to `max_window` blocks
+  in flight before it waits for an ACK, instead of one 512-byte block per
+  round trip.
+- The TFTP root is small (bootx64.efi and the iPXE scripts), so files are
+  kept in memory. They are re-read only when their mtime, size or inode
+  changes. The DATA packets for each negotiated block size are built once
+  and then reused by every transfer.
+- Each transfer reports a per-transfer dict (`on_transfer`) for boot
+  tracking and metrics. `stats()` returns the totals.
+"""
+
+import asyncio
+import itertools
+import os
+import struct
+import time
+
+TFTP_PORT = 69
+RRQ, WRQ, DATA, ACK, ERROR, OACK = range(1, 7)
+DEFAULT_BLKSIZE = 512
+MIN_BLKSIZE, MAX_BLKSIZE = 8, 65464
+# Error codes (RFC 1350 / 2347)
+NOT_FOUND, ACCESS_VIOLATION, ILLEGAL_OPERATION, UNKNOWN_TID, OPTION_REFUSED = 1, 2, 4, 5, 8
+# Packet lists kept per file: one per distinct block size in use
+PACKET_SETS = 4
+
+
+def error_packet(code, message):
+    return struct.pack("!HH", ERROR, code) + message.encode() + b"\0"
+
+
+def parse_request(data):
+    """(opcode, filename, mode, {option: value}) of an RRQ/WRQ; ValueError if malformed."""
+    opcode = struct.unpack_from("!H", data)[0]
+    fields = data[2:].split(b"\0")
+    if opcode not in (RRQ, WRQ) or len(fields) < 3:
+        raise ValueError("Malformed request")
+    filename, mode = fields[0].decode("latin-1"), fields[1].decode("latin-1").lower()
+    options = {}
+    for name, value in zip(fields[2:-1:2], fields[3::2]):
+        options[name.decode("latin-1").lower()] = value.decode("latin-1")
+    return opcode, filename, mode, options
+
+
+class CachedFile:
+    def __init__(self, data, key):
+        self.data = data
+        self.key = key
+        # blksize -> [DATA packet for block 1, 2, ...]; block numbers roll over at 65536
+        self.packets = {}
+
+    def blocks(self, blksize):
+        packets = self.packets.get(blksize)
+        if packets is None:
+            data = self.data
+            packets = [struct.pack("!HH", DATA, (i + 1) & 0xFFFF) + data[i * blksize:(i + 1) * blksize]
+                       for i in range(len(data) // blksize + 1)]
+            if len(self.packets) >= PACKET_SETS:
+                self.packets.pop(next(iter(self.packets)))
+            self.packets[blksize] = packets
+        return packets
+
+
+class TftpCache:
+    def __init__(self, root, max_file_size=64 * 1024 * 1024):
+        self.root = os.path.realpath(root)
+        self.max_file_size = max_file_size
+        self.files = {}
+
+    def resolve(self, filename):
+        name = os.path.normpath(filename.replace("\\", "/").lstrip("/"))
+        if name.startswith("..") or os.path.isabs(name):
+            return None
+        return name
+
+    def get(self, name):
+        """CachedFile for a path under the root, re-read when it changed on disk; None if missing."""
+        path = os.path.join(self.root, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.files.pop(name, None)
+            return None
+        key = (st.st_mtime_ns, st.st_size, st.st_ino)
+        cached = self.files.get(name)
+        if cached is not None and cached.key == key:
+            return cached
+        if st.st_size > self.max_file_size or not os.path.isfile(path):
+            return None
+        with open(path, "rb") as f:
+            cached = self.files[name] = CachedFile(f.read(), key)
+        return cached
+
+
+class Transfer(asyncio.DatagramProtocol):
+    def __init__(self, server, transfer_id, client, name, cached, blksize, window, timeout, oack):
+        self.server = server
+        self.id = transfer_id
+        self.client = client
+        self.name = name
+        self.size = len(cached.data)
+        self.packets = cached.blocks(blksize)
+        self.blksize = blksize
+        self.window = window
+        self.timeout = timeout
+        self.oack = oack
+        self.transport = None
+        self.started = time.time()
+        self.finished = None
+        # Blocks are numbered from 1; `acked` is the highest block the client confirmed
+        self.acked = 0
+        self.negotiated = oack is None
+        self.retransmits = 0
+        self.retries = 0
+        self.status = "sending"
+        self._timer = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self._send()
+
+    def _send(self):
+        if not self.negotiated:
+            self.transport.sendto(self.oack, self.client)
+        else:
+            send = self.transport.sendto
+            for packet in self.packets[self.acked:self.acked + self.window]:
+                send(packet, self.client)
+        self._arm()
+
+    def _arm(self):
+        if self._timer:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(self.timeout, self._expired)
+
+    def _expired(self):
+        self.retries += 1
+        if self.retries > self.server.retries:
+            self._finish("timeout")
+            return
+        self.retransmits += 1
+        self._send()
+
+    def datagram_received(self, data, addr):
+        if addr != self.client:
+            self.transport.sendto(error_packet(UNKNOWN_TID, "Unknown transfer ID"), addr)
+            return
+        if len(data) < 4:
+            return
+        opcode, block = struct.unpack_from("!HH", data)
+        if opcode == ERROR:
+            self._finish("aborted")
+            return
+        if opcode != ACK:
+            return
+        if not self.negotiated:
+            # ACK 0 confirms the OACK
+            if block == 0:
+                self.negotiated = True
+                self.retries = 0
+                self._send()
+            return
+        # Map the 16-bit block number onto the blocks sent in the current window
+        ahead = (block - self.acked) & 0xFFFF
+        if ahead == 0 or ahead > self.window:
+            return
+        self.acked += ahead
+        self.retries = 0
+        if self.acked >= len(self.packets):
+            self._finish("complete")
+        else:
+            self._send()
+
+    def error_received(self, exc):
+        self._finish("failed")
+
+    def _finish(self, status):
+        if self.status != "sending":
+            return
+        self.status = status
+        self.finished = time.time()
+        if self._timer:
+            self._timer.cancel()
+        if self.transport:
+            self.transport.close()
+        self.server._finished(self)
+
+    def to_dict(self):
+        sent = min(self.acked * self.blksize, self.size)
+        return {
+            "id": self.id,
+            "ip": self.client[0],
+            "file": self.name,
+            "size": self.size,
+            "bytes": sent,
+            "blksize": self.blksize,
+            "windowsize": self.window,
+            "retransmits": self.retransmits,
+            "seconds": round((self.finished or time.time()) - self.started, 3),
+            "status": self.status,
+            "ts": self.started,
+        }
+
+
+class _Listener(asyncio.DatagramProtocol):
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            self.server._request(data, addr, self.transport)
+        except Exception as e:
+            print(f"TFTP request from {addr[0]} failed: {e}")
+
+
+class TftpServer:
+    def __init__(self, root, host="0.0.0.0", port=TFTP_PORT, max_blksize=MAX_BLKSIZE, max_window=64, timeout=1.0,
+                 retries=5, on_transfer=None):
+        self.cache = TftpCache(root)
+        self.host = host
+        self.port = port
+        self.max_blksize = max_blksize
+        self.max_window = max_window
+        self.timeout = timeout
+        self.retries = retries
+        # `on_transfer(entry)` gets Transfer.to_dict() when a transfer ends (any status)
+        self.on_transfer = on_transfer
+        self.transport = None
+        self.transfers = {}
+        self.totals = {"requests": 0, "complete": 0, "failed": 0, "not_found": 0, "bytes": 0, "retransmits": 0}
+        self._ids = itertools.count(1)
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(lambda: _Listener(self), local_addr=(self.host, self.port))
+        print(f"TFTP server listening on {self.host}:{self.port} (root {self.cache.root})")
+
+    async def stop(self):
+        if self.transport:
+            self.transport.close()
+        for transfer in list(self.transfers.values()):
+            transfer._finish("aborted")
+
+    def stats(self):
+        return {"totals": dict(self.totals), "active": len(self.transfers),
+                "transfers": [t.to_dict() for t in self.transfers.values()]}
+
+    def _negotiate(self, options, size):
+        """(blksize, window, timeout, OACK packet or None) for the options we accept."""
+        accepted = {}
+        blksize, window, timeout = DEFAULT_BLKSIZE, 1, self.timeout
+        try:
+            if "blksize" in options:
+                blksize = min(max(int(options["blksize"]), MIN_BLKSIZE), self.max_blksize)
+                accepted["blksize"] = blksize
+            if "windowsize" in options:
+                window = min(max(int(options["windowsize"]), 1), self.max_window)
+                accepted["windowsize"] = window
+            if "timeout" in options and 1 <= int(options["timeout"]) <= 255:
+                timeout = int(options["timeout"])
+                accepted["timeout"] = timeout
+        except ValueError:
+            raise ValueError("Invalid option value")
+        if "tsize" in options:
+            accepted["tsize"] = size
+        if not accepted:
+            return blksize, window, timeout, None
+        oack = struct.pack("!H", OACK) + b"".join(f"{k}\0{v}\0".encode() for k, v in accepted.items())
+        return blksize, window, timeout, oack
+
+    def _request(self, data, addr, transport):
+        self.totals["requests"] += 1
+        try:
+            opcode, filename, mode, options = parse_request(data)
+        except (ValueError, struct.error):
+            transport.sendto(error_packet(ILLEGAL_OPERATION, "Illegal TFTP operation"), addr)
+            return
+        if opcode == WRQ:
+            transport.sendto(error_packet(ACCESS_VIOLATION, "Read-only server"), addr)
+            return
+        name = self.cache.resolve(filename)
+        cached = self.cache.get(name) if name else None
+        if cached is None:
+            self.totals["not_found"] += 1
+            transport.sendto(error_packet(NOT_FOUND, "File not found"), addr)
+            return
+        try:
+            blksize, window, timeout, oack = self._negotiate(options, len(cached.data))
+        except ValueError as e:
+            transport.sendto(error_packet(OPTION_REFUSED, str(e)), addr)
+            return
+        transfer_id = next(self._ids)
+        transfer = Transfer(self, transfer_id, addr, name, cached, blksize, window, timeout, oack)
+        self.transfers[transfer_id] = transfer
+        # Every transfer answers from its own port (the TID)
+        loop = asyncio.get_running_loop()
+        task = loop.create_task(loop.create_datagram_endpoint(lambda: transfer, local_addr=(self.host, 0)))
+        task.add_done_callback(lambda t: t.exception() and self._finished(transfer, failed=True))
+
+    def _finished(self, transfer, failed=False):
+        if self.transfers.pop(transfer.id, None) is None:
+            return
+        if failed:
+            transfer.status = "failed"
+        entry = transfer.to_dict()
+        self.totals["complete" if entry["status"] == "complete" else "failed"] += 1
+        self.totals["bytes"] += entry["bytes"]
+        self.totals["retransmits"] += entry["retransmits"]
+        if self.on_transfer:
+            try:
+                self.on_transfer(entry)
+            except Exception as e:
+                print(f"TFTP transfer listener error: {e}")
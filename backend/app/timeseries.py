@@ -0,0 +1,183 @@
+"""
+Fixed-size time-series store for dashboard history (no database).
+
+Every field is kept in three rings: 1s for 1h, 10s for 6h and 1m for 24h.
+Each sample updates the current slot of every ring (coarser rings keep a
+running mean), so downsampling costs O(rings) per sample. The rings live in
+one memory-mapped file under UPLOAD_DIR: its size is fixed by the layout
+(`HistoryStore.nbytes`), writes only touch the page cache, and a periodic
+flush makes history survive restarts. A range query walks exactly the slots
+it covers and never returns more than `max_points` per field: past the
+coarsest ring it averages neighbouring slots into a wider step.
+"""
+
+import json
+import mmap
+import os
+import threading
+import time
+
+MAGIC = b"PXETS001"
+HEADER_SIZE = 4096
+DEFAULT_RINGS = ((1, 3600), (10, 2160), (60, 1440))
+
+
+class Ring:
+    def __init__(self, step, capacity, fields, view):
+        self.step = step
+        self.capacity = capacity
+        # view: doubles laid out as [bucket start][sample count][field 0]...[field n], capacity each
+        self.starts = view[0:capacity]
+        self.counts = view[capacity:2 * capacity]
+        self.columns = {name: view[(2 + i) * capacity:(3 + i) * capacity] for i, name in enumerate(fields)}
+
+    @property
+    def span(self):
+        return self.step * self.capacity
+
+    def add(self, ts, values):
+        bucket = ts - ts % self.step
+        slot = int(bucket // self.step) % self.capacity
+        if self.starts[slot] != bucket:
+            self.starts[slot] = bucket
+            self.counts[slot] = 0
+        n = self.counts[slot]
+        for name, value in values.items():
+            column = self.columns.get(name)
+            if column is not None:
+                column[slot] = value if n == 0 else column[slot] + (value - column[slot]) / (n + 1)
+        self.counts[slot] = n + 1
+
+    def query(self, names, start, end):
+        first = start - start % self.step
+        points = int((end - first) // self.step) + 1
+        series = {name: [None] * points for name in names}
+        columns = [(series[name], self.columns[name]) for name in names]
+        for i in range(points):
+            bucket = first + i * self.step
+            slot = int(bucket // self.step) % self.capacity
+            if self.starts[slot] == bucket and self.counts[slot]:
+                for out, column in columns:
+                    out[i] = column[slot]
+        return first, series
+
+
+def _downsample(values, factor):
+    out = []
+    for i in range(0, len(values), factor):
+        present = [v for v in values[i:i + factor] if v is not None]
+        out.append(sum(present) / len(present) if present else None)
+    return out
+
+
+class HistoryStore:
+    def __init__(self, path, fields, rings=DEFAULT_RINGS):
+        self.path = path
+        self.fields = list(fields)
+        self.lock = threading.Lock()
+        layout = json.dumps({"fields": self.fields, "rings": [list(r) for r in rings]}).encode()
+        self.nbytes = HEADER_SIZE + sum(cap * (2 + len(self.fields)) * 8 for _, cap in rings)
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fresh = os.fstat(fd).st_size != self.nbytes
+            if not fresh:
+                header = os.pread(fd, HEADER_SIZE, 0)
+                fresh = header[:8] != MAGIC or header[8:8 + len(layout)] != layout
+            if fresh:
+                # Layout changed (or new file): start empty rather than misread old data
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, self.nbytes)
+                os.pwrite(fd, MAGIC + layout, 0)
+            self.map = mmap.mmap(fd, self.nbytes)
+        finally:
+            os.close(fd)
+
+        view = memoryview(self.map)[HEADER_SIZE:].cast("d")
+        self.rings = []
+        offset = 0
+        for step, capacity in rings:
+            size = capacity * (2 + len(self.fields))
+            self.rings.append(Ring(step, capacity, self.fields, view[offset:offset + size]))
+            offset += size
+
+    def add(self, values, ts=None):
+        ts = int(time.time() if ts is None else ts)
+        with self.lock:
+            for ring in self.rings:
+                ring.add(ts, values)
+
+    def query(self, fields=None, start=None, end=None, max_points=1000, step=None):
+        """Series for `fields` between `start` and `end` from the finest ring that covers the range in `max_points` (downsampled if none does)."""
+        names = [f for f in (fields or self.fields) if f in self.fields]
+        end = int(time.time() if end is None else end)
+        start = int(end - 3600 if start is None else start)
+        now = time.time()
+        candidates = [r for r in self.rings if step is None or r.step == step] or self.rings
+        ring = candidates[-1]
+        for candidate in candidates:
+            if now - start <= candidate.span and (end - start) / candidate.step <= max_points:
+                ring = candidate
+                break
+        start = max(start, int(now - ring.span) + ring.step)
+        if end < start:
+            return {"step": ring.step, "start": start, "end": end, "series": {name: [] for name in names}}
+        with self.lock:
+            first, series = ring.query(names, start, end)
+        points = int((end - first) // ring.step) + 1
+        if points <= max_points:
+            return {"step": ring.step, "start": first, "end": end, "series": series}
+        # Even the coarsest ring is too fine for the range: widen the step to a multiple of it (bucket means)
+        factor = -(-points // max_points)
+        while True:
+            step = ring.step * factor
+            pad = (first % step) // ring.step
+            if -(-(points + pad) // factor) <= max_points:
+                break
+            factor += 1
+        series = {name: _downsample([None] * pad + values, factor) for name, values in series.items()}
+        return {"step": step, "start": first - pad * ring.step, "end": end, "series": series}
+
+    def clear(self):
+        with self.lock:
+            self.map[HEADER_SIZE:] = bytes(self.nbytes - HEADER_SIZE)
+
+    def flush(self):
+        self.map.flush()
+
+
+class HistorySampler:
+    """Calls `collect()` every `interval` seconds into the store (None skips a tick); flushes the mmap every `flush_every` seconds."""
+
+    def __init__(self, store, collect, interval=1.0, flush_every=30):
+        self.store = store
+        self.collect = collect
+        self.interval = interval
+        self.flush_every = flush_every
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _loop(self):
+        last_flush = time.monotonic()
+        next_run = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                sample = self.collect()
+                if sample is not None:
+                    self.store.add(sample)
+            except Exception as e:
+                print(f"History sample error: {e}")
+            if time.monotonic() - last_flush >= self.flush_every:
+                self.store.flush()
+                last_flush = time.monotonic()
+            next_run = max(next_run + self.interval, time.monotonic())
+            self._stop.wait(max(next_run - time.monotonic(), 0))
+        self.store.flush()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="history", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,288 @@
+"""
+Chunked, resumable uploads for ISOs and boot components.
+
+A session preallocates its target file and accepts fixed-size chunks in any
+order, even several at once. Each chunk is checked against its SHA-256 and
+written in place with os.pwrite, so nothing is spooled to a temporary file.
+A chunk is marked received only after it is written: its digest goes into a
+sidecar file at a fixed offset. A session therefore survives a restart of
+the backend, and a client resumes by asking which chunks are missing.
+
+The whole-file SHA-256 is advanced while chunks arrive. Whenever the next
+chunk in order is present, the hash continues through it and any later
+chunks that are already contiguous. Finalising only hashes what is left.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+MIN_CHUNK_SIZE = 256 * 1024
+DIGEST_SIZE = 32
+SESSION_TTL = 24 * 3600
+EMPTY_DIGEST = bytes(DIGEST_SIZE)
+
+
+class UploadError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class UploadSession:
+    def __init__(self, root, session_id, meta):
+        self.id = session_id
+        self.meta = meta
+        self.filename = meta["filename"]
+        self.kind = meta["kind"]
+        self.size = meta["size"]
+        self.chunk_size = meta["chunk_size"]
+        self.chunks = max((self.size + self.chunk_size - 1) // self.chunk_size, 1)
+        self.path = os.path.join(root, f"{session_id}.part")
+        self.digest_path = os.path.join(root, f"{session_id}.sha")
+        self.meta_path = os.path.join(root, f"{session_id}.json")
+        self.received = bytearray(self.chunks)
+        self.count = 0
+        self.lock = threading.Lock()
+        # Chunk indexes with a pwrite in flight; a second writer for the same index is rejected,
+        # and close() waits for them so no write ever lands on a closed (or reused) descriptor
+        self.writing = set()
+        self.idle = threading.Condition(self.lock)
+        # "open" -> "finalising" (taken by UploadManager.take) -> "closed"
+        self.state = "open"
+        # Whole-file SHA-256 over chunks [0, hashed)
+        self.digest = hashlib.sha256()
+        self.hashed = 0
+        self.updated = meta["created"]
+        self.fd = None
+        self.digest_fd = None
+
+    def open(self, create=False):
+        flags = os.O_RDWR | (os.O_CREAT if create else 0)
+        self.fd = os.open(self.path, flags, 0o666)
+        self.digest_fd = os.open(self.digest_path, flags, 0o644)
+        if create:
+            try:
+                if self.size:
+                    os.posix_fallocate(self.fd, 0, self.size)
+            except OSError:
+                # Filesystems without fallocate (tmpfs on older kernels, overlay) still get the full length
+                os.ftruncate(self.fd, self.size)
+            os.ftruncate(self.digest_fd, self.chunks * DIGEST_SIZE)
+            return
+        digests = os.pread(self.digest_fd, self.chunks * DIGEST_SIZE, 0)
+        for index in range(self.chunks):
+            if digests[index * DIGEST_SIZE:(index + 1) * DIGEST_SIZE] != EMPTY_DIGEST:
+                self.received[index] = 1
+                self.count += 1
+
+    def close(self):
+        with self.lock:
+            self.state = "closed"
+            while self.writing:
+                self.idle.wait()
+            for fd in (self.fd, self.digest_fd):
+                if fd is not None:
+                    os.close(fd)
+            self.fd = self.digest_fd = None
+
+    def chunk_length(self, index):
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+    def missing(self):
+        return [i for i, done in enumerate(self.received) if not done]
+
+    def write(self, index, data, sha256=None):
+        if not 0 <= index < self.chunks:
+            raise UploadError(400, f"Chunk {index} out of range (0-{self.chunks - 1})")
+        if len(data) != self.chunk_length(index):
+            raise UploadError(400, f"Chunk {index} must be {self.chunk_length(index)} bytes, got {len(data)}")
+        digest = hashlib.sha256(data).digest()
+        if sha256 and digest.hex() != sha256.lower():
+            raise UploadError(422, f"Chunk {index} SHA-256 mismatch")
+        with self.lock:
+            if self.state == "closed":
+                raise UploadError(404, "Upload session not found")
+            if self.state == "finalising":
+                raise UploadError(409, "Upload is already being finalised")
+            if index in self.writing:
+                raise UploadError(409, f"Chunk {index} is already being written")
+            if self.received[index] and os.pread(self.digest_fd, DIGEST_SIZE, index * DIGEST_SIZE) != digest:
+                raise UploadError(409, f"Chunk {index} was already received with different content")
+            self.writing.add(index)
+        try:
+            view = memoryview(data)
+            offset = index * self.chunk_size
+            while view:
+                written = os.pwrite(self.fd, view, offset)
+                view = view[written:]
+                offset += written
+        except BaseException:
+            with self.lock:
+                self._done_writing(index)
+            raise
+        with self.lock:
+            self._done_writing(index)
+            os.pwrite(self.digest_fd, digest, index * DIGEST_SIZE)
+            if not self.received[index]:
+                self.received[index] = 1
+                self.count += 1
+            self.updated = time.time()
+            if index == self.hashed:
+                self.digest.update(data)
+                self.hashed += 1
+                self._advance_hash()
+
+    def _done_writing(self, index):
+        self.writing.discard(index)
+        if not self.writing:
+            self.idle.notify_all()
+
+    def _advance_hash(self, progress=None):
+        # Continue through chunks that were received out of order (read back from the page cache)
+        while self.hashed < self.chunks and self.received[self.hashed]:
+            length = self.chunk_length(self.hashed)
+            self.digest.update(os.pread(self.fd, length, self.hashed * self.chunk_size))
+            self.hashed += 1
+            if progress:
+                progress(length)
+
+    @property
+    def unhashed(self):
+        """Bytes finalize() still has to hash."""
+        return self.size - min(self.hashed * self.chunk_size, self.size)
+
+    def finalize(self, progress=None):
+        """Hash what is left (`progress(nbytes)` per chunk) and close; returns (path of the assembled file, whole-file SHA-256)."""
+        with self.lock:
+            self._advance_hash(progress)
+            sha256 = self.digest.hexdigest()
+        self.close()
+        return self.path, sha256
+
+    def to_dict(self, missing=True):
+        status = {
+            "id": self.id,
+            "filename": self.filename,
+            "kind": self.kind,
+            "size": self.size,
+            "chunk_size": self.chunk_size,
+            "chunks": self.chunks,
+            "received": self.count,
+            "bytes_received": sum(self.chunk_length(i) for i in range(self.chunks) if self.received[i]) if self.count < self.chunks else self.size,
+            "complete": self.count == self.chunks,
+            "created": self.meta["created"],
+            "updated": self.updated,
+        }
+        if missing:
+            status["missing"] = self.missing()
+        return status
+
+
+class UploadManager:
+    def __init__(self, root, ttl=SESSION_TTL):
+        self.root = root
+        self.ttl = ttl
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Pick up sessions left by a previous run so clients can resume them."""
+        if not os.path.isdir(self.root):
+            return
+        for name in os.listdir(self.root):
+            if not name.endswith(".json"):
+                continue
+            session_id = name[:-5]
+            try:
+                with open(os.path.join(self.root, name)) as f:
+                    session = UploadSession(self.root, session_id, json.load(f))
+                session.open()
+                self.sessions[session_id] = session
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Dropping unreadable upload session {session_id}: {e}")
+                self._remove_files(session_id)
+
+    def create(self, filename, size, kind, chunk_size=None):
+        chunk_size = min(max(chunk_size or DEFAULT_CHUNK_SIZE, MIN_CHUNK_SIZE), MAX_CHUNK_SIZE)
+        if size < 0:
+            raise UploadError(400, "Invalid size")
+        self.expire()
+        os.makedirs(self.root, exist_ok=True)
+        # Earlier sessions are preallocated, so free space already accounts for them
+        if shutil.disk_usage(self.root).free < size:
+            raise UploadError(507, "Not enough disk space for this upload")
+        session_id = uuid.uuid4().hex
+        meta = {"filename": filename, "kind": kind, "size": size, "chunk_size": chunk_size, "created": time.time()}
+        session = UploadSession(self.root, session_id, meta)
+        session.open(create=True)
+        with open(session.meta_path, "w") as f:
+            json.dump(meta, f)
+        with self.lock:
+            self.sessions[session_id] = session
+        return session
+
+    def get(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise UploadError(404, "Upload session not found")
+        return session
+
+    def take(self, session_id):
+        """Detach a complete session for finalising; its chunks can no longer be written."""
+        session = self.get(session_id)
+        with self.lock, session.lock:
+            if self.sessions.get(session_id) is not session:
+                raise UploadError(409, "Upload is already being finalised")
+            if session.count != session.chunks:
+                raise UploadError(409, f"{session.chunks - session.count} chunks missing")
+            if session.writing:
+                # A resent chunk is still being written; the client retries once it is acknowledged
+                raise UploadError(409, f"Chunks {sorted(session.writing)} are still being written")
+            session.state = "finalising"
+            del self.sessions[session_id]
+        for path in (session.digest_path, session.meta_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return session
+
+    def delete(self, session_id):
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+        if session is None:
+            raise UploadError(404, "Upload session not found")
+        session.close()
+        self._remove_files(session_id)
+
+    def _remove_files(self, session_id):
+        for ext in (".part", ".sha", ".json"):
+            try:
+                os.remove(os.path.join(self.root, session_id + ext))
+            except OSError:
+                pass
+
+    def expire(self):
+        cutoff = time.time() - self.ttl
+        for session_id, session in list(self.sessions.items()):
+            if session.updated < cutoff:
+                print(f"Upload session {session_id} ({session.filename}) expired")
+                self.delete(session_id)
+
+    def reset(self):
+        with self.lock:
+            sessions, self.sessions = self.sessions, {}
+        for session in sessions.values():
+            session.close()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def list(self):
+        return [s.to_dict(missing=False) for s in self.sessions.values()]
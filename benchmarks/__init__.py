@@ -0,0 +1,5 @@
+"""
+Benchmarks for the UTBK PXE Server backend.
+
+Run from the repository root, e.g. `python -m benchmarks.bench_logtail`.
+"""
@@ -0,0 +1,173 @@
+"""
+Boot-file server benchmark: many clients pull filesystem.squashfs at once.
+
+Runs the built-in server unlimited and with admission control + per-client
+rate limit, and nginx too when the `nginx` binary is installed (or
+--nginx-url is given). Reports wall time, aggregate throughput, per-client
+completion spread, Jain's fairness index of transfer rates and stalled clients (no byte for
+--stall seconds, like a live-boot fetch giving up).
+
+    python -m benchmarks.bench_bootserver [--clients 100] [--size-mb 32] [--max-streams 20]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+
+from backend.app.bootserver import BootFileServer
+
+PATH = "/pxe/filesystem.squashfs"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_port(port):
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Nothing listening on {port}")
+
+
+def run_engine(root, port, options):
+    async def main():
+        server = BootFileServer(root, host="127.0.0.1", port=port, **options)
+        await server.start()
+        await asyncio.Event().wait()
+    asyncio.run(main())
+
+
+def start_nginx(root, tmp):
+    port = free_port()
+    conf = os.path.join(tmp, "nginx.conf")
+    with open(conf, "w") as f:
+        f.write(
+            f"worker_processes 1; pid {tmp}/nginx.pid; error_log {tmp}/error.log; daemon off;\n"
+            "events { worker_connections 4096; }\n"
+            f"http {{ access_log off; sendfile on; sendfile_max_chunk 1m; client_body_temp_path {tmp};\n"
+            f"  server {{ listen 127.0.0.1:{port}; location /pxe/ {{ alias {root}/; }} }} }}\n"
+        )
+    proc = subprocess.Popen(["nginx", "-c", conf, "-p", tmp])
+    wait_port(port)
+    return proc, port
+
+
+async def download(port, stall, headers=""):
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {PATH} HTTP/1.1\r\nHost: bench\r\n{headers}Connection: close\r\n\r\n".encode())
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    first_byte = time.perf_counter() - started
+    status = int(head[9:12])
+    length = int([l for l in head.decode().split("\r\n") if l.lower().startswith("content-length")][0].split(":")[1])
+    received = 0
+    try:
+        while received < length:
+            chunk = await asyncio.wait_for(reader.read(1024 * 1024), stall)
+            if not chunk:
+                break
+            received += len(chunk)
+    except asyncio.TimeoutError:
+        pass
+    writer.close()
+    return status, received, length, time.perf_counter() - started, first_byte
+
+
+async def storm(port, clients, stall):
+    started = time.perf_counter()
+    results = await asyncio.gather(*(download(port, stall) for _ in range(clients)), return_exceptions=True)
+    return results, time.perf_counter() - started
+
+
+def report(label, results, elapsed, size):
+    done = [r for r in results if not isinstance(r, BaseException) and r[1] == r[2] == size]
+    failed = len(results) - len(done)
+    total = sum(r[1] for r in results if not isinstance(r, BaseException))
+    times = sorted(r[3] for r in done)
+    waits = sorted(r[4] for r in done)
+    # Fairness of the transfer itself; time spent queued for admission is reported separately
+    rates = [size / max(r[3] - r[4], 1e-6) for r in done]
+    jain = sum(rates) ** 2 / (len(rates) * sum(r * r for r in rates)) if rates else 0
+    print(f"\n{label}: {elapsed:.2f}s wall, {total / elapsed / 1e6:.0f} MB/s aggregate, {failed} failed/stalled")
+    if times:
+        print(f"  completion min {times[0]:.2f}s  p50 {times[len(times) // 2]:.2f}s  max {times[-1]:.2f}s  fairness (Jain) {jain:.3f}")
+        print(f"  queued before first byte p50 {waits[len(waits) // 2]:.2f}s  max {waits[-1]:.2f}s")
+
+
+def check_range(port, size):
+    async def run():
+        status, received, length, _, _ = await download(port, 10, headers=f"Range: bytes={size - 1000}-\r\n")
+        return status == 206 and received == length == 1000
+    return asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--size-mb", type=int, default=32)
+    parser.add_argument("--max-streams", type=int, default=20)
+    parser.add_argument("--client-rate-mb", type=float, default=0, help="per-client limit for the fair run (all bench clients share 127.0.0.1, so this caps them together)")
+    parser.add_argument("--stall", type=float, default=30, help="seconds without data before a client gives up")
+    parser.add_argument("--nginx-url", default=None, help="e.g. http://127.0.0.1:80 serving /pxe/ from the same file")
+    args = parser.parse_args()
+
+    size = args.size_mb * 1024 * 1024
+    with tempfile.TemporaryDirectory(dir="/dev/shm" if os.path.isdir("/dev/shm") else None) as tmp:
+        root = os.path.join(tmp, "ram")
+        os.makedirs(root)
+        with open(os.path.join(root, "filesystem.squashfs"), "wb") as f:
+            f.write(os.urandom(1024 * 1024) * args.size_mb)
+
+        runs = [
+            ("engine, unlimited", {}),
+            ("engine, admission + rate limit", {
+                "max_streams": args.max_streams,
+                "client_rate": int(args.client_rate_mb * 1024 * 1024),
+                "admission_min_size": 1,
+            }),
+        ]
+        for label, options in runs:
+            port = free_port()
+            proc = multiprocessing.Process(target=run_engine, args=(root, port, options), daemon=True)
+            proc.start()
+            try:
+                wait_port(port)
+                assert check_range(port, size), "Range request failed"
+                results, elapsed = asyncio.run(storm(port, args.clients, args.stall))
+                report(label, results, elapsed, size)
+            finally:
+                proc.terminate()
+                proc.join()
+
+        nginx_port, nginx = None, None
+        if args.nginx_url:
+            nginx_port = int(args.nginx_url.rsplit(":", 1)[1].strip("/"))
+        elif shutil.which("nginx"):
+            nginx, nginx_port = start_nginx(root, tmp)
+        if nginx_port:
+            try:
+                results, elapsed = asyncio.run(storm(nginx_port, args.clients, args.stall))
+                report("nginx", results, elapsed, size)
+            finally:
+                if nginx:
+                    nginx.terminate()
+                    nginx.wait()
+        else:
+            print("\nnginx not installed; pass --nginx-url to compare against a running nginx")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+"""
+End-to-end boot storm: virtual clients replay a full PXE boot while the dashboard polls.
+
+Every virtual client arrives after a random start jitter and then runs the
+whole boot sequence:
+
+1. DHCP: DISCOVER/OFFER/REQUEST/ACK against an in-process DhcpServer on
+   loopback. With --dhcp fake, it skips the exchange and takes a synthetic
+   address.
+2. TFTP: fetch bootx64.efi with blksize/windowsize options.
+3. GET /api/ipxe?mac=..&ip=.. (the chainloaded boot script).
+4. HTTP: fetch vmlinuz, initrd.img and filesystem.squashfs, optionally
+   capped at --client-rate MB/s per client.
+
+At the same time, --pollers dashboard pollers hit /api/stats, /api/logs,
+/api/files and /api/dhcp/* every --poll-interval seconds.
+
+By default it starts the backend itself: uvicorn on 127.0.0.1 with temp
+UPLOAD_DIR/RAM_DISK/TFTP_BOOT and synthetic components, using the built-in
+TFTP and boot-file servers. To load a running deployment instead, pass
+--api-url, --boot-url and --tftp (DHCP is then always local or fake; a
+real DHCP server needs broadcast on port 67).
+
+The report holds p50/p95/p99 boot time and per-phase times, server
+throughput, and per-endpoint API latency. It is printed as JSON, or written
+to --output. With --baseline, each metric is compared against a saved
+report. The exit status is 1 when one regressed by more than --tolerance
+percent.
+
+    python -m benchmarks.bench_bootstorm [--clients 50] [--jitter 5] [--client-rate 0] [--output report.json]
+    python -m benchmarks.bench_bootstorm --baseline report.json
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import json
+import os
+import random
+import shutil
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+from backend.app.dhcpserver import ACK, DISCOVER, OFFER, OPT_REQUESTED_IP, OPT_SERVER_ID, OPT_VENDOR_CLASS, REQUEST
+from benchmarks.bench_dhcpserver import PXE_VENDOR, Client, request_packet, start_server
+from benchmarks.bench_tftpserver import Download
+
+HOST = "127.0.0.1"
+TOKEN = "bench-storm"
+FILES = ("vmlinuz", "initrd.img", "filesystem.squashfs")
+POLLED = ("/api/stats", "/api/logs", "/api/files", "/api/dhcp/status", "/api/dhcp/summary", "/api/dhcp/leases",
+          "/api/dhcp/timeline")
+FIRST_IP = ipaddress.ip_address("10.77.0.10")
+
+
+def free_port(kind=socket.SOCK_STREAM):
+    with socket.socket(socket.AF_INET, kind) as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def percentiles(values, scale=1):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    values = sorted(values)
+
+    def pct(p):
+        return round(values[min(int(len(values) * p), len(values) - 1)] * scale, 3)
+    return {"p50": pct(0.5), "p95": pct(0.95), "p99": pct(0.99), "max": round(values[-1] * scale, 3)}
+
+
+async def http_get(url, headers=None, rate=0):
+    """(status, body bytes received); reads at most `rate` bytes/s when rate is set, discarding the body."""
+    parts = urlsplit(url)
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    target = parts.path + (f"?{parts.query}" if parts.query else "")
+    head = f"GET {target} HTTP/1.1\r\nHost: {parts.netloc}\r\nConnection: close\r\n"
+    head += "".join(f"{k}: {v}\r\n" for k, v in (headers or {}).items())
+    writer.write(f"{head}\r\n".encode())
+    await writer.drain()
+    try:
+        status_line = await reader.readuntil(b"\r\n")
+        response_head = await reader.readuntil(b"\r\n\r\n")
+        status = int(status_line.split()[1])
+        length = None
+        for line in response_head.decode("latin-1").split("\r\n"):
+            if line.lower().startswith("content-length:"):
+                length = int(line.split(":", 1)[1])
+        received = 0
+        started = time.perf_counter()
+        while length is None or received < length:
+            chunk = await reader.read(256 * 1024)
+            if not chunk:
+                break
+            received += len(chunk)
+            if rate:
+                ahead = started + received / rate - time.perf_counter()
+                if ahead > 0:
+                    await asyncio.sleep(ahead)
+        return status, received
+    finally:
+        writer.close()
+
+
+class Storm:
+    def __init__(self, args, api_url, boot_url, tftp, dhcp=None):
+        self.args = args
+        self.api_url = api_url.rstrip("/")
+        self.boot_url = boot_url.rstrip("/") + "/"
+        self.tftp = tftp
+        self.dhcp = dhcp
+        self.clients = []
+        self.api = {path: {"latencies": [], "errors": 0} for path in POLLED}
+        self.bytes = {"http": 0, "tftp": 0}
+
+    async def _dhcp(self, n, mac):
+        if self.dhcp is None:
+            return str(FIRST_IP + n)
+        client, target = self.dhcp
+        loop = asyncio.get_running_loop()
+        xid = 0x10000000 + n
+        offer = client.waiters[(xid, OFFER)] = loop.create_future()
+        client.transport.sendto(request_packet(DISCOVER, xid, mac, [(OPT_VENDOR_CLASS, PXE_VENDOR)]), target)
+        yiaddr, options = await asyncio.wait_for(offer, 10)
+        ack = client.waiters[(xid, ACK)] = loop.create_future()
+        client.transport.sendto(request_packet(REQUEST, xid, mac, [
+            (OPT_REQUESTED_IP, struct.pack("!I", yiaddr)), (OPT_SERVER_ID, options[OPT_SERVER_ID]),
+            (OPT_VENDOR_CLASS, PXE_VENDOR)]), target)
+        await asyncio.wait_for(ack, 10)
+        return str(ipaddress.ip_address(yiaddr))
+
+    async def _tftp(self):
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        options = {"blksize": str(self.args.tftp_blksize), "windowsize": str(self.args.tftp_window)}
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: Download(self.tftp, self.args.tftp_file, options, done), local_addr=(HOST, 0))
+        try:
+            received = await asyncio.wait_for(done, 60)
+        finally:
+            transport.close()
+        self.bytes["tftp"] += received
+
+    async def boot(self, n):
+        mac = struct.pack("!HI", 0x5254, 0x770000 + n)
+        mac_text = ":".join(f"{b:02x}" for b in mac)
+        result = {"phases": {}, "failed": None}
+        await asyncio.sleep(random.uniform(0, self.args.jitter))
+        started = time.perf_counter()
+        phase = "dhcp"
+        try:
+            t = time.perf_counter()
+            ip = await self._dhcp(n, mac)
+            result["phases"]["dhcp"] = time.perf_counter() - t
+
+            phase = "tftp"
+            t = time.perf_counter()
+            await self._tftp()
+            result["phases"]["tftp"] = time.perf_counter() - t
+
+            phase = "script"
+            t = time.perf_counter()
+            status, _ = await http_get(f"{self.api_url}/api/ipxe?mac={mac_text}&ip={ip}")
+            if status != 200:
+                raise RuntimeError(f"/api/ipxe returned {status}")
+            result["phases"]["script"] = time.perf_counter() - t
+
+            for name in FILES:
+                phase = name
+                t = time.perf_counter()
+                status, received = await http_get(f"{self.boot_url}{name}", rate=self.args.client_rate * 1e6)
+                if status != 200:
+                    raise RuntimeError(f"{name} returned {status}")
+                self.bytes["http"] += received
+                result["phases"][name] = time.perf_counter() - t
+            result["seconds"] = time.perf_counter() - started
+        except Exception as e:
+            result["failed"] = phase
+            print(f"  client {n} failed in {phase}: {e!r}")
+        self.clients.append(result)
+
+    async def poll(self, stop):
+        headers = {"X-Dashboard-Token": self.args.token}
+        while not stop.is_set():
+            for path in POLLED:
+                t = time.perf_counter()
+                try:
+                    status, _ = await http_get(f"{self.api_url}{path}", headers)
+                except OSError:
+                    status = 0
+                stats = self.api[path]
+                stats["latencies"].append(time.perf_counter() - t)
+                stats["errors"] += not 200 <= status < 300
+            try:
+                await asyncio.wait_for(stop.wait(), self.args.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self):
+        stop = asyncio.Event()
+        pollers = [asyncio.create_task(self.poll(stop)) for _ in range(self.args.pollers)]
+        started = time.perf_counter()
+        await asyncio.gather(*(self.boot(n) for n in range(self.args.clients)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await asyncio.gather(*pollers)
+        return self.report(elapsed)
+
+    def report(self, elapsed):
+        done = [c for c in self.clients if not c["failed"]]
+        failed = {}
+        for c in self.clients:
+            if c["failed"]:
+                failed[c["failed"]] = failed.get(c["failed"], 0) + 1
+        phases = ("dhcp", "tftp", "script") + FILES
+        return {
+            "config": {k: getattr(self.args, k) for k in ("clients", "jitter", "client_rate", "dhcp", "pollers",
+                                                          "poll_interval", "tftp_blksize", "tftp_window")},
+            "boot": {"clients": len(self.clients), "completed": len(done), "failed": failed,
+                     "seconds": percentiles([c["seconds"] for c in done])},
+            "phases": {p: percentiles([c["phases"][p] for c in self.clients if p in c["phases"]]) for p in phases},
+            "throughput": {"elapsed": round(elapsed, 3), "http_bytes": self.bytes["http"], "tftp_bytes": self.bytes["tftp"],
+                           "http_mbps": round(self.bytes["http"] / elapsed / 1e6, 2)},
+            "api": {path: {"requests": len(s["latencies"]), "errors": s["errors"], "ms": percentiles(s["latencies"], 1000)}
+                    for path, s in self.api.items()},
+        }
+
+
+def compare(report, baseline, tolerance):
+    """Print metric deltas against a baseline report; returns the names of regressed metrics."""
+    # (metric, value getter, higher is better)
+    metrics = [(f"boot {p}", lambda r, p=p: r["boot"]["seconds"][p], False) for p in ("p50", "p95", "p99")]
+    metrics.append(("http MB/s", lambda r: r["throughput"]["http_mbps"], True))
+    metrics.append(("completed", lambda r: r["boot"]["completed"], True))
+    metrics += [(f"{path} p95 ms", lambda r, path=path: r["api"][path]["ms"]["p95"], False) for path in POLLED]
+    regressed = []
+    changed = [k for k in report["config"] if baseline.get("config", {}).get(k) != report["config"][k]]
+    if changed:
+        print(f"\nnote: the baseline ran with a different {', '.join(changed)}")
+    print(f"\n{'metric':34} {'baseline':>10} {'now':>10} {'change':>8}")
+    for name, get, higher_better in metrics:
+        try:
+            old, new = get(baseline), get(report)
+        except KeyError:
+            continue
+        if old is None or new is None:
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        worse = -change if higher_better else change
+        flag = "  REGRESSION" if worse > tolerance else ""
+        if flag:
+            regressed.append(name)
+        print(f"{name:34} {old:10.3f} {new:10.3f} {change:+7.1f}%{flag}")
+    return regressed
+
+
+def start_backend(root, args):
+    """Run the backend under uvicorn with synthetic components; returns (process, api_url, boot_url, tftp)."""
+    for d in ("uploads", "ram", "tftp", "app/scripts"):
+        os.makedirs(os.path.join(root, d), exist_ok=True)
+    sizes = {"vmlinuz": args.kernel_mb, "initrd.img": args.initrd_mb, "filesystem.squashfs": args.squashfs_mb}
+    for name, mb in sizes.items():
+        with open(os.path.join(root, "uploads", name), "wb") as f:
+            for _ in range(mb):
+                f.write(os.urandom(1024 * 1024))
+    with open(os.path.join(root, "tftp", args.tftp_file), "wb") as f:
+        f.write(os.urandom(args.efi_kb * 1024))
+    open(os.path.join(root, "access.log"), "w").close()
+
+    api_port, boot_port, tftp_port = free_port(), free_port(), free_port(socket.SOCK_DGRAM)
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, UPLOAD_DIR=f"{root}/uploads", RAM_DISK=f"{root}/ram", TFTP_BOOT=f"{root}/tftp",
+               APP_DIR=f"{root}/app", ACCESS_LOG=f"{root}/access.log", FRONTEND_DIR=os.path.join(repo, "frontend"),
+               DOCKER_SOCKET=f"{root}/no-docker.sock", APP_PASSWORD=args.token,
+               BOOT_SERVER_PORT=str(boot_port), TFTP_SERVER_PORT=str(tftp_port))
+    log = open(os.path.join(root, "backend.log"), "w")
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "backend.app.main:app", "--host", HOST,
+                             "--port", str(api_port), "--log-level", "warning"],
+                            cwd=repo, env=env, stdout=log, stderr=subprocess.STDOUT)
+    boot_url = f"http://{HOST}:{boot_port}/pxe/"
+    deadline = time.time() + 120
+    while time.time() < deadline and proc.poll() is None:
+        try:
+            status, _ = asyncio.run(http_get(f"{boot_url}{FILES[-1]}", {"Range": "bytes=0-0"}))
+            if status in (200, 206):
+                return proc, f"http://{HOST}:{api_port}", boot_url, (HOST, tftp_port)
+        except OSError:
+            pass
+        time.sleep(0.2)
+    proc.kill()
+    log.close()
+    with open(os.path.join(root, "backend.log")) as f:
+        print(f.read()[-4000:])
+    raise SystemExit("backend did not come up")
+
+
+async def storm(args, api_url, boot_url, tftp):
+    dhcp = server = None
+    if args.dhcp == "local":
+        port, client_port = free_port(socket.SOCK_DGRAM), free_port(socket.SOCK_DGRAM)
+        server = await start_server("full", port, client_port, str(FIRST_IP), str(FIRST_IP + args.clients + 10))
+        transport, client = await asyncio.get_running_loop().create_datagram_endpoint(Client, local_addr=(HOST, client_port))
+        dhcp = (client, (HOST, port))
+    try:
+        return await Storm(args, api_url, boot_url, tftp, dhcp).run()
+    finally:
+        if server:
+            transport.close()
+            await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--jitter", type=float, default=5, help="clients start within this many seconds")
+    parser.add_argument("--client-rate", type=float, default=0, help="per-client HTTP cap in MB/s (0 = unlimited)")
+    parser.add_argument("--dhcp", choices=("local", "fake"), default="local")
+    parser.add_argument("--tftp-file", default="bootx64.efi")
+    parser.add_argument("--tftp-blksize", type=int, default=1468)
+    parser.add_argument("--tftp-window", type=int, default=8)
+    parser.add_argument("--pollers", type=int, default=1)
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--kernel-mb", type=int, default=8)
+    parser.add_argument("--initrd-mb", type=int, default=16)
+    parser.add_argument("--squashfs-mb", type=int, default=64)
+    parser.add_argument("--efi-kb", type=int, default=1024)
+    parser.add_argument("--api-url", help="running backend, e.g. http://10.0.0.1:8000 (default: start one)")
+    parser.add_argument("--boot-url", help="its /pxe/ base, e.g. http://10.0.0.1/pxe/")
+    parser.add_argument("--tftp", help="its TFTP server as host:port")
+    parser.add_argument("--token", default=os.getenv("APP_PASSWORD", TOKEN))
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="compare against this saved report")
+    parser.add_argument("--tolerance", type=float, default=10, help="allowed regression in percent")
+    args = parser.parse_args()
+
+    root = proc = None
+    if args.api_url:
+        if not (args.boot_url and args.tftp):
+            parser.error("--api-url needs --boot-url and --tftp")
+        host, port = args.tftp.rsplit(":", 1)
+        api_url, boot_url, tftp = args.api_url, args.boot_url, (host, int(port))
+    else:
+        root = tempfile.mkdtemp(prefix="bootstorm-")
+        proc, api_url, boot_url, tftp = start_backend(root, args)
+    try:
+        report = asyncio.run(storm(args, api_url, boot_url, tftp))
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait(10)
+        if root:
+            shutil.rmtree(root, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+        boot, throughput = report["boot"], report["throughput"]
+        print(f"{boot['completed']}/{boot['clients']} clients booted, p50 {boot['seconds']['p50']}s  p99 {boot['seconds']['p99']}s  "
+              f"{throughput['http_mbps']} MB/s over {throughput['elapsed']}s -> {args.output}")
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressed = compare(report, json.load(f), args.tolerance)
+        if regressed:
+            print(f"\n{len(regressed)} metric(s) regressed by more than {args.tolerance}%: {', '.join(regressed)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
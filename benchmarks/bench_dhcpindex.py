@@ -0,0 +1,119 @@
+"""
+DHCP index ingestion and query benchmark.
+
+Generates dnsmasq `log-dhcp` output for a lab booting at once: per client a
+DISCOVER/OFFER/REQUEST/ACK handshake with PXEClient vendor class, then (for
+most clients) a second iPXE handshake, plus NAKs, "no address available"
+and unrelated noise lines. Measures:
+
+1. Parse + index throughput in events/s (target: >= 10k/s).
+2. Query latency for summary(), filtered list_clients() pages and
+   recent_events() with the index fully loaded.
+
+    python -m benchmarks.bench_dhcpindex [--clients 20000] [--queries 200]
+"""
+
+import argparse
+import random
+import time
+
+from backend.app.dhcpindex import DhcpIndex, parse_dhcp_event
+
+TARGET = 10_000
+
+
+def mac(n):
+    return f"52:54:00:{(n >> 16) & 255:02x}:{(n >> 8) & 255:02x}:{n & 255:02x}"
+
+
+def ip(n):
+    return f"10.{(n >> 16) & 255}.{(n >> 8) & 255}.{n & 255 or 1}"
+
+
+def handshake(n, xid, vendor, user=None):
+    prefix = "dnsmasq-dhcp[1]:"
+    lines = [
+        f"{prefix} {xid} available DHCP range: 10.0.0.1 -- 10.255.255.254",
+        f"{prefix} {xid} vendor class: {vendor}",
+    ]
+    if user:
+        lines.append(f"{prefix} {xid} user class: {user}")
+    lines += [
+        f"{prefix} {xid} DHCPDISCOVER(eth0) {mac(n)}",
+        f"{prefix} {xid} tags: eth0",
+        f"{prefix} {xid} DHCPOFFER(eth0) {ip(n)} {mac(n)}",
+        f"{prefix} {xid} DHCPREQUEST(eth0) {ip(n)} {mac(n)}",
+        f"{prefix} {xid} DHCPACK(eth0) {ip(n)} {mac(n)} pc-{n}",
+        f"{prefix} {xid} sent size:  1 option: 53 message-type  5",
+    ]
+    return lines
+
+
+def generate(clients, seed=1):
+    rng = random.Random(seed)
+    lines = []
+    xid = 1000
+    for n in range(clients):
+        xid += 1
+        lines += handshake(n, xid, "PXEClient:Arch:00007:UNDI:003016")
+        if rng.random() < 0.9:
+            xid += 1
+            lines += handshake(n, xid, "PXEClient:Arch:00007:UNDI:003016", "iPXE")
+        if rng.random() < 0.02:
+            lines.append(f"dnsmasq-dhcp[1]: {xid} DHCPNAK(eth0) {ip(n + 1)} {mac(n)} wrong address")
+        if rng.random() < 0.01:
+            lines.append(f"dnsmasq-dhcp[1]: {xid} DHCPDISCOVER(eth0) {mac(n)} no address available")
+    return lines
+
+
+def timed(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    lines = generate(args.clients)
+    index = DhcpIndex()
+    index.set_range("10.0.0.1", "10.0.255.254")
+
+    # Feed in container-sized batches, as the log follow delivers them
+    started = time.perf_counter()
+    events = 0
+    ts = time.time()
+    for i in range(0, len(lines), 500):
+        batch = [e for e in (parse_dhcp_event(line, ts + i / 1e5) for line in lines[i:i + 500]) if e]
+        index.ingest(batch)
+        events += len(batch)
+    elapsed = time.perf_counter() - started
+
+    rate = events / elapsed
+    print(f"\nIngest: {len(lines)} lines, {events} events in {elapsed:.2f}s")
+    print(f"  {len(lines) / elapsed:10.0f} lines/s")
+    print(f"  {rate:10.0f} events/s  ({'OK' if rate >= TARGET else 'BELOW'} target {TARGET})")
+
+    summary = index.summary()
+    print(f"\nIndex: {summary['clients']} clients, {summary['leases']} leases, pool {summary['pool']['utilisation']:.4f} used, "
+          f"{summary['never_chained']} never chained, totals {summary['totals']}")
+
+    print(f"\nQueries ({args.queries} each):")
+    queries = {
+        "summary()": lambda: index.summary(),
+        "list_clients(limit=100)": lambda: index.list_clients(limit=100),
+        "list_clients(never_chained)": lambda: index.list_clients(never_chained=True, limit=100),
+        "list_clients(subnet, offset=50)": lambda: index.list_clients(subnet="10.0.1.0", offset=50, limit=100),
+        "recent_events(DHCPNAK)": lambda: index.recent_events(type="DHCPNAK", limit=100),
+        "client(ip)": lambda: index.client(ip(args.clients // 2)),
+    }
+    for name, fn in queries.items():
+        print(f"  {name:34} {timed(fn, args.queries) * 1000:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
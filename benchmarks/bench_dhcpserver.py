@@ -0,0 +1,148 @@
+"""
+In-process DHCP server benchmark on loopback with a synthetic DHCP client.
+
+The server binds 127.0.0.1 on unprivileged ports and "broadcasts" replies to
+127.0.0.1, so no root or real network is needed (the client is
+tests/dhcp_client.py). Measures:
+
+1. Full mode: DISCOVER bursts at a paced rate (default 1000/s) and unpaced,
+   with reply counts and OFFER latency percentiles; then complete
+   DISCOVER/OFFER/REQUEST/ACK handshakes.
+2. Hot reload: configure() with a new boot file and a wider range in the
+   middle of a burst. Every DISCOVER must still get an OFFER.
+3. ProxyDHCP mode: PXE DISCOVERs answered with options 66/67 only, and
+   non-PXE DISCOVERs ignored.
+
+    python -m benchmarks.bench_dhcpserver [--clients 5000] [--rate 1000]
+"""
+
+import argparse
+import asyncio
+import random
+import struct
+import time
+
+from backend.app.dhcpserver import (
+    ACK, DISCOVER, OFFER, OPT_BOOT_FILE, OPT_REQUESTED_IP, OPT_SERVER_ID, OPT_VENDOR_CLASS, REQUEST, DhcpServer,
+)
+from tests.dhcp_client import PXE_VENDOR, SERVER_IP, free_port, open_client, request_packet
+
+
+async def settle(client, expected, timeout=5):
+    deadline = time.perf_counter() + timeout
+    while len(client.replies) < expected and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+
+
+async def burst(client, target, count, rate, first_xid, vendor=PXE_VENDOR, during=None):
+    client.replies.clear()
+    sent = {}
+    started = time.perf_counter()
+    for i in range(count):
+        xid = first_xid + i
+        mac = struct.pack("!HI", 0x5254, xid)
+        options = [(OPT_VENDOR_CLASS, vendor)] if vendor else []
+        sent[xid] = time.perf_counter()
+        client.transport.sendto(request_packet(DISCOVER, xid, mac, options), target)
+        if during and i == count // 2:
+            during()
+        if rate:
+            delay = started + (i + 1) / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elif i % 64 == 63:
+            await asyncio.sleep(0)
+    await settle(client, count)
+    elapsed = time.perf_counter() - started
+    latencies = sorted((client.replies[(xid, OFFER)][0] - ts) * 1000 for xid, ts in sent.items() if (xid, OFFER) in client.replies)
+    return elapsed, latencies
+
+
+def report(label, count, elapsed, latencies):
+    def pct(p):
+        return latencies[min(int(len(latencies) * p), len(latencies) - 1)] if latencies else float("nan")
+    print(f"  {label:34} {len(latencies):6}/{count} offers in {elapsed:6.2f}s  p50 {pct(0.5):6.2f} ms  p99 {pct(0.99):6.2f} ms")
+
+
+async def handshakes(client, target, count, first_xid):
+    started = time.perf_counter()
+    acked = 0
+    loop = asyncio.get_running_loop()
+    for i in range(count):
+        xid = first_xid + i
+        mac = struct.pack("!HI", 0x5254, xid)
+        offer = client.waiters[(xid, OFFER)] = loop.create_future()
+        client.transport.sendto(request_packet(DISCOVER, xid, mac, [(OPT_VENDOR_CLASS, PXE_VENDOR)]), target)
+        yiaddr, options = await asyncio.wait_for(offer, 2)
+        ack = client.waiters[(xid, ACK)] = loop.create_future()
+        client.transport.sendto(request_packet(REQUEST, xid, mac, [
+            (OPT_REQUESTED_IP, struct.pack("!I", yiaddr)), (OPT_SERVER_ID, options[OPT_SERVER_ID]), (OPT_VENDOR_CLASS, PXE_VENDOR)]), target)
+        await asyncio.wait_for(ack, 2)
+        acked += 1
+    return acked, time.perf_counter() - started
+
+
+async def start_server(mode, port, client_port, start_ip, end_ip):
+    server = DhcpServer(mode, host=SERVER_IP, port=port, proxy_port=0, client_port=client_port, broadcast=SERVER_IP, offer_time=30)
+    server.configure(SERVER_IP, start_ip, end_ip)
+    await server.start()
+    return server
+
+
+async def run(args):
+    port = free_port()
+    _, client, client_port = await open_client()
+    target = (SERVER_IP, port)
+    xid = random.randrange(1 << 24)
+
+    print(f"\nFull mode ({args.clients} clients per burst):")
+    server = await start_server("full", port, client_port, "10.0.0.1", "10.0.255.254")
+    elapsed, latencies = await burst(client, target, args.clients, args.rate, xid)
+    report(f"DISCOVER at {args.rate}/s", args.clients, elapsed, latencies)
+    xid += args.clients
+    elapsed, latencies = await burst(client, target, args.clients, 0, xid)
+    report("DISCOVER unpaced", args.clients, elapsed, latencies)
+    xid += args.clients
+    count = min(args.clients, 2000)
+    acked, elapsed = await handshakes(client, target, count, xid)
+    xid += count
+    print(f"  {'sequential handshakes':34} {acked:6}/{count} ACKed in {elapsed:6.2f}s  ({acked / elapsed:.0f}/s)")
+
+    print("\nHot reload during a burst:")
+    started = []
+
+    def reload():
+        t = time.perf_counter()
+        server.configure(SERVER_IP, "10.0.0.1", "10.1.255.254", boot_file="ipxe.efi")
+        started.append(time.perf_counter() - t)
+    elapsed, latencies = await burst(client, target, args.clients, args.rate, xid, during=reload)
+    xid += args.clients
+    report("DISCOVER with configure() midway", args.clients, elapsed, latencies)
+    files = {client.replies[k][2][OPT_BOOT_FILE] for k in client.replies}
+    print(f"  configure() took {started[0] * 1000:.2f} ms, boot files served {sorted(f.decode() for f in files)}, "
+          f"leases kept {sum(1 for l in server.leases.values() if l.bound)}")
+    await server.stop()
+
+    print("\nProxyDHCP mode:")
+    server = await start_server("proxy", port, client_port, None, None)
+    elapsed, latencies = await burst(client, target, args.clients, args.rate, xid)
+    xid += args.clients
+    report(f"PXE DISCOVER at {args.rate}/s", args.clients, elapsed, latencies)
+    sample = next(iter(client.replies.values()), None)
+    if sample:
+        print(f"  OFFER yiaddr {sample[1]}, option 67 {sample[2][OPT_BOOT_FILE].decode()}, options {sorted(sample[2])}")
+    elapsed, latencies = await burst(client, target, 500, 0, xid, vendor=None)
+    print(f"  {'non-PXE DISCOVER':34} {len(latencies):6}/500 answered (expected 0)")
+    await server.stop()
+    client.transport.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=5000)
+    parser.add_argument("--rate", type=int, default=1000)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Docker Engine API client benchmark against a fake engine on a UNIX socket.
+
+The fake engine (tests/fake_docker.py) implements the calls main.py makes for
+pxe-dhcp (inspect, start/stop/restart, events stream, followed multiplexed
+logs). Measures:
+
+1. Status lookups: pooled keep-alive client vs a new connection per request
+   vs forking the `docker` CLI (only when installed; pointed at the fake
+   engine through DOCKER_HOST).
+2. ContainerMonitor: time for a stop/start to show up in the cached state,
+   and log lines delivered to listeners without duplicates across a restart.
+
+    python -m benchmarks.bench_dockerapi [--requests 2000] [--log-lines 20000]
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from backend.app.dockerapi import ContainerMonitor, DockerClient
+from tests.fake_docker import NAME, FakeEngine
+
+
+async def raw_request(path):
+    reader, writer = await asyncio.open_unix_connection(path)
+    writer.write(f"GET /v1.41/containers/{NAME}/json HTTP/1.1\r\nHost: docker\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    await reader.read()
+    writer.close()
+
+
+async def bench_requests(engine, sock, count):
+    client = DockerClient(sock)
+    started = time.perf_counter()
+    for _ in range(count):
+        await client.inspect(NAME)
+    pooled = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(count):
+        await raw_request(sock)
+    fresh = time.perf_counter() - started
+    print(f"\nStatus lookups ({count}):")
+    print(f"  pooled keep-alive client   {pooled / count * 1e6:8.0f} us/request")
+    print(f"  connection per request     {fresh / count * 1e6:8.0f} us/request")
+    if shutil.which("docker"):
+        env = {**os.environ, "DOCKER_HOST": f"unix://{sock}"}
+        n = min(count, 50)
+        started = time.perf_counter()
+        for _ in range(n):
+            await asyncio.to_thread(subprocess.run, ["docker", "inspect", "-f", "{{.State.Status}}", NAME], capture_output=True, env=env)
+        print(f"  docker CLI subprocess      {(time.perf_counter() - started) / n * 1e6:8.0f} us/request")
+    else:
+        print("  docker CLI not installed; subprocess comparison skipped")
+    await client.close()
+
+
+async def bench_monitor(engine, sock, log_lines):
+    client = DockerClient(sock)
+    monitor = ContainerMonitor(client, NAME, maxlen=log_lines * 2)
+    received = []
+    monitor.add_listener(lambda lines, stamps: received.extend(lines))
+    monitor.start()
+    while monitor.state != "running":
+        await asyncio.sleep(0.01)
+
+    timings = []
+    for action, expected in (("stop", "exited"), ("start", "running")):
+        started = time.perf_counter()
+        await engine.emit(action)
+        while monitor.state != expected:
+            await asyncio.sleep(0.0005)
+        timings.append((action, time.perf_counter() - started))
+        await asyncio.sleep(0.05)
+
+    half = log_lines // 2
+    started = time.perf_counter()
+    for i in range(0, half, 1000):
+        await engine.log([f"dnsmasq-dhcp[1]: DHCPACK(eth0) 10.0.{(n >> 8) & 255}.{n & 255} aa:bb:cc:00:{(n >> 8) & 255:02x}:{n & 255:02x}" for n in range(i, min(i + 1000, half))])
+    await asyncio.sleep(0.2)
+    await engine.emit("stop")
+    await asyncio.sleep(0.05)
+    await engine.emit("start")
+    await asyncio.sleep(0.05)
+    await engine.log([f"line {n}" for n in range(half, log_lines)])
+    while len(received) < log_lines and time.perf_counter() - started < 30:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    monitor.stop()
+
+    print("\nContainerMonitor:")
+    for action, seconds in timings:
+        print(f"  {action:5} visible in cached state after {seconds * 1000:.1f} ms")
+    print(f"  {len(received)}/{log_lines} log lines delivered in {elapsed:.2f}s across a restart, {len(received) - len(set(received))} duplicates")
+
+
+async def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        sock = os.path.join(tmp, "docker.sock")
+        engine = FakeEngine(sock)
+        await engine.start()
+        await bench_requests(engine, sock, args.requests)
+        await bench_monitor(engine, sock, args.log_lines)
+        await engine.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--log-lines", type=int, default=20000)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Instrumentation overhead: spans (disabled vs enabled), hotpaths() and profiler samples.
+
+Times an empty `with span(...)` block and `run(["true"])` with the tracer
+off and on. It then times `hotpaths()` over a full span ring. Last, it
+runs the sampling profiler against busy worker threads and reports how much
+it slowed them down.
+
+    python -m benchmarks.bench_instrument [--spans 1000000] [--threads 8]
+"""
+
+import argparse
+import threading
+import time
+
+from backend.app.instrument import SamplingProfiler, Tracer, run, span, tracer
+
+
+def per_call(fn, count):
+    started = time.perf_counter()
+    for _ in range(count):
+        fn()
+    return (time.perf_counter() - started) / count
+
+
+def empty_span():
+    with span("psutil", "virtual_memory"):
+        pass
+
+
+def busy(stop, counts, i):
+    def leaf(n):
+        return sum(range(n))
+
+    while not stop.is_set():
+        leaf(200)
+        counts[i] += 1
+
+
+def work_rate(threads, seconds, profiler=None):
+    stop, counts = threading.Event(), [0] * threads
+    workers = [threading.Thread(target=busy, args=(stop, counts, i)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    if profiler:
+        profiler.start(interval=0.01)
+    time.sleep(seconds)
+    stop.set()
+    for t in workers:
+        t.join()
+    collapsed = profiler.stop() if profiler else None
+    return sum(counts) / seconds, collapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--spans", type=int, default=1000000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=3)
+    args = parser.parse_args()
+
+    print("\nper call:")
+    for enabled in (False, True):
+        tracer.enabled = enabled
+        label = "enabled" if enabled else "disabled"
+        print(f"  {'span, ' + label:28} {per_call(empty_span, args.spans) * 1e9:8.0f} ns")
+        print(f"  {'run(true), ' + label:28} {per_call(lambda: run(['true']), 200) * 1e6:8.0f} us")
+    tracer.enabled = False
+
+    full = Tracer(enabled=True)
+    for i in range(full.spans.maxlen):
+        full.record("request", f"GET /api/route{i % 40}", 0.001 * (i % 97), status=200)
+    started = time.perf_counter()
+    summary = full.hotpaths(minutes=15)
+    print(f"  {'hotpaths(), ' + str(summary['spans']) + ' spans':28} {(time.perf_counter() - started) * 1000:8.1f} ms")
+
+    base, _ = work_rate(args.threads, args.seconds)
+    profiled, collapsed = work_rate(args.threads, args.seconds, SamplingProfiler())
+    print(f"\n{args.threads} busy threads: {base:,.0f} iterations/s, {profiled:,.0f} with the profiler at 100 Hz "
+          f"({100 * (1 - profiled / base):.1f}% slower), {len(collapsed.splitlines())} distinct stacks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Dynamic iPXE routing benchmark.
+
+1. Rule lookup: compiled MAC map + per-prefix CIDR tables vs a linear scan.
+2. Boot storm: N clients fetch /api/ipxe at once (one connection each, like
+   iPXE). Starts the API with uvicorn on temporary directories unless --url
+   points at a running server.
+
+    python -m benchmarks.bench_ipxe [--rules 5000] [--clients 1000] [--url http://10.0.0.1/api/ipxe]
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+from backend.app.routing import BootRouter, normalize_mac
+
+
+def random_mac():
+    return ":".join(f"{random.randint(0, 255):02x}" for _ in range(6))
+
+
+def make_rules(count):
+    rules = []
+    for i in range(count):
+        if i % 2:
+            rules.append({"match": random_mac(), "kernel_args": f"quiet lab={i}"})
+        else:
+            length = random.choice([16, 20, 24, 28])
+            network = ipaddress.IPv4Network((random.randint(0, 2**32 - 1), length), strict=False)
+            rules.append({"match": str(network), "server": f"10.0.0.{i % 250 + 1}"})
+    return {"default": {}, "rules": rules}
+
+
+def linear_resolve(rules, mac, ip):
+    params = {}
+    address = ipaddress.IPv4Address(ip)
+    best = -1
+    for rule in rules["rules"]:
+        if "/" in rule["match"]:
+            network = ipaddress.IPv4Network(rule["match"], strict=False)
+            if address in network and network.prefixlen > best:
+                best = network.prefixlen
+                params = {**rule}
+    for rule in rules["rules"]:
+        if normalize_mac(rule["match"]) == normalize_mac(mac):
+            params = {**params, **rule}
+    return params
+
+
+def bench_lookup(count, lookups):
+    rules = make_rules(count)
+    with tempfile.TemporaryDirectory() as tmp:
+        router = BootRouter(os.path.join(tmp, "boot_rules.json"))
+        started = time.perf_counter()
+        router.save(rules)
+        compile_time = time.perf_counter() - started
+    # Half the clients have a MAC rule, the rest only hit (or miss) the CIDR table
+    known = [r["match"] for r in rules["rules"] if "/" not in r["match"]]
+    queries = [
+        (random.choice(known) if i % 2 else random_mac(), str(ipaddress.IPv4Address(random.randint(0, 2**32 - 1))))
+        for i in range(lookups)
+    ]
+
+    started = time.perf_counter()
+    for mac, ip in queries:
+        router.script(mac, ip)
+    indexed = time.perf_counter() - started
+
+    sample = queries[:max(lookups // 2000, 10)]
+    started = time.perf_counter()
+    for mac, ip in sample:
+        linear_resolve(rules, mac, ip)
+    linear = (time.perf_counter() - started) / len(sample) * len(queries)
+
+    print(f"Rule lookup, {count} rules, {lookups} lookups (compile {compile_time * 1000:.1f} ms)")
+    print(f"  linear scan   {linear:8.3f}s  {lookups / linear:12.0f} lookups/s (extrapolated)")
+    print(f"  indexed+cache {indexed:8.3f}s  {lookups / indexed:12.0f} lookups/s")
+
+
+async def fetch(host, port, path):
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: iPXE/1.21.1\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    status = response[9:12].decode()
+    return status, time.perf_counter() - started
+
+
+async def storm(url, clients):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    paths = [f"{parts.path}?mac={random_mac()}&ip=10.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}" for _ in range(clients)]
+    started = time.perf_counter()
+    results = await asyncio.gather(*(fetch(host, port, p) for p in paths), return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    ok = sorted(r[1] for r in results if not isinstance(r, BaseException) and r[0] == "200")
+    failed = len(results) - len(ok)
+    print(f"Boot storm: {clients} clients in {elapsed:.2f}s ({clients / elapsed:.0f} req/s), {failed} failed")
+    if ok:
+        pick = lambda q: ok[min(int(len(ok) * q), len(ok) - 1)] * 1000
+        print(f"  latency p50 {pick(0.5):.1f} ms  p95 {pick(0.95):.1f} ms  p99 {pick(0.99):.1f} ms  max {ok[-1] * 1000:.1f} ms")
+
+
+def start_server(tmp, rules):
+    env = dict(os.environ)
+    for name in ("uploads", "ram", "tftp", "app"):
+        os.makedirs(os.path.join(tmp, name))
+    env.update(
+        UPLOAD_DIR=os.path.join(tmp, "uploads"), RAM_DISK=os.path.join(tmp, "ram"),
+        TFTP_BOOT=os.path.join(tmp, "tftp"), APP_DIR=os.path.join(tmp, "app"),
+        ACCESS_LOG=os.path.join(tmp, "access.log"), TFTP_LOG=os.path.join(tmp, "messages"),
+        FRONTEND_DIR=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "frontend"),
+    )
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    BootRouter(os.path.join(tmp, "uploads", "boot_rules.json")).save(rules)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--backlog", "4096"],
+        env=env,
+    )
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+    return proc, f"http://127.0.0.1:{port}/api/ipxe"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rules", type=int, default=5000)
+    parser.add_argument("--lookups", type=int, default=200000)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--url", default=None, help="existing /api/ipxe endpoint to load")
+    args = parser.parse_args()
+
+    bench_lookup(args.rules, args.lookups)
+
+    if args.url:
+        asyncio.run(storm(args.url, args.clients))
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        proc, url = start_server(tmp, make_rules(args.rules))
+        try:
+            asyncio.run(storm(url, args.clients))
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+ISO ingestion benchmark on a synthetic ISO built on the fly.
+
+Compares the legacy path (full extraction, then copy2 into UPLOAD_DIR and
+again into RAM_DISK) with the streaming pipeline (hash while writing, extract
+only the boot members straight into place).
+
+    python -m benchmarks.bench_isoingest [--squashfs-mb 256] [--filler-mb 256]
+
+The legacy path uses `7z x` when 7z is installed; otherwise a full extraction
+of every ISO member is emulated with the same ISO9660 reader.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from backend.app.isoingest import IsoImage, StageTimer, copy_extent, extract_boot_files, save_stream
+from benchmarks.isobuild import boot_iso_layout, build_iso
+
+COMPONENTS = ["vmlinuz", "initrd.img", "filesystem.squashfs"]
+
+
+def file_chunks(path, size=4 * 1024 * 1024):
+    async def gen():
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(size)
+                if not chunk:
+                    break
+                yield chunk
+    return gen()
+
+
+def legacy_upload(src, dest):
+    start = time.perf_counter()
+    with open(src, "rb") as fsrc, open(dest, "wb") as fdst:
+        shutil.copyfileobj(fsrc, fdst)
+    return time.perf_counter() - start
+
+
+def legacy_extract(iso_path, extract_path):
+    if shutil.which("7z"):
+        subprocess.run(["7z", "x", iso_path, f"-o{extract_path}", "-y"], check=True, capture_output=True)
+        return
+    with IsoImage(iso_path) as iso:
+        for entry in iso.walk():
+            target = os.path.join(extract_path, entry.path)
+            if entry.is_dir:
+                os.makedirs(target, exist_ok=True)
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            fd = os.open(target, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                offset = 0
+                for src_offset, length in entry.extents:
+                    copy_extent(iso.fd, fd, src_offset, length, offset)
+                    offset += length
+            finally:
+                os.close(fd)
+
+
+def run_legacy(src_iso, upload_dir, ram_dir):
+    timer = StageTimer()
+    iso_path = os.path.join(upload_dir, "uploaded.iso")
+    timer.record("upload", os.path.getsize(src_iso), legacy_upload(src_iso, iso_path))
+
+    extract_path = os.path.join(upload_dir, "iso_extract")
+    start = time.perf_counter()
+    legacy_extract(iso_path, extract_path)
+    sources = {
+        "vmlinuz": os.path.join(extract_path, "live", "vmlinuz"),
+        "initrd.img": os.path.join(extract_path, "live", "initrd.img"),
+        "filesystem.squashfs": os.path.join(extract_path, "live", "filesystem.squashfs"),
+    }
+    for name, src in sources.items():
+        shutil.copy2(src, os.path.join(upload_dir, name))
+    extracted = sum(os.path.getsize(os.path.join(upload_dir, n)) for n in COMPONENTS)
+    timer.record("extract", extracted, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for name in COMPONENTS:
+        shutil.copy2(os.path.join(upload_dir, name), os.path.join(ram_dir, name))
+    timer.record("deploy", extracted, time.perf_counter() - start)
+    # The old path never hashed the upload; hash afterwards for a fair comparison
+    start = time.perf_counter()
+    digest = hashlib.sha256()
+    with open(iso_path, "rb") as f:
+        for chunk in iter(lambda: f.read(4 * 1024 * 1024), b""):
+            digest.update(chunk)
+    timer.record("hash", os.path.getsize(iso_path), time.perf_counter() - start)
+    return timer
+
+
+def run_pipeline(src_iso, upload_dir, ram_dir):
+    timer = StageTimer()
+    iso_path = os.path.join(upload_dir, "uploaded.iso")
+    start = time.perf_counter()
+    size, _ = asyncio.run(save_stream(file_chunks(src_iso), iso_path))
+    timer.record("upload+hash", size, time.perf_counter() - start)
+    result = extract_boot_files(iso_path, upload_dir, timer)
+    assert all(result["found"].values()), result
+    start = time.perf_counter()
+    deployed = 0
+    for name in COMPONENTS:
+        shutil.copy2(os.path.join(upload_dir, name), os.path.join(ram_dir, name))
+        deployed += os.path.getsize(os.path.join(ram_dir, name))
+    timer.record("deploy", deployed, time.perf_counter() - start)
+    return timer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--squashfs-mb", type=int, default=256)
+    parser.add_argument("--filler-mb", type=int, default=256)
+    parser.add_argument("--workdir", default=None, help="directory for the synthetic ISO and outputs")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.workdir) as tmp:
+        src_iso = os.path.join(tmp, "synthetic.iso")
+        size = build_iso(src_iso, boot_iso_layout(args.squashfs_mb, args.filler_mb))
+        print(f"Synthetic ISO: {size / 1e6:.0f} MB")
+
+        results = {}
+        for label, runner in (("legacy", run_legacy), ("pipeline", run_pipeline)):
+            upload_dir = os.path.join(tmp, label, "uploads")
+            ram_dir = os.path.join(tmp, label, "ram")
+            os.makedirs(upload_dir)
+            os.makedirs(ram_dir)
+            start = time.perf_counter()
+            timer = runner(src_iso, upload_dir, ram_dir)
+            results[label] = (time.perf_counter() - start, timer.report())
+            shutil.rmtree(os.path.join(tmp, label))
+
+        for label, (total, stages) in results.items():
+            print(f"\n{label}: {total:.2f}s total")
+            for name, stage in stages.items():
+                print(f"  {name:<12} {stage['bytes'] / 1e6:>9.1f} MB {stage['seconds']:>8.3f}s {stage['mb_per_s'] or 0:>9.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Compare /api/stats + /api/logs latency: per-request `tail` subprocess vs the
+incremental LogFollower ring.
+
+    python -m benchmarks.bench_logtail [--sizes 10000 100000 1000000] [--requests 200]
+"""
+
+import argparse
+import os
+import random
+import re
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from backend.app.logtail import LogFollower, parse_access_line
+
+PATHS = ["/pxe/vmlinuz", "/pxe/initrd.img", "/pxe/filesystem.squashfs", "/api/stats", "/api/logs", "/logo.png"]
+NOISE = ("/api/", "/favicon.ico", "/nginx_status", "/logo.png")
+
+
+def write_log(path, lines):
+    now = datetime.now().astimezone()
+    start = now - timedelta(seconds=lines // 50)
+    with open(path, "w") as f:
+        for i in range(lines):
+            stamp = (start + timedelta(seconds=i // 50)).strftime("%d/%b/%Y:%H:%M:%S %z")
+            ip = f"10.0.{random.randint(0, 3)}.{random.randint(1, 254)}"
+            f.write(f'{ip} - - [{stamp}] "GET {random.choice(PATHS)} HTTP/1.1" 200 {random.randint(100, 10**8)} "-" "iPXE/1.21.1+"\n')
+
+
+def legacy_stats(log_file):
+    result = subprocess.run(["tail", "-n", "200", log_file], capture_output=True, text=True)
+    threshold = datetime.now() - timedelta(seconds=120)
+    unique_ips = set()
+    for line in result.stdout.splitlines():
+        if "/pxe/" in line:
+            match = re.search(r'(\d+\.\d+\.\d+\.\d+) .*? \[(.*?)\]', line)
+            if match:
+                try:
+                    if datetime.strptime(match.group(2).split(' ')[0], "%d/%b/%Y:%H:%M:%S") > threshold:
+                        unique_ips.add(match.group(1))
+                except ValueError:
+                    continue
+    return len(unique_ips)
+
+
+def legacy_logs(log_file):
+    result = subprocess.run(["tail", "-n", "100", log_file], capture_output=True, text=True)
+    pattern = re.compile(r'(?P<ip>\d+\.\d+\.\d+\.\d+) .*? \[(?P<time>.*?)\] "(?P<method>\w+) (?P<path>.*?) HTTP/.*?" (?P<status>\d+) (?P<size>\d+)')
+    parsed = []
+    for line in result.stdout.splitlines():
+        if any(x in line for x in NOISE):
+            continue
+        match = pattern.search(line)
+        if match:
+            parsed.append(match.groupdict())
+    parsed.reverse()
+    return parsed[:50]
+
+
+def follower_stats(follower):
+    threshold = time.time() - 120
+    unique_ips = set()
+    for entry in follower.recent():
+        if entry["ts"] <= threshold:
+            break
+        if entry["path"].startswith("/pxe/"):
+            unique_ips.add(entry["ip"])
+    return len(unique_ips)
+
+
+def follower_logs(follower):
+    return follower.recent(50, lambda entry: not any(x in entry["path"] for x in NOISE))
+
+
+def measure(fn, requests):
+    samples = []
+    for _ in range(requests):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000, samples[int(len(samples) * 0.99) - 1] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'lines':>9} {'approach':<10} {'stats p50':>10} {'stats p99':>10} {'logs p50':>10} {'logs p99':>10}  (ms)")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            log_file = os.path.join(tmp, f"access-{size}.log")
+            write_log(log_file, size)
+
+            s50, s99 = measure(lambda: legacy_stats(log_file), args.requests)
+            l50, l99 = measure(lambda: legacy_logs(log_file), args.requests)
+            print(f"{size:>9} {'tail':<10} {s50:>10.3f} {s99:>10.3f} {l50:>10.3f} {l99:>10.3f}")
+
+            follower = LogFollower(log_file, parse_access_line, maxlen=2000)
+            t0 = time.perf_counter()
+            follower.poll()
+            catchup = (time.perf_counter() - t0) * 1000
+            # Each request also pays for one (usually empty) poll, as the background thread would
+            s50, s99 = measure(lambda: (follower.poll(), follower_stats(follower)), args.requests)
+            l50, l99 = measure(lambda: (follower.poll(), follower_logs(follower)), args.requests)
+            print(f"{size:>9} {'follower':<10} {s50:>10.3f} {s99:>10.3f} {l50:>10.3f} {l99:>10.3f}  (initial catch-up {catchup:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Boot image optimiser benchmark: initrd codecs by size and decompression time.
+
+Repacks an initrd with every codec the kernel can unpack. It prints the
+size, the repack time and the estimated client decompression time for each.
+Without --initrd, it builds a synthetic initrd: an early microcode cpio,
+then an xz-compressed cpio of text-like and binary files. With --image
+<library dir> and squashfs-tools installed, it also runs the full
+repack_image on that image for each squashfs codec.
+
+    python -m benchmarks.bench_optimize [--initrd path] [--image path] [--mb 64]
+"""
+
+import argparse
+import lzma
+import os
+import random
+import shutil
+import tempfile
+
+from backend.app.optimize import DEFAULT_LEVELS, INITRD_CODECS, SQUASHFS_CODECS, _estimate, repack_image, repack_initrd
+
+
+def cpio(files):
+    out = bytearray()
+    for i, (name, data) in enumerate(files + [("TRAILER!!!", b"")]):
+        encoded = name.encode() + b"\0"
+        fields = (i, 0o100644, 0, 0, 1, 0, len(data), 0, 0, 0, 0, len(encoded), 0)
+        out += b"070701" + b"".join(b"%08X" % v for v in fields) + encoded
+        out += bytes(-len(out) % 4) + data
+        out += bytes(-len(out) % 4)
+    return bytes(out)
+
+
+def synthetic_initrd(path, megabytes):
+    words = [os.urandom(random.randint(2, 8)).hex().encode() for _ in range(4000)]
+    files = []
+    for i in range(megabytes):
+        if i % 3 == 0:
+            data = os.urandom(1024 * 1024)
+        else:
+            data = b" ".join(random.choice(words) for _ in range(120000))[:1024 * 1024]
+        files.append((f"usr/lib/modules/file{i}.ko", data))
+    early = cpio([("kernel/x86/microcode/GenuineIntel.bin", os.urandom(64 * 1024))])
+    early += bytes(-len(early) % 512)
+    with open(path, "wb") as f:
+        f.write(early + lzma.compress(cpio(files), check=lzma.CHECK_CRC32))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--initrd")
+    parser.add_argument("--image")
+    parser.add_argument("--mb", type=int, default=64)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as root:
+        initrd = args.initrd
+        if not initrd:
+            initrd = os.path.join(root, "initrd.img")
+            synthetic_initrd(initrd, args.mb)
+        print(f"\ninitrd {os.path.getsize(initrd) / 1e6:.1f} MB ({'synthetic' if not args.initrd else initrd}):")
+        for codec in INITRD_CODECS:
+            report = repack_initrd(initrd, os.path.join(root, f"initrd.{codec}"), codec, DEFAULT_LEVELS[codec], os.cpu_count())
+            _estimate(report, report["unpacked"], 0.35)
+            before, after = report["before"], report["after"]
+            print(f"  {before['codec']:4} -> {codec:5} {after['size'] / 1e6:8.1f} MB  repack {report['repack_seconds']:6.2f}s  "
+                  f"decompress {after['decompress_seconds']:6.3f}s here, ~{after['client_seconds']}s on a client "
+                  f"(was ~{before['client_seconds']}s)")
+
+        if args.image:
+            if not shutil.which("mksquashfs"):
+                print("\nsquashfs-tools not installed; skipping the full image repack")
+                return
+            print(f"\nfull repack of {args.image}:")
+            for codec in SQUASHFS_CODECS:
+                report = repack_image(args.image, os.path.join(root, codec), squashfs_codec=codec)
+                sq = report["squashfs"]
+                print(f"  {report['label']:28} squashfs {sq['before']['size'] / 1e6:8.1f} -> {sq['after']['size'] / 1e6:8.1f} MB  "
+                      f"client ~{sq['before']['client_seconds']}s -> ~{sq['after']['client_seconds']}s  "
+                      f"repack {sq['repack_seconds']}s")
+                shutil.rmtree(os.path.join(root, codec), ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Precomputed boot-file variants benchmark: bytes and syscalls with and without the index.
+
+Builds a small boot set: a kernel and an initrd (incompressible), plus
+iPXE/GRUB scripts and menus (text). N clients each fetch the whole set
+twice from the built-in boot file server, as a lab does when it boots,
+fails over and reboots. The first pass sends Accept-Encoding: gzip. The
+second pass also sends the ETag it got back as If-None-Match. This runs
+once with a bare server and once with a Precomputed index.
+
+Reports the bytes sent, the 304s and gzip responses, and the read/write
+syscall counts of the process (from /proc/self/io, where available).
+
+    python -m benchmarks.bench_precompute [--clients 50] [--kernel-mb 8] [--text-kb 256]
+"""
+
+import argparse
+import asyncio
+import http.client
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+
+from backend.app.bootserver import BootFileServer
+from backend.app.precompute import Precomputed
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def proc_io():
+    try:
+        with open("/proc/self/io") as f:
+            return {k: int(v) for k, v in (line.split(": ") for line in f)}
+    except OSError:
+        return {}
+
+
+def boot_set(root, kernel_mb, text_kb):
+    words = ["kernel", "initrd", "chain", "boot", "set", "menu", "item", "goto", "echo", "imgfree", "ramdisk",
+             "${next-server}", "http://10.0.0.1/pxe/", "fetch=", "ip=dhcp", "quiet", "splash", "toram"]
+    files = {"vmlinuz": os.urandom(kernel_mb * 1024 * 1024),
+             "initrd.img": os.urandom(kernel_mb * 2 * 1024 * 1024)}
+    for name in ("boot.ipxe", "menu.ipxe", "grub.cfg", "ldlinux.cfg"):
+        lines = [" ".join(random.choice(words) for _ in range(12)) for _ in range(text_kb * 1024 // 80)]
+        files[name] = "\n".join(lines).encode()
+    for name, data in files.items():
+        with open(os.path.join(root, name), "wb") as f:
+            f.write(data)
+    return list(files)
+
+
+def client(port, names, results):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    etags = {}
+    sent = {"bytes": 0, "304": 0, "gzip": 0}
+    for attempt in range(2):
+        for name in names:
+            headers = {"Accept-Encoding": "gzip"}
+            if attempt and etags.get(name):
+                headers["If-None-Match"] = etags[name]
+            conn.request("GET", f"/pxe/{name}", headers=headers)
+            res = conn.getresponse()
+            body = res.read()
+            sent["bytes"] += len(body)
+            sent["304"] += res.status == 304
+            sent["gzip"] += res.getheader("Content-Encoding") == "gzip"
+            etags[name] = res.getheader("ETag")
+    conn.close()
+    results.append(sent)
+
+
+def run(root, names, clients, precomputed):
+    port = free_port()
+    server = BootFileServer(root, host="127.0.0.1", port=port)
+    server.precomputed = precomputed
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    asyncio.run_coroutine_threadsafe(server.start(), loop).result()
+
+    results = []
+    before = proc_io()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(port, names, results)) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    after = proc_io()
+
+    asyncio.run_coroutine_threadsafe(server.stop(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    io = {k: after[k] - before[k] for k in ("syscr", "syscw", "rchar") if k in after}
+    return elapsed, server.totals, sum(r["bytes"] for r in results), io
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--kernel-mb", type=int, default=8)
+    parser.add_argument("--text-kb", type=int, default=256)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        names = boot_set(root, args.kernel_mb, args.text_kb)
+        print(f"\n{args.clients} clients x 2 passes over {len(names)} files "
+              f"({sum(os.path.getsize(os.path.join(root, n)) for n in names) / 1e6:.1f} MB per pass):")
+        baseline = None
+        for label in ("plain", "precomputed"):
+            precomputed = None
+            if label == "precomputed":
+                precomputed = Precomputed({"pxe": root})
+                t = time.perf_counter()
+                summary = precomputed.refresh()
+                print(f"  index built in {time.perf_counter() - t:.2f}s: {summary}")
+            elapsed, totals, received, io = run(root, names, args.clients, precomputed)
+            baseline = baseline or received
+            print(f"  {label:12} {received / 1e6:9.1f} MB sent ({100 * (1 - received / baseline):5.1f}% less)  "
+                  f"304 {totals['not_modified']:5}  gzip {totals['gzip']:5}  {elapsed:6.2f}s"
+                  + (f"  syscr {io['syscr']:7}  syscw {io['syscw']:7}  read {io['rchar'] / 1e6:8.1f} MB" if io else ""))
+
+
+if __name__ == "__main__":
+    main()
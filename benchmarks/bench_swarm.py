@@ -0,0 +1,155 @@
+"""
+Boot storm simulator for peer-assisted squashfs distribution on localhost.
+
+Runs a SwarmTracker behind a small HTTP server that serves the same paths as
+/api/swarm/*. The seed's egress is rate limited (default 125 MB/s, a
+saturated 1 GbE uplink). N virtual clients then arrive within a few seconds
+of each other. Each one is a SwarmClient with its own chunk server on
+127.0.0.1. Peers are not rate limited, because in a real room every client
+has its own link.
+
+Reports the server's bytes against the plain HTTP baseline (every client
+pulls the whole squashfs from the server), the share of chunks that came
+from peers, and the time until the last client finished.
+
+    python -m benchmarks.bench_swarm [--clients 30] [--size-mb 64] [--chunk-kb 1024] [--seed-rate 125]
+"""
+
+import argparse
+import hashlib
+import http.server
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from backend.app.swarm import SwarmClient, SwarmError, SwarmTracker
+
+HOST = "127.0.0.1"
+KEY = "bench"
+
+
+class Link:
+    """Shared egress of `rate` bytes/s; send() sleeps until the bytes would have left."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.free = time.monotonic()
+
+    def send(self, nbytes):
+        if not self.rate:
+            return
+        with self.lock:
+            start = max(self.free, time.monotonic())
+            self.free = start + nbytes / self.rate
+            done = self.free
+        time.sleep(max(done - time.monotonic(), 0))
+
+
+class TrackerHandler(http.server.BaseHTTPRequestHandler):
+    def _reply(self, status, body, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        tracker, parts = self.server.tracker, self.path.strip("/").split("/")
+        if parts == ["api", "swarm", KEY]:
+            self._reply(200, json.dumps(tracker.manifest(KEY)).encode())
+        elif parts[:4] == ["api", "swarm", KEY, "chunks"] and len(parts) == 5:
+            data = tracker.read_chunk(KEY, parts[4])
+            if data is None:
+                self._reply(404, b"{}")
+                return
+            self.server.link.send(len(data))
+            self._reply(200, data, "application/octet-stream")
+        else:
+            self._reply(404, b"{}")
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        try:
+            result = self.server.tracker.announce(KEY, body["peer_id"], f"http://{self.client_address[0]}:{body['port']}",
+                                                  body["have"], body["uploaded"], body["downloaded"])
+        except SwarmError as e:
+            self._reply(e.status, json.dumps({"detail": str(e)}).encode())
+            return
+        self._reply(200, json.dumps(result).encode())
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=30)
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--chunk-kb", type=int, default=1024)
+    parser.add_argument("--seed-rate", type=float, default=125, help="server egress in MB/s (0 = unlimited)")
+    parser.add_argument("--spread", type=float, default=3, help="arrivals are spread over this many seconds")
+    args = parser.parse_args()
+    size = args.size_mb * 1024 * 1024
+    chunk_size = args.chunk_kb * 1024
+
+    with tempfile.TemporaryDirectory() as root:
+        squashfs = os.path.join(root, "filesystem.squashfs")
+        with open(squashfs, "wb") as f:
+            f.write(os.urandom(size))
+        with open(squashfs, "rb") as f:
+            hashes = [hashlib.sha256(f.read(chunk_size)).hexdigest() for _ in range((size + chunk_size - 1) // chunk_size)]
+        tracker = SwarmTracker(peer_ttl=120)
+        tracker.publish(KEY, squashfs, chunk_size, hashes)
+        httpd = http.server.ThreadingHTTPServer((HOST, 0), TrackerHandler)
+        httpd.daemon_threads = True
+        httpd.tracker, httpd.link = tracker, Link(args.seed_rate * 1e6)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        server = f"http://{HOST}:{httpd.server_address[1]}"
+
+        clients, results, errors = [], [], []
+        started = time.perf_counter()
+
+        def boot(i, delay):
+            time.sleep(delay)
+            client = SwarmClient(server, KEY, os.path.join(root, f"client-{i}.squashfs"), host=HOST)
+            clients.append(client)
+            try:
+                t = time.perf_counter()
+                stats = client.download()
+                results.append((time.perf_counter() - t, stats))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=boot, args=(i, random.uniform(0, args.spread))) for i in range(args.clients)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+        for client in clients:
+            client.stop()
+        httpd.shutdown()
+
+    totals = tracker.stats()["totals"]
+    baseline = args.clients * size
+    from_peers = sum(s["from_peers"] for _, s in results)
+    from_seed = sum(s["from_seed"] for _, s in results)
+    durations = sorted(d for d, _ in results)
+    print(f"\n{args.clients} clients, {args.size_mb} MiB squashfs in {args.chunk_kb} KiB chunks, seed egress {args.seed_rate or 'unlimited'} MB/s:")
+    print(f"  plain HTTP baseline    {baseline / 1e6:10.1f} MB from the server"
+          + (f"  (~{baseline / (args.seed_rate * 1e6):.1f}s at the seed rate)" if args.seed_rate else ""))
+    print(f"  swarm                  {totals['seed_bytes'] / 1e6:10.1f} MB from the server  "
+          f"({100 * (1 - totals['seed_bytes'] / baseline):.1f}% less)")
+    print(f"  chunks from peers      {100 * from_peers / max(from_peers + from_seed, 1):9.1f}%   "
+          f"peer failures {sum(s['peer_failures'] for _, s in results)}   errors {len(errors)}")
+    if durations:
+        print(f"  per-client download    p50 {durations[len(durations) // 2]:.2f}s  max {durations[-1]:.2f}s   "
+              f"storm finished in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+In-process TFTP server benchmark on loopback.
+
+Serves a bootx64.efi-sized file (default 1 MiB) from a temporary root and
+runs many concurrent download sessions against it. Each configuration is
+run with the same session count:
+
+- classic RFC 1350 (512-byte blocks, one block per ACK)
+- blksize 1468 (fits an Ethernet MTU, as UEFI firmware asks for)
+- blksize 1468 with windowsize 8 and 32 (RFC 7440)
+
+Reports transfers/s, aggregate MB/s and retransmits.
+
+    python -m benchmarks.bench_tftpserver [--sessions 200] [--transfers 600] [--size 1048576]
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import struct
+import tempfile
+import time
+
+from backend.app.tftpserver import ACK, DATA, ERROR, OACK, RRQ, TftpServer
+
+HOST = "127.0.0.1"
+
+
+class Download(asyncio.DatagramProtocol):
+    """Synthetic TFTP client: RRQ with options, ACKs the last block of every window."""
+
+    def __init__(self, server, filename, options, done):
+        self.server = server
+        self.filename = filename
+        self.options = options
+        self.window = int(options.get("windowsize", 1))
+        self.blksize = int(options.get("blksize", 512))
+        self.done = done
+        self.expected = 1
+        self.in_window = 0
+        self.received = 0
+        self.peer = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        request = struct.pack("!H", RRQ) + f"{self.filename}\0octet\0".encode()
+        request += b"".join(f"{k}\0{v}\0".encode() for k, v in self.options.items())
+        transport.sendto(request, self.server)
+
+    def _ack(self, block):
+        self.transport.sendto(struct.pack("!HH", ACK, block & 0xFFFF), self.peer)
+
+    def datagram_received(self, data, addr):
+        opcode = struct.unpack_from("!H", data)[0]
+        self.peer = addr
+        if opcode == OACK:
+            self._ack(0)
+        elif opcode == DATA:
+            block = struct.unpack_from("!H", data, 2)[0]
+            if block != self.expected & 0xFFFF:
+                # Out of order: ask again from the last block received in order
+                self._ack(self.expected - 1)
+                self.in_window = 0
+                return
+            self.received += len(data) - 4
+            self.expected += 1
+            self.in_window += 1
+            last = len(data) - 4 < self.blksize
+            if last or self.in_window == self.window:
+                self.in_window = 0
+                self._ack(block)
+            if last and not self.done.done():
+                self.done.set_result(self.received)
+                self.transport.close()
+        elif opcode == ERROR and not self.done.done():
+            self.done.set_exception(RuntimeError(data[4:-1].decode()))
+
+
+async def download(server, filename, options):
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+    transport, _ = await loop.create_datagram_endpoint(lambda: Download(server, filename, options, done), local_addr=(HOST, 0))
+    try:
+        return await asyncio.wait_for(done, 60)
+    finally:
+        transport.close()
+
+
+async def run_config(server, port, label, options, sessions, transfers, size):
+    slots = asyncio.Semaphore(sessions)
+    before = dict(server.totals)
+
+    async def one():
+        async with slots:
+            received = await download((HOST, port), "bootx64.efi", options)
+            assert received == size, (received, size)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(transfers)))
+    elapsed = time.perf_counter() - started
+    retransmits = server.totals["retransmits"] - before["retransmits"]
+    print(f"  {label:28} {transfers / elapsed:8.1f} transfers/s  {transfers * size / elapsed / 1e6:8.1f} MB/s  "
+          f"{retransmits:5} retransmits  ({elapsed:.2f}s)")
+
+
+async def run(args):
+    with tempfile.TemporaryDirectory() as root:
+        with open(os.path.join(root, "bootx64.efi"), "wb") as f:
+            f.write(os.urandom(args.size))
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.bind((HOST, 0))
+            port = s.getsockname()[1]
+        server = TftpServer(root, host=HOST, port=port)
+        await server.start()
+        print(f"\n{args.transfers} downloads of {args.size} bytes, {args.sessions} concurrent sessions:")
+        configs = [
+            ("classic (512, window 1)", {}),
+            ("blksize 1468", {"blksize": 1468, "tsize": 0}),
+            ("blksize 1468, window 8", {"blksize": 1468, "windowsize": 8, "tsize": 0}),
+            ("blksize 1468, window 32", {"blksize": 1468, "windowsize": 32, "tsize": 0}),
+        ]
+        for label, options in configs:
+            await run_config(server, port, label, options, args.sessions, args.transfers, args.size)
+        print(f"  totals: {server.totals}")
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--transfers", type=int, default=600)
+    parser.add_argument("--size", type=int, default=1024 * 1024)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
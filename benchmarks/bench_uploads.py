@@ -0,0 +1,72 @@
+"""
+Chunked upload benchmark: UploadSession.write from several threads.
+
+Writes a synthetic file (default 512 MiB) into a session, one worker per
+simulated parallel request. The order of chunks is shuffled, the way
+parallel browser workers deliver them. For each worker count it reports
+chunk write throughput and the time finalize() still needs. The whole-file
+hash is mostly advanced while chunks arrive, so finalize() should only take
+a fraction of a full re-hash. A full re-hash is timed as a reference.
+
+    python -m benchmarks.bench_uploads [--size-mb 512] [--chunk-mb 8] [--workers 1,4,8]
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.app.uploads import UploadManager
+
+
+def run_one(root, payload, chunk_size, workers):
+    manager = UploadManager(root)
+    session = manager.create("bench.iso", len(payload), "iso", chunk_size)
+    order = list(range(session.chunks))
+    random.shuffle(order)
+    view = memoryview(payload)
+
+    def put(index):
+        chunk = bytes(view[index * chunk_size:(index + 1) * chunk_size])
+        session.write(index, chunk, hashlib.sha256(chunk).hexdigest())
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(put, order))
+    written = time.perf_counter() - started
+    unhashed = session.unhashed
+    manager.take(session.id)
+    started = time.perf_counter()
+    path, sha256 = session.finalize()
+    finalized = time.perf_counter() - started
+    os.remove(path)
+    return written, unhashed, finalized, sha256
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=512)
+    parser.add_argument("--chunk-mb", type=int, default=8)
+    parser.add_argument("--workers", default="1,4,8")
+    args = parser.parse_args()
+    size = args.size_mb * 1024 * 1024
+    chunk_size = args.chunk_mb * 1024 * 1024
+    payload = os.urandom(size)
+    started = time.perf_counter()
+    expected = hashlib.sha256(payload).hexdigest()
+    rehash = time.perf_counter() - started
+
+    print(f"\n{args.size_mb} MiB in {args.chunk_mb} MiB chunks, shuffled order (full re-hash: {rehash:.2f}s):")
+    with tempfile.TemporaryDirectory() as root:
+        for workers in (int(w) for w in args.workers.split(",")):
+            written, unhashed, finalized, sha256 = run_one(root, payload, chunk_size, workers)
+            assert sha256 == expected
+            print(f"  {workers:2} workers  {size / written / 1e6:8.1f} MB/s written  "
+                  f"{unhashed / 1e6:7.1f} MB left to hash  finalize {finalized:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
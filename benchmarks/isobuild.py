@@ -0,0 +1,127 @@
+"""
+Minimal ISO9660 writer for building synthetic boot ISOs in benchmarks.
+
+Only what the ingest pipeline needs: one primary volume descriptor, path
+tables and a directory tree with plain (upper-case) ISO9660 names.
+"""
+
+import os
+import struct
+import time
+
+SECTOR = 2048
+PATTERN = bytes(range(256)) * (1024 * 1024 // 256)
+
+
+def _both16(value):
+    return struct.pack("<H", value) + struct.pack(">H", value)
+
+
+def _both32(value):
+    return struct.pack("<I", value) + struct.pack(">I", value)
+
+
+def _sectors(size):
+    return max(1, (size + SECTOR - 1) // SECTOR)
+
+
+def _record(name, lba, size, is_dir):
+    name_len = len(name)
+    length = 33 + name_len + (1 - name_len % 2)
+    now = time.gmtime()
+    date = bytes([now.tm_year - 1900, now.tm_mon, now.tm_mday, now.tm_hour, now.tm_min, now.tm_sec, 0])
+    rec = bytes([length, 0]) + _both32(lba) + _both32(size) + date
+    rec += bytes([0x02 if is_dir else 0, 0, 0]) + _both16(1) + bytes([name_len]) + name
+    return rec + b"\x00" * (length - len(rec))
+
+
+def build_iso(path, files):
+    """Write an ISO at `path`. `files` maps "dir/name" -> size in bytes (content is a fixed pattern)."""
+    dirs = {"": []}
+    for file_path in files:
+        parts = file_path.split("/")
+        for i in range(1, len(parts)):
+            parent, child = "/".join(parts[:i - 1]), "/".join(parts[:i])
+            if child not in dirs:
+                dirs[child] = []
+                dirs[parent].append(child)
+        dirs["/".join(parts[:-1])].append(file_path)
+
+    # Directories (one sector each is plenty here) start at 20, files follow
+    dir_lba = {d: 20 + i for i, d in enumerate(sorted(dirs))}
+    next_lba = 20 + len(dirs)
+    file_lba = {}
+    for file_path, size in files.items():
+        file_lba[file_path] = next_lba
+        next_lba += _sectors(size)
+
+    def iso_name(entry, is_dir):
+        base = entry.rsplit("/", 1)[-1].upper()
+        return base.encode() if is_dir else (base + ";1").encode()
+
+    dir_data = {}
+    for d, children in dirs.items():
+        parent = d.rsplit("/", 1)[0] if "/" in d else ""
+        data = _record(b"\x00", dir_lba[d], SECTOR, True) + _record(b"\x01", dir_lba[parent], SECTOR, True)
+        for child in sorted(children):
+            if child in dirs:
+                data += _record(iso_name(child, True), dir_lba[child], SECTOR, True)
+            else:
+                data += _record(iso_name(child, False), file_lba[child], files[child], False)
+        assert len(data) <= SECTOR, "directory too large for the synthetic builder"
+        dir_data[d] = data
+
+    ordered = sorted(dirs)
+    index = {d: i + 1 for i, d in enumerate(ordered)}
+    l_table, m_table = b"", b""
+    for d in ordered:
+        name = iso_name(d, True) if d else b"\x00"
+        parent = index[d.rsplit("/", 1)[0] if "/" in d else ""]
+        pad = b"\x00" * (len(name) % 2)
+        l_table += bytes([len(name), 0]) + struct.pack("<IH", dir_lba[d], parent) + name + pad
+        m_table += bytes([len(name), 0]) + struct.pack(">IH", dir_lba[d], parent) + name + pad
+
+    pvd = bytearray(SECTOR)
+    pvd[0:7] = b"\x01CD001\x01"
+    pvd[8:40] = b"LINUX".ljust(32)
+    pvd[40:72] = b"SYNTHETIC_BOOT".ljust(32)
+    pvd[80:88] = _both32(next_lba)
+    pvd[120:124] = _both16(1)
+    pvd[124:128] = _both16(1)
+    pvd[128:132] = _both16(SECTOR)
+    pvd[132:140] = _both32(len(l_table))
+    pvd[140:144] = struct.pack("<I", 18)
+    pvd[148:152] = struct.pack(">I", 19)
+    pvd[156:190] = _record(b"\x00", dir_lba[""], SECTOR, True)
+    pvd[881] = 1
+    terminator = bytearray(SECTOR)
+    terminator[0:7] = b"\xffCD001\x01"
+
+    with open(path, "wb") as f:
+        f.write(b"\x00" * (16 * SECTOR))
+        f.write(pvd)
+        f.write(terminator)
+        f.write(l_table.ljust(SECTOR, b"\x00"))
+        f.write(m_table.ljust(SECTOR, b"\x00"))
+        for d in ordered:
+            f.write(dir_data[d].ljust(SECTOR, b"\x00"))
+        for file_path, size in files.items():
+            assert f.tell() == file_lba[file_path] * SECTOR
+            remaining = size
+            while remaining:
+                chunk = PATTERN[:min(remaining, len(PATTERN))]
+                f.write(chunk)
+                remaining -= len(chunk)
+            f.write(b"\x00" * (_sectors(size) * SECTOR - size))
+    return os.path.getsize(path)
+
+
+def boot_iso_layout(squashfs_mb=256, filler_mb=256):
+    """A live-ISO-like layout: kernel, initrd and squashfs under live/, plus unrelated filler."""
+    return {
+        "live/vmlinuz": 12 * 1024 * 1024,
+        "live/initrd.img": 48 * 1024 * 1024,
+        "live/filesystem.squashfs": squashfs_mb * 1024 * 1024,
+        "pool/main/filler.deb": filler_mb * 1024 * 1024,
+        "efi/boot/bootx64.efi": 1024 * 1024,
+    }
@@ -4,12 +4,20 @@
 echo "Preparing TFTP binaries..."
 cp /tmp/ipxe/snponly.efi /var/lib/tftpboot/bootx64.efi || true
 
-# Start TFTP server
-echo "Starting TFTP server..."
-/usr/sbin/in.tftpd --foreground --user root --address 0.0.0.0:69 --secure -L -vvv /var/lib/tftpboot &
+# Start syslog so in.tftpd transfers end up in /var/log/messages (boot progress tracking)
+syslogd -O /var/log/messages || true
 
-# Start Nginx
+# Start TFTP server (unless the backend serves TFTP itself, see TFTP_SERVER_PORT)
+if [ "${TFTP_SERVER_PORT:-0}" = "0" ]; then
+    echo "Starting TFTP server..."
+    /usr/sbin/in.tftpd --foreground --user root --address 0.0.0.0:69 --secure -L -vvv /var/lib/tftpboot &
+else
+    echo "TFTP served by the backend on port $TFTP_SERVER_PORT"
+fi
+
+# Start Nginx (the backend renders /etc/nginx/pxe.d/cache.conf and reloads it after deploys)
 echo "Starting Nginx..."
+mkdir -p /etc/nginx/pxe.d
 nginx &
 
 # Start FastAPI
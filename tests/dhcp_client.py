@@ -0,0 +1,66 @@
+"""
+Synthetic DHCP client on loopback, shared by tests/test_dhcpserver.py and benchmarks/bench_dhcpserver.py.
+
+The server under test binds 127.0.0.1 on unprivileged ports and
+"broadcasts" its replies to 127.0.0.1 (`broadcast=SERVER_IP`), so no root
+or real network is needed.
+"""
+
+import asyncio
+import socket
+import struct
+import time
+
+from backend.app.dhcpserver import BOOTP, MAGIC_COOKIE, OPT_MESSAGE_TYPE, parse_packet
+
+SERVER_IP = "127.0.0.1"
+PXE_VENDOR = b"PXEClient:Arch:00007:UNDI:003016"
+
+
+def request_packet(message_type, xid, mac, options=(), ciaddr=0):
+    head = BOOTP.pack(1, 1, 6, 0, xid, 0, 0x8000, ciaddr, 0, 0, 0, mac + bytes(10), b"", b"")
+    body = bytearray(MAGIC_COOKIE) + bytes([OPT_MESSAGE_TYPE, 1, message_type])
+    for code, value in options:
+        body += bytes([code, len(value)]) + value
+    return head + bytes(body) + b"\xff"
+
+
+def reply_info(data):
+    """(xid, message type, yiaddr, options) of a server reply."""
+    xid, yiaddr = struct.unpack_from("!I", data, 4)[0], struct.unpack_from("!I", data, 16)[0]
+    fake = bytearray(data)
+    fake[0] = 1
+    packet = parse_packet(bytes(fake))
+    return xid, packet.message_type, yiaddr, packet.options
+
+
+class Client(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.replies = {}
+        self.waiters = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        xid, kind, yiaddr, options = reply_info(data)
+        self.replies[(xid, kind)] = (time.perf_counter(), yiaddr, options)
+        waiter = self.waiters.pop((xid, kind), None)
+        if waiter and not waiter.done():
+            waiter.set_result((yiaddr, options))
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind((SERVER_IP, 0))
+        return s.getsockname()[1]
+
+
+async def open_client():
+    """(transport, Client, port) bound to an ephemeral loopback port."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
+    sock.bind((SERVER_IP, 0))
+    port = sock.getsockname()[1]
+    transport, client = await asyncio.get_running_loop().create_datagram_endpoint(Client, sock=sock)
+    return transport, client, port
@@ -0,0 +1,141 @@
+"""
+Fake Docker Engine on a UNIX socket, shared by tests/test_dockerapi.py and benchmarks/bench_dockerapi.py.
+
+Implements the calls main.py makes for pxe-dhcp: inspect, start/stop/restart,
+the chunked events stream and followed logs (8-byte multiplexed frames, or
+raw lines for a TTY container). `split` cuts every chunked body into HTTP
+chunks of at most that many bytes, so frames and lines straddle chunk
+boundaries. `disconnect()` drops every open connection, as a daemon restart
+does.
+"""
+
+import asyncio
+import json
+import time
+
+NAME = "pxe-dhcp"
+
+
+def stamp(ts):
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(ts)) + f".{int(ts % 1 * 1e9):09d}Z"
+
+
+class FakeEngine:
+    def __init__(self, path, split=None, tty=False):
+        self.path = path
+        self.split = split
+        self.tty = tty
+        self.state = "running"
+        # (timestamp, stream, line); stream 1 is stdout, 2 stderr
+        self.logs = []
+        self.events = []
+        self.changed = asyncio.Condition()
+        self.server = None
+        self.connections = 0
+        self.writers = set()
+
+    async def start(self):
+        self.server = await asyncio.start_unix_server(self._handle, self.path)
+
+    async def close(self):
+        await self.disconnect()
+        self.server.close()
+
+    async def disconnect(self):
+        async with self.changed:
+            for writer in self.writers:
+                writer.close()
+            self.changed.notify_all()
+
+    async def emit(self, action):
+        async with self.changed:
+            self.state = {"start": "running", "restart": "running", "stop": "exited", "die": "exited"}[action]
+            self.events.append({"Type": "container", "Action": action, "Actor": {"Attributes": {"name": NAME}}, "time": time.time()})
+            self.changed.notify_all()
+
+    async def log(self, lines, stream=2, ts=None):
+        async with self.changed:
+            now = time.time() if ts is None else ts
+            self.logs.extend((now, stream, line) for line in lines)
+            self.changed.notify_all()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        self.writers.add(writer)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                request_line, *lines = head.decode().split("\r\n")
+                method, target, _ = request_line.split()
+                length = next((int(l.split(":")[1]) for l in lines if l.lower().startswith("content-length")), 0)
+                if length:
+                    await reader.readexactly(length)
+                path = target.split("?")[0].split("/", 2)[2]
+                query = dict(p.split("=", 1) for p in target.partition("?")[2].split("&") if "=" in p)
+                if path == "events":
+                    await self._events(writer)
+                    return
+                if path.endswith("/logs"):
+                    await self._logs(writer, query)
+                    return
+                if path == f"containers/{NAME}/json":
+                    body = json.dumps({"Name": f"/{NAME}", "State": {"Status": self.state}}).encode()
+                    status = "200 OK"
+                elif path.startswith(f"containers/{NAME}/"):
+                    await self.emit(path.rsplit("/", 1)[1])
+                    status, body = "204 No Content", b""
+                else:
+                    status, body = "404 Not Found", b'{"message": "No such container"}'
+                writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+                await writer.drain()
+                if b"connection: close" in head.lower():
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    def _chunk(self, writer, data):
+        step = self.split or len(data)
+        for i in range(0, len(data), step):
+            piece = data[i:i + step]
+            writer.write(f"{len(piece):x}\r\n".encode() + piece + b"\r\n")
+
+    async def _events(self, writer):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nTransfer-Encoding: chunked\r\n\r\n")
+        sent = len(self.events)
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: len(self.events) > sent or writer.is_closing())
+                if writer.is_closing():
+                    return
+                for event in self.events[sent:]:
+                    self._chunk(writer, json.dumps(event).encode() + b"\n")
+                sent = len(self.events)
+            await writer.drain()
+
+    async def _logs(self, writer, query):
+        since = float(query.get("since", 0))
+        content_type = "application/vnd.docker.raw-stream" if not self.tty else "text/plain"
+        writer.write(f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\nTransfer-Encoding: chunked\r\n\r\n".encode())
+        tail = query.get("tail", "all")
+        position = 0 if "since" in query or tail == "all" else max(len(self.logs) - int(tail), 0)
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: len(self.logs) > position or self.state != "running" or writer.is_closing())
+                if writer.is_closing():
+                    return
+                batch, position = self.logs[position:], len(self.logs)
+            frames = b""
+            for ts, stream, line in batch:
+                if ts >= since:
+                    payload = f"{stamp(ts)} {line}\n".encode()
+                    frames += payload if self.tty else bytes([stream, 0, 0, 0]) + len(payload).to_bytes(4, "big") + payload
+            if frames:
+                self._chunk(writer, frames)
+                await writer.drain()
+            if self.state != "running":
+                writer.write(b"0\r\n\r\n")
+                await writer.drain()
+                return
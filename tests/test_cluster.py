@@ -0,0 +1,207 @@
+"""
+Two ClusterNode instances on 127.0.0.1: peer polling, rendezvous routing and chunked image sync.
+
+Each instance pairs a ClusterNode with a small HTTP server that answers the
+/api/cluster/* calls the way main.py does (status, image manifest, chunks),
+so the nodes talk to each other over real loopback sockets.
+
+    python -m pytest -q tests/test_cluster.py
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from backend.app.cluster import ClusterError, ClusterNode, image_chunks, rendezvous_rank
+
+TOKEN = "secret"
+IMAGE = "img1"
+COMPONENTS = ["vmlinuz", "initrd.img"]
+CHUNK = 64 * 1024
+
+
+class Instance:
+    """A ClusterNode plus the HTTP side of its /api/cluster endpoints."""
+
+    def __init__(self, role, boot_host, images_root, resident=(), active=None, interval=0.05, spread="hash"):
+        self.images_root = images_root
+        self.status = {"role": role, "boot_host": boot_host, "active_image": active, "resident": list(resident),
+                       "load": {"clients": 0, "tx_rate": 0, "cpu": 0}}
+        self.requests = []
+        self.corrupt = set()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.status["node"] = self.url
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+        self.behind = []
+        self.node = ClusterNode(self.url, role, [], TOKEN, lambda: dict(self.status, ts=time.time()), interval=interval,
+                                spread=spread, on_behind=lambda url, image: self.behind.append((url, image)))
+
+    def peer(self, other):
+        self.node.peers[other.url] = {"url": other.url, "status": None, "last_ok": 0, "error": None}
+
+    def close(self):
+        self.node.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def manifest(self, image_id):
+        image_dir = os.path.join(self.images_root, image_id)
+        chunks = image_chunks(image_dir, COMPONENTS, CHUNK)
+        components = {}
+        for name in COMPONENTS:
+            with open(os.path.join(image_dir, name), "rb") as f:
+                data = f.read()
+            components[name] = {"size": len(data), "sha256": hashlib.sha256(data).hexdigest(), "chunks": chunks[name]}
+        return {"id": image_id, "name": "test.iso", "source": {}, "size": sum(c["size"] for c in components.values()),
+                "chunk_size": CHUNK, "components": components}
+
+    def _handler(self):
+        instance = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, content_type="application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                instance.requests.append(self.path)
+                if self.headers.get("X-Dashboard-Token") != TOKEN:
+                    return self._send(401, b'{"detail": "Unauthorized"}')
+                parts = self.path.strip("/").split("/")[2:]
+                if parts == ["status"]:
+                    return self._send(200, json.dumps({**instance.node.local_status(), "peers": []}).encode())
+                if len(parts) == 2 and parts[0] == "images":
+                    return self._send(200, json.dumps(instance.manifest(parts[1])).encode())
+                if len(parts) == 4 and parts[0] == "images":
+                    _, image_id, name, index = parts
+                    with open(os.path.join(instance.images_root, image_id, name), "rb") as f:
+                        data = os.pread(f.fileno(), CHUNK, int(index) * CHUNK)
+                    if (name, int(index)) in instance.corrupt:
+                        instance.corrupt.discard((name, int(index)))
+                        data = bytes(len(data))
+                    return self._send(200, data, "application/octet-stream")
+                self._send(404, b'{"detail": "Not found"}')
+
+        return Handler
+
+
+@pytest.fixture
+def cluster():
+    """Primary A (IMAGE active and on disk) and replica B (IMAGE resident, nothing active), peered with each other."""
+    with tempfile.TemporaryDirectory() as tmp:
+        image_dir = os.path.join(tmp, "a", IMAGE)
+        os.makedirs(image_dir)
+        for name, size in (("vmlinuz", 3 * CHUNK + 123), ("initrd.img", 5 * CHUNK)):
+            with open(os.path.join(image_dir, name), "wb") as f:
+                f.write(os.urandom(size))
+        a = Instance("primary", "10.0.0.1", os.path.join(tmp, "a"), resident=[IMAGE], active=IMAGE)
+        b = Instance("replica", "10.0.0.2", os.path.join(tmp, "b"), resident=[IMAGE])
+        a.peer(b)
+        b.peer(a)
+        try:
+            yield a, b, tmp
+        finally:
+            a.close()
+            b.close()
+
+
+MACS = [f"52:54:00:00:{n >> 8:02x}:{n & 255:02x}" for n in range(200)]
+
+
+def test_nodes_poll_each_other_and_route_clients_alike(cluster):
+    a, b, _ = cluster
+    a.node.poll()
+    b.node.poll()
+    assert [p["url"] for p in b.node.healthy_peers()] == [a.url]
+    assert b.node.primary()["url"] == a.url
+    picks = [a.node.pick(mac, IMAGE) for mac in MACS]
+    # Both nodes rank the same node set, so a client lands on the same node whichever one renders its script
+    assert picks == [b.node.pick(mac, IMAGE) for mac in MACS]
+    assert picks == [rendezvous_rank(mac, a.node.nodes())[0]["boot_host"] for mac in MACS]
+    assert 50 < picks.count("10.0.0.1") < 150
+    # Only nodes holding the client's image are candidates
+    a.status["resident"] = []
+    b.node.poll()
+    assert {b.node.pick(mac, IMAGE) for mac in MACS} == {"10.0.0.2"}
+    assert b.node.pick(MACS[0], "unknown") is None
+
+
+def test_losing_a_node_only_moves_its_own_clients(cluster):
+    a, b, _ = cluster
+    b.node.poll()
+    before = {mac: b.node.pick(mac, IMAGE) for mac in MACS}
+    a.close()
+    time.sleep(3 * b.node.interval)
+    b.node.poll()
+    assert b.node.healthy_peers() == []
+    assert b.node.peers[a.url]["error"]
+    after = {mac: b.node.pick(mac, IMAGE) for mac in MACS}
+    assert set(after.values()) == {"10.0.0.2"}
+    assert all(after[mac] == host for mac, host in before.items() if host == "10.0.0.2")
+
+
+def test_load_spread_prefers_the_less_loaded_of_the_two_best(cluster):
+    a, b, _ = cluster
+    b.node.spread = "load"
+    a.status["load"]["clients"] = 500
+    b.node.poll()
+    assert {b.node.pick(mac, IMAGE) for mac in MACS} == {"10.0.0.2"}
+
+
+def test_replica_behind_the_primary_asks_for_its_active_image(cluster):
+    a, b, _ = cluster
+    b.node.start()
+    deadline = time.monotonic() + 5
+    while not b.behind and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert b.behind[0] == (a.url, IMAGE)
+    # The primary itself never syncs
+    a.node.start()
+    time.sleep(5 * a.node.interval)
+    assert a.behind == []
+
+
+def test_download_image_fetches_and_verifies_every_chunk(cluster):
+    a, b, tmp = cluster
+    manifest = b.node.fetch_manifest(a.url, IMAGE)
+    assert len(manifest["components"]["vmlinuz"]["chunks"]) == 4
+    dest = os.path.join(tmp, "b", ".sync", IMAGE)
+    a.corrupt.add(("initrd.img", 2))
+    done = []
+    b.node.download_image(a.url, manifest, dest, progress=done.append)
+    for name in COMPONENTS:
+        with open(os.path.join(a.images_root, IMAGE, name), "rb") as src, open(os.path.join(dest, name), "rb") as copy:
+            assert src.read() == copy.read()
+    assert sum(done) == manifest["size"]
+    chunk_requests = [p for p in a.requests if p.count("/") == 6]
+    # 9 chunks, one of them fetched twice after failing verification
+    assert len(chunk_requests) == 10
+
+    # A resumed sync keeps the chunks already on disk with the right hash
+    a.requests.clear()
+    with open(os.path.join(dest, "vmlinuz"), "r+b") as f:
+        f.seek(CHUNK)
+        f.write(b"\0" * 16)
+    b.node.download_image(a.url, manifest, dest)
+    assert a.requests == [f"/api/cluster/images/{IMAGE}/vmlinuz/1"]
+
+
+def test_download_image_gives_up_on_a_peer_that_refuses(cluster):
+    a, b, tmp = cluster
+    manifest = b.node.fetch_manifest(a.url, IMAGE)
+    b.node.token = "wrong"
+    with pytest.raises(ClusterError):
+        b.node.download_image(a.url, manifest, os.path.join(tmp, "b", ".sync", IMAGE), workers=1)
@@ -0,0 +1,158 @@
+"""
+DhcpServer handshakes over 127.0.0.1 with the synthetic client in tests/dhcp_client.py.
+
+    python -m pytest -q tests/test_dhcpserver.py
+"""
+
+import asyncio
+import socket
+import struct
+
+from backend.app.dhcpserver import (
+    ACK, DECLINE, DISCOVER, NAK, OFFER, OPT_BOOT_FILE, OPT_REQUESTED_IP, OPT_SERVER_ID, OPT_TFTP_SERVER,
+    OPT_VENDOR_CLASS, REQUEST, DhcpServer,
+)
+
+from .dhcp_client import PXE_VENDOR, SERVER_IP, free_port, open_client, request_packet
+
+PXE = [(OPT_VENDOR_CLASS, PXE_VENDOR)]
+
+
+def ip_int(ip):
+    return struct.unpack("!I", socket.inet_aton(ip))[0]
+
+
+def mac_for(n):
+    return struct.pack("!HI", 0x5254, n)
+
+
+class Harness:
+    def __init__(self, server, client, target):
+        self.server = server
+        self.client = client
+        self.target = target
+        self.lines = []
+        server.add_listener(self.lines.extend)
+
+    async def send(self, message_type, xid, mac, options=(), ciaddr=0, reply=None, port=None):
+        """Send a request; with `reply`, wait for that reply type and return (yiaddr, options)."""
+        waiter = None
+        if reply is not None:
+            waiter = self.client.waiters[(xid, reply)] = asyncio.get_running_loop().create_future()
+        self.client.transport.sendto(request_packet(message_type, xid, mac, options, ciaddr), (SERVER_IP, port or self.target))
+        if waiter is not None:
+            return await asyncio.wait_for(waiter, 2)
+        await asyncio.sleep(0.1)
+
+    async def handshake(self, xid, mac, options=PXE):
+        yiaddr, offer = await self.send(DISCOVER, xid, mac, options, reply=OFFER)
+        return await self.send(REQUEST, xid, mac, [(OPT_REQUESTED_IP, struct.pack("!I", yiaddr)),
+                                                  (OPT_SERVER_ID, offer[OPT_SERVER_ID])] + list(options), reply=ACK)
+
+
+def with_server(mode, start_ip="10.0.0.10", end_ip="10.0.0.12", proxy=False):
+    """Runs `test(harness)` against a DhcpServer on loopback inside its own event loop."""
+    def wrap(test):
+        def run():
+            async def main():
+                transport, client, client_port = await open_client()
+                port = free_port()
+                server = DhcpServer(mode, host=SERVER_IP, port=port, proxy_port=free_port() if proxy else 0,
+                                    client_port=client_port, broadcast=SERVER_IP)
+                server.configure(SERVER_IP, start_ip, end_ip)
+                await server.start()
+                try:
+                    await asyncio.wait_for(test(Harness(server, client, port)), 20)
+                finally:
+                    await server.stop()
+                    transport.close()
+            asyncio.run(main())
+        run.__name__ = test.__name__
+        return run
+    return wrap
+
+
+# --- full DHCP ---
+
+@with_server("full")
+async def test_full_handshake_leases_an_address_from_the_range(h):
+    yiaddr, options = await h.handshake(1, mac_for(1))
+    assert ip_int("10.0.0.10") <= yiaddr <= ip_int("10.0.0.12")
+    assert options[OPT_SERVER_ID] == socket.inet_aton(SERVER_IP)
+    assert options[OPT_BOOT_FILE] == b"bootx64.efi"
+    lease = h.server.leases[mac_for(1).hex(":")]
+    assert lease.bound and lease.ip == yiaddr
+    # Log lines in dnsmasq format, so the DHCP index reads them like the container's
+    kinds = [line.split()[2].split("(")[0] for line in h.lines if "class:" not in line]
+    assert kinds == ["DHCPDISCOVER", "DHCPOFFER", "DHCPREQUEST", "DHCPACK"]
+    # The same client gets its address back
+    again, _ = await h.send(DISCOVER, 2, mac_for(1), PXE, reply=OFFER)
+    assert again == yiaddr
+
+
+@with_server("full")
+async def test_request_outside_the_range_or_for_a_taken_address_is_naked(h):
+    taken, _ = await h.handshake(1, mac_for(1))
+    await h.send(REQUEST, 2, mac_for(2), [(OPT_REQUESTED_IP, socket.inet_aton("192.168.1.5"))], reply=NAK)
+    await h.send(REQUEST, 3, mac_for(3), [(OPT_REQUESTED_IP, struct.pack("!I", taken))], reply=NAK)
+    assert h.server.sent["DHCPNAK"] == 2
+    assert h.server.leases[mac_for(1).hex(":")].ip == taken
+
+
+@with_server("full")
+async def test_request_for_another_server_drops_the_offer(h):
+    yiaddr, _ = await h.send(DISCOVER, 1, mac_for(1), PXE, reply=OFFER)
+    await h.send(REQUEST, 1, mac_for(1), [(OPT_REQUESTED_IP, struct.pack("!I", yiaddr)),
+                                          (OPT_SERVER_ID, socket.inet_aton("10.0.0.254"))])
+    assert (1, ACK) not in h.client.replies and (1, NAK) not in h.client.replies
+    assert mac_for(1).hex(":") not in h.server.leases
+
+
+@with_server("full", end_ip="10.0.0.11")
+async def test_declined_address_is_kept_out_of_the_pool(h):
+    declined, _ = await h.handshake(1, mac_for(1))
+    await h.send(DECLINE, 2, mac_for(1), [(OPT_REQUESTED_IP, struct.pack("!I", declined))])
+    assert mac_for(1).hex(":") not in h.server.leases
+    other, _ = await h.send(DISCOVER, 3, mac_for(2), PXE, reply=OFFER)
+    assert other != declined
+    # Two-address pool: one declined, one offered, so the next client finds none
+    await h.send(DISCOVER, 4, mac_for(3), PXE)
+    assert (4, OFFER) not in h.client.replies
+    assert h.lines[-1].endswith("no address available")
+
+
+@with_server("full")
+async def test_malformed_requested_ip_option_is_ignored(h):
+    yiaddr, _ = await h.send(DISCOVER, 1, mac_for(1), [(OPT_REQUESTED_IP, b"\x0a\x00\x00")] + PXE, reply=OFFER)
+    assert ip_int("10.0.0.10") <= yiaddr <= ip_int("10.0.0.12")
+    assert any("DHCPDISCOVER" in line for line in h.lines)
+
+
+@with_server("full")
+async def test_configure_keeps_leases_inside_the_new_range(h):
+    kept, _ = await h.handshake(1, mac_for(1))
+    h.server.configure(SERVER_IP, "10.0.0.10", "10.0.0.50", boot_file="ipxe.efi")
+    again, options = await h.send(DISCOVER, 2, mac_for(1), PXE, reply=OFFER)
+    assert again == kept
+    assert options[OPT_BOOT_FILE] == b"ipxe.efi"
+
+
+# --- ProxyDHCP ---
+
+@with_server("proxy", start_ip=None, end_ip=None, proxy=True)
+async def test_proxy_answers_pxe_clients_with_the_boot_file_only(h):
+    yiaddr, options = await h.send(DISCOVER, 1, mac_for(1), PXE, reply=OFFER)
+    assert yiaddr == 0
+    assert options[OPT_BOOT_FILE] == b"bootx64.efi"
+    assert options[OPT_TFTP_SERVER] == SERVER_IP.encode()
+    # The boot server request on port 4011 is acknowledged too
+    _, options = await h.send(REQUEST, 2, mac_for(1), PXE, port=h.server.proxy_port, reply=ACK)
+    assert options[OPT_BOOT_FILE] == b"bootx64.efi"
+    assert h.server.leases == {}
+
+
+@with_server("proxy", start_ip=None, end_ip=None)
+async def test_proxy_ignores_clients_without_pxe_vendor_class(h):
+    await h.send(DISCOVER, 1, mac_for(1))
+    assert h.client.replies == {}
+    assert h.server.totals["DHCPDISCOVER"] == 1
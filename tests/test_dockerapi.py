@@ -0,0 +1,170 @@
+"""
+DockerClient / ContainerMonitor against the fake engine in tests/fake_docker.py.
+
+    python -m pytest -q tests/test_dockerapi.py
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+
+import pytest
+
+from backend.app.dockerapi import ContainerMonitor, DockerClient, DockerError, LogDemuxer
+
+from .fake_docker import NAME, FakeEngine, stamp
+
+
+def frame(stream, payload):
+    return bytes([stream, 0, 0, 0]) + len(payload).to_bytes(4, "big") + payload
+
+
+async def until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached in time")
+        await asyncio.sleep(0.005)
+
+
+def with_engine(**options):
+    """Runs `test(engine, sock)` against a fresh fake engine inside its own event loop."""
+    def wrap(test):
+        def run():
+            async def main():
+                with tempfile.TemporaryDirectory() as tmp:
+                    sock = os.path.join(tmp, "docker.sock")
+                    engine = FakeEngine(sock, **options)
+                    await engine.start()
+                    try:
+                        await asyncio.wait_for(test(engine, sock), 20)
+                    finally:
+                        await engine.close()
+            asyncio.run(main())
+        run.__name__ = test.__name__
+        return run
+    return wrap
+
+
+# --- log framing ---
+
+def test_demuxer_reassembles_frames_split_at_every_byte():
+    data = frame(1, b"first line\nsecond ") + frame(2, b"line\r\n") + frame(1, b"third\n")
+    demux, lines = LogDemuxer(), []
+    for i in range(len(data)):
+        lines += demux.feed(data[i:i + 1])
+    assert lines == ["first line", "second line", "third"]
+
+
+def test_demuxer_passes_tty_output_through():
+    demux = LogDemuxer()
+    assert demux.feed(b"no frames here\npart") == ["no frames here"]
+    assert demux.feed(b"ial\n") == ["partial"]
+
+
+@pytest.mark.parametrize("split", [None, 1, 7, 64])
+def test_follow_logs_over_chunked_multiplexed_body(split):
+    @with_engine(split=split)
+    async def check(engine, sock):
+        ts = time.time()
+        await engine.log([f"stdout {n}" for n in range(50)], stream=1, ts=ts)
+        await engine.log([f"stderr {n}" for n in range(50)], stream=2, ts=ts + 1)
+        engine.state = "exited"
+        client = DockerClient(sock)
+        received = [entry async for batch in client.follow_logs(NAME) for entry in batch]
+        await client.close()
+        assert [line for _, line in received] == [f"stdout {n}" for n in range(50)] + [f"stderr {n}" for n in range(50)]
+        assert received[0][0] == stamp(ts) and received[-1][0] == stamp(ts + 1)
+
+    check()
+
+
+def test_follow_logs_from_tty_container():
+    @with_engine(tty=True, split=5)
+    async def check(engine, sock):
+        await engine.log(["a", "b", "c"])
+        engine.state = "exited"
+        client = DockerClient(sock)
+        received = [line async for batch in client.follow_logs(NAME) for _, line in batch]
+        await client.close()
+        assert received == ["a", "b", "c"]
+
+    check()
+
+
+# --- requests ---
+
+@with_engine()
+async def test_requests_share_one_connection_and_survive_a_dropped_one(engine, sock):
+    client = DockerClient(sock)
+    for _ in range(5):
+        assert (await client.inspect(NAME))["State"]["Status"] == "running"
+    assert engine.connections == 1
+    await engine.disconnect()
+    await asyncio.sleep(0.05)
+    await client.stop(NAME)
+    assert (await client.inspect(NAME))["State"]["Status"] == "exited"
+    assert engine.connections == 2
+    assert await client.inspect("missing") is None
+    with pytest.raises(DockerError) as e:
+        await client.start("missing")
+    assert e.value.status == 404
+    await client.close()
+
+
+# --- ContainerMonitor ---
+
+@with_engine(split=13)
+async def test_monitor_follows_state_and_logs_across_restarts(engine, sock):
+    client = DockerClient(sock)
+    monitor = ContainerMonitor(client, NAME, retry=0.05)
+    received, stamps = [], []
+    monitor.add_listener(lambda lines, batch_stamps: (received.extend(lines), stamps.extend(batch_stamps)))
+    monitor.start()
+    await until(lambda: monitor.state == "running")
+
+    ts = time.time()
+    await engine.log([f"before {n}" for n in range(100)], ts=ts)
+    await until(lambda: len(received) == 100)
+    await engine.emit("stop")
+    await until(lambda: monitor.state == "exited")
+    await engine.emit("start")
+    await until(lambda: monitor.state == "running")
+    # Lines sharing the last timestamp seen before the restart must not be dropped or repeated
+    await engine.log([f"same stamp {n}" for n in range(10)], ts=ts)
+    await engine.log([f"after {n}" for n in range(100)])
+    await until(lambda: len(received) >= 210)
+    await asyncio.sleep(0.1)
+    monitor.stop()
+    await client.close()
+
+    expected = [f"before {n}" for n in range(100)] + [f"same stamp {n}" for n in range(10)] + [f"after {n}" for n in range(100)]
+    assert received == expected
+    assert stamps[0] == pytest.approx(ts, abs=1e-6)
+
+
+@with_engine()
+async def test_monitor_reconnects_after_the_engine_drops_its_streams(engine, sock):
+    client = DockerClient(sock)
+    monitor = ContainerMonitor(client, NAME, retry=0.05)
+    states, received = [], []
+    monitor.add_state_listener(states.append)
+    monitor.add_listener(lambda lines, batch_stamps: received.extend(lines))
+    monitor.start()
+    await until(lambda: monitor.state == "running")
+    await engine.log([f"line {n}" for n in range(20)])
+    await until(lambda: len(received) == 20)
+
+    await engine.disconnect()
+    await until(lambda: "error" in states and monitor.state == "running")
+    # Events stream is back: state changes show up again, and the log follow resumed where it stopped
+    await engine.log([f"line {n}" for n in range(20, 40)])
+    await until(lambda: len(received) == 40)
+    await engine.emit("stop")
+    await until(lambda: monitor.state == "exited")
+    monitor.stop()
+    await client.close()
+
+    assert received == [f"line {n}" for n in range(40)]
+    assert monitor.error is None